@@ -36,6 +36,10 @@ void setup() {
   BLE.setAdvertisedService(sensorService);
   sensorService.addCharacteristic(sensorCharacteristic);
   BLE.addService(sensorService);
+
+  // Intervalo de conexión preferido 15-30 ms (unidades de 1.25 ms): holgado para 20 Hz
+  // y acorta la reconexión; el central puede aceptarlo o imponer el suyo
+  BLE.setConnectionInterval(0x000C, 0x0018);
   
   sensorCharacteristic.writeValue("Sensor Pierna - Esperando conexión...");
   
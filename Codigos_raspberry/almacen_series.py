@@ -0,0 +1,332 @@
+"""
+Almacén local de series de tiempo para los datos crudos de los sensores
+Escribe bloques comprimidos por minuto con un índice temporal, rollups de 1 s y 1 min
+y retención por tamaño (bloques, rollups y los archivos externos que se declaren, como
+los paquetes en preparación de subida_archivos.py, cuentan para ALMACEN_MAX_MB; se elimina
+primero lo más antiguo). Los bloques que `retener` marca (p. ej. aún sin subir) se conservan
+mientras el total no pase de ALMACEN_HOLGURA_RETENIDOS veces el máximo.
+Un bloque se cierra cuando cualquier flujo pasa al minuto siguiente o tras
+ALMACEN_CIERRE_INACTIVO_S sin muestras, así un sensor callado no deja su minuto abierto.
+Pensado para 20 Hz por sensor en una tarjeta SD: la compresión y los fsync se hacen en un
+hilo aparte y en lotes.
+
+Estructura en disco:
+    <raiz>/indice.csv                       flujo,inicio,fin,filas,archivo,bytes
+    <raiz>/<flujo>/<inicio_ms>.npz          bloque comprimido (ts float64, valores float32)
+    <raiz>/<flujo>/rollup_1s_<AAAAMMDD>.csv
+    <raiz>/<flujo>/rollup_1min_<AAAAMMDD>.csv
+"""
+import calendar
+import csv
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# --- CONFIGURACIÓN ---
+ALMACEN_DIR = os.environ.get("ALMACEN_DIR", "almacen")
+ALMACEN_ACTIVO = os.environ.get("ALMACEN_ACTIVO", "1") == "1"
+ALMACEN_MAX_MB = float(os.environ.get("ALMACEN_MAX_MB", "512"))
+# Tope para los bloques retenidos (sin subir): sobre max × holgura se eliminan igual, los más antiguos primero
+ALMACEN_HOLGURA_RETENIDOS = float(os.environ.get("ALMACEN_HOLGURA_RETENIDOS", "1.5"))
+DURACION_BLOQUE_S = 60  # Bloques alineados al minuto: los rollups nunca cruzan bloques
+FSYNC_CADA_S = float(os.environ.get("ALMACEN_FSYNC_CADA_S", "300"))
+# Un flujo sin muestras durante este tiempo cierra su bloque abierto (sensor desconectado o todos callados)
+CIERRE_INACTIVO_S = float(os.environ.get("ALMACEN_CIERRE_INACTIVO_S", "30"))
+RESOLUCIONES_ROLLUP = {"1s": 1, "1min": 60}
+COLUMNAS = ['ax', 'ay', 'az', 'gx', 'gy', 'gz']
+
+_CAMPOS_INDICE = ["flujo", "inicio", "fin", "filas", "archivo", "bytes"]
+
+
+# --- ROLLUPS ---
+def calcular_rollup(ts: np.ndarray, valores: np.ndarray, resolucion: float):
+    """Agrega (ts ordenado, valores) en cubetas de `resolucion` segundos.
+
+    Devuelve (inicio_cubeta, n, media, minimo, maximo) con una fila por cubeta.
+    """
+    cubetas = np.floor(ts / resolucion).astype(np.int64)
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(cubetas)) + 1))
+    n = np.diff(np.concatenate((inicios, [len(ts)])))
+    suma = np.add.reduceat(valores, inicios, axis=0, dtype=np.float64)
+    minimo = np.minimum.reduceat(valores, inicios, axis=0)
+    maximo = np.maximum.reduceat(valores, inicios, axis=0)
+    return cubetas[inicios] * resolucion, n, suma / n[:, None], minimo, maximo
+
+
+# --- ALMACÉN ---
+class AlmacenSeries:
+    """Almacén append-only con escritura en segundo plano"""
+
+    def __init__(self, raiz=ALMACEN_DIR, columnas=COLUMNAS, max_bytes: float = ALMACEN_MAX_MB * 1024 * 1024,
+                 fsync_cada_s: float = FSYNC_CADA_S, holgura_retenidos: float = ALMACEN_HOLGURA_RETENIDOS,
+                 cierre_inactivo_s: float = CIERRE_INACTIVO_S):
+        self.raiz = Path(raiz)
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        self.columnas = list(columnas)
+        self.max_bytes = max_bytes
+        self.holgura_retenidos = holgura_retenidos
+        self.fsync_cada_s = fsync_cada_s
+        self.cierre_inactivo_s = cierre_inactivo_s
+        self.retener = None  # callable(bloque) -> True si la retención no debe eliminarlo
+        self.bytes_externos = None  # callable() -> bytes de otros archivos bajo la raíz
+        self.retenidos_eliminados = 0
+        self.ruta_indice = self.raiz / "indice.csv"
+
+        self._buffers = {}  # flujo -> [minuto, [(ts, *valores), ...], última muestra (monotonic)]
+        self._minuto_reciente = float("-inf")  # Minuto más nuevo visto en cualquier flujo
+        self._lock_buffers = threading.Lock()  # agregar() contra leer() desde otro hilo
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()  # Protege el índice y los tamaños en memoria
+        self._pendientes_fsync = set()
+        self._ultimo_fsync = time.monotonic()
+        self.bloques = self._cargar_indice()
+        self.rollups = {ruta: ruta.stat().st_size for ruta in self.raiz.glob("*/rollup_*.csv")}
+        self.bytes_totales = sum(b["bytes"] for b in self.bloques) + sum(self.rollups.values())
+
+        self._hilo = threading.Thread(target=self._escritor, daemon=True, name="almacen-series")
+        self._hilo.start()
+
+    # --- CAMINO CALIENTE ---
+    def agregar(self, flujo: str, ts: float, valores):
+        """Agrega una fila; solo hace append a una lista (seguro para el loop de asyncio)"""
+        minuto = int(ts // DURACION_BLOQUE_S)
+        with self._lock_buffers:
+            if minuto > self._minuto_reciente:
+                # Cambio de minuto en cualquier flujo: también se cierran los bloques de los sensores
+                # callados, antes de que subida_archivos.py empaquete ese minuto sin ellos
+                self._minuto_reciente = minuto
+                self._cerrar_buffers(lambda abierto: abierto[0] < minuto)
+            actual = self._buffers.get(flujo)
+            if actual is None:
+                actual = self._buffers[flujo] = [minuto, [], 0.0]
+            elif actual[0] != minuto and actual[1]:
+                # Cambio de minuto: el bloque anterior se cierra y pasa al hilo escritor
+                self._cola.put((flujo, actual[1]))
+                actual[0], actual[1] = minuto, []
+            actual[1].append((ts, *valores))
+            actual[2] = time.monotonic()
+
+    def vaciar(self):
+        """Cierra los bloques abiertos (p. ej. al terminar)"""
+        with self._lock_buffers:
+            self._cerrar_buffers(lambda abierto: True)
+
+    def cerrar_inactivos(self, ahora: float | None = None):
+        """Cierra los bloques de los flujos sin muestras desde hace `cierre_inactivo_s`"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock_buffers:
+            self._cerrar_buffers(lambda abierto: ahora - abierto[2] >= self.cierre_inactivo_s)
+
+    def _cerrar_buffers(self, condicion):
+        # Requiere _lock_buffers
+        for flujo, abierto in list(self._buffers.items()):
+            if condicion(abierto):
+                if abierto[1]:
+                    self._cola.put((flujo, abierto[1]))
+                del self._buffers[flujo]
+
+    def cerrar(self):
+        self.vaciar()
+        self._cola.put(None)
+        self._hilo.join(timeout=30)
+        self._fsync_pendientes()
+
+    # --- HILO ESCRITOR ---
+    def _escritor(self):
+        while True:
+            try:
+                item = self._cola.get(timeout=min(self.fsync_cada_s, self.cierre_inactivo_s))
+            except queue.Empty:
+                item = ()
+                self.cerrar_inactivos()
+            if item is None:
+                break
+            if item:
+                try:
+                    self._escribir_bloque(*item)
+                    self._aplicar_retencion()
+                except OSError as e:
+                    print(f"ℹ Error escribiendo almacén local: {e}")
+            if time.monotonic() - self._ultimo_fsync >= self.fsync_cada_s:
+                self._fsync_pendientes()
+
+    def _escribir_bloque(self, flujo: str, filas: list):
+        tabla = np.asarray(filas, dtype=np.float64)
+        tabla = tabla[np.argsort(tabla[:, 0], kind="stable")]
+        ts = tabla[:, 0]
+        valores = tabla[:, 1:].astype(np.float32)
+
+        directorio = self.raiz / flujo
+        directorio.mkdir(exist_ok=True)
+        archivo = directorio / f"{int(ts[0] * 1000)}.npz"
+        np.savez_compressed(archivo, ts=ts, valores=valores)
+        self._pendientes_fsync.add(archivo)
+
+        bloque = {
+            "flujo": flujo, "inicio": float(ts[0]), "fin": float(ts[-1]), "filas": len(ts),
+            "archivo": str(archivo.relative_to(self.raiz)), "bytes": archivo.stat().st_size,
+        }
+        nuevo = not self.ruta_indice.exists()
+        with open(self.ruta_indice, "a", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=_CAMPOS_INDICE)
+            if nuevo:
+                escritor.writeheader()
+            escritor.writerow(bloque)
+        self._pendientes_fsync.add(self.ruta_indice)
+
+        with self._lock:
+            self.bloques.append(bloque)
+            self.bytes_totales += bloque["bytes"]
+
+        for nombre, resolucion in RESOLUCIONES_ROLLUP.items():
+            self._escribir_rollup(directorio, nombre, *calcular_rollup(ts, valores, resolucion))
+
+    def _escribir_rollup(self, directorio: Path, nombre: str, inicio, n, media, minimo, maximo):
+        dia = time.strftime("%Y%m%d", time.gmtime(inicio[0]))
+        ruta = directorio / f"rollup_{nombre}_{dia}.csv"
+        nuevo = not ruta.exists()
+        with open(ruta, "a", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            if nuevo:
+                escritor.writerow(["ts", "n"] + [f"{stat}_{c}" for stat in ("media", "min", "max")
+                                                 for c in self.columnas])
+            filas = np.column_stack((inicio, n, media, minimo, maximo))
+            escritor.writerows(np.round(filas, 5).tolist())
+        self._pendientes_fsync.add(ruta)
+        tamano = ruta.stat().st_size
+        with self._lock:
+            self.bytes_totales += tamano - self.rollups.get(ruta, 0)
+            self.rollups[ruta] = tamano
+
+    def _fsync_pendientes(self):
+        """Un solo fsync por archivo tocado desde el último lote (limita el desgaste de la SD)"""
+        directorios = set()
+        for ruta in self._pendientes_fsync:
+            try:
+                fd = os.open(ruta, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                directorios.add(ruta.parent)
+            except OSError:
+                pass
+        for directorio in directorios:
+            try:
+                fd = os.open(directorio, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+        self._pendientes_fsync.clear()
+        self._ultimo_fsync = time.monotonic()
+
+    # --- RETENCIÓN ---
+    @staticmethod
+    def _fin_dia_rollup(ruta: Path) -> float:
+        """Un rollup diario cuenta como tan antiguo como el final de su día (UTC)"""
+        return calendar.timegm(time.strptime(ruta.stem.rsplit("_", 1)[-1], "%Y%m%d")) + 86400
+
+    def ocupado(self) -> int:
+        """Bytes en disco que cuentan para max_bytes"""
+        return self.bytes_totales + (self.bytes_externos() if self.bytes_externos is not None else 0)
+
+    def _aplicar_retencion(self):
+        """Elimina lo más antiguo (bloques y rollups diarios) mientras se supere max_bytes.
+        Un rollup de un día se elimina después de los bloques de ese día; el de 1 s antes que el de 1 min.
+        Los bloques retenidos solo se eliminan si el total supera max_bytes × holgura_retenidos.
+        """
+        externos = self.bytes_externos() if self.bytes_externos is not None else 0
+        if self.bytes_totales + externos <= self.max_bytes:
+            return
+        with self._lock:
+            candidatos = [(b["inicio"], 0, "bloque", b) for b in self.bloques]
+            candidatos += [(self._fin_dia_rollup(ruta), 1 + ("_1min_" in ruta.name), "rollup", ruta)
+                           for ruta in self.rollups]
+            candidatos.sort(key=lambda c: c[:2])
+            bloques_eliminados, rollups_eliminados, retenidos = [], [], []
+            for _, _, tipo, item in candidatos:
+                if self.bytes_totales + externos <= self.max_bytes:
+                    break
+                if tipo == "bloque":
+                    if self.retener is not None and self.retener(item):
+                        retenidos.append(item)
+                        continue
+                    self.bytes_totales -= item["bytes"]
+                    bloques_eliminados.append(item)
+                else:
+                    self.bytes_totales -= self.rollups.pop(item)
+                    rollups_eliminados.append(item)
+            for bloque in retenidos:
+                if self.bytes_totales + externos <= self.max_bytes * self.holgura_retenidos:
+                    break
+                self.bytes_totales -= bloque["bytes"]
+                bloques_eliminados.append(bloque)
+                self.retenidos_eliminados += 1
+                print(f"ℹ Almacén lleno: se elimina {bloque['archivo']} sin haberse subido")
+            if bloques_eliminados:
+                eliminados = {id(b) for b in bloques_eliminados}
+                self.bloques = [b for b in self.bloques if id(b) not in eliminados]
+            restantes = list(self.bloques)
+        for ruta in [self.raiz / b["archivo"] for b in bloques_eliminados] + rollups_eliminados:
+            ruta.unlink(missing_ok=True)
+        if bloques_eliminados:
+            self._reescribir_indice(restantes)
+
+    def _reescribir_indice(self, bloques):
+        tmp = self.ruta_indice.with_suffix(".tmp")
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=_CAMPOS_INDICE)
+            escritor.writeheader()
+            escritor.writerows(bloques)
+        os.replace(tmp, self.ruta_indice)
+        self._pendientes_fsync.add(self.ruta_indice)
+
+    def _cargar_indice(self) -> list:
+        if not self.ruta_indice.exists():
+            return []
+        with open(self.ruta_indice, newline="", encoding="utf-8") as f:
+            bloques = []
+            for fila in csv.DictReader(f):
+                fila["inicio"], fila["fin"] = float(fila["inicio"]), float(fila["fin"])
+                fila["filas"], fila["bytes"] = int(fila["filas"]), int(fila["bytes"])
+                bloques.append(fila)
+        return bloques
+
+    # --- LECTURA ---
+    def leer(self, flujo: str, desde: float = 0, hasta: float = float("inf")):
+        """Devuelve (ts, valores) del flujo en [desde, hasta] usando el índice temporal"""
+        with self._lock:
+            candidatos = sorted((b for b in self.bloques
+                                 if b["flujo"] == flujo and b["fin"] >= desde and b["inicio"] <= hasta),
+                                key=lambda b: b["inicio"])
+        partes_ts, partes_val = [], []
+        for bloque in candidatos:
+            try:
+                with np.load(self.raiz / bloque["archivo"]) as datos:
+                    ts, valores = datos["ts"], datos["valores"]
+            except FileNotFoundError:
+                continue  # Eliminado por retención
+            mascara = (ts >= desde) & (ts <= hasta)
+            partes_ts.append(ts[mascara])
+            partes_val.append(valores[mascara])
+
+        # Incluye también las filas aún en memoria
+        with self._lock_buffers:
+            abierto = self._buffers.get(flujo)
+            filas = list(abierto[1]) if abierto else []
+        if filas:
+            tabla = np.asarray(filas, dtype=np.float64)
+            mascara = (tabla[:, 0] >= desde) & (tabla[:, 0] <= hasta)
+            partes_ts.append(tabla[mascara, 0])
+            partes_val.append(tabla[mascara, 1:].astype(np.float32))
+
+        if not partes_ts:
+            return np.empty(0), np.empty((0, len(self.columnas)), dtype=np.float32)
+        return np.concatenate(partes_ts), np.concatenate(partes_val)
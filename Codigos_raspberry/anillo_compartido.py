@@ -0,0 +1,112 @@
+"""
+Buffer circular en memoria compartida entre procesos
+Un proceso escritor (BLE) agrega muestras y los lectores (inferencia) obtienen ventanas sin copias
+
+Cada muestra se escribe dos veces (posición i e i + capacidad) para que cualquier
+ventana de hasta `capacidad` muestras sea contigua y se pueda entregar como vista numpy.
+Los lectores validan con el contador de secuencia que la ventana no se haya sobrescrito.
+"""
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# --- CONFIGURACIÓN ---
+CAPACIDAD = 4096  # ~3.4 minutos a 20 Hz
+N_FEATURES = 12
+
+# Cabecera: [secuencia, capacidad, n_features, reservado]
+_CABECERA = 4
+_BYTES_CABECERA = _CABECERA * 8
+
+
+class AnilloCompartido:
+    """Ring buffer de muestras float32 con marcas de tiempo float64"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, propietario: bool):
+        self.shm = shm
+        self.propietario = propietario
+        self.cabecera = np.ndarray((_CABECERA,), dtype=np.int64, buffer=shm.buf)
+        self.capacidad = int(self.cabecera[1])
+        self.n_features = int(self.cabecera[2])
+        offset = _BYTES_CABECERA
+        self.tiempos = np.ndarray((2 * self.capacidad,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.tiempos.nbytes
+        self.datos = np.ndarray((2 * self.capacidad, self.n_features), dtype=np.float32,
+                                buffer=shm.buf, offset=offset)
+
+    @property
+    def nombre(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def crear(cls, capacidad: int = CAPACIDAD, n_features: int = N_FEATURES, nombre: str | None = None):
+        tamano = _BYTES_CABECERA + 2 * capacidad * (8 + 4 * n_features)
+        shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+        cabecera = np.ndarray((_CABECERA,), dtype=np.int64, buffer=shm.buf)
+        cabecera[:] = (0, capacidad, n_features, 0)
+        del cabecera
+        return cls(shm, propietario=True)
+
+    @classmethod
+    def abrir(cls, nombre: str):
+        # Los lectores son hijos del creador y comparten su resource_tracker,
+        # por lo que el segmento solo se libera cuando el creador llama a cerrar()
+        shm = shared_memory.SharedMemory(name=nombre)
+        return cls(shm, propietario=False)
+
+    # --- ESCRITURA ---
+    @property
+    def secuencia(self) -> int:
+        """Total de muestras escritas desde la creación"""
+        return int(self.cabecera[0])
+
+    def escribir(self, muestra, ts: float | None = None):
+        """Agrega una muestra; la secuencia se publica después de los datos"""
+        seq = int(self.cabecera[0])
+        i = seq % self.capacidad
+        ts = time.time() if ts is None else ts
+        self.datos[i] = muestra
+        self.datos[i + self.capacidad] = muestra
+        self.tiempos[i] = ts
+        self.tiempos[i + self.capacidad] = ts
+        self.cabecera[0] = seq + 1
+
+    # --- LECTURA ---
+    def ventana(self, n: int, hasta: int | None = None):
+        """Devuelve (seq_fin, datos, tiempos) con las n muestras previas a `hasta`.
+
+        `datos` y `tiempos` son vistas sobre la memoria compartida (sin copia);
+        llamar a `vigente(seq_fin - n)` después de usarlas confirma que no se sobrescribieron.
+        """
+        if n > self.capacidad:
+            raise ValueError(f"Ventana de {n} muestras excede la capacidad {self.capacidad}")
+        seq = self.secuencia if hasta is None else hasta
+        if seq < n:
+            return seq, None, None
+        inicio = (seq - n) % self.capacidad
+        return seq, self.datos[inicio:inicio + n], self.tiempos[inicio:inicio + n]
+
+    def vigente(self, seq_inicio: int) -> bool:
+        """True si la muestra seq_inicio no fue (ni está siendo) sobrescrita"""
+        return self.secuencia - seq_inicio < self.capacidad
+
+    def esperar(self, seq_objetivo: int, timeout: float = 1.0, intervalo: float = 0.005) -> bool:
+        """Espera activa liviana hasta que la secuencia alcance seq_objetivo"""
+        limite = time.monotonic() + timeout
+        while self.secuencia < seq_objetivo:
+            if time.monotonic() > limite:
+                return False
+            time.sleep(intervalo)
+        return True
+
+    # --- CIERRE ---
+    def cerrar(self):
+        # Las vistas numpy deben soltarse antes de cerrar el buffer
+        self.cabecera = self.tiempos = self.datos = None
+        self.shm.close()
+        if self.propietario:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
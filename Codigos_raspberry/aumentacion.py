@@ -0,0 +1,252 @@
+"""
+Aumentación de datos vectorizada para ventanas IMU (n, window_size, n_features)
+Rotación aleatoria de los ejes de cada sensor, escalado de magnitud, deformación temporal,
+ruido y desfase entre cadera y pierna. Trabaja sobre ventanas ya escaladas con la spec:
+la rotación usa la misma matriz para acelerómetro y giroscopio de un mismo sensor.
+
+Reproducible: cada lote usa una semilla derivada de (semilla, época, lote), así el resultado
+no depende de cuántos hilos lo generen ni del orden en que terminen.
+
+Benchmark:
+    python aumentacion.py --benchmark
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+import preprocesamiento as prep
+
+# --- CONFIGURACIÓN ---
+SEMILLA = int(os.environ.get("AUMENTACION_SEMILLA", "42"))
+PROBABILIDAD = 0.5  # Cada transformación se aplica a la mitad de las ventanas del lote
+MAX_GRADOS = 15.0
+SIGMA_MAGNITUD = 0.1
+SIGMA_TIEMPO = 0.2
+NODOS_TIEMPO = 4
+SIGMA_RUIDO = 0.03  # Relativo a la desviación estándar de cada columna en el lote
+MAX_DESFASE = 3  # Muestras de desfase entre cadera y pierna (150 ms a 20 Hz)
+HILOS = os.cpu_count() or 1
+PREFETCH = 4  # Lotes preparados por adelantado por hilo
+
+
+# --- COLUMNAS ---
+def grupos_ejes(columnas) -> list:
+    """Tripletas (x, y, z) de acelerómetro y giroscopio por sensor: [(sensor, [ia], [ig]), ...]"""
+    grupos = []
+    for prefijo in ("cadera_", "pierna_", ""):
+        acel = [f"{prefijo}a{e}" for e in "xyz"]
+        giro = [f"{prefijo}g{e}" for e in "xyz"]
+        if all(c in columnas for c in acel + giro):
+            grupos.append((prefijo.rstrip("_") or "unico", [columnas.index(c) for c in acel],
+                           [columnas.index(c) for c in giro]))
+    return grupos
+
+
+def columnas_pierna(columnas) -> list:
+    return [i for i, c in enumerate(columnas) if c.startswith("pierna_")]
+
+
+# --- TRANSFORMACIONES ---
+def matrices_rotacion(rng, n: int, max_grados: float = MAX_GRADOS) -> np.ndarray:
+    """n matrices 3x3 (fórmula de Rodrigues) con eje aleatorio y ángulo uniforme en ±max_grados"""
+    eje = rng.normal(size=(n, 3))
+    eje /= np.linalg.norm(eje, axis=1, keepdims=True)
+    angulo = np.radians(rng.uniform(-max_grados, max_grados, size=n))
+    K = np.zeros((n, 3, 3))
+    K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -eje[:, 2], eje[:, 1], -eje[:, 0]
+    K -= K.transpose(0, 2, 1)
+    seno, coseno = np.sin(angulo)[:, None, None], np.cos(angulo)[:, None, None]
+    return np.eye(3) + seno * K + (1 - coseno) * (K @ K)
+
+
+def rotar(X: np.ndarray, rng, columnas, max_grados: float = MAX_GRADOS) -> np.ndarray:
+    """Rota los ejes de cada sensor (montaje distinto del IMU en el cuerpo)"""
+    for _, acel, giro in grupos_ejes(columnas):
+        R = matrices_rotacion(rng, len(X), max_grados).astype(X.dtype)
+        for idx in (acel, giro):
+            X[:, :, idx] = np.einsum("nij,ntj->nti", R, X[:, :, idx])
+    return X
+
+
+def escalar_magnitud(X: np.ndarray, rng, sigma: float = SIGMA_MAGNITUD) -> np.ndarray:
+    """Multiplica cada columna de cada ventana por un factor ~N(1, sigma)"""
+    X *= rng.normal(1.0, sigma, size=(len(X), 1, X.shape[2])).astype(X.dtype)
+    return X
+
+
+def _interpolar(X: np.ndarray, posiciones: np.ndarray) -> np.ndarray:
+    """Muestrea X (n, w, c) en posiciones fraccionarias (n, w) con interpolación lineal"""
+    w = X.shape[1]
+    posiciones = np.clip(posiciones, 0, w - 1)
+    i0 = np.floor(posiciones).astype(np.int64)
+    i1 = np.minimum(i0 + 1, w - 1)
+    frac = (posiciones - i0)[:, :, None].astype(X.dtype)
+    a = np.take_along_axis(X, i0[:, :, None], axis=1)
+    b = np.take_along_axis(X, i1[:, :, None], axis=1)
+    return a + (b - a) * frac
+
+
+def deformar_tiempo(X: np.ndarray, rng, sigma: float = SIGMA_TIEMPO, nodos: int = NODOS_TIEMPO) -> np.ndarray:
+    """Acelera y frena la ventana con una curva de velocidad suave (caídas más rápidas o lentas)"""
+    n, w, _ = X.shape
+    velocidad_nodos = np.clip(rng.normal(1.0, sigma, size=(n, nodos + 2)), 0.2, None)
+    t_nodos = np.linspace(0, w - 1, nodos + 2)
+    t = np.arange(w)
+    # Interpolación lineal de la velocidad en cada instante (vectorizada por ventana)
+    k = np.clip(np.searchsorted(t_nodos, t, side="right") - 1, 0, nodos)
+    frac = (t - t_nodos[k]) / (t_nodos[k + 1] - t_nodos[k])
+    velocidad = velocidad_nodos[:, k] * (1 - frac) + velocidad_nodos[:, k + 1] * frac
+    acumulada = np.cumsum(velocidad, axis=1)
+    acumulada = (acumulada - acumulada[:, :1]) / (acumulada[:, -1:] - acumulada[:, :1]) * (w - 1)
+    return _interpolar(X, acumulada)
+
+
+def agregar_ruido(X: np.ndarray, rng, sigma: float = SIGMA_RUIDO) -> np.ndarray:
+    """Ruido gaussiano proporcional a la desviación de cada columna"""
+    escala = X.std(axis=(0, 1), keepdims=True) * sigma
+    X += (rng.standard_normal(size=X.shape, dtype=np.float32) * escala).astype(X.dtype)
+    return X
+
+
+def desfasar_sensores(X: np.ndarray, rng, columnas, max_desfase: int = MAX_DESFASE) -> np.ndarray:
+    """Desplaza la pierna respecto de la cadera ±max_desfase muestras (latencia BLE distinta)"""
+    pierna = columnas_pierna(columnas)
+    if not pierna or max_desfase <= 0:
+        return X
+    n, w, _ = X.shape
+    desfase = rng.integers(-max_desfase, max_desfase + 1, size=(n, 1))
+    indices = np.clip(np.arange(w)[None, :] - desfase, 0, w - 1)
+    X[:, :, pierna] = np.take_along_axis(X[:, :, pierna], indices[:, :, None], axis=1)
+    return X
+
+
+TRANSFORMACIONES = ("rotacion", "magnitud", "tiempo", "ruido", "desfase")
+
+
+def aumentar(X: np.ndarray, rng, columnas, probabilidad: float = PROBABILIDAD,
+             transformaciones=TRANSFORMACIONES) -> np.ndarray:
+    """Devuelve una copia aumentada; cada transformación se aplica a un subconjunto aleatorio"""
+    X = np.array(X, dtype=np.float32, copy=True)
+    for nombre in transformaciones:
+        elegidas = np.flatnonzero(rng.random(len(X)) < probabilidad)
+        if not len(elegidas):
+            continue
+        sub = X[elegidas]
+        if nombre == "rotacion":
+            sub = rotar(sub, rng, columnas)
+        elif nombre == "magnitud":
+            sub = escalar_magnitud(sub, rng)
+        elif nombre == "tiempo":
+            sub = deformar_tiempo(sub, rng)
+        elif nombre == "ruido":
+            sub = agregar_ruido(sub, rng)
+        elif nombre == "desfase":
+            sub = desfasar_sensores(sub, rng, columnas)
+        X[elegidas] = sub
+    return X
+
+
+# --- PIPELINE DE ENTRADA ---
+def _lote(X, y, columnas, semilla, epoca, lote, batch_size, balancear):
+    rng = np.random.default_rng([semilla, epoca, lote])
+    if balancear:
+        # Igual probabilidad por clase: las caídas (minoría) aparecen tanto como las normales
+        clases, conteos = np.unique(y, return_counts=True)
+        pesos = (1.0 / conteos[np.searchsorted(clases, y)])
+        indices = rng.choice(len(X), size=batch_size, p=pesos / pesos.sum())
+    else:
+        indices = rng.integers(0, len(X), size=batch_size)
+    return aumentar(X[indices], rng, columnas), y[indices]
+
+
+def generador_lotes(X, y, columnas, batch_size: int, semilla: int = SEMILLA, hilos: int = HILOS,
+                    balancear: bool = False, epocas: int | None = None):
+    """Genera (X_lote, y_lote) indefinidamente (o `epocas` épocas) preparando lotes en paralelo.
+
+    Una época son ceil(len(X) / batch_size) lotes, igual que `steps_per_epoch` en model.fit.
+    Al cerrar el generador (`close()`, o cuando se libera) se cancelan los lotes adelantados
+    y se liberan los hilos.
+    """
+    y = np.asarray(y)
+    lotes_por_epoca = -(-len(X) // batch_size)
+    trabajos = ((e, b) for e in _contador(epocas) for b in range(lotes_por_epoca))
+    pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="aumentacion")
+    try:
+        pendientes = [pool.submit(_lote, X, y, columnas, semilla, e, b, batch_size, balancear)
+                      for e, b in islice(trabajos, hilos * PREFETCH)]
+        while pendientes:
+            futuro = pendientes.pop(0)
+            for e, b in islice(trabajos, 1):
+                pendientes.append(pool.submit(_lote, X, y, columnas, semilla, e, b, batch_size, balancear))
+            yield futuro.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def entrenar_modelo(model, X_train, y_train, validacion, columnas, epochs: int, batch_size: int,
+                    callbacks=(), con_aumentacion: bool = False, balancear: bool = False,
+                    semilla: int = SEMILLA):
+    """model.fit con lotes aumentados (TRAIN_AUMENTAR/TRAIN_BALANCEAR) o con los datos tal cual.
+
+    Devuelve el History de Keras. Los hilos del generador se liberan al terminar, también
+    cuando EarlyStopping corta antes o el entrenamiento falla.
+    """
+    if not con_aumentacion:
+        return model.fit(X_train, y_train, validation_data=validacion, epochs=epochs,
+                         batch_size=batch_size, callbacks=list(callbacks), verbose=1)
+    balanceo = ", lotes balanceados por clase" if balancear else ""
+    print(f"🔀 Aumentación activa (semilla {semilla}, {HILOS} hilos{balanceo})")
+    lotes = generador_lotes(X_train, y_train, columnas, batch_size, semilla, balancear=balancear)
+    try:
+        return model.fit(lotes, steps_per_epoch=-(-len(X_train) // batch_size), validation_data=validacion,
+                         epochs=epochs, callbacks=list(callbacks), verbose=1)
+    finally:
+        lotes.close()  # Keras deja de pedir lotes (fin o EarlyStopping): liberar los hilos
+
+
+def _contador(limite):
+    e = 0
+    while limite is None or e < limite:
+        yield e
+        e += 1
+
+
+# --- BENCHMARK ---
+def benchmark(n: int = 4096, batch_size: int = 256, columnas=prep.FEATURES_DUAL):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, prep.WINDOW_SIZE, len(columnas))).astype(np.float32)
+    y = (rng.random(n) < 0.1).astype(np.int32)
+    print(f"📊 {n} ventanas {X.shape[1:]} | lotes de {batch_size}")
+
+    for nombre in TRANSFORMACIONES:
+        t0 = time.perf_counter()
+        for i in range(0, n, batch_size):
+            aumentar(X[i:i + batch_size], rng, columnas, probabilidad=1.0, transformaciones=(nombre,))
+        dt = time.perf_counter() - t0
+        print(f"   {nombre:<10} {n / dt:>12,.0f} ventanas/s")
+
+    for hilos in sorted({1, 2, HILOS}):
+        t0 = time.perf_counter()
+        total = sum(len(xb) for xb, _ in generador_lotes(X, y, columnas, batch_size, hilos=hilos, epocas=1))
+        dt = time.perf_counter() - t0
+        print(f"   pipeline completo, {hilos} hilo(s): {total / dt:>10,.0f} ventanas/s")
+
+    a = next(generador_lotes(X, y, columnas, batch_size, semilla=7, hilos=1, epocas=1))[0]
+    b = next(generador_lotes(X, y, columnas, batch_size, semilla=7, hilos=HILOS, epocas=1))[0]
+    print(f"   Reproducible con distinta cantidad de hilos: {'sí' if np.array_equal(a, b) else 'NO'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aumentación de ventanas IMU")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--ventanas", type=int, default=4096)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.ventanas, args.batch)
+    else:
+        parser.print_help()
@@ -0,0 +1,258 @@
+"""
+Prueba de carga y resistencia (soak) del gateway de alertas server.py
+Levanta un CallMeBot falso con latencia y tasa de error configurables, inicia server.py
+apuntando a él (CALLMEBOT_URL) y simula receptores y dashboards enviando a /send-alert.
+Reporta por intervalo y al final: throughput, percentiles de latencia, errores por tipo
+y memoria residente (RSS) del servidor.
+
+Uso:
+    python carga_servidor.py --receptores 20 --dashboards 5 --duracion 60
+    python carga_servidor.py --duracion 3600 --intervalo 60 --latencia-ms 800 --tasa-error 0.05   (soak)
+    python carga_servidor.py --url http://192.168.1.50:5000/send-alert   (servidor ya iniciado)
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from metricas import Histograma
+
+# --- CONFIGURACIÓN ---
+LATENCIA_MS = 300.0  # Latencia media de CallMeBot
+JITTER_MS = 100.0
+TASA_ERROR = 0.0
+TIMEOUT_CLIENTE_S = 30.0
+BUCKETS_MS = tuple(np.round(np.geomspace(1, 60_000, 60), 2))  # Histograma global acotado en memoria
+MENSAJE = "ALERTA DE CAÍDA DETECTADA\n\nPersona: Prueba\nConfianza: 97.0%\nID: carga"
+ORIGEN_DASHBOARD = "http://localhost:3000"
+
+
+# --- CALLMEBOT FALSO ---
+class CallMeBotFalso:
+    """Responde como whatsapp.php tras una latencia gaussiana; falla con probabilidad tasa_error"""
+
+    def __init__(self, latencia_ms: float = LATENCIA_MS, jitter_ms: float = JITTER_MS,
+                 tasa_error: float = TASA_ERROR):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.tasa_error = tasa_error
+        self.solicitudes = 0
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/whatsapp.php"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True, name="callmebot-falso").start()
+
+    def _handler(self):
+        falso = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                falso.solicitudes += 1
+                time.sleep(max(0.0, random.gauss(falso.latencia_ms, falso.jitter_ms)) / 1000)
+                if random.random() < falso.tasa_error:
+                    codigo, cuerpo = 500, b"APIKey is invalid or server error"
+                else:
+                    codigo, cuerpo = 200, b"Message queued. You will receive it in a few seconds."
+                self.send_response(codigo)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+        return Handler
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+# --- SERVIDOR BAJO PRUEBA ---
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(callmebot_url: str, timeout_callmebot_s: float):
+    """Lanza server.py en un subproceso; devuelve (proceso, url de /send-alert)"""
+    puerto = puerto_libre()
+    entorno = dict(os.environ, CALLMEBOT_URL=callmebot_url, SERVER_PUERTO=str(puerto),
+                   CALLMEBOT_TIMEOUT_S=str(timeout_callmebot_s), PYTHONUNBUFFERED="1")
+    proceso = subprocess.Popen([sys.executable, str(Path(__file__).with_name("server.py"))], env=entorno,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + 15
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.5).close()
+            return proceso, f"http://127.0.0.1:{puerto}/send-alert"
+        except OSError:
+            if proceso.poll() is not None:
+                break
+            time.sleep(0.1)
+    proceso.kill()
+    raise RuntimeError("server.py no inició (¿flask y flask_cors instalados?)")
+
+
+def rss_mb(pid: int | None) -> float | None:
+    """Memoria residente del proceso (Linux /proc); None si no se puede leer"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# --- CLIENTES SIMULADOS ---
+class Resultados:
+    """Acumula resultados por intervalo (exactos) y globales (histograma acotado)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.intervalo = []  # (tipo, latencia_ms, resultado)
+        self.global_ = {"receptor": Histograma(BUCKETS_MS), "dashboard": Histograma(BUCKETS_MS)}
+        self.resultados = Counter()
+
+    def registrar(self, tipo: str, latencia_ms: float, resultado: str):
+        with self._lock:
+            self.intervalo.append((tipo, latencia_ms, resultado))
+            self.global_[tipo].observar(latencia_ms)
+            self.resultados[(tipo, resultado)] += 1
+
+    def tomar_intervalo(self) -> list:
+        with self._lock:
+            filas, self.intervalo = self.intervalo, []
+        return filas
+
+
+def cliente(tipo: str, url: str, resultados: Resultados, detener: threading.Event, pausa_s: float):
+    """Un receptor (POST directo) o un dashboard (preflight CORS + POST) en bucle cerrado"""
+    sesion = requests.Session()
+    cabeceras = {"Origin": ORIGEN_DASHBOARD} if tipo == "dashboard" else {}
+    cuerpo = {"phone": "+56900000000", "apiCode": "123456", "message": MENSAJE}
+    while not detener.is_set():
+        t0 = time.perf_counter()
+        try:
+            if tipo == "dashboard":
+                sesion.options(url, headers={**cabeceras, "Access-Control-Request-Method": "POST"},
+                               timeout=TIMEOUT_CLIENTE_S)
+            r = sesion.post(url, json=cuerpo, headers=cabeceras, timeout=TIMEOUT_CLIENTE_S)
+            resultado = "ok" if r.status_code == 200 else f"http_{r.status_code}"
+        except requests.exceptions.Timeout:
+            resultado = "timeout"
+        except requests.exceptions.ConnectionError:
+            resultado = "conexion"
+        resultados.registrar(tipo, (time.perf_counter() - t0) * 1000, resultado)
+        if pausa_s > 0:
+            detener.wait(random.expovariate(1 / pausa_s))
+    sesion.close()
+
+
+# --- REPORTE ---
+def resumir_intervalo(filas: list, dt: float, rss: float | None) -> str:
+    if not filas:
+        return f"   0 solicitudes en {dt:.0f}s" + (f" | RSS {rss:.1f} MB" if rss else "")
+    latencias = np.array([f[1] for f in filas])
+    errores = sum(f[2] != "ok" for f in filas)
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    texto = (f"   {len(filas) / dt:7.1f} sol/s | p50 {p50:7.1f} ms | p95 {p95:7.1f} ms | p99 {p99:7.1f} ms"
+             f" | errores {100 * errores / len(filas):5.1f}%")
+    return texto + (f" | RSS {rss:.1f} MB" if rss else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga y soak de server.py con un CallMeBot falso")
+    parser.add_argument("--url", help="URL de /send-alert ya en ejecución (no inicia server.py)")
+    parser.add_argument("--receptores", type=int, default=10)
+    parser.add_argument("--dashboards", type=int, default=2)
+    parser.add_argument("--pausa-s", type=float, default=0.0, help="Pausa media entre envíos por cliente")
+    parser.add_argument("--duracion", type=float, default=30.0)
+    parser.add_argument("--intervalo", type=float, default=5.0)
+    parser.add_argument("--latencia-ms", type=float, default=LATENCIA_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--tasa-error", type=float, default=TASA_ERROR)
+    parser.add_argument("--timeout-callmebot", type=float, default=10.0)
+    args = parser.parse_args()
+
+    falso = proceso = None
+    url = args.url
+    if url is None:
+        falso = CallMeBotFalso(args.latencia_ms, args.jitter_ms, args.tasa_error)
+        proceso, url = iniciar_servidor(falso.url, args.timeout_callmebot)
+        print(f"🤖 CallMeBot falso: {args.latencia_ms:.0f}±{args.jitter_ms:.0f} ms, "
+              f"error {args.tasa_error:.0%} | server.py pid {proceso.pid}")
+    pid = proceso.pid if proceso else None
+
+    resultados = Resultados()
+    detener = threading.Event()
+    hilos = [threading.Thread(target=cliente, args=(tipo, url, resultados, detener, args.pausa_s), daemon=True)
+             for tipo, n in (("receptor", args.receptores), ("dashboard", args.dashboards)) for _ in range(n)]
+    print(f"🚀 {args.receptores} receptores + {args.dashboards} dashboards → {url} durante {args.duracion:.0f}s")
+
+    rss_inicial = rss_mb(pid)
+    rss_max = rss_inicial or 0.0
+    t_inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    try:
+        t_intervalo = t_inicio
+        while time.monotonic() - t_inicio < args.duracion:
+            time.sleep(min(args.intervalo, max(0.0, args.duracion - (time.monotonic() - t_inicio))))
+            ahora = time.monotonic()
+            rss = rss_mb(pid)
+            rss_max = max(rss_max, rss or 0.0)
+            print(f"[{ahora - t_inicio:6.0f}s]" + resumir_intervalo(resultados.tomar_intervalo(),
+                                                                     ahora - t_intervalo, rss))
+            t_intervalo = ahora
+            if proceso is not None and proceso.poll() is not None:
+                print(f"❌ server.py terminó (código {proceso.returncode})")
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detener.set()
+        for hilo in hilos:
+            hilo.join(timeout=TIMEOUT_CLIENTE_S)
+        rss_final = rss_mb(pid)
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+        if falso is not None:
+            falso.cerrar()
+
+    dt = time.monotonic() - t_inicio
+    print("\n📊 Resumen")
+    for tipo, hist in resultados.global_.items():
+        if not hist.total:
+            continue
+        errores = {r: n for (t, r), n in resultados.resultados.items() if t == tipo and r != "ok"}
+        print(f"   {tipo:<10} {hist.total:>8} sol | {hist.total / dt:7.1f} sol/s | media {hist.suma / hist.total:7.1f} ms"
+              f" | p50 ≤{hist.percentil(0.5):.0f} ms | p95 ≤{hist.percentil(0.95):.0f} ms"
+              f" | p99 ≤{hist.percentil(0.99):.0f} ms")
+        if errores:
+            print("              errores: " +", ".join(f"{r}={n}" for r, n in sorted(errores.items())))
+    if rss_inicial:
+        print(f"   RSS server.py: {rss_inicial:.1f} → {rss_final or rss_max:.1f} MB (máx {rss_max:.1f} MB)")
+    if falso is not None:
+        print(f"   CallMeBot falso recibió {falso.solicitudes} solicitudes")
+
+
+if __name__ == "__main__":
+    main()
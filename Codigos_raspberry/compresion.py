@@ -0,0 +1,245 @@
+"""
+Compresión del modelo: destilación a un estudiante pequeño y poda por magnitud
+El estudiante reemplaza Flatten → Dense(64) por GlobalAveragePooling1D y aprende de las
+etiquetas reales y de los logits del maestro; la temperatura solo entra en la pérdida, así
+la salida del estudiante guardado es una probabilidad sin suavizar, como la del maestro.
+Reporta parámetros, tamaño del archivo, latencia y recall de caídas frente al maestro al
+umbral de alerta del receptor (UMBRAL_CAIDA), y guarda el estudiante más pequeño que cumple
+el piso de recall.
+
+Uso:
+    python compresion.py datos/*.csv --maestro ../modelo_cnn_imu.h5 --recall-min 0.95
+    (los archivos con "caida"/"fall" en el nombre son caídas, como en train.py)
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+import aumentacion
+import modelo_ligero
+import preprocesamiento as prep
+
+# --- CONFIGURACIÓN ---
+MAESTRO_PATH = "modelo_cnn_imu.h5"
+SALIDA_PATH = "modelo_cnn_imu_compacto.h5"
+# (filtros conv1, filtros conv2) de cada estudiante candidato, del más chico al más grande
+ESTUDIANTES = [(4, 8), (8, 16), (16, 32)]
+TEMPERATURA = 2.0  # Suaviza maestro y estudiante solo dentro de la pérdida
+ALFA = 0.5  # Peso de la etiqueta real frente a la del maestro
+PODA = 0.5  # Fracción de pesos de menor magnitud que se anulan
+EPOCHS = 20
+EPOCHS_PODA = 3
+BATCH_SIZE = 64
+UMBRAL = modelo_ligero.UMBRAL_CAIDA  # El receptor, el hub y el detector alertan a 0.95
+RECALL_MIN = 0.95  # Relativo al recall del maestro
+REPETICIONES_LATENCIA = 200
+
+
+# --- DATOS ---
+def cargar_ventanas(archivos, spec: dict):
+    """Ventanas con la spec del maestro; etiqueta por nombre de archivo"""
+    ventanas, etiquetas = [], []
+    for ruta in archivos:
+        etiqueta = int('caida' in ruta.name.lower() or 'fall' in ruta.name.lower())
+        X = prep.preparar_dataframe(pd.read_csv(ruta), spec)
+        v = prep.crear_ventanas(X, spec["window_size"], spec["overlap"])
+        ventanas.append(v)
+        etiquetas.append(np.full(len(v), etiqueta, dtype=np.int32))
+        print(f"   {ruta.name}: {len(v)} ventanas ({'caída' if etiqueta else 'normal'})")
+    return np.concatenate(ventanas).astype(np.float32), np.concatenate(etiquetas)
+
+
+# --- MODELOS ---
+def crear_estudiante(window_size: int, num_features: int, filtros):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv1D, MaxPooling1D, Dropout, GlobalAveragePooling1D, Dense, Input
+
+    f1, f2 = filtros
+    return Sequential([
+        Input(shape=(window_size, num_features)),
+        Conv1D(f1, 5, activation='relu', padding='same'),
+        MaxPooling1D(2),
+        Conv1D(f2, 3, activation='relu', padding='same'),
+        Dropout(0.2),
+        GlobalAveragePooling1D(),
+        Dense(1, activation='sigmoid'),
+    ])
+
+
+def objetivos_destilacion(maestro, X, y):
+    """Columnas [etiqueta real, logit del maestro] para perdida_destilacion (sin temperatura)"""
+    p = np.clip(maestro.predict(X, verbose=0).reshape(-1), 1e-6, 1 - 1e-6)
+    return np.column_stack([y, np.log(p / (1 - p))]).astype(np.float32)
+
+
+def perdida_destilacion(objetivos, p):
+    """ALFA · BCE(etiqueta, p) + (1 − ALFA) · T² · BCE(σ(logit_maestro / T), σ(logit_estudiante / T)).
+    La temperatura solo suaviza dentro de la pérdida: el estudiante sigue prediciendo
+    probabilidades calibradas contra la etiqueta real y el umbral de alerta conserva su sentido.
+    """
+    import tensorflow as tf
+    from tensorflow.keras.losses import binary_crossentropy
+
+    y, logit_maestro = objetivos[:, :1], objetivos[:, 1:]
+    p = tf.clip_by_value(p, 1e-6, 1 - 1e-6)
+    logit = tf.math.log(p / (1 - p))
+    dura = binary_crossentropy(y, p)
+    suave = binary_crossentropy(tf.sigmoid(logit_maestro / TEMPERATURA), tf.sigmoid(logit / TEMPERATURA))
+    return ALFA * dura + (1 - ALFA) * TEMPERATURA ** 2 * suave
+
+
+def lotes_destilacion(maestro, X, y, spec, aumentar: bool):
+    """Lotes (aumentados si corresponde) con los logits del maestro calculados sobre el lote final"""
+    if aumentar:
+        for Xb, yb in aumentacion.generador_lotes(X, y, spec["columnas"], BATCH_SIZE):
+            yield Xb, objetivos_destilacion(maestro, Xb, yb)
+    else:
+        rng = np.random.default_rng(aumentacion.SEMILLA)
+        while True:
+            indices = rng.permutation(len(X))
+            for i in range(0, len(X), BATCH_SIZE):
+                lote = indices[i:i + BATCH_SIZE]
+                yield X[lote], objetivos_destilacion(maestro, X[lote], y[lote])
+
+
+def _kernels(modelo):
+    return [capa for capa in modelo.layers if getattr(capa, "kernel", None) is not None]
+
+
+def podar(modelo, fraccion: float) -> dict:
+    """Anula la fracción de pesos de menor magnitud de cada kernel; devuelve las máscaras"""
+    mascaras = {}
+    for capa in _kernels(modelo):
+        pesos = capa.get_weights()
+        umbral = np.quantile(np.abs(pesos[0]), fraccion)
+        mascaras[capa.name] = (np.abs(pesos[0]) > umbral).astype(pesos[0].dtype)
+        pesos[0] = pesos[0] * mascaras[capa.name]
+        capa.set_weights(pesos)
+    return mascaras
+
+
+def callback_mascaras(modelo, mascaras):
+    """Reaplica las máscaras tras cada lote para que el ajuste fino no reviva pesos podados"""
+    from tensorflow.keras.callbacks import LambdaCallback
+
+    def aplicar(*_):
+        for capa in _kernels(modelo):
+            pesos = capa.get_weights()
+            pesos[0] = pesos[0] * mascaras[capa.name]
+            capa.set_weights(pesos)
+    return LambdaCallback(on_train_batch_end=aplicar)
+
+
+# --- MEDICIONES ---
+def medir(modelo, X_val, y_val, umbral: float = UMBRAL) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = Path(tmp) / "modelo.h5"
+        modelo.save(ruta)
+        contenido = ruta.read_bytes()
+    # Los pesos podados (ceros) solo ahorran espacio comprimidos: se reportan ambos tamaños
+    ventana = X_val[:1]
+    modelo(ventana, training=False)
+    tiempos = []
+    for _ in range(REPETICIONES_LATENCIA):
+        t0 = time.perf_counter()
+        modelo(ventana, training=False)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    pred = modelo.predict(X_val, verbose=0).reshape(-1) > umbral
+    positivos = y_val == 1
+    return {
+        "umbral": umbral,
+        "parametros": int(modelo.count_params()),
+        "bytes": len(contenido),
+        "bytes_gzip": len(gzip.compress(contenido)),
+        "latencia_ms_p50": float(np.percentile(tiempos, 50)),
+        "latencia_ms_p95": float(np.percentile(tiempos, 95)),
+        "recall": float(pred[positivos].mean()) if positivos.any() else float("nan"),
+        "falsos_positivos": int(pred[~positivos].sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Destila el modelo CNN en estudiantes pequeños")
+    parser.add_argument("archivos", nargs="+", type=Path, help="CSV de entrenamiento")
+    parser.add_argument("--maestro", default=MAESTRO_PATH)
+    parser.add_argument("--salida", default=SALIDA_PATH)
+    parser.add_argument("--recall-min", type=float, default=RECALL_MIN, help="Recall mínimo relativo al maestro")
+    parser.add_argument("--poda", type=float, default=PODA, help="Fracción a podar (0 = sin poda)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--sin-aumentacion", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    from tensorflow import keras
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    maestro = keras.models.load_model(args.maestro)
+    spec = prep.cargar_spec(args.maestro) or prep.spec_por_defecto(maestro.input_shape)
+    prep.validar_modelo(maestro.input_shape, spec)
+    print(f"🎓 Maestro: {args.maestro} ({prep.describir_layout(spec['columnas'])})")
+
+    print("📂 Cargando datos...")
+    X, y = cargar_ventanas(args.archivos, spec)
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    ref = medir(maestro, X_val, y_val)
+    filas = [{"modelo": "maestro", **ref}]
+    print(f"   Maestro: {ref['parametros']:,} parámetros | recall {ref['recall']:.3f} (umbral {UMBRAL})")
+
+    pasos = -(-len(X_train) // BATCH_SIZE)
+    objetivos_val = objetivos_destilacion(maestro, X_val, y_val)
+    candidatos = []
+    for filtros in ESTUDIANTES:
+        nombre = f"estudiante_{filtros[0]}x{filtros[1]}"
+        print(f"\n🧪 {nombre}")
+        modelo = crear_estudiante(spec["window_size"], len(spec["columnas"]), filtros)
+        modelo.compile(optimizer='adam', loss=perdida_destilacion)
+        modelo.fit(lotes_destilacion(maestro, X_train, y_train, spec, not args.sin_aumentacion),
+                   steps_per_epoch=pasos, epochs=args.epochs, validation_data=(X_val, objetivos_val),
+                   callbacks=[EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+                   verbose=0)
+        variantes = [(nombre, modelo)]
+        if args.poda > 0:
+            podado = keras.models.clone_model(modelo)
+            podado.set_weights(modelo.get_weights())
+            podado.compile(optimizer=keras.optimizers.Adam(1e-4), loss=perdida_destilacion)
+            mascaras = podar(podado, args.poda)
+            podado.fit(lotes_destilacion(maestro, X_train, y_train, spec, not args.sin_aumentacion),
+                       steps_per_epoch=pasos, epochs=EPOCHS_PODA,
+                       callbacks=[callback_mascaras(podado, mascaras)], verbose=0)
+            variantes.append((f"{nombre}_poda{int(args.poda * 100)}", podado))
+        for etiqueta, variante in variantes:
+            r = medir(variante, X_val, y_val)
+            r["recall_relativo"] = r["recall"] / ref["recall"] if ref["recall"] else float("nan")
+            filas.append({"modelo": etiqueta, **r})
+            candidatos.append((r["bytes_gzip"], etiqueta, variante, r))
+            print(f"   {etiqueta}: {r['parametros']:,} parámetros | {r['bytes_gzip'] / 1024:.1f} KB gzip | "
+                  f"{r['latencia_ms_p50']:.2f} ms | recall {r['recall']:.3f} ({r['recall_relativo']:.2f}x)")
+
+    tabla = pd.DataFrame(filas)
+    print("\n📊 Resumen:")
+    print(tabla.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    tabla.to_csv(Path(args.salida).with_suffix(".csv"), index=False)
+
+    validos = [c for c in sorted(candidatos, key=lambda c: c[0]) if c[3]["recall_relativo"] >= args.recall_min]
+    if not validos:
+        print(f"\n❌ Ningún estudiante alcanza {args.recall_min:.2f}x el recall del maestro al umbral {UMBRAL}")
+        exit(1)
+    _, etiqueta, elegido, r = validos[0]
+    # Sin la pérdida de destilación en el archivo: el receptor lo carga con keras.models.load_model
+    elegido.compile(optimizer='adam', loss='binary_crossentropy')
+    elegido.save(args.salida)
+    prep.guardar_spec(args.salida, spec)
+    print(f"\n💾 {etiqueta} guardado en {args.salida} "
+          f"({r['parametros'] / ref['parametros']:.1%} de los parámetros del maestro)")
+
+
+if __name__ == "__main__":
+    main()
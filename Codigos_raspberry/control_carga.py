@@ -0,0 +1,76 @@
+"""
+Control de carga del lazo de detección (Raspberry Pi sobrecargada o con throttling térmico)
+Mide cuánto se atrasa cada iteración respecto de su plazo de 50 ms y, con un promedio
+exponencial e histéresis, sube o baja un nivel de degradación de a un paso:
+
+    0 normal          todo activo
+    1 sin_consola     no se imprime el resumen en consola
+    2 paso_amplio     se predice cada PASO_PREDICCION * CARGA_FACTOR_PASO muestras
+    3 backend_ligero  el modelo dual se reemplaza por el modelo ligero (modelo_ligero.py)
+
+Ningún nivel descarta muestras: la ventana recibe siempre todas, solo se hace menos trabajo por muestra.
+"""
+import os
+import time
+
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+NIVELES = ("normal", "sin_consola", "paso_amplio", "backend_ligero")
+CARGA_SUBIR_MS = float(os.environ.get("CARGA_SUBIR_MS", "20"))  # Retraso medio que hace subir un nivel
+CARGA_BAJAR_MS = float(os.environ.get("CARGA_BAJAR_MS", "5"))  # Retraso medio bajo el cual se baja un nivel
+CARGA_ALFA = float(os.environ.get("CARGA_ALFA", "0.1"))  # Peso de la última iteración en el promedio
+CARGA_ESPERA_S = float(os.environ.get("CARGA_ESPERA_S", "5"))  # Mínimo entre dos subidas
+CARGA_CALMA_S = float(os.environ.get("CARGA_CALMA_S", "30"))  # Tiempo en calma antes de bajar un nivel
+CARGA_FACTOR_PASO = int(os.environ.get("CARGA_FACTOR_PASO", "2"))
+BUCKETS_RETRASO_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+METRICAS.describir("receptor_lazo_retraso_ms", "histogram", "Atraso de cada iteración del lazo respecto de su plazo")
+METRICAS.describir("receptor_carga_nivel", "gauge", "Nivel de degradación por carga (0 = normal)")
+METRICAS.describir("receptor_carga_cambios_total", "counter", "Cambios de nivel de degradación por nivel y sentido")
+
+
+class ControlCarga:
+    """Alimentado con el retraso de cada iteración; `nivel` indica cuánto degradar"""
+
+    def __init__(self, nivel_max: int = len(NIVELES) - 1, subir_ms: float = CARGA_SUBIR_MS,
+                 bajar_ms: float = CARGA_BAJAR_MS, alfa: float = CARGA_ALFA,
+                 espera_s: float = CARGA_ESPERA_S, calma_s: float = CARGA_CALMA_S):
+        self.nivel_max = nivel_max
+        self.subir_ms = subir_ms
+        self.bajar_ms = bajar_ms
+        self.alfa = alfa
+        self.espera_s = espera_s
+        self.calma_s = calma_s
+        self.nivel = 0
+        self.retraso_ms = 0.0  # Promedio exponencial
+        self._cambio = float("-inf")
+        self._calma_desde = None
+        METRICAS.fijar("receptor_carga_nivel", 0)
+
+    def registrar(self, retraso_s: float, ahora: float | None = None) -> int:
+        """Retorna el nivel vigente tras considerar el retraso de esta iteración"""
+        ahora = time.monotonic() if ahora is None else ahora
+        retraso_ms = max(0.0, retraso_s * 1000)
+        METRICAS.observar("receptor_lazo_retraso_ms", retraso_ms, buckets=BUCKETS_RETRASO_MS)
+        self.retraso_ms = self.alfa * retraso_ms + (1 - self.alfa) * self.retraso_ms
+
+        if self.retraso_ms < self.bajar_ms:
+            if self._calma_desde is None:
+                self._calma_desde = ahora
+        else:
+            self._calma_desde = None
+
+        if (self.retraso_ms > self.subir_ms and self.nivel < self.nivel_max
+                and ahora - self._cambio >= self.espera_s):
+            self._cambiar(self.nivel + 1, ahora, "sube")
+        elif self.nivel > 0 and self._calma_desde is not None and ahora - max(self._calma_desde, self._cambio) >= self.calma_s:
+            self._cambiar(self.nivel - 1, ahora, "baja")
+        return self.nivel
+
+    def _cambiar(self, nivel: int, ahora: float, sentido: str):
+        self.nivel = nivel
+        self._cambio = ahora
+        METRICAS.fijar("receptor_carga_nivel", nivel)
+        METRICAS.incrementar("receptor_carga_cambios_total", nivel=NIVELES[nivel], sentido=sentido)
+        print(f"⚖️  Carga: nivel {nivel} ({NIVELES[nivel]}), retraso medio {self.retraso_ms:.1f} ms")
@@ -0,0 +1,247 @@
+"""
+Detector de eventos de caída sobre las probabilidades por ventana
+Suaviza con EMA y votación k de n, aplica histéresis (umbral alto para confirmar,
+umbral bajo para cerrar) y recorre los estados reposo → pre-impacto → impacto → inactividad
+→ refractario. Tras el impacto se exige quietud sostenida (quietud_s) antes de emitir: poco
+movimiento medido en la señal cruda (ver movimiento()) o, sin ese dato, probabilidad baja.
+Si la persona sigue en movimiento durante inactividad_max_s el candidato se descarta.
+Emite un solo evento por caída con inicio, fin del impacto y confianza pico.
+
+Ajuste offline sobre las salidas de puntuar_sesiones.py (archivos *_ventanas.csv;
+los archivos con "caida"/"fall" en el nombre se consideran caídas, como en train.py):
+    python detector_eventos.py puntuaciones/ --barrido
+    python detector_eventos.py puntuaciones/ --alfa 0.5 --k 2 --umbral-bajo 0.6
+"""
+import argparse
+import itertools
+import os
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import preprocesamiento as prep
+
+# --- ESTADOS ---
+REPOSO = "reposo"
+PRE_IMPACTO = "pre_impacto"  # La probabilidad sube pero aún no se confirma
+IMPACTO = "impacto"  # Confirmado; se sigue el pico hasta que baje
+INACTIVIDAD = "inactividad"  # Tras el impacto: se espera quietud sostenida para emitir
+REFRACTARIO = "refractario"  # Tras emitir: no se abren eventos nuevos
+
+# --- CONFIGURACIÓN ---
+PARAMETROS = {
+    "alfa": float(os.environ.get("DETECTOR_ALFA", "0.5")),  # Peso de la ventana nueva en la EMA
+    "umbral_alto": float(os.environ.get("DETECTOR_UMBRAL_ALTO", "0.95")),
+    "umbral_bajo": float(os.environ.get("DETECTOR_UMBRAL_BAJO", "0.6")),
+    "k": int(os.environ.get("DETECTOR_K", "2")),  # Ventanas sobre umbral_alto entre las últimas n
+    "n": int(os.environ.get("DETECTOR_N", "3")),
+    "impacto_max_s": float(os.environ.get("DETECTOR_IMPACTO_MAX_S", "1.5")),  # Cota de latencia de la alerta
+    "quietud_s": float(os.environ.get("DETECTOR_QUIETUD_S", "1.0")),  # Quietud continua para emitir
+    "inactividad_max_s": float(os.environ.get("DETECTOR_INACTIVIDAD_MAX_S", "5")),  # Espera máxima de quietud
+    "movimiento_max": float(os.environ.get("DETECTOR_MOVIMIENTO_MAX", "0.1")),  # Desviación de |a| en g
+    "refractario_s": float(os.environ.get("DETECTOR_REFRACTARIO_S", "10")),
+}
+MUESTRAS_MOVIMIENTO = int(prep.FRECUENCIA_HZ)  # Último segundo de señal para medir movimiento
+
+REJILLA = {
+    "alfa": (0.3, 0.5, 0.7, 1.0),
+    "umbral_alto": (0.9, 0.95, 0.98),
+    "umbral_bajo": (0.5, 0.7),
+    "k": (1, 2, 3),
+}
+
+
+def movimiento(bloque, columnas=prep.FEATURES_DUAL, n: int = MUESTRAS_MOVIMIENTO) -> float | None:
+    """Desviación estándar de la magnitud de la aceleración (g) en las últimas n muestras crudas.
+    Con dos sensores se toma la mayor. `bloque` (muestras, ≥len(columnas)) en el orden de `columnas`.
+    """
+    bloque = np.asarray(bloque, dtype=np.float32)
+    if len(bloque) < 2:
+        return None
+    reciente = bloque[-n:]
+    desviaciones = []
+    for prefijo in ("cadera_", "pierna_", ""):
+        ejes = [f"{prefijo}a{e}" for e in "xyz"]
+        if all(c in columnas for c in ejes):
+            acel = reciente[:, [columnas.index(c) for c in ejes]]
+            desviaciones.append(float(np.linalg.norm(acel, axis=1).std()))
+    return max(desviaciones) if desviaciones else None
+
+
+class DetectorEventos:
+    """Máquina de estados alimentada con (ts, probabilidad[, movimiento]) en orden temporal"""
+
+    def __init__(self, **parametros):
+        self.p = {**PARAMETROS, **parametros}
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.estado = REPOSO
+        self.ema = 0.0
+        self.votos = deque(maxlen=self.p["n"])
+        self.inicio = None
+        self.desde = None  # ts de entrada al estado actual (impacto, inactividad o refractario)
+        self.fin = None  # ts de cierre del impacto
+        self.quieto_desde = None
+        self.pico = 0.0
+        self.ts_pico = None
+        self.ventanas = 0
+        self.descartados = 0  # Impactos sin quietud posterior
+
+    def actualizar(self, ts: float, prob: float, movimiento: float | None = None) -> dict | None:
+        """Procesa una ventana; devuelve el evento al confirmarse una caída, si no None.
+        `movimiento` es el de movimiento() sobre la misma ventana (None = usar la probabilidad).
+        """
+        p = self.p
+        prob = float(prob)
+        self.ema = p["alfa"] * prob + (1 - p["alfa"]) * self.ema
+        self.votos.append(prob > p["umbral_alto"])
+        confirmado = self.ema >= p["umbral_alto"] or sum(self.votos) >= p["k"]
+
+        if self.estado == REFRACTARIO:
+            if ts - self.desde < p["refractario_s"]:
+                return None
+            self.estado = REPOSO
+
+        if self.estado == INACTIVIDAD:
+            return self._verificar_quietud(ts, movimiento)
+
+        if self.estado == REPOSO:
+            if not confirmado and self.ema < p["umbral_bajo"]:
+                return None
+            self.estado = PRE_IMPACTO
+            self.inicio, self.pico, self.ts_pico, self.ventanas = ts, prob, ts, 0
+
+        self.ventanas += 1
+        if prob > self.pico:
+            self.pico, self.ts_pico = prob, ts
+
+        if self.estado == PRE_IMPACTO:
+            if confirmado:
+                self.estado, self.desde = IMPACTO, ts
+            elif self.ema < p["umbral_bajo"]:
+                self.estado = REPOSO  # Subida que no llegó a confirmarse
+                return None
+            else:
+                return None
+
+        # IMPACTO: se cierra al bajar de umbral_bajo o al cumplir impacto_max_s
+        if self.ema < p["umbral_bajo"] or ts - self.desde >= p["impacto_max_s"]:
+            self.estado, self.desde, self.fin, self.quieto_desde = INACTIVIDAD, ts, ts, None
+            return self._verificar_quietud(ts, movimiento)
+        return None
+
+    def _verificar_quietud(self, ts: float, movimiento: float | None) -> dict | None:
+        p = self.p
+        if movimiento is not None:
+            quieto = movimiento < p["movimiento_max"]
+        else:
+            quieto = self.ema < p["umbral_bajo"]
+        if not quieto:
+            self.quieto_desde = None
+        elif self.quieto_desde is None:
+            self.quieto_desde = ts
+
+        if self.quieto_desde is not None and ts - self.quieto_desde >= p["quietud_s"]:
+            evento = {"inicio": self.inicio, "fin": self.fin, "pico": self.pico, "ts_pico": self.ts_pico,
+                      "ventanas": self.ventanas, "inactividad_s": ts - self.fin}
+            self.estado, self.desde = REFRACTARIO, ts
+            return evento
+        if ts - self.fin >= p["inactividad_max_s"]:
+            self.estado = REPOSO  # Siguió moviéndose: no era una caída (o ya se levantó)
+            self.descartados += 1
+        return None
+
+
+def detectar(ts, probs, **parametros) -> list:
+    """Eventos de una secuencia completa de probabilidades"""
+    detector = DetectorEventos(**parametros)
+    eventos = []
+    for t, prob in zip(ts, probs):
+        evento = detector.actualizar(float(t), prob)
+        if evento:
+            eventos.append(evento)
+    return eventos
+
+
+# --- AJUSTE OFFLINE ---
+def cargar_puntuaciones(directorio) -> list:
+    """[(nombre, es_caida, ts, probs)] desde los *_ventanas.csv de puntuar_sesiones.py"""
+    sesiones = []
+    for ruta in sorted(Path(directorio).glob("*_ventanas.csv")):
+        df = pd.read_csv(ruta)
+        nombre = ruta.name[:-len("_ventanas.csv")]
+        es_caida = 'caida' in nombre.lower() or 'fall' in nombre.lower()
+        # El receptor dispone de la ventana cuando llega su última muestra
+        ts = df["muestra_fin"].to_numpy(dtype=np.float64) / prep.FRECUENCIA_HZ
+        sesiones.append((nombre, es_caida, ts, df["probabilidad"].to_numpy(dtype=np.float32)))
+    return sesiones
+
+
+def evaluar(sesiones: list, **parametros) -> dict:
+    """Recall por archivo de caída y falsos eventos por hora en archivos normales"""
+    caidas = detectadas = eventos_caida = falsos = 0
+    horas_normales = 0.0
+    for _, es_caida, ts, probs in sesiones:
+        n = len(detectar(ts, probs, **parametros))
+        if es_caida:
+            caidas += 1
+            detectadas += n > 0
+            eventos_caida += n
+        else:
+            falsos += n
+            if len(ts):
+                horas_normales += (ts[-1] - ts[0] + 1 / prep.FRECUENCIA_HZ) / 3600
+    return {
+        "recall": detectadas / caidas if caidas else float("nan"),
+        "eventos_por_caida": eventos_caida / detectadas if detectadas else 0.0,
+        "falsos": falsos,
+        "falsos_por_hora": falsos / horas_normales if horas_normales else 0.0,
+    }
+
+
+def barrido(sesiones: list, rejilla: dict = REJILLA) -> pd.DataFrame:
+    """Evalúa todas las combinaciones de la rejilla (mejor recall, luego menos falsos)"""
+    nombres = list(rejilla)
+    filas = []
+    for valores in itertools.product(*(rejilla[n] for n in nombres)):
+        parametros = dict(zip(nombres, valores))
+        if parametros.get("umbral_bajo", 0) >= parametros.get("umbral_alto", 1):
+            continue
+        filas.append({**parametros, **evaluar(sesiones, **parametros)})
+    return pd.DataFrame(filas).sort_values(["recall", "falsos_por_hora", "eventos_por_caida"],
+                                           ascending=[False, True, True], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajusta el detector de eventos sobre puntuaciones offline")
+    parser.add_argument("directorio", type=Path, help="Salida de puntuar_sesiones.py")
+    parser.add_argument("--barrido", action="store_true", help="Probar la rejilla de parámetros")
+    parser.add_argument("--top", type=int, default=10)
+    for nombre, valor in PARAMETROS.items():
+        parser.add_argument(f"--{nombre.replace('_', '-')}", dest=nombre, type=type(valor), default=valor)
+    args = parser.parse_args()
+
+    sesiones = cargar_puntuaciones(args.directorio)
+    if not sesiones:
+        print(f"❌ No hay archivos *_ventanas.csv en {args.directorio}")
+        exit(1)
+    n_caidas = sum(s[1] for s in sesiones)
+    print(f"📂 {len(sesiones)} sesiones ({n_caidas} de caída, {len(sesiones) - n_caidas} normales)")
+
+    if args.barrido:
+        resultados = barrido(sesiones)
+        print(resultados.head(args.top).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        return
+
+    parametros = {nombre: getattr(args, nombre) for nombre in PARAMETROS}
+    r = evaluar(sesiones, **parametros)
+    print(f"Parámetros: {parametros}")
+    print(f"  Recall por archivo: {r['recall']:.3f}  |  eventos por caída: {r['eventos_por_caida']:.2f}")
+    print(f"  Falsos: {r['falsos']} ({r['falsos_por_hora']:.2f}/h)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Carga de modelos y elección del modelo según los sensores frescos
+Compartido por el receptor (receptor_dual_ble.py) y el hub (hub_inferencia.py): una "entrada"
+es un modelo listo para predecir con su spec, la escala, las columnas que usa de las 12 crudas
+y las banderas de frescura que necesita.
+"""
+import numpy as np
+
+import modelo_ligero
+import preprocesamiento as prep
+
+N_CRUDAS = len(prep.FEATURES_DUAL)  # Tras las 12 columnas crudas van las banderas de frescura (cadera, pierna)
+MODOS = ("dual", "cadera", "pierna")  # Orden de preferencia
+
+
+def cargar_entrada(ruta, sensor_por_defecto="cadera"):
+    """Carga un modelo, valida su spec y lo calienta con una predicción en blanco.
+    Lanza ValueError si el modelo no es compatible con el receptor.
+    """
+    if modelo_ligero.es_ligero(ruta):
+        modelo = modelo_ligero.cargar(ruta)  # Backend sin TensorFlow (ver modelo_ligero.py)
+    else:
+        # Import diferido: el proceso de captura BLE del modo dividido no carga TensorFlow
+        from tensorflow import keras
+        modelo = keras.models.load_model(ruta)
+
+    spec_modelo = prep.cargar_spec(ruta)
+    if spec_modelo is None:
+        spec_modelo = prep.spec_por_defecto(modelo.input_shape, sensor_por_defecto)
+        print(f" Sin {prep.ruta_spec(ruta).name}; se asume layout {prep.describir_layout(spec_modelo['columnas'])}")
+    prep.validar_modelo(modelo.input_shape, spec_modelo)
+    # Solo se pueden armar columnas de cadera/pierna
+    indices = prep.indices_columnas(spec_modelo["columnas"], sensor_por_defecto)
+
+    window_size = spec_modelo["window_size"]
+    modelo.predict(np.zeros((1, window_size, len(indices)), dtype=np.float32), verbose=0)
+    return {
+        "ruta": str(ruta),
+        "modelo": modelo,
+        "spec": spec_modelo,
+        "escala": prep.vector_escala(spec_modelo),
+        "indices": indices,
+        "window_size": window_size,
+        # Banderas de frescura que deben estar activas (0 = cadera, 1 = pierna)
+        "sensores": sorted({N_CRUDAS + (i >= len(prep.FEATURES_CADERA)) for i in indices}),
+    }
+
+
+def elegir_modo(modelos: dict, bloque: np.ndarray):
+    """Elige el modelo según qué sensores tienen datos frescos en toda su ventana.
+    Prefiere el dual; si un sensor está obsoleto usa el modelo del otro (si existe).
+    """
+    for modo in MODOS:
+        entrada = modelos.get(modo)
+        if entrada is None or len(bloque) < entrada["window_size"]:
+            continue
+        if bloque[-entrada["window_size"]:, entrada["sensores"]].all():
+            return modo
+    return None
@@ -0,0 +1,205 @@
+"""
+Evaluación en sombra (A/B) de un modelo candidato sobre el flujo en vivo
+El receptor entrega cada ventana ya evaluada por el modelo de producción; un hilo aparte
+la puntúa en lotes con el candidato, registra desacuerdos y diferencias de probabilidad
+y mantiene un resumen. La latencia del camino principal no cambia (solo una copia y un put).
+
+Uso del informe:
+    python evaluacion_sombra.py [directorio]
+
+Estructura en disco:
+    <ALMACEN_DIR>/sombra/desacuerdos_<AAAAMMDD>.csv   ts,modo,p_produccion,p_candidato,delta
+    <ALMACEN_DIR>/sombra/resumen.json                 contadores acumulados
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from almacen_series import ALMACEN_DIR
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+SOMBRA_DIR = os.path.join(ALMACEN_DIR, "sombra")
+LOTE_MAX = 32  # Ventanas por llamada a predict del candidato
+DELTA_REGISTRO = float(os.environ.get("SOMBRA_DELTA", "0.2"))  # |Δp| que se registra aunque coincidan
+RESUMEN_CADA_S = 60.0
+BUCKETS_DELTA = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+
+_CAMPOS = ["ts", "modo", "p_produccion", "p_candidato", "delta"]
+
+METRICAS.describir("receptor_sombra_ventanas_total", "counter", "Ventanas puntuadas por el modelo candidato")
+METRICAS.describir("receptor_sombra_desacuerdos_total", "counter", "Ventanas donde candidato y producción deciden distinto")
+METRICAS.describir("receptor_sombra_descartadas_total", "counter", "Ventanas no evaluadas por cola llena")
+METRICAS.describir("receptor_sombra_delta", "histogram", "|p_candidato - p_produccion| por ventana")
+
+
+def resumen_vacio() -> dict:
+    return {"ventanas": 0, "desacuerdos": 0, "solo_produccion": 0, "solo_candidato": 0,
+            "ambos_caida": 0, "suma_abs_delta": 0.0, "max_abs_delta": 0.0, "descartadas": 0}
+
+
+class EvaluadorSombra:
+    """Puntúa ventanas con un modelo candidato en un hilo aparte.
+
+    `entrada` es un dict como los de `cargar_entrada` del receptor (modelo, indices,
+    escala, window_size, sensores).
+    """
+
+    def __init__(self, entrada: dict, umbral: float, directorio=SOMBRA_DIR, lote_max: int = LOTE_MAX):
+        self.entrada = entrada
+        self.umbral = umbral
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.lote_max = lote_max
+        self.resumen = self._cargar_resumen()
+        self._cola = queue.Queue(maxsize=8 * lote_max)
+        self._ultimo_resumen = time.monotonic()
+        self._hilo = threading.Thread(target=self._trabajador, daemon=True, name="evaluacion-sombra")
+        self._hilo.start()
+
+    # --- CAMINO CALIENTE ---
+    def enviar(self, ts: float, bloque: np.ndarray, prob: float, modo: str):
+        """Encola la ventana para el candidato; nunca bloquea"""
+        w = self.entrada["window_size"]
+        if len(bloque) < w or not bloque[-w:, self.entrada["sensores"]].all():
+            return  # El candidato no tiene datos frescos de sus sensores
+        X = bloque[-w:, self.entrada["indices"]] * self.entrada["escala"]
+        try:
+            self._cola.put_nowait((ts, X, float(prob), modo))
+        except queue.Full:
+            self.resumen["descartadas"] += 1
+            METRICAS.incrementar("receptor_sombra_descartadas_total")
+
+    def cerrar(self):
+        self._cola.put(None)
+        self._hilo.join(timeout=10)
+        self._guardar_resumen()
+
+    # --- HILO DE EVALUACIÓN ---
+    def _trabajador(self):
+        while True:
+            item = self._cola.get()
+            if item is None:
+                return
+            lote = [item]
+            fin = False
+            while len(lote) < self.lote_max:
+                try:
+                    item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    fin = True  # Se evalúa lo ya reunido antes de terminar
+                    break
+                lote.append(item)
+            try:
+                self._procesar(lote)
+            except Exception as e:
+                print(f"ℹ Error en evaluación en sombra: {e}")
+            if fin:
+                return
+
+    def _procesar(self, lote: list):
+        ts, X, p_prod, modos = zip(*lote)
+        p_prod = np.asarray(p_prod, dtype=np.float32)
+        p_cand = self.entrada["modelo"].predict(np.stack(X), verbose=0)[:, 0]
+        delta = p_cand - p_prod
+        caida_prod = p_prod > self.umbral
+        caida_cand = p_cand > self.umbral
+        desacuerdo = caida_prod != caida_cand
+
+        r = self.resumen
+        r["ventanas"] += len(lote)
+        r["desacuerdos"] += int(desacuerdo.sum())
+        r["solo_produccion"] += int((caida_prod & ~caida_cand).sum())
+        r["solo_candidato"] += int((caida_cand & ~caida_prod).sum())
+        r["ambos_caida"] += int((caida_prod & caida_cand).sum())
+        r["suma_abs_delta"] += float(np.abs(delta).sum())
+        r["max_abs_delta"] = max(r["max_abs_delta"], float(np.abs(delta).max()))
+        METRICAS.incrementar("receptor_sombra_ventanas_total", len(lote))
+        METRICAS.incrementar("receptor_sombra_desacuerdos_total", int(desacuerdo.sum()))
+        for d in np.abs(delta):
+            METRICAS.observar("receptor_sombra_delta", float(d), buckets=BUCKETS_DELTA)
+
+        registrar = np.flatnonzero(desacuerdo | (np.abs(delta) >= DELTA_REGISTRO))
+        if len(registrar):
+            self._escribir_filas([(ts[i], modos[i], p_prod[i], p_cand[i], delta[i]) for i in registrar])
+        if time.monotonic() - self._ultimo_resumen >= RESUMEN_CADA_S:
+            self._guardar_resumen()
+
+    # --- PERSISTENCIA ---
+    def _escribir_filas(self, filas: list):
+        ruta = self.directorio / f"desacuerdos_{datetime.fromtimestamp(filas[0][0]).strftime('%Y%m%d')}.csv"
+        nuevo = not ruta.exists()
+        with open(ruta, "a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            if nuevo:
+                w.writerow(_CAMPOS)
+            for ts, modo, p_prod, p_cand, delta in filas:
+                w.writerow([f"{ts:.3f}", modo, f"{p_prod:.4f}", f"{p_cand:.4f}", f"{delta:+.4f}"])
+
+    def _cargar_resumen(self) -> dict:
+        resumen = resumen_vacio()
+        try:
+            with open(self.directorio / "resumen.json", encoding="utf-8") as f:
+                resumen.update(json.load(f).get("contadores", {}))
+        except (OSError, ValueError):
+            pass
+        return resumen
+
+    def _guardar_resumen(self):
+        self._ultimo_resumen = time.monotonic()
+        datos = {"candidato": self.entrada.get("ruta"), "umbral": self.umbral,
+                 "actualizado": datetime.now().isoformat(timespec="seconds"), "contadores": self.resumen}
+        tmp = self.directorio / "resumen.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2)
+        os.replace(tmp, self.directorio / "resumen.json")
+
+
+# --- INFORME ---
+def informe(directorio=SOMBRA_DIR, top: int = 10):
+    """Imprime el resumen acumulado y las mayores diferencias registradas"""
+    directorio = Path(directorio)
+    try:
+        with open(directorio / "resumen.json", encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        print(f"Sin resumen en {directorio}")
+        return
+    r = datos["contadores"]
+    n = max(r["ventanas"], 1)
+    print(f"Candidato: {datos.get('candidato')} (umbral {datos.get('umbral')}, actualizado {datos.get('actualizado')})")
+    print(f"  Ventanas evaluadas: {r['ventanas']}  (descartadas por cola llena: {r['descartadas']})")
+    print(f"  Desacuerdos: {r['desacuerdos']} ({100 * r['desacuerdos'] / n:.2f}%)")
+    print(f"    caída solo producción: {r['solo_produccion']}  caída solo candidato: {r['solo_candidato']}"
+          f"  ambos: {r['ambos_caida']}")
+    print(f"  |Δp| medio: {r['suma_abs_delta'] / n:.4f}  máximo: {r['max_abs_delta']:.4f}")
+
+    filas = []
+    for ruta in sorted(directorio.glob("desacuerdos_*.csv")):
+        with open(ruta, newline="", encoding="utf-8") as f:
+            filas.extend(csv.DictReader(f))
+    if not filas:
+        return
+    print(f"\nMayores diferencias ({len(filas)} registradas):")
+    for fila in sorted(filas, key=lambda f: -abs(float(f["delta"])))[:top]:
+        hora = datetime.fromtimestamp(float(fila["ts"])).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"  {hora} [{fila['modo']}] producción {float(fila['p_produccion']):.3f}"
+              f" → candidato {float(fila['p_candidato']):.3f} ({fila['delta']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Informe de la evaluación en sombra")
+    parser.add_argument("directorio", nargs="?", default=SOMBRA_DIR)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    informe(args.directorio, args.top)
@@ -0,0 +1,237 @@
+"""
+Exportación masiva del historial de alertas (Historial/Personas/<persona>) a archivos columnares
+Divide el rango de hora_caida en particiones y las recorre en paralelo con runQuery sobre
+una sesión HTTP con pool de conexiones; decodifica los campos tipados de Firestore
+({"doubleValue": ...}) por columna con pandas y escribe una parte nueva por ejecución.
+El cursor (última hora_caida exportada) permite exportar solo lo nuevo.
+
+Uso:
+    python exportar_historial.py --salida historial/            (Parquet; requiere pyarrow)
+    python exportar_historial.py --salida historial/ --formato csv
+    FIRESTORE_BASE=http://localhost:8080/v1 python exportar_historial.py   (emulador)
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- CONFIGURACIÓN ---
+FIRESTORE_BASE = os.environ.get("FIRESTORE_BASE", "https://firestore.googleapis.com/v1")
+FIREBASE_PROJECT_ID = os.environ.get("FIREBASE_PROJECT_ID", "detector-de-caidas-360")
+PERSONA = os.environ.get("PERSONA", "Vicente")
+CAMPO_ORDEN = "hora_caida"
+TAM_PAGINA = 300
+HILOS = 8
+PARTICIONES = 8
+TIMEOUT_S = 15
+
+# Al combinar un campo con varios tipos, el primero presente manda
+_TIPOS_NUMERICOS = ("doubleValue", "integerValue")
+_TIPOS_TEXTO = ("stringValue", "bytesValue", "referenceValue")
+
+
+# --- CLIENTE ---
+class ClienteFirestore:
+    """runQuery sobre Historial/Personas/<persona> con una sesión compartida entre hilos"""
+
+    def __init__(self, base: str = FIRESTORE_BASE, proyecto: str = FIREBASE_PROJECT_ID, persona: str = PERSONA,
+                 hilos: int = HILOS):
+        self.persona = persona
+        self.url = f"{base}/projects/{proyecto}/databases/(default)/documents/Historial/Personas:runQuery"
+        self.sesion = requests.Session()
+        reintentos = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                           allowed_methods=None)
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=hilos, max_retries=reintentos)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+        self.solicitudes = 0
+
+    def consultar(self, desde: str | None = None, hasta: str | None = None, limite: int = TAM_PAGINA,
+                  despues_de: dict | None = None, descendente: bool = False) -> list:
+        """Una página ordenada por hora_caida dentro de [desde, hasta)"""
+        filtros = []
+        if desde:
+            filtros.append(_filtro("GREATER_THAN_OR_EQUAL", desde))
+        if hasta:
+            filtros.append(_filtro("LESS_THAN", hasta))
+        consulta = {
+            "from": [{"collectionId": self.persona}],
+            # __name__ desempata documentos con la misma hora_caida entre páginas
+            "orderBy": [{"field": {"fieldPath": campo}, "direction": "DESCENDING" if descendente else "ASCENDING"}
+                        for campo in (CAMPO_ORDEN, "__name__")],
+            "limit": limite,
+        }
+        if len(filtros) == 1:
+            consulta["where"] = filtros[0]
+        elif filtros:
+            consulta["where"] = {"compositeFilter": {"op": "AND", "filters": filtros}}
+        if despues_de:
+            consulta["startAt"] = {"values": [despues_de["fields"][CAMPO_ORDEN], {"referenceValue": despues_de["name"]}],
+                                   "before": False}
+        self.solicitudes += 1
+        r = self.sesion.post(self.url, json={"structuredQuery": consulta}, timeout=TIMEOUT_S)
+        r.raise_for_status()
+        return [item["document"] for item in r.json() if "document" in item]
+
+    def extremo(self, descendente: bool) -> str | None:
+        """hora_caida mínima (o máxima) de la colección"""
+        docs = self.consultar(limite=1, descendente=descendente)
+        return docs[0]["fields"][CAMPO_ORDEN]["timestampValue"] if docs else None
+
+    def rango(self, desde: str, hasta: str | None) -> list:
+        """Todas las páginas de una partición"""
+        documentos, ultimo = [], None
+        while True:
+            pagina = self.consultar(desde, hasta, despues_de=ultimo)
+            documentos += pagina
+            if len(pagina) < TAM_PAGINA:
+                return documentos
+            ultimo = pagina[-1]
+
+    def cerrar(self):
+        self.sesion.close()
+
+
+def _filtro(op: str, valor: str) -> dict:
+    return {"fieldFilter": {"field": {"fieldPath": CAMPO_ORDEN}, "op": op, "value": {"timestampValue": valor}}}
+
+
+def _rfc3339(ts: pd.Timestamp) -> str:
+    return ts.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def particionar(desde: str, hasta: str, n: int) -> list:
+    """n rangos [a, b) contiguos; el último incluye `hasta`"""
+    a, b = pd.Timestamp(desde), pd.Timestamp(hasta) + pd.Timedelta(microseconds=1)
+    bordes = pd.date_range(a, b, periods=n + 1) if b > a else pd.DatetimeIndex([a, b])
+    return [(_rfc3339(x), _rfc3339(y)) for x, y in zip(bordes[:-1], bordes[1:])]
+
+
+# --- DECODIFICACIÓN ---
+def decodificar(documentos: list) -> pd.DataFrame:
+    """Documentos REST → DataFrame con un tipo nativo por columna (vectorizado por columna)"""
+    if not documentos:
+        return pd.DataFrame(columns=["id"])
+    plano = pd.json_normalize([d.get("fields", {}) for d in documentos], max_level=1)
+    tipos_por_campo = {}
+    for columna in plano.columns:
+        campo, _, tipo = columna.partition(".")
+        tipos_por_campo.setdefault(campo, []).append(tipo)
+
+    salida = {"id": pd.Series([d["name"].rsplit("/", 1)[-1] for d in documentos])}
+    for campo, tipos in tipos_por_campo.items():
+        partes = []
+        for tipo in tipos:
+            serie = plano[f"{campo}.{tipo}"]
+            if tipo == "doubleValue":
+                partes.append(pd.to_numeric(serie, errors="coerce"))
+            elif tipo == "integerValue":
+                partes.append(pd.to_numeric(serie, errors="coerce").astype("Int64"))
+            elif tipo == "timestampValue":
+                partes.append(pd.to_datetime(serie, utc=True, format="ISO8601"))
+            elif tipo == "booleanValue":
+                partes.append(serie.astype("boolean"))
+            elif tipo in _TIPOS_TEXTO:
+                partes.append(serie.astype("string"))
+            # mapValue / arrayValue / nullValue no se usan en el historial
+        if not partes:
+            continue
+        if len(partes) > 1:
+            if all(t in _TIPOS_NUMERICOS for t in tipos):
+                partes = [p.astype("Float64") for p in partes]
+            else:
+                partes = [p.astype("string") for p in partes]  # p.ej. phone como texto o número
+        columna = partes[0]
+        for parte in partes[1:]:
+            columna = columna.fillna(parte)
+        salida[campo] = columna
+    df = pd.DataFrame(salida)
+    return df.sort_values(CAMPO_ORDEN, ignore_index=True) if CAMPO_ORDEN in df else df
+
+
+# --- CURSOR Y SALIDA ---
+def cargar_cursor(directorio: Path) -> dict:
+    try:
+        with open(directorio / "cursor.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"desde": None, "ids": []}
+
+
+def guardar_cursor(directorio: Path, cursor: dict):
+    tmp = directorio / "cursor.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cursor, f, indent=2)
+    os.replace(tmp, directorio / "cursor.json")
+
+
+def escribir_parte(df: pd.DataFrame, directorio: Path, formato: str) -> Path:
+    ruta = directorio / f"parte_{time.strftime('%Y%m%dT%H%M%S')}_{len(df)}.{formato}"
+    tmp = ruta.with_name("." + ruta.name)
+    if formato == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def exportar(directorio, cliente: ClienteFirestore | None = None, formato: str = "parquet",
+             hilos: int = HILOS, particiones: int = PARTICIONES) -> pd.DataFrame:
+    """Exporta los documentos con hora_caida >= cursor; devuelve los nuevos"""
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    cliente = cliente or ClienteFirestore(hilos=hilos)
+    cursor = cargar_cursor(directorio)
+
+    desde = cursor["desde"] or cliente.extremo(descendente=False)
+    hasta = cliente.extremo(descendente=True)
+    if desde is None or hasta is None:
+        return decodificar([])
+    rangos = particionar(desde, hasta, particiones)
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="exportar") as pool:
+        documentos = [d for parte in pool.map(lambda r: cliente.rango(*r), rangos) for d in parte]
+
+    df = decodificar(documentos)
+    # hora_caida >= cursor vuelve a traer los del instante del cursor: se descartan por id
+    df = df[~df["id"].isin(cursor["ids"])].drop_duplicates("id", ignore_index=True)
+    if df.empty:
+        return df
+    escribir_parte(df, directorio, formato)
+    desde = _rfc3339(df[CAMPO_ORDEN].max())  # Truncado a µs: se guardan los ids desde ese instante
+    guardar_cursor(directorio, {
+        "desde": desde,
+        "ids": df.loc[df[CAMPO_ORDEN] >= pd.Timestamp(desde), "id"].tolist(),
+    })
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el historial de alertas de Firestore")
+    parser.add_argument("--salida", type=Path, default=Path("historial"))
+    parser.add_argument("--formato", choices=("parquet", "csv"), default="parquet")
+    parser.add_argument("--hilos", type=int, default=HILOS)
+    parser.add_argument("--particiones", type=int, default=PARTICIONES)
+    parser.add_argument("--persona", default=PERSONA)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    cliente = ClienteFirestore(persona=args.persona, hilos=args.hilos)
+    try:
+        df = exportar(args.salida, cliente, args.formato, args.hilos, args.particiones)
+    finally:
+        cliente.cerrar()
+    dt = time.perf_counter() - t0
+    print(f"📤 {len(df)} documentos nuevos en {dt:.1f}s ({cliente.solicitudes} solicitudes)")
+    print(f"💾 Salida: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Codificación compacta de fragmentos de señal para adjuntar a las alertas
+Cuantiza cada columna, codifica en deltas int16 (int32 si no caben) y comprime con zlib
+
+Formato (little endian):
+    b"FRG1" | version u8 | ancho_delta u8 | filas u16 | columnas u16 | frecuencia_hz f32 | t0 f64
+    escalas f32[columnas] | primera_fila i32[columnas] | zlib(deltas[columnas, filas - 1])
+"""
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+import preprocesamiento as prep
+
+MAGIA = b"FRG1"
+VERSION = 1
+_CABECERA = struct.Struct("<4sBBHHfd")
+
+# Resolución de cuantización: 1 mg para acelerómetro, 0.1 °/s para giroscopio
+ESCALA_ACEL = 1000.0
+ESCALA_GIRO = 10.0
+
+
+def escalas_por_columna(columnas) -> np.ndarray:
+    return np.array([ESCALA_GIRO if c[-2:] in ('gx', 'gy', 'gz') else ESCALA_ACEL for c in columnas],
+                    dtype=np.float32)
+
+
+def codificar(muestras, columnas=prep.FEATURES_DUAL, frecuencia_hz: float = prep.FRECUENCIA_HZ,
+              t0: float = 0.0) -> bytes:
+    """Codifica (filas, columnas) de muestras crudas a bytes comprimidos"""
+    X = np.asarray(muestras, dtype=np.float64).reshape(-1, len(columnas))
+    escalas = escalas_por_columna(columnas)
+    enteros = np.round(X * escalas).astype(np.int64)
+    primera = enteros[0] if len(enteros) else np.zeros(len(columnas), dtype=np.int64)
+    # Deltas por columna (orden columna-mayor: mejor compresión)
+    deltas = np.diff(enteros, axis=0).T
+    ancho = 2
+    if deltas.size and (deltas.min() < -32768 or deltas.max() > 32767):
+        ancho = 4
+    deltas = deltas.astype(np.int16 if ancho == 2 else np.int32)
+
+    cabecera = _CABECERA.pack(MAGIA, VERSION, ancho, len(X), len(columnas), frecuencia_hz, t0)
+    return (cabecera + escalas.astype("<f4").tobytes() + primera.astype("<i4").tobytes()
+            + zlib.compress(deltas.astype(deltas.dtype.newbyteorder("<")).tobytes(), 9))
+
+
+def decodificar(datos: bytes):
+    """Devuelve (muestras float32 (filas, columnas), frecuencia_hz, t0)"""
+    magia, version, ancho, filas, columnas, frecuencia_hz, t0 = _CABECERA.unpack_from(datos)
+    if magia != MAGIA or version != VERSION:
+        raise ValueError("Fragmento con formato desconocido")
+    offset = _CABECERA.size
+    escalas = np.frombuffer(datos, dtype="<f4", count=columnas, offset=offset)
+    offset += 4 * columnas
+    primera = np.frombuffer(datos, dtype="<i4", count=columnas, offset=offset).astype(np.int64)
+    offset += 4 * columnas
+    deltas = np.frombuffer(zlib.decompress(datos[offset:]), dtype="<i2" if ancho == 2 else "<i4")
+    deltas = deltas.reshape(columnas, max(filas - 1, 0)).T.astype(np.int64)
+    if filas == 0:
+        return np.empty((0, columnas), dtype=np.float32), frecuencia_hz, t0
+    enteros = np.vstack((primera, primera + np.cumsum(deltas, axis=0)))
+    return (enteros / escalas).astype(np.float32), frecuencia_hz, t0
+
+
+# --- FORMATO FIRESTORE ---
+def a_firestore(datos: bytes) -> dict:
+    """Valor Firestore REST para un campo bytes"""
+    return {"bytesValue": base64.b64encode(datos).decode("ascii")}
+
+
+def desde_firestore(valor: dict):
+    return decodificar(base64.b64decode(valor["bytesValue"]))
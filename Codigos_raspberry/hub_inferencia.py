@@ -0,0 +1,403 @@
+"""
+Hub central de inferencia para varios receptores livianos (RECEPTOR_MODO=reenvio)
+Cada Raspberry solo captura BLE y reenvía muestras por TCP (protocolo_hub.py); el hub arma
+la ventana de cada usuario, agrupa las ventanas listas de todos los clientes en una sola
+llamada al modelo y devuelve a cada receptor su decisión y los eventos de caída confirmados.
+
+Contrapresión por cliente:
+    - entrada: cada cliente tiene a lo sumo una ventana pendiente; si llega otra antes de
+      evaluarla se reemplaza por la más reciente (un cliente rápido no acapara el lote)
+    - salida: cola de decisiones acotada por cliente (se descartan las más antiguas);
+      los eventos de caída nunca se descartan. Un receptor lento solo frena su propia conexión.
+
+Uso:
+    python hub_inferencia.py                                   (escucha en HUB_PUERTO)
+    python hub_inferencia.py --benchmark --clientes 100 --duracion 20
+    python hub_inferencia.py --benchmark --sin-modelo          (protocolo y agrupación, sin TensorFlow)
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import preprocesamiento as prep
+import protocolo_hub as proto
+from detector_eventos import DetectorEventos, movimiento
+from entradas_modelo import N_CRUDAS, cargar_entrada, elegir_modo
+from metricas import METRICAS, METRICAS_PUERTO, RESUMEN_CADA_S, iniciar_servidor_http
+
+# --- CONFIGURACIÓN ---
+HUB_HOST = os.environ.get("HUB_HOST", "0.0.0.0")
+HUB_PUERTO = int(os.environ.get("HUB_PUERTO", "9100"))
+MODEL_PATH = os.environ.get("MODEL_PATH", "modelo_cnn_imu.h5")
+MODELOS_COMPANEROS = {
+    "cadera": os.environ.get("MODEL_CADERA_PATH", "modelo_cnn_imu_cadera.h5"),
+    "pierna": os.environ.get("MODEL_PIERNA_PATH", "modelo_cnn_imu_pierna.h5"),
+}
+UMBRAL_CAIDA = 0.95
+PASO_PREDICCION = 5  # Igual que el receptor: una ventana cada 5 muestras por cliente
+LOTE_MAX = int(os.environ.get("HUB_LOTE_MAX", "64"))
+ESPERA_LOTE_MS = float(os.environ.get("HUB_ESPERA_LOTE_MS", "5"))  # Espera para juntar más ventanas
+SALIDA_MAX = int(os.environ.get("HUB_SALIDA_MAX", "32"))  # Decisiones pendientes de envío por cliente
+TIMEOUT_HOLA_S = 10.0
+# Un nombre con tramas más recientes que esto está vivo: otra conexión con el mismo nombre se rechaza
+CLIENTE_INACTIVO_S = float(os.environ.get("HUB_CLIENTE_INACTIVO_S", "5"))
+N_COLUMNAS = N_CRUDAS + 2  # 12 columnas crudas + frescura de cadera y pierna
+BUCKETS_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+METRICAS.describir("hub_clientes_conectados", "gauge", "Receptores conectados al hub")
+METRICAS.describir("hub_lote_ventanas", "histogram", "Ventanas por llamada al modelo")
+METRICAS.describir("hub_inferencia_ms", "histogram", "Latencia de modelo.predict por lote en milisegundos")
+METRICAS.describir("hub_espera_ms", "histogram", "Desde que una ventana queda lista hasta enviar su decisión")
+METRICAS.describir("hub_ventanas_evaluadas_total", "counter", "Ventanas evaluadas por modelo")
+METRICAS.describir("hub_ventanas_reemplazadas_total", "counter", "Ventanas pendientes reemplazadas por una más reciente")
+METRICAS.describir("hub_decisiones_descartadas_total", "counter", "Decisiones descartadas por un receptor lento")
+METRICAS.describir("hub_eventos_total", "counter", "Caídas confirmadas enviadas a los receptores")
+METRICAS.describir("hub_errores_modelo_total", "counter", "Lotes en que el modelo lanzó una excepción")
+METRICAS.describir("hub_conexiones_rechazadas_total", "counter", "Conexiones rechazadas por un nombre ya conectado")
+
+
+# --- MODELOS ---
+def cargar_modelos() -> dict:
+    """Modelo dual (obligatorio) y los de un solo sensor disponibles"""
+    modelos = {"dual": cargar_entrada(MODEL_PATH)}
+    for sensor, ruta in MODELOS_COMPANEROS.items():
+        if ruta and Path(ruta).exists():
+            modelos[sensor] = cargar_entrada(ruta, sensor)
+    return modelos
+
+
+class _ModeloSinRed:
+    """Sustituto numérico para medir protocolo y agrupación sin TensorFlow"""
+
+    def predict(self, X, verbose=0):
+        energia = np.abs(X).mean(axis=(1, 2))
+        return (1 / (1 + np.exp(-(energia - 2.0))))[:, None]
+
+
+def modelos_sin_red() -> dict:
+    spec = prep.crear_spec(prep.FEATURES_DUAL)
+    return {"dual": {"ruta": "(sin modelo)", "modelo": _ModeloSinRed(), "escala": prep.vector_escala(spec),
+                     "indices": list(range(N_CRUDAS)), "window_size": spec["window_size"],
+                     "sensores": [N_CRUDAS, N_CRUDAS + 1]}}
+
+
+def predecir(entrada: dict, X: np.ndarray) -> np.ndarray:
+    return np.asarray(entrada["modelo"].predict(X, verbose=0), dtype=np.float32)[:, 0]
+
+
+# --- CLIENTES ---
+class ClienteHub:
+    """Estado de un receptor conectado: ventana propia, detector propio y colas de salida"""
+
+    def __init__(self, nombre: str, escritor: asyncio.StreamWriter, umbral: float, salida_max: int):
+        self.nombre = nombre
+        self.escritor = escritor
+        self.ultima_trama = time.monotonic()
+        self.datos = np.zeros((0, N_COLUMNAS), dtype=np.float32)
+        self.nuevas = 0
+        self.pendiente = None  # (seq, ts, monotonic) de la ventana lista y aún no evaluada
+        self.detector = DetectorEventos(umbral_alto=umbral)
+        self.decisiones = deque(maxlen=salida_max)
+        self.eventos = deque()
+        self.hay_salida = asyncio.Event()
+
+    def recibir(self, seq: int, ts: float, muestras: np.ndarray, window_size: int, paso: int) -> bool:
+        """Agrega muestras; True si quedó una ventana nueva lista para evaluar"""
+        # Siempre un arreglo nuevo: el agrupador puede estar leyendo el anterior
+        self.datos = np.concatenate([self.datos, muestras])[-window_size:]
+        self.nuevas += len(muestras)
+        if self.nuevas < paso or len(self.datos) < window_size:
+            return False
+        self.nuevas = 0
+        if self.pendiente is not None:
+            METRICAS.incrementar("hub_ventanas_reemplazadas_total")
+        self.pendiente = (seq, ts, time.monotonic())
+        return True
+
+    def enviar_decision(self, datos: bytes):
+        if len(self.decisiones) == self.decisiones.maxlen:
+            METRICAS.incrementar("hub_decisiones_descartadas_total")
+        self.decisiones.append(datos)
+        self.hay_salida.set()
+
+    def enviar_evento(self, datos: bytes):
+        self.eventos.append(datos)
+        self.hay_salida.set()
+
+    async def escribir(self):
+        """Vacía las colas de salida; drain() solo frena a este cliente"""
+        while True:
+            await self.hay_salida.wait()
+            self.hay_salida.clear()
+            while self.eventos or self.decisiones:
+                self.escritor.write(self.eventos.popleft() if self.eventos else self.decisiones.popleft())
+                await self.escritor.drain()
+
+
+# --- HUB ---
+class HubInferencia:
+    def __init__(self, modelos: dict, umbral: float = UMBRAL_CAIDA, paso: int = PASO_PREDICCION,
+                 lote_max: int = LOTE_MAX, espera_lote_ms: float = ESPERA_LOTE_MS, salida_max: int = SALIDA_MAX,
+                 inactivo_s: float = CLIENTE_INACTIVO_S):
+        self.modelos = modelos
+        self.umbral = umbral
+        self.paso = paso
+        self.lote_max = lote_max
+        self.espera_lote_s = espera_lote_ms / 1000
+        self.salida_max = salida_max
+        self.inactivo_s = inactivo_s
+        self.window_size = max(m["window_size"] for m in modelos.values())
+        self.clientes = {}
+        self.listos = {}  # nombre → cliente, en orden de llegada (FIFO entre clientes)
+        self.hay_trabajo = asyncio.Event()
+        # Un solo hilo para el modelo: el lazo de eventos sigue recibiendo mientras se predice
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hub-modelo")
+        self.ventanas = 0
+        self.lotes = 0
+
+    async def atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        """Una conexión de receptor: HOLA → BIENVENIDA → MUESTRAS..."""
+        cliente = tarea_salida = None
+        try:
+            tipo, carga = await asyncio.wait_for(proto.leer_trama(lector), TIMEOUT_HOLA_S)
+            if tipo != proto.HOLA:
+                return
+            hola = json.loads(carga)
+            nombre = hola.get("cliente") or str(escritor.get_extra_info("peername"))
+            if hola.get("columnas", N_COLUMNAS) != N_COLUMNAS:
+                print(f"❌ {nombre}: {hola.get('columnas')} columnas por muestra, se esperan {N_COLUMNAS}")
+                return
+            anterior = self.clientes.get(nombre)
+            if anterior is not None:
+                if time.monotonic() - anterior.ultima_trama < self.inactivo_s:
+                    # Dos receptores con el mismo nombre compartirían ventana y detector
+                    METRICAS.incrementar("hub_conexiones_rechazadas_total")
+                    print(f"❌ {nombre}: ya hay un receptor conectado con ese nombre, se rechaza el nuevo")
+                    escritor.write(proto.trama_json(proto.RECHAZO, {"motivo": f"nombre duplicado: {nombre}"}))
+                    await escritor.drain()
+                    return
+                anterior.escritor.close()  # Reconexión: la conexión vieja quedó colgada sin tramas
+            cliente = ClienteHub(nombre, escritor, self.umbral, self.salida_max)
+            self.clientes[nombre] = cliente
+            METRICAS.fijar("hub_clientes_conectados", len(self.clientes))
+            escritor.write(proto.trama_json(proto.BIENVENIDA, {"window_size": self.window_size, "paso": self.paso}))
+            tarea_salida = asyncio.create_task(cliente.escribir())
+            print(f"🔌 {nombre} conectado ({len(self.clientes)} receptores)")
+
+            while True:
+                tipo, carga = await proto.leer_trama(lector)
+                cliente.ultima_trama = time.monotonic()
+                if tipo != proto.MUESTRAS:
+                    continue
+                seq, ts, muestras = proto.leer_muestras(carga, N_COLUMNAS)
+                if cliente.recibir(seq, ts, muestras, self.window_size, self.paso):
+                    self.listos[nombre] = cliente
+                    self.hay_trabajo.set()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            if tarea_salida is not None:
+                tarea_salida.cancel()
+            if cliente is not None and self.clientes.get(cliente.nombre) is cliente:
+                del self.clientes[cliente.nombre]
+                self.listos.pop(cliente.nombre, None)
+                METRICAS.fijar("hub_clientes_conectados", len(self.clientes))
+                print(f"🔌 {cliente.nombre} desconectado ({len(self.clientes)} receptores)")
+            escritor.close()
+
+    def _tomar_lote(self) -> list:
+        nombres = list(self.listos)[:self.lote_max]
+        lote = [self.listos.pop(n) for n in nombres]
+        if self.listos:
+            self.hay_trabajo.set()
+        return lote
+
+    async def agrupar(self):
+        """Junta las ventanas listas de todos los clientes y las evalúa en una llamada por modelo"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.hay_trabajo.wait()
+            if len(self.listos) < self.lote_max and self.espera_lote_s > 0:
+                await asyncio.sleep(self.espera_lote_s)
+            self.hay_trabajo.clear()
+            grupos = {}
+            for cliente in self._tomar_lote():
+                datos, pendiente = cliente.datos, cliente.pendiente
+                cliente.pendiente = None
+                modo = elegir_modo(self.modelos, datos)
+                grupos.setdefault(modo, []).append((cliente, datos, pendiente))
+
+            for modo, grupo in grupos.items():
+                if modo is None:
+                    for cliente, _, (seq, _, _) in grupo:
+                        cliente.enviar_decision(proto.trama_decision(seq, None, None))
+                    continue
+                entrada = self.modelos[modo]
+                w = entrada["window_size"]
+                X = np.stack([datos[-w:, entrada["indices"]] for _, datos, _ in grupo]) * entrada["escala"]
+                t0 = time.perf_counter()
+                try:
+                    probs = await loop.run_in_executor(self.ejecutor, predecir, entrada, X)
+                except Exception as e:
+                    METRICAS.incrementar("hub_errores_modelo_total", modo=modo)
+                    print(f"⚠️ Error del modelo {modo} con lote de {len(grupo)}: {e}")
+                    continue
+                METRICAS.observar("hub_inferencia_ms", (time.perf_counter() - t0) * 1000, modo=modo)
+                METRICAS.observar("hub_lote_ventanas", len(grupo), buckets=BUCKETS_LOTE)
+                METRICAS.incrementar("hub_ventanas_evaluadas_total", len(grupo), modo=modo)
+                self.ventanas += len(grupo)
+                self.lotes += 1
+                ahora = time.monotonic()
+                for (cliente, datos, (seq, ts, listo)), prob in zip(grupo, probs.tolist()):
+                    cliente.enviar_decision(proto.trama_decision(seq, prob, modo))
+                    evento = cliente.detector.actualizar(ts, prob, movimiento(datos))
+                    if evento:
+                        METRICAS.incrementar("hub_eventos_total")
+                        print(f"🚨 {cliente.nombre}: caída ({evento['pico']*100:.1f}%)")
+                        cliente.enviar_evento(proto.trama_json(proto.EVENTO, {"seq": seq, "modo": modo,
+                                                                              "evento": evento}))
+                    METRICAS.observar("hub_espera_ms", (ahora - listo) * 1000)
+
+    def cerrar(self):
+        self.ejecutor.shutdown(wait=False)
+
+
+async def reportar(hub: HubInferencia, cada_s: float = RESUMEN_CADA_S):
+    ventanas, lotes = hub.ventanas, hub.lotes
+    while True:
+        await asyncio.sleep(cada_s)
+        dv, dl = hub.ventanas - ventanas, hub.lotes - lotes
+        ventanas, lotes = hub.ventanas, hub.lotes
+        print(f"📊 {len(hub.clientes)} receptores | {dv / cada_s:.1f} ventanas/s | "
+              f"lote medio {dv / max(dl, 1):.1f}")
+
+
+async def servir(hub: HubInferencia, host: str, puerto: int):
+    servidor = await asyncio.start_server(hub.atender, host, puerto)
+    print(f"🛰️  Hub de inferencia en {host}:{puerto} (lote máx {hub.lote_max}, ventana {hub.window_size})")
+    async with servidor:
+        await asyncio.gather(servidor.serve_forever(), hub.agrupar(), reportar(hub))
+
+
+# --- BENCHMARK ---
+async def cliente_simulado(nombre: str, puerto: int, hz: float, detener: asyncio.Event, latencias: list,
+                           conteo: dict):
+    """Receptor falso: envía muestras en reposo a `hz` y mide la latencia de cada decisión"""
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    escritor.write(proto.trama_json(proto.HOLA, {"cliente": nombre, "columnas": N_COLUMNAS}))
+    _, carga = await proto.leer_trama(lector)
+    bienvenida = json.loads(carga)
+    paso = bienvenida["paso"]
+    rng = np.random.default_rng(int(nombre.rsplit("-", 1)[-1]))
+    reposo = rng.normal(0, 0.02, (bienvenida["window_size"] + 10 * paso, N_COLUMNAS)).astype(np.float32)
+    reposo[:, [2, 8]] += 1.0  # az = 1 g en ambos sensores
+    reposo[:, N_CRUDAS:] = 1.0  # Ambos sensores frescos
+    enviados = {}
+
+    async def recibir():
+        while True:
+            tipo, carga = await proto.leer_trama(lector)
+            if tipo == proto.DECISION:
+                seq, _, _ = proto.leer_decision(carga)
+                t = enviados.pop(seq, None)
+                if t is not None:
+                    latencias.append((time.perf_counter() - t) * 1000)
+                conteo["decisiones"] += 1
+
+    tarea = asyncio.create_task(recibir())
+    seq = bienvenida["window_size"]
+    escritor.write(proto.trama_muestras(seq, time.time(), reposo[:seq]))
+    try:
+        while not detener.is_set():
+            i = seq % (len(reposo) - paso)
+            seq += paso
+            enviados[seq] = time.perf_counter()
+            escritor.write(proto.trama_muestras(seq, time.time(), reposo[i:i + paso]))
+            conteo["tramas"] += 1
+            await escritor.drain()
+            if len(enviados) > 1000:  # Decisiones que nunca llegarán (ventanas reemplazadas)
+                for viejo in sorted(enviados)[:-100]:
+                    del enviados[viejo]
+            await asyncio.sleep(paso / hz if hz > 0 else 0)
+    finally:
+        tarea.cancel()
+        escritor.close()
+
+
+async def benchmark(args):
+    modelos = modelos_sin_red() if args.sin_modelo else cargar_modelos()
+    hub = HubInferencia(modelos, lote_max=args.lote_max, espera_lote_ms=args.espera_lote_ms)
+    servidor = await asyncio.start_server(hub.atender, "127.0.0.1", 0)
+    puerto = servidor.sockets[0].getsockname()[1]
+    tarea_hub = asyncio.create_task(hub.agrupar())
+    detener = asyncio.Event()
+    latencias, conteo = [], {"decisiones": 0, "tramas": 0}
+    print(f"🏁 {args.clientes} clientes a {args.hz or '∞'} Hz durante {args.duracion:.0f}s "
+          f"({modelos['dual']['ruta']}, lote máx {args.lote_max})")
+
+    clientes = [asyncio.create_task(cliente_simulado(f"sim-{i}", puerto, args.hz, detener, latencias, conteo))
+                for i in range(args.clientes)]
+    await asyncio.sleep(1.0)  # Conexión y ventana inicial fuera de la medición
+    latencias.clear()
+    v0, l0, d0, t0 = hub.ventanas, hub.lotes, conteo["decisiones"], time.perf_counter()
+    await asyncio.sleep(args.duracion)
+    dt = time.perf_counter() - t0
+    ventanas, lotes, decisiones = hub.ventanas - v0, hub.lotes - l0, conteo["decisiones"] - d0
+    detener.set()
+    await asyncio.gather(*clientes, return_exceptions=True)
+    servidor.close()
+    await asyncio.sleep(0.5)  # El hub ve el cierre de cada cliente antes de apagar el lazo
+    tarea_hub.cancel()
+    hub.cerrar()
+
+    print(f"\n📊 {ventanas / dt:,.0f} ventanas/s | {decisiones / dt:,.0f} decisiones/s | "
+          f"{lotes / dt:,.1f} lotes/s (lote medio {ventanas / max(lotes, 1):.1f})")
+    if latencias:
+        p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+        print(f"   Latencia muestra → decisión: p50 {p50:.1f} ms | p95 {p95:.1f} ms | p99 {p99:.1f} ms")
+    print(f"   Ventanas reemplazadas: {METRICAS.valor('hub_ventanas_reemplazadas_total'):.0f} | "
+          f"decisiones descartadas: {METRICAS.valor('hub_decisiones_descartadas_total'):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hub central de inferencia para receptores livianos")
+    parser.add_argument("--host", default=HUB_HOST)
+    parser.add_argument("--puerto", type=int, default=HUB_PUERTO)
+    parser.add_argument("--lote-max", type=int, default=LOTE_MAX)
+    parser.add_argument("--espera-lote-ms", type=float, default=ESPERA_LOTE_MS)
+    parser.add_argument("--benchmark", action="store_true", help="Mide el throughput con clientes simulados")
+    parser.add_argument("--clientes", type=int, default=50)
+    parser.add_argument("--hz", type=float, default=prep.FRECUENCIA_HZ, help="Muestras/s por cliente (0 = sin pausa)")
+    parser.add_argument("--duracion", type=float, default=10.0)
+    parser.add_argument("--sin-modelo", action="store_true", help="Sustituto numérico en vez de la CNN")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        asyncio.run(benchmark(args))
+        return
+    try:
+        modelos = cargar_modelos()
+    except Exception as e:
+        print(f"Error cargando modelo: {e}")
+        exit(1)
+    for modo, entrada in modelos.items():
+        print(f" Modelo {modo} cargado: {entrada['ruta']}")
+    iniciar_servidor_http(METRICAS)
+    hub = HubInferencia(modelos, lote_max=args.lote_max, espera_lote_ms=args.espera_lote_ms)
+    try:
+        asyncio.run(servir(hub, args.host, args.puerto))
+    except KeyboardInterrupt:
+        print("\n Exit")
+    finally:
+        hub.cerrar()
+
+
+if __name__ == "__main__":
+    main()
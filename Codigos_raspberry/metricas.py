@@ -0,0 +1,337 @@
+"""
+Métricas de bajo costo para el receptor BLE
+Contadores, gauges e histogramas exportables como texto Prometheus o JSON periódico
+Incluye un perfilador por muestreo opcional y un resumen de consola con límite de frecuencia
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURACIÓN ---
+METRICAS_PUERTO = int(os.environ.get("METRICAS_PUERTO", "0"))  # 0 = sin endpoint HTTP
+METRICAS_JSON = os.environ.get("METRICAS_JSON")  # Ruta del volcado JSON periódico (opcional)
+METRICAS_JSON_CADA_S = float(os.environ.get("METRICAS_JSON_CADA_S", "30"))
+RESUMEN_CADA_S = float(os.environ.get("RESUMEN_CADA_S", "10"))  # Resumen de consola
+PERFILADOR_ACTIVO = os.environ.get("RECEPTOR_PERFILADOR", "0") == "1"
+PERFILADOR_INTERVALO_S = float(os.environ.get("PERFILADOR_INTERVALO_S", "0.01"))
+PERFILADOR_SALIDA = os.environ.get("PERFILADOR_SALIDA", "perfil_receptor.txt")
+
+# Buckets en milisegundos para latencias (inferencia, HTTP)
+BUCKETS_LATENCIA_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+# --- HISTOGRAMA ---
+class Histograma:
+    """Histograma acumulativo con buckets fijos (estilo Prometheus)"""
+
+    def __init__(self, buckets=BUCKETS_LATENCIA_MS):
+        self.buckets = tuple(sorted(buckets))
+        self.conteos = [0] * (len(self.buckets) + 1)  # Último = +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.conteos[bisect.bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def copia(self) -> "Histograma":
+        otro = Histograma(self.buckets)
+        otro.conteos, otro.suma, otro.total = list(self.conteos), self.suma, self.total
+        return otro
+
+    def percentil(self, q: float) -> float:
+        """Aproxima el percentil q (0-1) con el límite superior del bucket"""
+        if self.total == 0:
+            return 0.0
+        objetivo = q * self.total
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return float(limite)
+        return float("inf")
+
+
+# --- REGISTRO DE MÉTRICAS ---
+class Registro:
+    """Almacena métricas en diccionarios planos.
+
+    Se actualizan desde varios hilos (loop de asyncio, canales del notificador, subida de
+    archivos, evaluación en sombra, modelo del hub): cada actualización y cada lectura para
+    exportar toma un lock; el camino caliente solo lo retiene durante la suma.
+    """
+
+    def __init__(self):
+        self.contadores = {}
+        self.gauges = {}
+        self.histogramas = {}
+        self.descripciones = {}
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+
+    def describir(self, nombre: str, tipo: str, texto: str):
+        self.descripciones[nombre] = (tipo, texto)
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self.gauges[clave] = valor
+
+    def observar(self, nombre: str, valor: float, buckets=BUCKETS_LATENCIA_MS, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            hist = self.histogramas.get(clave)
+            if hist is None:
+                hist = self.histogramas[clave] = Histograma(buckets)
+            hist.observar(valor)
+
+    def valor(self, nombre: str, **etiquetas) -> float:
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            return self.contadores.get(clave, self.gauges.get(clave, 0))
+
+    def total(self, nombre: str) -> float:
+        """Suma de un contador sobre todas sus etiquetas"""
+        with self._lock:
+            return sum(v for (n, _), v in self.contadores.items() if n == nombre)
+
+    def histograma(self, nombre: str, **etiquetas):
+        """Copia del histograma (None si no hay observaciones)"""
+        with self._lock:
+            hist = self.histogramas.get((nombre, tuple(sorted(etiquetas.items()))))
+            return hist.copia() if hist is not None else None
+
+    def instantanea(self):
+        """Copias coherentes de (contadores, gauges, histogramas) para exportar"""
+        with self._lock:
+            return (dict(self.contadores), dict(self.gauges),
+                    {k: h.copia() for k, h in self.histogramas.items()})
+
+    # --- EXPORTADORES ---
+    def a_prometheus(self) -> str:
+        """Formato de exposición de texto de Prometheus"""
+        contadores, gauges, histogramas = self.instantanea()
+        lineas = []
+        vistos = set()
+
+        def encabezado(nombre, tipo):
+            if nombre in vistos:
+                return
+            vistos.add(nombre)
+            _, texto = self.descripciones.get(nombre, (tipo, ""))
+            if texto:
+                lineas.append(f"# HELP {nombre} {texto}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+        for (nombre, etiquetas), valor in sorted(contadores.items()):
+            encabezado(nombre, "counter")
+            lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+        for (nombre, etiquetas), valor in sorted(gauges.items()):
+            encabezado(nombre, "gauge")
+            lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+        for (nombre, etiquetas), hist in sorted(histogramas.items()):
+            encabezado(nombre, "histogram")
+            acumulado = 0
+            for limite, conteo in zip(hist.buckets, hist.conteos):
+                acumulado += conteo
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', limite),))} {acumulado}")
+            lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', '+Inf'),))} {hist.total}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {hist.suma}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {hist.total}")
+        return "\n".join(lineas) + "\n"
+
+    def a_dict(self) -> dict:
+        """Instantánea serializable en JSON"""
+        def nombre_completo(nombre, etiquetas):
+            return nombre + _etiquetas(etiquetas)
+
+        contadores, gauges, histogramas = self.instantanea()
+        return {
+            "timestamp": time.time(),
+            "uptime_s": time.time() - self.inicio,
+            "contadores": {nombre_completo(*k): v for k, v in contadores.items()},
+            "gauges": {nombre_completo(*k): v for k, v in gauges.items()},
+            "histogramas": {
+                nombre_completo(*k): {
+                    "count": h.total, "sum": h.suma,
+                    "p50": h.percentil(0.5), "p95": h.percentil(0.95), "p99": h.percentil(0.99),
+                }
+                for k, h in histogramas.items()
+            },
+        }
+
+
+def _etiquetas(etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in etiquetas) + "}"
+
+
+# Registro global usado por el receptor
+METRICAS = Registro()
+
+
+# --- EXPORTACIÓN HTTP ---
+def iniciar_servidor_http(registro: Registro, puerto: int = METRICAS_PUERTO):
+    """Sirve /metrics (Prometheus) y /metrics.json en un hilo daemon"""
+    if not puerto:
+        return None
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                cuerpo = json.dumps(registro.a_dict()).encode("utf-8")
+                tipo = "application/json"
+            elif self.path.startswith("/metrics"):
+                cuerpo = registro.a_prometheus().encode("utf-8")
+                tipo = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass  # Sin logs por petición
+
+    servidor = ThreadingHTTPServer(("0.0.0.0", puerto), _Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas-http").start()
+    print(f"📈 Métricas en http://0.0.0.0:{puerto}/metrics")
+    return servidor
+
+
+def iniciar_volcado_json(registro: Registro, ruta: str | None = METRICAS_JSON,
+                         cada_s: float = METRICAS_JSON_CADA_S):
+    """Escribe periódicamente la instantánea JSON (escritura atómica)"""
+    if not ruta:
+        return None
+
+    def _bucle():
+        while True:
+            time.sleep(cada_s)
+            try:
+                tmp = f"{ruta}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(registro.a_dict(), f)
+                os.replace(tmp, ruta)
+            except OSError as e:
+                print(f"ℹ Error escribiendo métricas JSON: {e}")
+
+    hilo = threading.Thread(target=_bucle, daemon=True, name="metricas-json")
+    hilo.start()
+    return hilo
+
+
+# --- PERFILADOR POR MUESTREO ---
+class PerfiladorMuestreo:
+    """Toma muestras periódicas de la pila de un hilo y acumula pilas colapsadas.
+
+    La salida usa el formato "func;func;func conteo" compatible con flamegraph.pl.
+    """
+
+    def __init__(self, hilo_id: int | None = None, intervalo_s: float = PERFILADOR_INTERVALO_S):
+        self.hilo_id = hilo_id or threading.main_thread().ident
+        self.intervalo_s = intervalo_s
+        self.pilas = Counter()
+        self.muestras = 0
+        self._activo = threading.Event()
+        self._hilo = None
+
+    @property
+    def activo(self) -> bool:
+        return self._activo.is_set()
+
+    def iniciar(self):
+        if self.activo:
+            return
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="perfilador")
+        self._hilo.start()
+        print(f"🔬 Perfilador activo (cada {self.intervalo_s*1000:.0f} ms)")
+
+    def detener(self):
+        self._activo.clear()
+
+    def alternar(self):
+        if self.activo:
+            self.detener()
+            self.guardar()
+        else:
+            self.iniciar()
+
+    def _bucle(self):
+        while self._activo.is_set():
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is not None:
+                pila = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                    frame = frame.f_back
+                self.pilas[";".join(reversed(pila))] += 1
+                self.muestras += 1
+            time.sleep(self.intervalo_s)
+
+    def top(self, n: int = 10):
+        """Funciones hoja más frecuentes como (función, fracción)"""
+        hojas = Counter()
+        for pila, conteo in self.pilas.items():
+            hojas[pila.rsplit(";", 1)[-1]] += conteo
+        total = max(self.muestras, 1)
+        return [(func, conteo / total) for func, conteo in hojas.most_common(n)]
+
+    def guardar(self, ruta: str = PERFILADOR_SALIDA):
+        with open(ruta, "w", encoding="utf-8") as f:
+            for pila, conteo in self.pilas.most_common():
+                f.write(f"{pila} {conteo}\n")
+        print(f"💾 Perfil guardado: {ruta} ({self.muestras} muestras)")
+        for func, fraccion in self.top(5):
+            print(f"   {fraccion*100:5.1f}%  {func}")
+
+
+# --- RESUMEN DE CONSOLA ---
+class ResumenConsola:
+    """Imprime un resumen compacto como máximo una vez cada `cada_s` segundos"""
+
+    def __init__(self, registro: Registro, cada_s: float = RESUMEN_CADA_S):
+        self.registro = registro
+        self.cada_s = cada_s
+        self._ultimo = time.monotonic()
+        self._previos = {}
+
+    def tal_vez_imprimir(self, estado: str = ""):
+        ahora = time.monotonic()
+        dt = ahora - self._ultimo
+        if dt < self.cada_s:
+            return False
+        self._ultimo = ahora
+
+        tasas = []
+        for sensor in ("cadera", "pierna"):
+            total = self.registro.valor("receptor_notificaciones_total", sensor=sensor)
+            previo = self._previos.get(sensor, total)
+            self._previos[sensor] = total
+            tasas.append(f"{sensor} {(total - previo) / dt:5.1f}/s")
+
+        errores = self.registro.total("receptor_errores_parseo_total")
+        descartadas = self.registro.total("receptor_muestras_descartadas_total")
+        hist = self.registro.histograma("receptor_inferencia_ms")
+        latencia = f"p50 {hist.percentil(0.5):.0f}ms p95 {hist.percentil(0.95):.0f}ms" if hist else "--"
+        print(f"[{time.strftime('%H:%M:%S')}] {' | '.join(tasas)} | "
+              f"errores {errores:.0f} | descartadas {descartadas:.0f} | "
+              f"inferencia {latencia} | {estado}")
+        return True
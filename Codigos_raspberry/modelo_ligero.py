@@ -0,0 +1,264 @@
+"""
+Modelo ligero basado en características: alternativa a la CNN que no necesita TensorFlow
+Calcula por ventana (vectorizado sobre el lote) estadísticas por eje, picos del vector de
+magnitud (SMV), jerk, cambio de orientación y energía por bandas de la FFT, y ajusta un
+clasificador de scikit-learn (gradient boosting o regresión logística). Como ambos se entrenan
+con class_weight="balanced", sus probabilidades se calibran (Platt, validación cruzada) para que
+el umbral de alerta del receptor (UMBRAL_CAIDA = 0.95) signifique lo mismo que con la CNN.
+
+ModeloLigero expone predict() e input_shape como un modelo de Keras: el receptor y el hub lo
+cargan igual que la CNN cuando MODEL_PATH termina en .joblib (spec en el mismo .preproc.json).
+
+Uso:
+    python modelo_ligero.py datos/*.csv                        (entrena y guarda modelo_ligero.joblib)
+    python modelo_ligero.py datos/*.csv --tipo lineal --cnn ../modelo_cnn_imu.h5   (compara con la CNN)
+    (los archivos con "caida"/"fall" en el nombre son caídas, como en train.py)
+"""
+import argparse
+import gzip
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import preprocesamiento as prep
+
+# --- CONFIGURACIÓN ---
+SALIDA_PATH = "modelo_ligero.joblib"
+VERSION = 1
+BANDAS_HZ = ((0.0, 1.0), (1.0, 3.0), (3.0, 6.0), (6.0, 10.01))  # Hasta Nyquist a 20 Hz
+UMBRAL_CAIDA = 0.95  # Mismo umbral de alerta que el receptor, el hub y el respaldo por carga
+UMBRALES_BARRIDO = (0.5, 0.8, 0.9, 0.95, 0.99)
+CALIBRACION_CV = 3
+SEMILLA = 42
+REPETICIONES_LATENCIA = 200
+_EPS = 1e-6
+
+
+# --- CARACTERÍSTICAS ---
+def _sensores(columnas) -> list:
+    """[(nombre, índices acelerómetro, índices giroscopio)] de los sensores presentes"""
+    sensores = []
+    for prefijo in ("cadera_", "pierna_", ""):
+        acel = [columnas.index(prefijo + e) for e in ("ax", "ay", "az") if prefijo + e in columnas]
+        giro = [columnas.index(prefijo + e) for e in ("gx", "gy", "gz") if prefijo + e in columnas]
+        if len(acel) == 3 and len(giro) == 3:
+            sensores.append((prefijo.rstrip("_") or "imu", acel, giro))
+    return sensores
+
+
+def caracteristicas(X, columnas, frecuencia_hz: float = prep.FRECUENCIA_HZ) -> np.ndarray:
+    """Ventanas (n, w, f) ya escaladas según la spec → matriz (n, k) de características"""
+    X = np.asarray(X, dtype=np.float32)
+    if X.ndim == 2:
+        X = X[None]
+    jerk = np.abs(np.diff(X, axis=1)) * frecuencia_hz
+    # Por eje: media, desviación, mínimo, máximo, jerk medio y máximo
+    partes = [X.mean(1), X.std(1), X.min(1), X.max(1), jerk.mean(1), jerk.max(1)]
+
+    frecuencias = np.fft.rfftfreq(X.shape[1], d=1 / frecuencia_hz)
+    bandas = [(frecuencias >= a) & (frecuencias < b) for a, b in BANDAS_HZ]
+    cuarto = max(1, X.shape[1] // 4)
+    for _, acel, giro in _sensores(list(columnas)):
+        smv = np.linalg.norm(X[..., acel], axis=2)
+        giro_mag = np.linalg.norm(X[..., giro], axis=2)
+        # Cambio de orientación: ángulo entre la gravedad media del primer y el último cuarto
+        g0, g1 = X[:, :cuarto, acel].mean(1), X[:, -cuarto:, acel].mean(1)
+        coseno = (g0 * g1).sum(1) / (np.linalg.norm(g0, axis=1) * np.linalg.norm(g1, axis=1) + _EPS)
+        potencia = np.abs(np.fft.rfft(smv - smv.mean(1, keepdims=True), axis=1)) ** 2
+        partes += [
+            np.stack([smv.max(1), smv.min(1), smv.std(1), smv.max(1) - smv.min(1),
+                      np.argmax(smv, axis=1) / X.shape[1],
+                      giro_mag.max(1), giro_mag.mean(1),
+                      np.arccos(np.clip(coseno, -1, 1))], axis=1),
+            np.log1p(np.stack([potencia[:, b].sum(1) for b in bandas], axis=1)),
+        ]
+    return np.concatenate(partes, axis=1).astype(np.float32)
+
+
+def nombres_caracteristicas(columnas) -> list:
+    """Nombres en el mismo orden que caracteristicas()"""
+    nombres = [f"{c}_{e}" for e in ("media", "std", "min", "max", "jerk_medio", "jerk_max") for c in columnas]
+    for sensor, _, _ in _sensores(list(columnas)):
+        nombres += [f"{sensor}_{n}" for n in ("smv_max", "smv_min", "smv_std", "smv_rango", "smv_pos_pico",
+                                               "giro_max", "giro_medio", "cambio_orientacion")]
+        nombres += [f"{sensor}_banda_{a:g}_{b:.0f}hz" for a, b in BANDAS_HZ]
+    return nombres
+
+
+# --- MODELO ---
+def crear_clasificador(tipo: str = "gbt", calibracion_cv: int = CALIBRACION_CV):
+    """Clasificador base envuelto en CalibratedClassifierCV (calibracion_cv < 2 = sin calibrar)"""
+    if tipo == "lineal":
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        base = make_pipeline(StandardScaler(), LogisticRegression(max_iter=2000, class_weight="balanced"))
+    else:
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        base = HistGradientBoostingClassifier(max_iter=200, max_leaf_nodes=15, learning_rate=0.1,
+                                              class_weight="balanced", random_state=SEMILLA)
+    if calibracion_cv < 2:
+        return base
+    from sklearn.calibration import CalibratedClassifierCV
+    return CalibratedClassifierCV(base, method="sigmoid", cv=calibracion_cv)
+
+
+class ModeloLigero:
+    """Clasificador sobre características con la interfaz de Keras que usan el receptor y el hub"""
+
+    def __init__(self, clasificador, spec: dict, tipo: str):
+        self.clasificador = clasificador
+        self.spec = spec
+        self.tipo = tipo
+
+    @property
+    def input_shape(self):
+        return (None, self.spec["window_size"], len(self.spec["columnas"]))
+
+    def predict(self, X, verbose=0) -> np.ndarray:
+        F = caracteristicas(X, self.spec["columnas"])
+        return self.clasificador.predict_proba(F)[:, 1:2].astype(np.float32)
+
+    def guardar(self, ruta) -> Path:
+        joblib.dump({"version": VERSION, "tipo": self.tipo, "clasificador": self.clasificador, "spec": self.spec},
+                    ruta, compress=3)
+        return prep.guardar_spec(ruta, self.spec)
+
+
+def es_ligero(ruta) -> bool:
+    return Path(ruta).suffix == ".joblib"
+
+
+def cargar(ruta) -> ModeloLigero:
+    datos = joblib.load(ruta)
+    if datos.get("version") != VERSION:
+        raise ValueError(f"Versión de modelo ligero no soportada: {datos.get('version')}")
+    return ModeloLigero(datos["clasificador"], datos["spec"], datos["tipo"])
+
+
+def entrenar(X, y, spec: dict, tipo: str = "gbt", calibrar: bool = True) -> ModeloLigero:
+    # Cada pliegue de la calibración necesita ejemplos de ambas clases
+    minoritaria = int(np.bincount(np.asarray(y, dtype=np.int64)).min()) if len(np.unique(y)) > 1 else 0
+    clasificador = crear_clasificador(tipo, min(CALIBRACION_CV, minoritaria) if calibrar else 0)
+    clasificador.fit(caracteristicas(X, spec["columnas"]), y)
+    return ModeloLigero(clasificador, spec, tipo)
+
+
+# --- COMPARACIÓN ---
+def _decisiones(prob: np.ndarray, positivos: np.ndarray, umbral: float) -> dict:
+    pred = prob > umbral
+    return {
+        "acierto": float((pred == positivos).mean()),
+        "recall": float(pred[positivos].mean()) if positivos.any() else float("nan"),
+        "falsos_positivos": int(pred[~positivos].sum()),
+    }
+
+
+def medir(modelo, X_val, y_val, tamano_bytes: int | None = None, umbral: float = UMBRAL_CAIDA) -> dict:
+    """Acierto al umbral de alerta y latencia por ventana a través de predict(), igual que en el receptor"""
+    ventana = X_val[:1]
+    modelo.predict(ventana, verbose=0)
+    tiempos = []
+    for _ in range(REPETICIONES_LATENCIA):
+        t0 = time.perf_counter()
+        modelo.predict(ventana, verbose=0)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    prob = modelo.predict(X_val, verbose=0).reshape(-1)
+    lote_ms = (time.perf_counter() - t0) * 1000
+    return {
+        "umbral": umbral,
+        **_decisiones(prob, np.asarray(y_val) == 1, umbral),
+        "latencia_ms_p50": float(np.percentile(tiempos, 50)),
+        "latencia_ms_p95": float(np.percentile(tiempos, 95)),
+        "lote_ms_por_ventana": lote_ms / len(X_val),
+        "bytes_gzip": tamano_bytes,
+    }
+
+
+def barrido_umbrales(modelo, X_val, y_val, umbrales=UMBRALES_BARRIDO) -> pd.DataFrame:
+    """Acierto, recall y falsos positivos a cada umbral (el receptor alerta a UMBRAL_CAIDA)"""
+    prob = modelo.predict(X_val, verbose=0).reshape(-1)
+    positivos = np.asarray(y_val) == 1
+    return pd.DataFrame([{"umbral": u, **_decisiones(prob, positivos, u)} for u in umbrales])
+
+
+def ruta_junto_a_cnn(ruta_cnn) -> Path:
+    """modelo_cnn_imu[_sensor].h5 → modelo_ligero[_sensor].joblib"""
+    ruta_cnn = Path(ruta_cnn)
+    return ruta_cnn.with_name(ruta_cnn.stem.replace("cnn_imu", "ligero") + ".joblib")
+
+
+def entrenar_y_comparar(X_train, y_train, X_test, y_test, spec: dict, cnn, ruta_cnn) -> Path:
+    """Entrena el modelo ligero junto a la CNN de train.py, lo guarda y compara ambos al umbral de alerta"""
+    print("\n🌲 Entrenando modelo ligero (características + gradient boosting)...")
+    ligero = entrenar(X_train, y_train, spec)
+    ruta = ruta_junto_a_cnn(ruta_cnn)
+    ligero.guardar(ruta)
+    comparacion = pd.DataFrame([
+        {"modelo": ruta.name, **medir(ligero, X_test, y_test)},
+        {"modelo": Path(ruta_cnn).name, **medir(cnn, X_test, y_test)},
+    ]).drop(columns="bytes_gzip")
+    print(f"   Umbral de alerta: {UMBRAL_CAIDA}")
+    print(comparacion.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print("   Barrido de umbrales del modelo ligero:")
+    print(barrido_umbrales(ligero, X_test, y_test).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"💾 Modelo ligero guardado: {ruta}")
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el modelo ligero y lo compara con la CNN")
+    parser.add_argument("archivos", nargs="+", type=Path, help="CSV de entrenamiento")
+    parser.add_argument("--tipo", choices=("gbt", "lineal"), default="gbt")
+    parser.add_argument("--cnn", help="Modelo .h5 de referencia (define también la spec de las ventanas)")
+    parser.add_argument("--salida", default=SALIDA_PATH)
+    args = parser.parse_args()
+
+    from sklearn.model_selection import train_test_split
+    from compresion import cargar_ventanas
+
+    cnn = spec = None
+    if args.cnn:
+        spec = prep.cargar_spec(args.cnn)
+        try:
+            from tensorflow import keras
+            cnn = keras.models.load_model(args.cnn)
+            spec = spec or prep.spec_por_defecto(cnn.input_shape)
+        except ImportError:
+            print("ℹ TensorFlow no disponible: solo se mide el modelo ligero")
+    if spec is None:
+        spec = prep.crear_spec(prep.detectar_columnas(pd.read_csv(args.archivos[0], nrows=1).columns))
+    print(f"📐 Spec: {prep.describir_layout(spec['columnas'])}, ventana {spec['window_size']}")
+
+    print("📂 Cargando datos...")
+    X, y = cargar_ventanas(args.archivos, spec)
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=SEMILLA, stratify=y)
+
+    print(f"\n🌲 Entrenando modelo ligero ({args.tipo}) con {X_train.shape[0]} ventanas...")
+    t0 = time.perf_counter()
+    ligero = entrenar(X_train, y_train, spec, args.tipo)
+    print(f"   {len(nombres_caracteristicas(spec['columnas']))} características | {time.perf_counter() - t0:.1f}s")
+    ligero.guardar(args.salida)
+
+    filas = [{"modelo": f"ligero_{args.tipo}",
+              **medir(ligero, X_val, y_val, len(gzip.compress(Path(args.salida).read_bytes())))}]
+    if cnn is not None:
+        filas.append({"modelo": Path(args.cnn).name,
+                      **medir(cnn, X_val, y_val, len(gzip.compress(Path(args.cnn).read_bytes())))})
+    tabla = pd.DataFrame(filas)
+    print(f"\n📊 Comparación (validación, umbral {UMBRAL_CAIDA}):")
+    print(tabla.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    modelos = [(f"ligero_{args.tipo}", ligero)] + ([(Path(args.cnn).name, cnn)] if cnn is not None else [])
+    for nombre, modelo in modelos:
+        print(f"\n🎚️  Barrido de umbrales ({nombre}):")
+        print(barrido_umbrales(modelo, X_val, y_val).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    tabla.to_csv(Path(args.salida).with_suffix(".csv"), index=False)
+    print(f"\n💾 Modelo ligero guardado en {args.salida} (spec: {prep.ruta_spec(args.salida).name})")
+
+
+if __name__ == "__main__":
+    main()
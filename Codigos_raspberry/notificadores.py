@@ -0,0 +1,202 @@
+"""
+Envío concurrente de cada alerta a todos los canales configurados
+Cada canal (Firestore, Realtime Database, WhatsApp vía server.py, webhook local) corre en su
+propio hilo con su timeout: el primer aviso a un cuidador llega en lo que tarda el canal más
+rápido y no en la suma de todos. Los canales se lanzan por prioridad (menor = antes), lo que
+importa cuando NOTIF_HILOS es menor que el número de canales.
+Al terminar todos se llama a `al_terminar(despacho)` (el receptor actualiza ahí el estado del
+documento) sin bloquear el lazo de detección.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+RTDB_URL = os.environ.get("RTDB_URL")  # p.ej. https://detector-de-caidas-360-default-rtdb.firebaseio.com (None = desactivado)
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")  # POST JSON con el resumen de la alerta (None = desactivado)
+NOTIF_HILOS = int(os.environ.get("NOTIF_HILOS", "0"))  # 0 = un hilo por canal
+TIMEOUTS_S = {
+    "firestore": float(os.environ.get("NOTIF_TIMEOUT_FIRESTORE_S", "5")),
+    "rtdb": float(os.environ.get("NOTIF_TIMEOUT_RTDB_S", "5")),
+    "whatsapp": float(os.environ.get("NOTIF_TIMEOUT_WHATSAPP_S", "15")),
+    "webhook": float(os.environ.get("NOTIF_TIMEOUT_WEBHOOK_S", "3")),
+}
+# Orden de lanzamiento: los avisos directos al cuidador primero, el registro histórico después
+PRIORIDADES = {nombre: i for i, nombre in enumerate(
+    os.environ.get("NOTIF_PRIORIDADES", "whatsapp,rtdb,webhook,firestore").split(","))}
+
+METRICAS.describir("notificador_canal_total", "counter", "Envíos de alerta por canal y resultado")
+METRICAS.describir("notificador_canal_ms", "histogram", "Latencia de envío por canal en milisegundos")
+METRICAS.describir("notificador_primer_aviso_ms", "histogram",
+                   "Desde la alerta hasta el primer canal de aviso exitoso, en milisegundos")
+
+
+class Canal:
+    """`enviar(alerta, timeout_s)` retorna True si se entregó; `aviso` = llega a un cuidador"""
+
+    def __init__(self, nombre: str, enviar, timeout_s: float | None = None, prioridad: int | None = None,
+                 aviso: bool = True):
+        self.nombre = nombre
+        self.enviar = enviar
+        self.timeout_s = TIMEOUTS_S.get(nombre, 5.0) if timeout_s is None else timeout_s
+        self.prioridad = PRIORIDADES.get(nombre, len(PRIORIDADES)) if prioridad is None else prioridad
+        self.aviso = aviso
+
+
+class Despacho:
+    """Resultado en curso de una alerta: {canal: (ok, detalle, ms)}"""
+
+    def __init__(self, alerta: dict, canales: list):
+        self.alerta = alerta
+        self.t0 = time.perf_counter()
+        self.resultados = {}
+        self.primer_aviso_ms = None
+        self.canales = {c.nombre for c in canales}
+        self._faltan = len(canales)
+        self._lock = threading.Lock()
+        self._resultado = threading.Condition(self._lock)
+        self._listo = threading.Event()
+
+    @property
+    def avisado(self) -> bool:
+        return self.primer_aviso_ms is not None
+
+    def fallidos(self) -> dict:
+        return {canal: detalle for canal, (ok, detalle, _) in self.resultados.items() if not ok}
+
+    def esperar(self, timeout: float | None = None) -> bool:
+        return self._listo.wait(timeout)
+
+    def resultado(self, canal: str, timeout: float | None = None):
+        """Espera el resultado de un canal sin esperar a los demás: (ok, detalle, ms) o None"""
+        with self._resultado:
+            if canal in self.canales:
+                self._resultado.wait_for(lambda: canal in self.resultados, timeout)
+            return self.resultados.get(canal)
+
+
+class Notificador:
+    def __init__(self, canales: list, al_terminar=None, hilos: int = NOTIF_HILOS):
+        self.canales = sorted(canales, key=lambda c: c.prioridad)
+        self.al_terminar = al_terminar
+        self._pool = ThreadPoolExecutor(max_workers=hilos or max(1, len(self.canales)),
+                                        thread_name_prefix="notificador")
+        self._pendientes = set()
+        self._lock = threading.Lock()
+        self.ultimo = None  # Último despacho (diagnóstico y pruebas)
+
+    def notificar(self, alerta: dict) -> Despacho:
+        """Lanza todos los canales y retorna de inmediato"""
+        despacho = Despacho(alerta, self.canales)
+        with self._lock:
+            self._pendientes.add(despacho)
+            self.ultimo = despacho
+        for canal in self.canales:
+            self._pool.submit(self._enviar, canal, despacho)
+        if not self.canales:
+            self._terminar(despacho)
+        return despacho
+
+    def _enviar(self, canal: Canal, despacho: Despacho):
+        t0 = time.perf_counter()
+        try:
+            ok, detalle = bool(canal.enviar(despacho.alerta, canal.timeout_s)), ""
+            resultado = "ok" if ok else "error"
+        except requests.exceptions.Timeout:
+            ok, detalle, resultado = False, f"timeout ({canal.timeout_s:g}s)", "timeout"
+        except Exception as e:
+            ok, detalle, resultado = False, f"{type(e).__name__}: {e}", "error"
+        ahora = time.perf_counter()
+        METRICAS.observar("notificador_canal_ms", (ahora - t0) * 1000, canal=canal.nombre)
+        METRICAS.incrementar("notificador_canal_total", canal=canal.nombre, resultado=resultado)
+        with despacho._lock:
+            despacho.resultados[canal.nombre] = (ok, detalle or ("" if ok else "rechazado"), (ahora - t0) * 1000)
+            if ok and canal.aviso and despacho.primer_aviso_ms is None:
+                despacho.primer_aviso_ms = (ahora - despacho.t0) * 1000
+                METRICAS.observar("notificador_primer_aviso_ms", despacho.primer_aviso_ms)
+            despacho._faltan -= 1
+            ultimo = despacho._faltan == 0
+            despacho._resultado.notify_all()
+        if ultimo:
+            self._terminar(despacho)
+
+    def _terminar(self, despacho: Despacho):
+        try:
+            if self.al_terminar is not None:
+                self.al_terminar(despacho)
+        except Exception as e:
+            print(f"Error cerrando el despacho de la alerta: {e}")
+        finally:
+            with self._lock:
+                self._pendientes.discard(despacho)
+            despacho._listo.set()
+
+    def esperar(self, timeout: float | None = None) -> bool:
+        """Espera a que terminen las alertas en curso (al cerrar el receptor o en pruebas)"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pendientes = list(self._pendientes)
+            if not pendientes:
+                return True
+            restante = None if limite is None else limite - time.monotonic()
+            if restante is not None and restante <= 0:
+                return False
+            pendientes[0].esperar(restante)
+
+    def cerrar(self, timeout: float | None = None):
+        self.esperar(timeout if timeout is not None else max(TIMEOUTS_S.values()))
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- CANALES HTTP GENÉRICOS ---
+def resumen_alerta(alerta: dict) -> dict:
+    """Cuerpo JSON para RTDB y webhooks (mismo formato que test_notificaciones_web.py)"""
+    return {
+        "id": alerta["id"],
+        "persona": alerta["persona"],
+        "timestamp": datetime.fromtimestamp(alerta["ts"]).isoformat(),
+        "probabilidad": float(alerta["probabilidad"]),
+        "modo": alerta["modo"],
+        "sensor_cadera": {k: float(v) for k, v in alerta["cadera"].items()},
+        "sensor_pierna": {k: float(v) for k, v in alerta["pierna"].items()},
+    }
+
+
+def canal_rtdb(url: str, sesion: requests.Session | None = None) -> Canal:
+    """POST a {url}/alertas.json (el dashboard escucha ese nodo)"""
+    sesion = sesion or requests.Session()
+
+    def enviar(alerta, timeout_s):
+        r = sesion.post(f"{url.rstrip('/')}/alertas.json", json=resumen_alerta(alerta), timeout=timeout_s)
+        r.raise_for_status()
+        return True
+
+    return Canal("rtdb", enviar)
+
+
+def canal_webhook(url: str, sesion: requests.Session | None = None) -> Canal:
+    sesion = sesion or requests.Session()
+
+    def enviar(alerta, timeout_s):
+        r = sesion.post(url, json=resumen_alerta(alerta), timeout=timeout_s)
+        r.raise_for_status()
+        return True
+
+    return Canal("webhook", enviar)
+
+
+def canales_opcionales() -> list:
+    """Canales activados por variables de entorno"""
+    canales = []
+    if RTDB_URL:
+        canales.append(canal_rtdb(RTDB_URL))
+    if WEBHOOK_URL:
+        canales.append(canal_webhook(WEBHOOK_URL))
+    return canales
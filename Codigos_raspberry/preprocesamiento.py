@@ -0,0 +1,186 @@
+"""
+Preprocesamiento compartido entre entrenamiento, puntuación offline y receptor
+Define el orden de columnas, el escalado del giroscopio, FACTOR_CADERA y el tamaño de ventana
+La especificación se guarda junto al modelo para garantizar la paridad train/serve
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+# --- CONFIGURACIÓN ---
+WINDOW_SIZE = 100  # Ventana del modelo entregado (modelo_cnn_imu.h5: entrada (100, 12))
+OVERLAP = 50  # Paso entre ventanas de entrenamiento (50% de solapamiento)
+FRECUENCIA_HZ = 20  # El receptor muestrea cada 50 ms
+ESCALA_GIRO = 4.0  # Giroscopio escalado x4 para darle más peso
+FACTOR_CADERA = 1.0  # Peso adicional de las columnas de cadera
+VERSION_SPEC = 1
+
+EJES = ['ax', 'ay', 'az', 'gx', 'gy', 'gz']
+FEATURES_CADERA = [f'cadera_{e}' for e in EJES]
+FEATURES_PIERNA = [f'pierna_{e}' for e in EJES]
+FEATURES_DUAL = FEATURES_CADERA + FEATURES_PIERNA
+FEATURES_UNICO = list(EJES)
+SENSORES_ENTRENAMIENTO = ("auto", "cadera", "pierna")
+
+
+# --- ESPECIFICACIÓN ---
+def crear_spec(columnas, window_size: int = WINDOW_SIZE, overlap: int = OVERLAP) -> dict:
+    """Especificación serializable del pipeline de features"""
+    return {
+        "version": VERSION_SPEC,
+        "columnas": list(columnas),
+        "window_size": int(window_size),
+        "overlap": int(overlap),
+        "frecuencia_hz": FRECUENCIA_HZ,
+        "escala_giro": ESCALA_GIRO,
+        "factor_cadera": FACTOR_CADERA,
+    }
+
+
+def detectar_columnas(columnas) -> list:
+    """Elige el layout de features disponible (dual > cadera > sensor único)"""
+    columnas = set(columnas)
+    if 'cadera_ax' in columnas and 'pierna_ax' in columnas:
+        return list(FEATURES_DUAL)
+    if 'cadera_ax' in columnas:
+        return list(FEATURES_CADERA)
+    if 'ax' in columnas:
+        return list(FEATURES_UNICO)
+    raise ValueError(f"Columnas no reconocidas: {sorted(columnas)}")
+
+
+def validar_sensores(sensores: str) -> str:
+    """Valida TRAIN_SENSORES: "auto" usa el layout del CSV, "cadera"/"pierna" el respaldo de un sensor"""
+    if sensores not in SENSORES_ENTRENAMIENTO:
+        raise ValueError(f"TRAIN_SENSORES={sensores!r} no válido (usa {', '.join(SENSORES_ENTRENAMIENTO)})")
+    return sensores
+
+
+def columnas_entrenamiento(columnas, sensores: str = "auto") -> list:
+    """Columnas del CSV con las que se entrena según TRAIN_SENSORES"""
+    if validar_sensores(sensores) == "auto":
+        return detectar_columnas(columnas)
+    elegidas = FEATURES_CADERA if sensores == "cadera" else FEATURES_PIERNA
+    faltantes = [c for c in elegidas if c not in set(columnas)]
+    if faltantes:
+        raise ValueError(f"no tiene datos de {sensores} (faltan {', '.join(faltantes)})")
+    return list(elegidas)
+
+
+def describir_layout(columnas) -> str:
+    if columnas == FEATURES_DUAL:
+        return "CADERA + PIERNA"
+    if columnas == FEATURES_CADERA:
+        return "CADERA"
+    if columnas == FEATURES_PIERNA:
+        return "PIERNA"
+    return "sensor único"
+
+
+def vector_escala(spec: dict) -> np.ndarray:
+    """Factor multiplicativo por columna (giroscopio y peso de cadera)"""
+    escala = np.ones(len(spec["columnas"]), dtype=np.float32)
+    for i, col in enumerate(spec["columnas"]):
+        if col[-2:] in ('gx', 'gy', 'gz'):
+            escala[i] *= spec["escala_giro"]
+        if col.startswith('cadera_'):
+            escala[i] *= spec["factor_cadera"]
+    return escala
+
+
+# --- TRANSFORMACIONES ---
+def transformar(X: np.ndarray, spec: dict, escala: np.ndarray | None = None) -> np.ndarray:
+    """Aplica el escalado a muestras crudas (..., n_features) y devuelve float32"""
+    if escala is None:
+        escala = vector_escala(spec)
+    return np.asarray(X, dtype=np.float32) * escala
+
+
+def preparar_dataframe(df, spec: dict) -> np.ndarray:
+    """Extrae las columnas de la spec en orden y las escala: (n_muestras, n_features)"""
+    faltantes = [c for c in spec["columnas"] if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas: {faltantes}")
+    return transformar(df[spec["columnas"]].to_numpy(dtype=np.float32), spec)
+
+
+def crear_ventanas(X: np.ndarray, window_size: int, stride: int) -> np.ndarray:
+    """Vista (n_ventanas, window_size, n_features) sin copiar datos"""
+    if len(X) < window_size:
+        return np.empty((0, window_size, X.shape[1]), dtype=X.dtype)
+    vistas = np.lib.stride_tricks.sliding_window_view(X, window_size, axis=0)
+    return vistas[::stride].transpose(0, 2, 1)
+
+
+def muestra_desde_lecturas(lecturas: dict, spec: dict) -> list:
+    """Arma una muestra cruda en el orden de la spec.
+
+    `lecturas` mapea sensor ("cadera", "pierna") a su dict {ax, ..., gz}; un layout de
+    sensor único usa la lectura de cadera.
+    """
+    muestra = []
+    for col in spec["columnas"]:
+        sensor, _, eje = col.rpartition('_')
+        muestra.append(lecturas[sensor or "cadera"][eje])
+    return muestra
+
+
+# --- PERSISTENCIA JUNTO AL MODELO ---
+def ruta_spec(ruta_modelo) -> Path:
+    """modelo_cnn_imu.h5 -> modelo_cnn_imu.preproc.json"""
+    ruta_modelo = Path(ruta_modelo)
+    return ruta_modelo.with_name(ruta_modelo.stem + ".preproc.json")
+
+
+def guardar_spec(ruta_modelo, spec: dict) -> Path:
+    ruta = ruta_spec(ruta_modelo)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+def cargar_spec(ruta_modelo) -> dict | None:
+    """Devuelve la spec guardada o None si el modelo no la tiene (modelos antiguos)"""
+    ruta = ruta_spec(ruta_modelo)
+    if not ruta.exists():
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def spec_por_defecto(input_shape, sensor: str = "cadera") -> dict:
+    """Spec para modelos sin archivo .preproc.json: layout dual, o el del sensor indicado si son 6 features"""
+    window_size, num_features = int(input_shape[1]), int(input_shape[2])
+    if num_features == len(FEATURES_DUAL):
+        columnas = FEATURES_DUAL
+    else:
+        columnas = FEATURES_PIERNA if sensor == "pierna" else FEATURES_CADERA
+    return crear_spec(columnas, window_size)
+
+
+def indices_columnas(columnas, sensor: str = "cadera") -> list:
+    """Posición de cada columna dentro de FEATURES_DUAL.
+
+    Las columnas sin prefijo (sensor único) se toman del sensor indicado.
+    """
+    indices = []
+    for col in columnas:
+        completa = col if col.startswith(("cadera_", "pierna_")) else f"{sensor}_{col}"
+        if completa not in FEATURES_DUAL:
+            raise ValueError(f"Columna no disponible en el receptor: {col}")
+        indices.append(FEATURES_DUAL.index(completa))
+    return indices
+
+
+def validar_modelo(input_shape, spec: dict, columnas_esperadas=None):
+    """Lanza ValueError si la entrada del modelo no coincide con la spec"""
+    if spec.get("version") != VERSION_SPEC:
+        raise ValueError(f"Versión de spec no soportada: {spec.get('version')}")
+    window_size, num_features = input_shape[1], input_shape[2]
+    if window_size != spec["window_size"]:
+        raise ValueError(f"El modelo espera ventanas de {window_size} muestras, la spec indica {spec['window_size']}")
+    if num_features != len(spec["columnas"]):
+        raise ValueError(f"El modelo espera {num_features} features, la spec indica {len(spec['columnas'])}")
+    if columnas_esperadas is not None and list(spec["columnas"]) != list(columnas_esperadas):
+        raise ValueError(f"Columnas de la spec {spec['columnas']} no coinciden con {list(columnas_esperadas)}")
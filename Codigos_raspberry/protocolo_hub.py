@@ -0,0 +1,63 @@
+"""
+Protocolo binario entre receptores livianos y el hub de inferencia (TCP persistente)
+
+Cada trama (little endian):  tipo u8 | longitud u32 | carga[longitud]
+
+    HOLA        receptor → hub   JSON {"cliente", "persona", "columnas"}
+    BIENVENIDA  hub → receptor   JSON {"window_size", "paso"}
+    MUESTRAS    receptor → hub   seq u64 | ts f64 | float32[n, columnas]   (seq = contador de la última muestra)
+    DECISION    hub → receptor   seq u64 | prob f32 | modo u8               (prob NaN si no hubo datos frescos)
+    EVENTO      hub → receptor   JSON {"seq", "modo", "evento"}             (caída confirmada por el detector)
+    RECHAZO     hub → receptor   JSON {"motivo"}                            (en lugar de BIENVENIDA; el hub cierra)
+"""
+import asyncio
+import json
+import struct
+
+import numpy as np
+
+HOLA, BIENVENIDA, MUESTRAS, DECISION, EVENTO, RECHAZO = range(1, 7)
+MODOS = ("dual", "cadera", "pierna")
+SIN_MODO = 255
+LONGITUD_MAX = 1 << 20  # Una trama más grande indica un cliente roto o ajeno
+
+_CABECERA = struct.Struct("<BI")
+_MUESTRAS = struct.Struct("<Qd")
+_DECISION = struct.Struct("<QfB")
+
+
+def trama(tipo: int, carga: bytes) -> bytes:
+    return _CABECERA.pack(tipo, len(carga)) + carga
+
+
+def trama_json(tipo: int, objeto: dict) -> bytes:
+    return trama(tipo, json.dumps(objeto).encode("utf-8"))
+
+
+def trama_muestras(seq: int, ts: float, muestras) -> bytes:
+    return trama(MUESTRAS, _MUESTRAS.pack(seq, ts) + np.asarray(muestras, dtype="<f4").tobytes())
+
+
+def leer_muestras(carga: bytes, columnas: int):
+    """Devuelve (seq, ts, float32 (n, columnas))"""
+    seq, ts = _MUESTRAS.unpack_from(carga)
+    return seq, ts, np.frombuffer(carga, dtype="<f4", offset=_MUESTRAS.size).reshape(-1, columnas)
+
+
+def trama_decision(seq: int, prob: float | None, modo: str | None) -> bytes:
+    return trama(DECISION, _DECISION.pack(seq, np.nan if prob is None else prob,
+                                          MODOS.index(modo) if modo in MODOS else SIN_MODO))
+
+
+def leer_decision(carga: bytes):
+    """Devuelve (seq, prob o None, modo o None)"""
+    seq, prob, modo = _DECISION.unpack(carga)
+    return seq, (None if np.isnan(prob) else float(prob)), (MODOS[modo] if modo < len(MODOS) else None)
+
+
+async def leer_trama(lector: asyncio.StreamReader):
+    """Devuelve (tipo, carga); lanza asyncio.IncompleteReadError al cerrarse la conexión"""
+    tipo, longitud = _CABECERA.unpack(await lector.readexactly(_CABECERA.size))
+    if longitud > LONGITUD_MAX:
+        raise ValueError(f"trama de {longitud} bytes")
+    return tipo, await lector.readexactly(longitud)
@@ -0,0 +1,74 @@
+"""
+Publicador del stream en vivo hacia server.py (GET /stream, Server-Sent Events)
+El lazo de muestreo solo encola (nunca bloquea); un hilo junta las muestras de cada
+intervalo y las envía en un POST a /stream/publicar. Si el servidor no responde, los
+lotes se descartan: el stream es para visualizar, las alertas van por su propio camino.
+"""
+import os
+import queue
+import threading
+import time
+
+import requests
+
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+STREAM_URL = os.environ.get("STREAM_URL")  # p.ej. http://localhost:5000/stream/publicar (None = desactivado)
+STREAM_LOTE_S = float(os.environ.get("STREAM_LOTE_S", "0.25"))
+COLA_MAX = 400  # ~20 s de muestras a 20 Hz
+TIMEOUT_S = 2.0
+
+METRICAS.describir("receptor_stream_lotes_total", "counter", "Lotes enviados al stream en vivo por resultado")
+
+
+class PublicadorVivo:
+    def __init__(self, url: str = STREAM_URL, persona: str = "Vicente", lote_s: float = STREAM_LOTE_S):
+        self.url = url
+        self.persona = persona
+        self.lote_s = lote_s
+        self._cola = queue.Queue(maxsize=COLA_MAX)
+        self._sesion = requests.Session()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="publicador-vivo")
+        self._hilo.start()
+
+    def muestra(self, ts: float, muestra, prob: float | None = None, modo: str | None = None):
+        """Encola una muestra cruda de 12 columnas (y la probabilidad si hubo predicción)"""
+        try:
+            self._cola.put_nowait((ts, list(muestra), None if prob is None else float(prob), modo))
+        except queue.Full:
+            METRICAS.incrementar("receptor_stream_lotes_total", resultado="cola_llena")
+
+    def _bucle(self):
+        while not self._detener.wait(self.lote_s):
+            items = []
+            while True:
+                try:
+                    items.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            if not items:
+                continue
+            probs = [(p, m) for _, _, p, m in items if p is not None]
+            cuerpo = {"persona": self.persona, "ts": [t for t, _, _, _ in items], "muestras": [m for _, m, _, _ in items]}
+            if probs:
+                cuerpo["prob"], cuerpo["modo"] = probs[-1]
+            try:
+                r = self._sesion.post(self.url, json=cuerpo, timeout=TIMEOUT_S)
+                resultado = "ok" if r.ok else f"http_{r.status_code}"
+            except requests.RequestException:
+                resultado = "error"
+            METRICAS.incrementar("receptor_stream_lotes_total", resultado=resultado)
+
+    def cerrar(self):
+        self._detener.set()
+        self._hilo.join(timeout=TIMEOUT_S + self.lote_s)
+        self._sesion.close()
+
+
+def crear_publicador(persona: str) -> PublicadorVivo | None:
+    if not STREAM_URL:
+        return None
+    print(f"📺 Stream en vivo → {STREAM_URL}")
+    return PublicadorVivo(STREAM_URL, persona)
@@ -0,0 +1,201 @@
+"""
+Puntuación offline de sesiones grabadas
+Aplica el modelo CNN a todas las ventanas de muchos CSV/Parquet en lotes grandes
+Escribe probabilidades por ventana y eventos de caída detectados (mismo detector que el receptor)
+
+Uso:
+    python puntuar_sesiones.py capturas/*.csv --modelo ../modelo_cnn_imu.h5 --salida puntuaciones
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import detector_eventos
+import preprocesamiento as prep
+
+# --- CONFIGURACIÓN ---
+MODEL_PATH = "modelo_cnn_imu.h5"
+STRIDE = 5  # El receptor predice cada 5 muestras
+UMBRAL_CAIDA = 0.95
+BATCH_SIZE = 1024
+
+_modelo = None  # Un modelo por proceso trabajador
+_spec = None
+
+
+# --- CARGA DE DATOS ---
+def leer_grabacion(ruta: Path) -> pd.DataFrame:
+    if ruta.suffix.lower() == ".parquet":
+        return pd.read_parquet(ruta)
+    return pd.read_csv(ruta)
+
+
+# --- MODELO ---
+class _ModeloTFLite:
+    """Adaptador mínimo para modelos exportados a .tflite con predict por lotes"""
+
+    def __init__(self, ruta):
+        import tensorflow as tf
+        self.interprete = tf.lite.Interpreter(model_path=str(ruta))
+        self.entrada = self.interprete.get_input_details()[0]
+        self.salida = self.interprete.get_output_details()[0]
+        self.input_shape = tuple(self.entrada["shape"])
+        self._lote = None
+
+    def predict(self, X, verbose=0, batch_size=None):
+        if self._lote != len(X):
+            self.interprete.resize_tensor_input(self.entrada["index"], X.shape)
+            self.interprete.allocate_tensors()
+            self._lote = len(X)
+        self.interprete.set_tensor(self.entrada["index"], X.astype(np.float32))
+        self.interprete.invoke()
+        return self.interprete.get_tensor(self.salida["index"])
+
+
+def cargar_modelo(ruta):
+    """Carga el modelo y su spec de preprocesamiento; falla si no coinciden"""
+    ruta = Path(ruta)
+    if ruta.suffix == ".tflite":
+        modelo = _ModeloTFLite(ruta)
+    else:
+        from tensorflow import keras
+        modelo = keras.models.load_model(ruta)
+    spec = prep.cargar_spec(ruta) or prep.spec_por_defecto(modelo.input_shape)
+    prep.validar_modelo(modelo.input_shape, spec)
+    return modelo, spec
+
+
+def _iniciar_trabajador(ruta_modelo, hilos):
+    global _modelo, _spec
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    if hilos:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(hilos)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    _modelo, _spec = cargar_modelo(ruta_modelo)
+
+
+def predecir_lotes(modelo, ventanas: np.ndarray, batch_size: int = BATCH_SIZE) -> np.ndarray:
+    """Predice en lotes contiguos; evita materializar todas las ventanas a la vez"""
+    probs = np.empty(len(ventanas), dtype=np.float32)
+    for i in range(0, len(ventanas), batch_size):
+        lote = np.ascontiguousarray(ventanas[i:i + batch_size])
+        probs[i:i + len(lote)] = modelo.predict(lote, verbose=0).reshape(-1)
+    return probs
+
+
+# --- EVENTOS ---
+def extraer_eventos(inicios: np.ndarray, probs: np.ndarray, window_size: int, **parametros) -> list:
+    """Pasa las probabilidades por el detector de eventos del receptor (ver detector_eventos.py)"""
+    hz = prep.FRECUENCIA_HZ
+    ts = (inicios + window_size) / hz  # Cada ventana está disponible al llegar su última muestra
+    eventos = []
+    for evento in detector_eventos.detectar(ts, probs, **parametros):
+        eventos.append({
+            "muestra_inicio": int(round(evento["inicio"] * hz)) - window_size,
+            "muestra_fin": int(round(evento["fin"] * hz)),
+            "ventanas": evento["ventanas"],
+            "probabilidad_pico": evento["pico"],
+            "muestra_pico": int(round(evento["ts_pico"] * hz)) - window_size,
+        })
+    return eventos
+
+
+# --- PUNTUAR UN ARCHIVO ---
+def puntuar_archivo(ruta, salida, stride, parametros, batch_size):
+    """Se ejecuta en un proceso trabajador; devuelve un resumen del archivo"""
+    ruta = Path(ruta)
+    t0 = time.perf_counter()
+    df = leer_grabacion(ruta)
+    window_size = _spec["window_size"]
+
+    # Mismas columnas, orden y escalado que en entrenamiento
+    X = prep.preparar_dataframe(df, _spec)
+    ventanas = prep.crear_ventanas(X, window_size, stride)
+    inicios = np.arange(len(ventanas), dtype=np.int64) * stride
+    probs = predecir_lotes(_modelo, ventanas, batch_size)
+
+    salida = Path(salida)
+    pd.DataFrame({
+        "muestra_inicio": inicios,
+        "muestra_fin": inicios + window_size,
+        "probabilidad": probs,
+    }).to_csv(salida / f"{ruta.stem}_ventanas.csv", index=False)
+
+    eventos = extraer_eventos(inicios, probs, window_size, **parametros)
+    for evento in eventos:
+        evento["archivo"] = ruta.name
+    return {
+        "archivo": ruta.name,
+        "muestras": len(X),
+        "ventanas": len(ventanas),
+        "eventos": eventos,
+        "segundos": time.perf_counter() - t0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Puntúa grabaciones CSV/Parquet con el modelo CNN")
+    parser.add_argument("archivos", nargs="+", type=Path, help="Archivos .csv/.parquet o directorios")
+    parser.add_argument("--modelo", default=MODEL_PATH)
+    parser.add_argument("--salida", type=Path, default=Path("puntuaciones"))
+    parser.add_argument("--stride", type=int, default=STRIDE)
+    parser.add_argument("--umbral", type=float, default=UMBRAL_CAIDA, help="umbral_alto del detector")
+    for nombre in ("alfa", "umbral_bajo", "k", "n"):
+        valor = detector_eventos.PARAMETROS[nombre]
+        parser.add_argument(f"--{nombre.replace('_', '-')}", dest=nombre, type=type(valor), default=valor)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    archivos = []
+    for ruta in args.archivos:
+        if ruta.is_dir():
+            archivos += sorted(p for p in ruta.iterdir() if p.suffix.lower() in (".csv", ".parquet"))
+        else:
+            archivos.append(ruta)
+    if not archivos:
+        print("❌ No hay archivos para puntuar")
+        exit(1)
+
+    args.salida.mkdir(parents=True, exist_ok=True)
+    parametros = {"umbral_alto": args.umbral, "alfa": args.alfa, "umbral_bajo": args.umbral_bajo,
+                  "k": args.k, "n": args.n}
+    procesos = max(1, min(args.procesos, len(archivos)))
+    hilos = max(1, (os.cpu_count() or 1) // procesos)
+    print(f"📂 {len(archivos)} archivos | {procesos} procesos x {hilos} hilos | modelo {args.modelo}")
+
+    t0 = time.perf_counter()
+    eventos, total_ventanas = [], 0
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador,
+                             initargs=(args.modelo, hilos)) as pool:
+        futuros = {pool.submit(puntuar_archivo, ruta, args.salida, args.stride, parametros, args.batch): ruta
+                   for ruta in archivos}
+        for futuro in as_completed(futuros):
+            ruta = futuros[futuro]
+            try:
+                resumen = futuro.result()
+            except Exception as e:
+                print(f"   ❌ {ruta.name}: {e}")
+                continue
+            total_ventanas += resumen["ventanas"]
+            eventos += resumen["eventos"]
+            print(f"   ✅ {resumen['archivo']}: {resumen['ventanas']} ventanas, "
+                  f"{len(resumen['eventos'])} eventos ({resumen['segundos']:.1f}s)")
+
+    pd.DataFrame(eventos, columns=["archivo", "muestra_inicio", "muestra_fin", "ventanas",
+                                   "probabilidad_pico", "muestra_pico"]) \
+        .to_csv(args.salida / "eventos.csv", index=False)
+    dt = time.perf_counter() - t0
+    print(f"\n📊 {total_ventanas} ventanas en {dt:.1f}s ({total_ventanas / max(dt, 1e-9):.0f} ventanas/s)")
+    print(f"💾 Resultados en: {args.salida}")
+    print(f"   Para ajustar el detector: python detector_eventos.py {args.salida} --barrido")
+
+
+if __name__ == "__main__":
+    main()
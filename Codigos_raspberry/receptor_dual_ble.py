@@ -3,18 +3,44 @@ Cliente BLE para conectar DOS Arduinos Nano 33 BLE Sense
 Recibe datos de cadera y pierna simultáneamente
 Usa modelo CNN para detectar caídas en tiempo real
 Envía alertas a Firebase cuando detecta caída
+
+Con RECEPTOR_MODO=dividido la captura BLE, la inferencia y las alertas corren en
+procesos separados comunicados por un buffer en memoria compartida.
+Con RECEPTOR_MODO=reenvio solo se captura: las muestras van por TCP al hub de inferencia
+(hub_inferencia.py) y el receptor envía las alertas de los eventos que el hub confirma
 """
 import asyncio
 import json
 import numpy as np
 import requests
 from pathlib import Path
-from bleak import BleakClient, BleakScanner
+from supervisor_ble import SupervisorBLE, calcular_backoff
 from datetime import datetime, timezone, timedelta
-from tensorflow import keras
 from collections import deque
+import multiprocessing
+import threading
 import time
 import os
+import signal
+import socket
+import uuid
+from anillo_compartido import AnilloCompartido
+from registro_modelos import MODELOS_DIR, VigilanteModelos
+from almacen_series import ALMACEN_ACTIVO, AlmacenSeries
+from detector_eventos import (MUESTRAS_MOVIMIENTO, PARAMETROS as PARAMETROS_DETECTOR, DetectorEventos,
+                              movimiento)
+from evaluacion_sombra import EvaluadorSombra
+from publicador_vivo import crear_publicador
+from notificadores import TIMEOUTS_S, Canal, Notificador, canales_opcionales
+from control_carga import CARGA_FACTOR_PASO, NIVELES, ControlCarga
+from subida_archivos import crear_subidor
+from entradas_modelo import cargar_entrada, elegir_modo
+import fragmentos
+import modelo_ligero
+import preprocesamiento as prep
+import protocolo_hub as proto
+from metricas import (METRICAS, METRICAS_PUERTO, PERFILADOR_ACTIVO, PerfiladorMuestreo, ResumenConsola,
+                      iniciar_servidor_http, iniciar_volcado_json)
 
 # --- CONFIGURACIÓN ---
 DEVICE_CADERA = "Sensor-Cadera"
@@ -25,15 +51,78 @@ CHAR_CADERA = "19b10001-0000-1000-8000-00805f9b34fb"
 CHAR_PIERNA = "19b20001-0000-1000-8000-00805f9b34fb"
 
 # Modelo y ventana de detección
-MODEL_PATH = "modelo_cnn_imu.h5"
-WINDOW_SIZE = 40  # 2 segundos a 40Hz
-UMBRAL_CAIDA = 0.95  # 95% de confianza requerida
+MODEL_PATH = os.environ.get("MODEL_PATH", "modelo_cnn_imu.h5")  # .joblib = modelo ligero sin TensorFlow
+WINDOW_SIZE = prep.WINDOW_SIZE  # Se reemplaza por la ventana de la spec del modelo al cargarlo
+UMBRAL_CAIDA = 0.95  # 95% de confianza requerida (umbral alto del detector de eventos)
+PASO_PREDICCION = 5  # Predecir cada 5 muestras
+PERIODO_MUESTRA_S = 1 / prep.FRECUENCIA_HZ
+
+# Notificaciones en cola por sensor: el atraso que el lazo recupera sin perder lecturas (40 = 2 s a 20 Hz);
+# más allá se descartan las más antiguas
+COLA_NOTIFICACIONES = int(os.environ.get("RECEPTOR_COLA_NOTIFICACIONES", "40"))
+
+# Degradación por carga (ver control_carga.py); el último nivel usa el modelo ligero si existe
+CONTROL_CARGA = os.environ.get("CARGA_CONTROL", "1") == "1"
+MODEL_LIGERO_PATH = os.environ.get("MODEL_LIGERO_PATH", "modelo_ligero.joblib")
+
+# Modelos de respaldo de un solo sensor (opcionales) para cuando el otro IMU deja de notificar
+MODELOS_COMPANEROS = {
+    "cadera": os.environ.get("MODEL_CADERA_PATH", "modelo_cnn_imu_cadera.h5"),
+    "pierna": os.environ.get("MODEL_PIERNA_PATH", "modelo_cnn_imu_pierna.h5"),
+}
+SENSOR_OBSOLETO_S = float(os.environ.get("SENSOR_OBSOLETO_S", "1.0"))  # Sin notificaciones → obsoleto
+# Recarga en caliente desde el registro de versiones (ver registro_modelos.py)
+RECARGA_MODELOS = os.environ.get("MODELOS_RECARGA", "1") == "1"
+PERIODO_PRUEBA_S = float(os.environ.get("MODELOS_PRUEBA_S", "60"))  # Ventana para revertir una versión nueva
+VALIDACION_MIN_ACIERTO = 0.8  # Acierto mínimo sobre replay.npz cuando trae etiquetas
+
+# Modelo candidato evaluado en sombra junto al de producción (no genera alertas)
+MODEL_SOMBRA_PATH = os.environ.get("MODEL_SOMBRA_PATH")
+DESCRIPCION_MODO = {
+    "dual": "Dual (Cadera + Pierna)",
+    "cadera": "Cadera (modo degradado)",
+    "pierna": "Pierna (modo degradado)",
+}
+
+# Arquitectura: "unico" (un proceso), "dividido" (BLE / inferencia / alertas en procesos separados)
+# o "reenvio" (sin modelo local: la inferencia la hace el hub central)
+MODO_RECEPTOR = os.environ.get("RECEPTOR_MODO", "unico")
+# Reinicio de los procesos hijos del modo dividido: backoff exponencial con tope y presupuesto
+EXIT_CONFIGURACION = 78  # EX_CONFIG: modelo ausente o incompatible, reiniciar no lo arregla
+REINICIO_MIN_S = 1.0
+REINICIO_MAX_S = float(os.environ.get("RECEPTOR_REINICIO_MAX_S", "60"))
+REINICIOS_MAX = int(os.environ.get("RECEPTOR_REINICIOS_MAX", "5"))  # Por proceso dentro de la ventana
+REINICIOS_VENTANA_S = float(os.environ.get("RECEPTOR_REINICIOS_VENTANA_S", "600"))
+HUB_DIRECCION = os.environ.get("HUB_DIRECCION", "localhost:9100")
 
-# Firebase Firestore (REST API)
+def id_dispositivo():
+    """Hostname más /etc/machine-id (o la MAC): el hostname solo se repite entre Pis ("raspberrypi")"""
+    try:
+        maquina = Path("/etc/machine-id").read_text().strip()
+    except OSError:
+        maquina = ""
+    return f"{socket.gethostname()}-{(maquina or f'{uuid.getnode():012x}')[:12]}"
+
+HUB_NOMBRE = os.environ.get("HUB_NOMBRE") or id_dispositivo()  # Identifica al usuario ante el hub (único)
+HUB_BUFFER_MAX = 64 * 1024  # Bytes sin enviar al hub antes de dejar de escribir tramas
+SPEC_ANILLO = prep.crear_spec(prep.FEATURES_DUAL)  # Las muestras guardan siempre las 12 columnas crudas
+# Tras las 12 columnas crudas van 2 banderas de frescura (cadera, pierna) por muestra
+N_CRUDAS = len(SPEC_ANILLO["columnas"])
+SENSORES = ("cadera", "pierna")
+
+# Fragmento de señal adjunto a cada alerta (antes y después de la caída)
+FRAGMENTO_PRE_S = float(os.environ.get("FRAGMENTO_PRE_S", "5"))
+FRAGMENTO_POST_S = float(os.environ.get("FRAGMENTO_POST_S", "5"))
+N_PRE = int(FRAGMENTO_PRE_S * prep.FRECUENCIA_HZ)
+N_POST = int(FRAGMENTO_POST_S * prep.FRECUENCIA_HZ)
+
+# Firebase Firestore (REST API). FIRESTORE_BASE permite apuntar a un Firestore local (ver tests/)
+FIRESTORE_BASE = os.environ.get("FIRESTORE_BASE", "https://firestore.googleapis.com/v1")
 FIREBASE_PROJECT_ID = "detector-de-caidas-360"
 PERSONA = "Vicente"
-FIRESTORE_URL = f"https://firestore.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/databases/(default)/documents/Historial/Personas/{PERSONA}"
-CONFIG_DOC_URL = f"https://firestore.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/databases/(default)/documents/Historial/Personas/{PERSONA}/_config"
+COLECCION_DOC = f"projects/{FIREBASE_PROJECT_ID}/databases/(default)/documents/Historial/Personas/{PERSONA}"
+FIRESTORE_URL = f"{FIRESTORE_BASE}/{COLECCION_DOC}"
+CONFIG_DOC_URL = f"{FIRESTORE_BASE}/{COLECCION_DOC}/_config"
 COOLDOWN_ALERTAS = 10.0  # Segundos entre alertas (evitar sobreposición)
 
 # Configuración WhatsApp (vía servidor local)
@@ -51,7 +140,12 @@ def _timestamp_firestore_now():
     epoch_nanos = int((ahora_utc.timestamp() - epoch_seconds) * 1e9)
     return {"timestampValue": f"{ahora_utc.strftime('%Y-%m-%dT%H:%M:%S')}.{epoch_nanos:09d}Z"}
 
-def enviar_whatsapp_via_servidor(message: str) -> bool:
+def _timestamp_firestore(ts: float):
+    """timestampValue UTC para un epoch en segundos"""
+    momento = datetime.fromtimestamp(ts, timezone.utc)
+    return {"timestampValue": momento.strftime('%Y-%m-%dT%H:%M:%S.%fZ')}
+
+def enviar_whatsapp_via_servidor(message: str, timeout_s: float = 15) -> bool:
     """Envía WhatsApp usando el servidor local. Requiere CALLMEBOT_PHONE y CALLMEBOT_APIKEY.
     Retorna True si se envió correctamente.
     """
@@ -71,6 +165,19 @@ def enviar_whatsapp_via_servidor(message: str) -> bool:
     if not phone or not apikey:
         print("⚠️  WhatsApp no configurado (CALLMEBOT_PHONE / CALLMEBOT_APIKEY). Se omite envío.")
         return False
+
+    try:
+        # server.py espera los mismos campos que envía el dashboard (phone, apiCode, message)
+        r = requests.post(SERVER_ALERT_URL, json={"phone": phone, "apiCode": apikey, "message": message},
+                          timeout=timeout_s)
+        if r.status_code == 200:
+            print("   WhatsApp enviado vía servidor")
+            return True
+        print(f"   Servidor de alertas respondió {r.status_code}: {r.text[:200]}")
+    except requests.exceptions.RequestException as e:
+        print(f"   No se pudo contactar al servidor de alertas: {e}")
+    return False
+
 def fetch_config_from_firestore():
     """Obtiene (phone, apiCode) desde Firestore _config con caché de 60s."""
     try:
@@ -104,10 +211,9 @@ def fetch_config_from_firestore():
 
 
 def actualizar_estado_documento(doc_id: str, enviado: bool, error_msg: str | None = None):
-    """Actualiza el documento en Firestore con el estado del envío de WhatsApp."""
+    """Actualiza el documento en Firestore con el estado de los avisos (y los canales que fallaron)."""
     try:
-        doc_name = f"projects/{FIREBASE_PROJECT_ID}/databases/(default)/documents/Historial/Personas/Vicente/{doc_id}"
-        url = f"https://firestore.googleapis.com/v1/{doc_name}?updateMask.fieldPaths=estado&updateMask.fieldPaths=mensaje_enviado&updateMask.fieldPaths=hora_envio&updateMask.fieldPaths=error_envio"
+        url = f"{FIRESTORE_URL}/{doc_id}?updateMask.fieldPaths=estado&updateMask.fieldPaths=mensaje_enviado&updateMask.fieldPaths=hora_envio&updateMask.fieldPaths=error_envio"
         body = {
             "fields": {
                 "estado": {"stringValue": "Enviada" if enviado else "Error al enviar"},
@@ -115,7 +221,7 @@ def actualizar_estado_documento(doc_id: str, enviado: bool, error_msg: str | Non
                 "hora_envio": _timestamp_firestore_now(),
             }
         }
-        if not enviado and error_msg:
+        if error_msg:
             body["fields"]["error_envio"] = {"stringValue": error_msg[:300]}
 
         r = requests.patch(url, json=body, timeout=5)
@@ -126,284 +232,941 @@ def actualizar_estado_documento(doc_id: str, enviado: bool, error_msg: str | Non
     except Exception as e:
         print(f"Error actualizando documento: {e}")
 
+def actualizar_fragmento_post(doc_id: str, fragmento: bytes):
+    """Adjunta al documento el fragmento de señal posterior a la caída."""
+    try:
+        url = f"{FIRESTORE_URL}/{doc_id}?updateMask.fieldPaths=fragmento_post"
+        body = {"fields": {"fragmento_post": fragmentos.a_firestore(fragmento)}}
+        r = requests.patch(url, json=body, timeout=5)
+        if r.status_code == 200:
+            print(f"   Fragmento post-caída adjuntado ({len(fragmento)} bytes)")
+        else:
+            print(f" No se pudo adjuntar el fragmento post-caída: {r.status_code} - {r.text[:200]}")
+    except Exception as e:
+        print(f"Error adjuntando fragmento post-caída: {e}")
+
+def adjuntar_fragmento_post(doc_id: str, fragmento: bytes):
+    """Adjunta el fragmento post-caída solo cuando el canal Firestore ya creó el documento:
+    un PATCH anterior lo crearía incompleto y el POST ?documentId= de la alerta fallaría.
+    """
+    despacho = despachos.pop(doc_id, None)
+    resultado = despacho.resultado("firestore", timeout=sum(TIMEOUTS_S.values())) if despacho else None
+    if not resultado or not resultado[0]:
+        print(f" Fragmento post-caída descartado: el documento {doc_id} no se creó")
+        return
+    actualizar_fragmento_post(doc_id, fragmento)
+
+def codificar_muestras(items):
+    """Codifica [(ts, muestra_12_columnas), ...] como fragmento comprimido"""
+    if not items:
+        return None
+    return fragmentos.codificar([m for _, m in items], SPEC_ANILLO["columnas"], t0=items[0][0])
+
 # --- VARIABLES GLOBALES ---
 datos_cadera = {"ax": 0, "ay": 0, "az": 0, "gx": 0, "gy": 0, "gz": 0}
 datos_pierna = {"ax": 0, "ay": 0, "az": 0, "gx": 0, "gy": 0, "gz": 0}
 contador = 0
 ultima_alerta = 0  # Timestamp de la última alerta enviada
 
-# Buffer circular para ventana deslizante
+# Buffer circular para ventana deslizante: 12 columnas crudas + 2 banderas de frescura
 ventana = deque(maxlen=WINDOW_SIZE)
-modelo = None
+
+# Modelos cargados y calentados: "dual" y, si existen, los de un solo sensor
+modelos = {}
+modo_actual = None  # Modelo usado en la última predicción
+
+# Registro de modelos: versión activa y la anterior mientras dura el periodo de prueba
+vigilante = None
+version_modelo = None  # None = modelos de MODEL_PATH cargados al iniciar
+modelos_previos = None  # (version, modelos) para revertir
+prueba_hasta = 0.0
+
+# Evaluador en sombra del modelo candidato (None si MODEL_SOMBRA_PATH no está definido)
+sombra = None
+
+# Suavizado + histéresis: una alerta por caída en lugar de una por ventana sobre el umbral
+detector = DetectorEventos(umbral_alto=UMBRAL_CAIDA)
+
+# Última notificación de cada sensor (monotonic) para detectar datos congelados
+ultima_notificacion = {"cadera": 0.0, "pierna": 0.0}
+
+# Historial crudo de 12 columnas para los fragmentos pre/post caída (incluye la quietud que el
+# detector espera entre el impacto y la alerta)
+historial = deque(maxlen=N_PRE + N_POST + int(PARAMETROS_DETECTOR["inactividad_max_s"] * prep.FRECUENCIA_HZ)
+                  + 4 * PASO_PREDICCION)
+
+# Almacén local de series de tiempo (datos crudos de ambos sensores) y su subida opcional
+almacen = None
+subidor = None
+
+# Modo dividido: anillo compartido, cola de alertas y procesos hijos
+anillo = None
+cola_alertas = None
+procesos = {}
+reinicios = {}  # nombre -> {"recientes": deque de reinicios (monotonic), "proximo": reinicio programado}
+
+# Modo reenvío: conexión al hub, contador de la última muestra enviada y última decisión recibida
+hub_escritor = None
+enviado_hasta = 0
+decision_hub = None  # (prob, modo) aún no publicada en el stream en vivo
+
+# Stream en vivo hacia server.py (None si STREAM_URL no está definido)
+publicador = None
+
+# Envío concurrente de alertas (ver notificadores.py) y despachos aún sin fragmento post-caída
+notificador = None
+despachos = {}  # ID del documento -> Despacho
+
+# Control de carga del lazo de detección
+control_carga = None
+nivel_carga = 0
+paso_prediccion = PASO_PREDICCION
+entrada_ligera = None  # Modelo ligero precargado para el nivel backend_ligero
+
+# Lecturas recibidas y aún no consumidas por el muestreo: un lazo atrasado no las sobrescribe
+colas_lecturas = {sensor: deque() for sensor in SENSORES}
+
+# --- MÉTRICAS ---
+METRICAS.describir("receptor_notificaciones_total", "counter", "Notificaciones BLE recibidas por sensor")
+METRICAS.describir("receptor_errores_parseo_total", "counter", "Notificaciones que no se pudieron decodificar")
+METRICAS.describir("receptor_muestras_descartadas_total", "counter",
+                   "Notificaciones descartadas por cola llena antes de entrar a la ventana")
+METRICAS.describir("receptor_inferencia_ms", "histogram", "Latencia de modelo.predict en milisegundos")
+METRICAS.describir("receptor_ventana_muestras", "gauge", "Muestras actualmente en la ventana deslizante")
+METRICAS.describir("receptor_reconexiones_total", "counter", "Reintentos de conexión BLE")
+METRICAS.describir("receptor_alertas_total", "counter", "Alertas de caída por resultado")
+METRICAS.describir("receptor_probabilidad_caida", "gauge", "Última probabilidad de caída")
+METRICAS.describir("receptor_anillo_retraso_muestras", "gauge", "Muestras escritas aún no evaluadas por la inferencia")
+METRICAS.describir("receptor_ventanas_sobrescritas_total", "counter", "Ventanas invalidadas por el escritor durante la lectura")
+METRICAS.describir("receptor_procesos_reiniciados_total", "counter", "Procesos hijos reiniciados en modo dividido")
+METRICAS.describir("receptor_modo_inferencia", "gauge", "1 para el modelo en uso (dual, cadera, pierna, ninguno)")
+METRICAS.describir("receptor_cambios_modo_total", "counter", "Cambios entre modelo dual y de un solo sensor")
+METRICAS.describir("receptor_recargas_modelo_total", "counter", "Versiones de modelo activadas, revertidas o rechazadas")
+METRICAS.describir("receptor_hub_conectado", "gauge", "1 si el receptor liviano está conectado al hub")
+METRICAS.describir("receptor_hub_tramas_total", "counter", "Tramas de muestras enviadas al hub por resultado")
+resumen = ResumenConsola(METRICAS)
+perfilador = PerfiladorMuestreo()
 
 # --- CARGAR MODELO ---
 def cargar_modelo():
-    """Carga el modelo CNN entrenado"""
-    global modelo
+    """Carga el modelo dual (obligatorio) y los de un solo sensor disponibles"""
     try:
-        modelo = keras.models.load_model(MODEL_PATH)
-        num_features = modelo.input_shape[2]
-        print(f" Modelo cargado: {MODEL_PATH}")
-        print(f" Entrada: (batch, {WINDOW_SIZE}, {num_features})")
-        return num_features
+        modelos["dual"] = cargar_entrada(MODEL_PATH)
+    except ValueError as e:
+        print(f"Modelo incompatible con el receptor: {e}")
+        exit(EXIT_CONFIGURACION)
     except Exception as e:
         print(f"Error cargando modelo: {e}")
-        exit(1)
-
-# --- BUSCAR DISPOSITIVOS ---
-async def find_devices():
-    """Busca ambos Arduinos y retorna sus direcciones"""
-    print("Buscando dispositivos BLE...")
-    devices = await BleakScanner.discover(timeout=10.0)
-    
-    cadera_addr = None
-    pierna_addr = None
-    
-    for device in devices:
-        if device.name == DEVICE_CADERA:
-            cadera_addr = device.address
-            print(f"Encontrado CADERA: {device.name} ({device.address})")
-        elif device.name == DEVICE_PIERNA:
-            pierna_addr = device.address
-            print(f"Encontrado PIERNA: {device.name} ({device.address})")
+        exit(EXIT_CONFIGURACION)
     
-    if not cadera_addr or not pierna_addr:
-        raise Exception(f"No se encontraron ambos dispositivos")
+    for sensor, ruta in MODELOS_COMPANEROS.items():
+        if not ruta or not Path(ruta).exists():
+            continue
+        try:
+            modelos[sensor] = cargar_entrada(ruta, sensor)
+        except Exception as e:
+            print(f" Modelo de respaldo {sensor} no disponible ({ruta}): {e}")
     
-    return cadera_addr, pierna_addr
+    ajustar_ventana()
+    for modo, entrada in modelos.items():
+        print(f" Modelo {modo} cargado: {entrada['ruta']}")
+        print(f"   Entrada: (batch, {entrada['window_size']}, {len(entrada['indices'])}) - "
+              f"{prep.describir_layout(entrada['spec']['columnas'])}")
+    return len(modelos["dual"]["indices"])
+
+def validar_archivos_modelo():
+    """Comprueba sin TensorFlow lo que haría fallar siempre al proceso de inferencia (modelo dual
+    ausente, spec ilegible o incompatible) antes de lanzarlo; sale con EXIT_CONFIGURACION.
+    """
+    try:
+        if not Path(MODEL_PATH).exists():
+            raise ValueError(f"no existe {MODEL_PATH}")
+        if modelo_ligero.es_ligero(MODEL_PATH):
+            cargar_entrada(MODEL_PATH)  # Backend sin TensorFlow: se valida completo
+        else:
+            spec_modelo = prep.cargar_spec(MODEL_PATH)
+            if spec_modelo is not None:
+                prep.validar_modelo((None, spec_modelo["window_size"], len(spec_modelo["columnas"])), spec_modelo)
+                prep.indices_columnas(spec_modelo["columnas"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Modelo incompatible con el receptor: {e}")
+        exit(EXIT_CONFIGURACION)
+
+def ajustar_ventana():
+    """Ajusta la ventana deslizante al modelo más largo, conservando las muestras recientes"""
+    global ventana, WINDOW_SIZE
+    WINDOW_SIZE = max(m["window_size"] for m in modelos.values())
+    if ventana.maxlen != WINDOW_SIZE:
+        ventana = deque(ventana, maxlen=WINDOW_SIZE)
+
+# --- RECARGA EN CALIENTE ---
+def cargar_version(directorio):
+    """Carga (en el hilo del vigilante) el modelo dual y los de respaldo de una versión"""
+    entradas = {"dual": cargar_entrada(directorio / Path(MODEL_PATH).name)}
+    for sensor, ruta in MODELOS_COMPANEROS.items():
+        candidato = directorio / Path(ruta).name
+        if candidato.exists():
+            entradas[sensor] = cargar_entrada(candidato, sensor)
+    return entradas
+
+def ventanas_replay(window_size=None):
+    """Ventanas crudas (n, w, 12) de replay.npz y sus etiquetas (o None).
+    Sin archivo se usa una ventana en reposo de window_size muestras (solo se verifica que la
+    salida sea válida).
+    """
+    ruta = Path(MODELOS_DIR) / "replay.npz"
+    if ruta.exists():
+        with np.load(ruta) as datos:
+            return datos["X"][..., :N_CRUDAS].astype(np.float32), (datos["y"] if "y" in datos else None)
+    reposo = np.zeros((1, window_size or WINDOW_SIZE, N_CRUDAS), dtype=np.float32)
+    reposo[..., SPEC_ANILLO["columnas"].index("cadera_az")] = 1.0
+    reposo[..., SPEC_ANILLO["columnas"].index("pierna_az")] = 1.0
+    return reposo, None
+
+def validar_version(entradas):
+    """Lanza ValueError si algún modelo de la versión falla sobre las ventanas de replay"""
+    # La versión nueva puede traer una ventana más larga (ajustar_ventana() la admite)
+    X, y = ventanas_replay(max(e["window_size"] for e in entradas.values()))
+    for modo, entrada in entradas.items():
+        w = entrada["window_size"]
+        if X.shape[1] < w:
+            raise ValueError(f"replay de {X.shape[1]} muestras, el modelo {modo} necesita {w}")
+        preds = entrada["modelo"].predict(X[:, -w:, entrada["indices"]] * entrada["escala"], verbose=0)[:, 0]
+        if not np.all(np.isfinite(preds)) or preds.min() < 0 or preds.max() > 1:
+            raise ValueError(f"el modelo {modo} entrega probabilidades inválidas en el replay")
+        if y is not None:
+            acierto = float(np.mean((preds > UMBRAL_CAIDA) == (np.asarray(y) > 0.5)))
+            if acierto < VALIDACION_MIN_ACIERTO:
+                raise ValueError(f"acierto del modelo {modo} en el replay: {acierto:.2f} < {VALIDACION_MIN_ACIERTO}")
+
+def iniciar_recarga():
+    global vigilante
+    if not RECARGA_MODELOS:
+        return
+    vigilante = VigilanteModelos(cargar_version, validar_version)
+    vigilante.iniciar()
+
+def iniciar_sombra():
+    """Carga el candidato de MODEL_SOMBRA_PATH; un error aquí no detiene el receptor"""
+    global sombra
+    if not MODEL_SOMBRA_PATH:
+        return
+    try:
+        sombra = EvaluadorSombra(cargar_entrada(MODEL_SOMBRA_PATH), UMBRAL_CAIDA)
+        print(f"🌓 Evaluando en sombra: {MODEL_SOMBRA_PATH}")
+    except Exception as e:
+        print(f" Modelo en sombra no disponible ({MODEL_SOMBRA_PATH}): {e}")
+
+def aplicar_modelos_pendientes():
+    """Activa entre dos predicciones la versión que el vigilante dejó lista"""
+    global modelos, modelos_previos, version_modelo, prueba_hasta
+    pendiente = vigilante.tomar_pendiente() if vigilante is not None else None
+    if pendiente is None:
+        if modelos_previos is not None and time.monotonic() > prueba_hasta:
+            modelos_previos = None  # Periodo de prueba superado: ya no se revierte
+        return
+    version, nuevos = pendiente
+    modelos_previos = (version_modelo, modelos)
+    modelos = {**modelos, **nuevos}  # Los respaldos que la versión no trae se mantienen
+    version_modelo = version
+    prueba_hasta = time.monotonic() + PERIODO_PRUEBA_S
+    ajustar_ventana()
+    vigilante.confirmar(version)
+    METRICAS.incrementar("receptor_recargas_modelo_total", resultado="activado")
+    print(f"🔁 Modelo {version} activo ({', '.join(nuevos)})")
+
+def revertir_modelo(motivo):
+    """Vuelve a la versión anterior si la nueva falla durante el periodo de prueba"""
+    global modelos, modelos_previos, version_modelo
+    fallida = version_modelo
+    version_modelo, modelos = modelos_previos
+    modelos_previos = None
+    ajustar_ventana()
+    vigilante.revertir(fallida, version_modelo, motivo)
+    METRICAS.incrementar("receptor_recargas_modelo_total", resultado="revertido")
+    print(f"↩️  Volviendo al modelo {version_modelo or MODEL_PATH}")
+
+def muestra_actual():
+    """Muestra cruda de 12 columnas más las banderas de frescura de cada sensor"""
+    ahora = time.monotonic()
+    return prep.muestra_desde_lecturas({"cadera": datos_cadera, "pierna": datos_pierna}, SPEC_ANILLO) + [
+        float(ahora - ultima_notificacion[sensor] < SENSOR_OBSOLETO_S) for sensor in SENSORES
+    ]
+
+def muestras_pendientes():
+    """Muestras que corresponde producir ahora: una por lectura encolada del sensor más adelantado.
+    Tras un atraso se recupera todo lo encolado (sin inventar periodos); si ningún sensor está
+    fresco se produce una muestra marcada como obsoleta para que el lazo siga avanzando.
+    """
+    pendientes = max(len(cola) for cola in colas_lecturas.values())
+    if pendientes == 0 and not any(muestra_actual()[N_CRUDAS:]):
+        return 1
+    return pendientes
+
+def siguiente_muestra():
+    """Avanza cada sensor a su siguiente lectura en cola y retorna la muestra combinada.
+    Un sensor sin lectura en cola conserva la última (solo cuando va detrás del otro).
+    """
+    global datos_cadera, datos_pierna
+    if colas_lecturas["cadera"]:
+        datos_cadera = colas_lecturas["cadera"].popleft()
+    if colas_lecturas["pierna"]:
+        datos_pierna = colas_lecturas["pierna"].popleft()
+    return muestra_actual()
 
 # --- HANDLERS DE NOTIFICACIONES ---
-def handler_cadera(sender, data):
-    """Maneja datos del sensor de cadera"""
-    global datos_cadera
+def encolar_lectura(sensor, data):
+    """Decodifica una notificación y la encola; con la cola llena se descarta la más antigua"""
     try:
-        json_str = data.decode("utf-8")
-        lectura = json.loads(json_str)
-        datos_cadera = {
+        lectura = json.loads(data.decode("utf-8"))
+        datos = {
             "ax": lectura["ax"], "ay": lectura["ay"], "az": lectura["az"],
             "gx": lectura["gx"], "gy": lectura["gy"], "gz": lectura["gz"]
         }
-    except Exception as e:
-        print(f"Error en cadera: {e}")
+    except Exception:
+        METRICAS.incrementar("receptor_errores_parseo_total", sensor=sensor)
+        return
+    METRICAS.incrementar("receptor_notificaciones_total", sensor=sensor)
+    cola = colas_lecturas[sensor]
+    if len(cola) >= COLA_NOTIFICACIONES:
+        cola.popleft()
+        METRICAS.incrementar("receptor_muestras_descartadas_total", sensor=sensor)
+    cola.append(datos)
+    ultima_notificacion[sensor] = time.monotonic()
+    if almacen is not None:
+        almacen.agregar(sensor, time.time(), datos.values())
+
+def handler_cadera(sender, data):
+    """Maneja datos del sensor de cadera"""
+    encolar_lectura("cadera", data)
 
 def handler_pierna(sender, data):
     """Maneja datos del sensor de pierna"""
-    global datos_pierna
-    try:
-        json_str = data.decode("utf-8")
-        lectura = json.loads(json_str)
-        datos_pierna = {
-            "ax": lectura["ax"], "ay": lectura["ay"], "az": lectura["az"],
-            "gx": lectura["gx"], "gy": lectura["gy"], "gz": lectura["gz"]
-        }
-    except Exception as e:
-        print(f"Error en pierna: {e}")
+    encolar_lectura("pierna", data)
+
+# --- ENVIAR ALERTA (FIRESTORE + AVISOS EN PARALELO) ---
+def crear_documento(alerta, timeout_s):
+    """Canal Firestore: crea el documento con el ID ya asignado a la alerta"""
+    r = requests.post(f"{FIRESTORE_URL}?documentId={alerta['id']}", json=alerta["documento"], timeout=timeout_s)
+    if r.status_code != 200:
+        raise RuntimeError(f"Firestore {r.status_code}: {r.text[:200]}")
+    print(f"   Alerta registrada en Firestore: Historial/Personas/{PERSONA}/{alerta['id']}")
+    return True
+
+def cerrar_alerta(despacho):
+    """Al terminar todos los canales: métricas y estado final del documento"""
+    doc_id = despacho.alerta["id"]
+    fallidos = despacho.fallidos()
+    METRICAS.incrementar("receptor_alertas_total", resultado="enviada" if despacho.avisado else "error")
+    for canal, detalle in fallidos.items():
+        print(f"   Canal {canal} falló: {detalle}")
+    if "firestore" in fallidos:
+        return  # Sin documento que actualizar (un PATCH lo crearía incompleto)
+    error = "; ".join(f"{canal}: {detalle}" for canal, detalle in fallidos.items()) or None
+    actualizar_estado_documento(doc_id, despacho.avisado, error)
+
+def crear_notificador():
+    canales = [
+        Canal("firestore", crear_documento, aviso=False),
+        Canal("whatsapp", lambda alerta, timeout_s: enviar_whatsapp_via_servidor(alerta["mensaje"], timeout_s)),
+        *canales_opcionales(),
+    ]
+    print(f"📣 Canales de alerta: {', '.join(c.nombre for c in sorted(canales, key=lambda c: c.prioridad))}")
+    return Notificador(canales, al_terminar=cerrar_alerta)
+
+def notificador_alertas():
+    """Notificador del proceso actual (se crea al primer uso, también en el proceso de alertas)"""
+    global notificador
+    if notificador is None:
+        notificador = crear_notificador()
+    return notificador
 
-# --- ENVIAR ALERTA A FIRESTORE ---
-def enviar_a_firestore(probabilidad, datos_cadera, datos_pierna):
-    """Envía alerta de caída a Firestore (Historial/Personas/Vicente)"""
+def enviar_a_firestore(probabilidad, datos_cadera, datos_pierna, fragmento_pre: bytes | None = None,
+                       modo: str = "dual", evento: dict | None = None):
+    """Registra la caída en Firestore (Historial/Personas/Vicente) y avisa por todos los canales a la vez.
+    No bloquea: retorna el ID del documento (asignado aquí), o None si la alerta cae en el cooldown.
+    """
     global ultima_alerta
     
-    # Verificar cooldown de 5 segundos
+    # Verificar cooldown entre alertas
     tiempo_actual = time.time()
     if tiempo_actual - ultima_alerta < COOLDOWN_ALERTAS:
-        tiempo_restante = COOLDOWN_ALERTAS - (tiempo_actual - ultima_alerta)
-        print(f"   ⏳ Cooldown activo - {tiempo_restante:.1f}s restantes")
-        return False
+        METRICAS.incrementar("receptor_alertas_total", resultado="cooldown")
+        return None
+    ultima_alerta = tiempo_actual
+    doc_id = uuid.uuid4().hex[:20]
     
-    try:
-        # Timestamp en formato Firestore - Hora de Chile (UTC-3) convertida a UTC
-        timestamp_firestore = _timestamp_firestore_now()
-        
-        # Preparar documento en formato Firestore REST API
-        documento = {
-            "fields": {
-                "hora_caida": timestamp_firestore,
-                "tipo": {"stringValue": "Caída detectada - Sistema dual"},
-                "confianza": {"doubleValue": float(probabilidad)},
-                "ubicacion": {"stringValue": "Detectado por sensores"},
-                "estado": {"stringValue": "Pendiente"},
-                "sensor": {"stringValue": "Dual (Cadera + Pierna)"},
-                "probabilidad": {"doubleValue": float(probabilidad)},
-                # Datos sensor cadera
-                "cadera_ax": {"doubleValue": float(datos_cadera["ax"])},
-                "cadera_ay": {"doubleValue": float(datos_cadera["ay"])},
-                "cadera_az": {"doubleValue": float(datos_cadera["az"])},
-                "cadera_gx": {"doubleValue": float(datos_cadera["gx"])},
-                "cadera_gy": {"doubleValue": float(datos_cadera["gy"])},
-                "cadera_gz": {"doubleValue": float(datos_cadera["gz"])},
-                # Datos sensor pierna
-                "pierna_ax": {"doubleValue": float(datos_pierna["ax"])},
-                "pierna_ay": {"doubleValue": float(datos_pierna["ay"])},
-                "pierna_az": {"doubleValue": float(datos_pierna["az"])},
-                "pierna_gx": {"doubleValue": float(datos_pierna["gx"])},
-                "pierna_gy": {"doubleValue": float(datos_pierna["gy"])},
-                "pierna_gz": {"doubleValue": float(datos_pierna["gz"])},
-            }
+    # Timestamp en formato Firestore - Hora de Chile (UTC-3) convertida a UTC
+    timestamp_firestore = _timestamp_firestore_now()
+    
+    # Preparar documento en formato Firestore REST API
+    documento = {
+        "fields": {
+            "hora_caida": timestamp_firestore,
+            "tipo": {"stringValue": "Caída detectada - Sistema dual"},
+            "confianza": {"doubleValue": float(probabilidad)},
+            "ubicacion": {"stringValue": "Detectado por sensores"},
+            "estado": {"stringValue": "Pendiente"},
+            "sensor": {"stringValue": DESCRIPCION_MODO.get(modo, modo)},
+            "probabilidad": {"doubleValue": float(probabilidad)},
+            # Datos sensor cadera
+            "cadera_ax": {"doubleValue": float(datos_cadera["ax"])},
+            "cadera_ay": {"doubleValue": float(datos_cadera["ay"])},
+            "cadera_az": {"doubleValue": float(datos_cadera["az"])},
+            "cadera_gx": {"doubleValue": float(datos_cadera["gx"])},
+            "cadera_gy": {"doubleValue": float(datos_cadera["gy"])},
+            "cadera_gz": {"doubleValue": float(datos_cadera["gz"])},
+            # Datos sensor pierna
+            "pierna_ax": {"doubleValue": float(datos_pierna["ax"])},
+            "pierna_ay": {"doubleValue": float(datos_pierna["ay"])},
+            "pierna_az": {"doubleValue": float(datos_pierna["az"])},
+            "pierna_gx": {"doubleValue": float(datos_pierna["gx"])},
+            "pierna_gy": {"doubleValue": float(datos_pierna["gy"])},
+            "pierna_gz": {"doubleValue": float(datos_pierna["gz"])},
         }
-        
-        # Enviar a Firestore REST API
-        response = requests.post(FIRESTORE_URL, json=documento, timeout=5)
-        
-        if response.status_code == 200:
-            ultima_alerta = tiempo_actual
-            doc_data = response.json()
-            doc_id = doc_data.get('name', '').split('/')[-1]
-            print(f"   Alerta enviada a Firestore")
-            print(f"   ID: {doc_id}")
-            print(f"   Ruta: Historial/Personas/Vicente/{doc_id}")
-
-            # Componer mensaje WhatsApp
-            porcentaje = f"{float(probabilidad)*100:.1f}%"
-            fecha_local = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            mensaje = (
-                "ALERTA DE CAÍDA DETECTADA\n\n"
-                f"Persona: Vicente\n"
-                f"Fecha: {fecha_local}\n"
-                f"Confianza: {porcentaje}\n"
-                f"ID: {doc_id}\n\n"
-                "Verifica el estado de la persona inmediatamente."
-            )
-
-            enviado = enviar_whatsapp_via_servidor(mensaje)
-            if enviado:
-                actualizar_estado_documento(doc_id, True)
-            else:
-                actualizar_estado_documento(doc_id, False, "No se pudo enviar WhatsApp desde receptor_dual_ble.py")
+    }
+    if fragmento_pre:
+        # Señal previa a la caída (ver fragmentos.py para el formato)
+        documento["fields"]["fragmento_pre"] = fragmentos.a_firestore(fragmento_pre)
+        documento["fields"]["fragmento_columnas"] = {"stringValue": ",".join(SPEC_ANILLO["columnas"])}
+    if evento:
+        # Inicio/fin del evento según el detector (ver detector_eventos.py)
+        documento["fields"]["inicio_evento"] = _timestamp_firestore(evento["inicio"])
+        documento["fields"]["fin_evento"] = _timestamp_firestore(evento["fin"])
+        documento["fields"]["ventanas_evento"] = {"integerValue": str(evento["ventanas"])}
 
-            return True
-        else:
-            print(f"   Error Firestore: {response.status_code}")
-            print(f"   Respuesta: {response.text[:200]}")
-            return False
-            
-    except requests.exceptions.Timeout:
-        print(f"   Timeout al conectar con Firestore")
-        return False
-    except Exception as e:
-        print(f"   Error enviando a Firebase: {e}")
-        return False
+    # Componer mensaje WhatsApp
+    porcentaje = f"{float(probabilidad)*100:.1f}%"
+    fecha_local = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    mensaje = (
+        "ALERTA DE CAÍDA DETECTADA\n\n"
+        f"Persona: {PERSONA}\n"
+        f"Fecha: {fecha_local}\n"
+        f"Confianza: {porcentaje}\n"
+        f"ID: {doc_id}\n\n"
+        "Verifica el estado de la persona inmediatamente."
+    )
+
+    despachos[doc_id] = notificador_alertas().notificar({
+        "id": doc_id, "persona": PERSONA, "ts": tiempo_actual, "probabilidad": float(probabilidad), "modo": modo,
+        "cadera": dict(datos_cadera), "pierna": dict(datos_pierna), "documento": documento, "mensaje": mensaje,
+    })
+    print(f"   Alerta {doc_id} en camino")
+    return doc_id
 
 # --- PREDECIR CAÍDA ---
+def registrar_modo(modo):
+    global modo_actual
+    if modo == modo_actual:
+        return
+    print(f"🔀 Modo de inferencia: {modo_actual or 'ninguno'} → {modo or 'ninguno'}")
+    if modo_actual is not None or modo is not None:
+        METRICAS.incrementar("receptor_cambios_modo_total")
+    for nombre in ("dual", "cadera", "pierna", "ninguno"):
+        METRICAS.fijar("receptor_modo_inferencia", int(nombre == (modo or "ninguno")), modo=nombre)
+    modo_actual = modo
+
+def preparar_entrada(bloque):
+    """Arma la entrada del modelo a partir de las muestras más recientes de `bloque` (n, 14).
+    Retorna (X, entrada, modo) o (None, None, None) si ningún modelo tiene datos frescos.
+    """
+    modo = elegir_modo(modelos, bloque)
+    registrar_modo(modo)
+    if modo is None:
+        return None, None, None
+    entrada = modelos[modo]
+    if modo == "dual" and entrada_ligera is not None and nivel_carga >= NIVELES.index("backend_ligero"):
+        entrada = entrada_ligera
+    # Mismas columnas y escalado que en entrenamiento (copia fuera del bloque)
+    X = bloque[-entrada["window_size"]:, entrada["indices"]] * entrada["escala"]
+    return X, entrada, modo
+
+def evaluar_bloque(bloque):
+    """Retorna (probabilidad, modo) o (None, None)"""
+    X, entrada, modo = preparar_entrada(bloque)
+    if X is None:
+        return None, None
+    prob = inferir(X, entrada)
+    if sombra is not None and prob is not None:
+        sombra.enviar(time.time(), bloque, prob, modo)
+    return prob, modo
+
 def predecir_caida():
     """Usa el modelo CNN para predecir si hay caída"""
-    global ventana, modelo
-    
     if len(ventana) < WINDOW_SIZE:
-        return None  # No hay suficientes datos aún
-    
-    # Convertir ventana a numpy array
-    X = np.array(list(ventana))  # Shape: (40, 12)
-    X = X.reshape(1, WINDOW_SIZE, -1)  # Shape: (1, 40, 12)
-    
-    # Predecir
-    pred = modelo.predict(X, verbose=0)[0][0]
+        return None, None  # No hay suficientes datos aún
+    return evaluar_bloque(np.asarray(ventana, dtype=np.float32))
+
+def inferir(X, entrada):
+    """Ejecuta el modelo sobre una ventana ya escalada y registra la latencia"""
+    X = X.reshape(1, entrada["window_size"], -1)  # Shape: (1, window_size, n_features)
+    t0 = time.perf_counter()
+    try:
+        pred = entrada["modelo"].predict(X, verbose=0)[0][0]
+        if not np.isfinite(pred):
+            raise ValueError("predicción no finita")
+    except Exception as e:
+        if modelos_previos is None:
+            raise
+        revertir_modelo(f"{type(e).__name__}: {e}")
+        return None
+    METRICAS.observar("receptor_inferencia_ms", (time.perf_counter() - t0) * 1000)
+    METRICAS.fijar("receptor_probabilidad_caida", float(pred))
     return pred
 
 # --- DETECTAR CAÍDAS EN TIEMPO REAL ---
 async def detectar_caidas():
-    """Detecta caídas en tiempo real sin guardar CSV"""
+    """Detecta caídas en tiempo real (los datos crudos van al almacén local, no a CSV)"""
     global contador, ventana
     
     print("\nIniciando detección en tiempo real...")
-    print("─" * 120)
-    print(f"{'Seq':<6} {'Cadera (ax,ay,az | gx,gy,gz)':<55} {'Pierna (ax,ay,az | gx,gy,gz)':<40} {'Estado':<15}")
-    print("─" * 120)
+    print(f"Resumen en consola cada {resumen.cada_s:.0f}s")
     
+    estado = "No iniciado"
+    proximo = time.monotonic()
     while True:
-        contador += 1
+        # Plazos fijos de 50ms (20Hz). Al menos 1 ms de espera: si el lazo va atrasado, las
+        # notificaciones que esperan en el event loop se encolan antes de producir las muestras
+        await asyncio.sleep(max(0.001, proximo - time.monotonic()))
+        retraso = time.monotonic() - proximo
+        if control_carga is not None:
+            aplicar_nivel_carga(control_carga.registrar(retraso))
         
-        # Combinar datos de ambos sensores (12 features)
-        # Escalar giroscopio x4 (mismo factor usado en entrenamiento)
-        muestra = [
-            datos_cadera["ax"], datos_cadera["ay"], datos_cadera["az"],
-            datos_cadera["gx"] * 4.0, datos_cadera["gy"] * 4.0, datos_cadera["gz"] * 4.0,
-            datos_pierna["ax"], datos_pierna["ay"], datos_pierna["az"],
-            datos_pierna["gx"] * 4.0, datos_pierna["gy"] * 4.0, datos_pierna["gz"] * 4.0
-        ]
-        
-        # Agregar a ventana deslizante
-        ventana.append(muestra)
-        
-        # Predecir cada 5 muestras
-        estado = "No iniciado"
-        if contador % 5 == 0:
-            prob_caida = predecir_caida()
-            
-            if prob_caida is not None:
-                if prob_caida > UMBRAL_CAIDA:
-                    estado = f"CAÍDA ({prob_caida*100:.1f}%)"
-                    # Enviar a Firestore con cooldown de 5 segundos
-                    enviar_a_firestore(prob_caida, datos_cadera, datos_pierna)
-                else:
-                    estado = f"OK ({prob_caida*100:.1f}%)"
-            
-            print(f"{contador:<6} "
-                  f"({datos_cadera['ax']:6.3f},{datos_cadera['ay']:6.3f},{datos_cadera['az']:6.3f} | "
-                  f"{datos_cadera['gx']:6.3f},{datos_cadera['gy']:6.3f},{datos_cadera['gz']:6.3f})  "
-                  f"({datos_pierna['ax']:6.3f},{datos_pierna['ay']:6.3f},{datos_pierna['az']:6.3f} | "
-                  f"{datos_pierna['gx']:6.3f},{datos_pierna['gy']:6.3f},{datos_pierna['gz']:6.3f})  {estado}")
-        
-        await asyncio.sleep(0.05)  # 50ms = 20Hz
+        # Una muestra por lectura encolada: tras un atraso se vacía la cola (la latencia se recupera)
+        # y los periodos perdidos no se rellenan con repeticiones
+        n = muestras_pendientes()
+        ahora = time.time()
+        for i in range(n):
+            nuevo, doc_id = procesar_muestra(siguiente_muestra(), ahora - (n - 1 - i) * PERIODO_MUESTRA_S)
+            estado = nuevo or estado
+            if doc_id:
+                asyncio.create_task(capturar_post_caida(doc_id, contador))
+        if nivel_carga < NIVELES.index("sin_consola"):
+            resumen.tal_vez_imprimir(estado)
+        proximo = max(proximo + PERIODO_MUESTRA_S, time.monotonic())
+
+def iniciar_control_carga():
+    """Activa la degradación por carga; el nivel backend_ligero requiere MODEL_LIGERO_PATH"""
+    global control_carga, entrada_ligera
+    if not CONTROL_CARGA:
+        return
+    if Path(MODEL_LIGERO_PATH).exists() and not modelo_ligero.es_ligero(MODEL_PATH):
+        try:
+            entrada = cargar_entrada(MODEL_LIGERO_PATH)
+            if entrada["window_size"] <= WINDOW_SIZE and entrada["sensores"] == modelos["dual"]["sensores"]:
+                entrada_ligera = entrada
+            else:
+                print(f" Modelo ligero {MODEL_LIGERO_PATH} no reemplaza al dual (ventana o sensores distintos)")
+        except Exception as e:
+            print(f" Modelo ligero no disponible ({MODEL_LIGERO_PATH}): {e}")
+    niveles = NIVELES if entrada_ligera is not None else NIVELES[:-1]
+    control_carga = ControlCarga(nivel_max=len(niveles) - 1)
+    print(f"⚖️  Control de carga: {' → '.join(niveles)}")
+
+def aplicar_nivel_carga(nivel):
+    """Ajusta el trabajo por muestra al nivel de degradación (nunca se descartan muestras)"""
+    global nivel_carga, paso_prediccion
+    if nivel == nivel_carga:
+        return
+    nivel_carga = nivel
+    paso_prediccion = PASO_PREDICCION * (CARGA_FACTOR_PASO if nivel >= NIVELES.index("paso_amplio") else 1)
+
+def procesar_muestra(muestra, ts):
+    """Agrega una muestra (12 columnas crudas + frescura) y predice cada PASO_PREDICCION muestras.
+    Si el detector cierra una caída envía la alerta. Retorna (estado o None, ID del documento o None).
+    """
+    global contador
+    contador += 1
+    ventana.append(muestra)
+    historial.append((ts, muestra[:N_CRUDAS]))
+    METRICAS.fijar("receptor_ventana_muestras", len(ventana))
+
+    # Predecir cada 5 muestras (los modelos nuevos se activan justo antes)
+    estado = doc_id = prob_caida = modo = None
+    if contador % paso_prediccion == 0:
+        aplicar_modelos_pendientes()
+        prob_caida, modo = predecir_caida()
+
+        if prob_caida is None:
+            estado = "Sin datos frescos"
+        else:
+            evento = detector.actualizar(ts, prob_caida, movimiento(list(ventana)[-MUESTRAS_MOVIMIENTO:]))
+            if evento:
+                estado = f"CAÍDA ({evento['pico']*100:.1f}%, {evento['fin'] - evento['inicio']:.1f}s)"
+                print(f"{contador:<6} {estado}")
+                # Enviar a Firestore con cooldown y el fragmento previo a la caída (termina en el impacto)
+                previas = list(historial)
+                pre = codificar_muestras(previas[:len(previas) - muestras_inactividad(evento)][-N_PRE:])
+                doc_id = enviar_a_firestore(evento["pico"], datos_cadera, datos_pierna, pre, modo, evento)
+            else:
+                estado = f"OK ({prob_caida*100:.1f}%)"
+                if detector.estado != "reposo":
+                    estado += f" [{detector.estado}]"
+            if modo != "dual":
+                estado += f" [{modo}]"
+
+    if publicador is not None:
+        publicador.muestra(ts, muestra[:N_CRUDAS], prob_caida, modo)
+    return estado, doc_id
 
-# --- CONEXIÓN DUAL ---
-async def conectar_dispositivos():
-    """Conecta a ambos dispositivos simultáneamente"""
-    cadera_addr, pierna_addr = await find_devices()
+def muestras_inactividad(evento):
+    """Muestras entre el fin del impacto y la confirmación del evento (quietud posterior)"""
+    return int(round(evento.get("inactividad_s", 0.0) * prep.FRECUENCIA_HZ))
+
+async def capturar_post_caida(doc_id, contador_caida):
+    """Espera la señal posterior a la caída y la adjunta sin bloquear la detección"""
+    while contador - contador_caida < N_POST:
+        await asyncio.sleep(0.25)
+    nuevas = list(historial)[-(contador - contador_caida):][:N_POST]
+    fragmento = codificar_muestras(nuevas)
+    if fragmento:
+        await asyncio.get_running_loop().run_in_executor(None, adjuntar_fragmento_post, doc_id, fragmento)
+
+# --- MODO DIVIDIDO: CAPTURA → ANILLO COMPARTIDO ---
+async def muestrear_a_anillo():
+    """Escribe la muestra combinada al anillo a 20 Hz (proceso BLE, sin TensorFlow)"""
+    global contador
     
-    print(f"\n🔗 Conectando a ambos dispositivos...")
+    print(f"\nCapturando al anillo compartido {anillo.nombre}...")
+    while True:
+        for _ in range(muestras_pendientes()):
+            contador += 1
+            muestra = siguiente_muestra()
+            anillo.escribir(muestra)
+            if publicador is not None:
+                publicador.muestra(time.time(), muestra[:N_CRUDAS])
+        resumen.tal_vez_imprimir(f"anillo seq {anillo.secuencia}")
+        await asyncio.sleep(0.05)  # 50ms = 20Hz
+
+# --- MODO DIVIDIDO: PROCESO DE INFERENCIA ---
+def proceso_inferencia(nombre_anillo, cola):
+    """Lee ventanas del anillo sin copiarlas y publica las caídas en la cola de alertas"""
+    global anillo
+    try:
+        cargar_modelo()
+        iniciar_recarga()
+        iniciar_sombra()
+        anillo = AnilloCompartido.abrir(nombre_anillo)
+        iniciar_servidor_http(METRICAS, METRICAS_PUERTO + 1 if METRICAS_PUERTO else 0)
+        estado = "Esperando datos"
+        siguiente = anillo.secuencia + PASO_PREDICCION
+        while True:
+            if not anillo.esperar(siguiente, timeout=1.0):
+                continue
+            aplicar_modelos_pendientes()
+            seq, datos, _ = anillo.ventana(WINDOW_SIZE)
+            METRICAS.fijar("receptor_anillo_retraso_muestras", anillo.secuencia - seq)
+            siguiente = seq + PASO_PREDICCION  # Si la inferencia se atrasa, salta a lo más reciente
+            if datos is None:
+                continue
+            X, entrada, modo = preparar_entrada(datos)
+            ultima = datos[-1, :N_CRUDAS].tolist()
+            if not anillo.vigente(seq - WINDOW_SIZE):
+                METRICAS.incrementar("receptor_ventanas_sobrescritas_total")
+                continue
+            if X is None:
+                estado = "Sin datos frescos"
+                resumen.tal_vez_imprimir(estado)
+                continue
+            
+            prob_caida = inferir(X, entrada)
+            if prob_caida is None:
+                continue
+            if sombra is not None:
+                sombra.enviar(time.time(), datos, prob_caida, modo)
+            evento = detector.actualizar(time.time(), prob_caida, movimiento(datos))
+            if evento:
+                estado = f"CAÍDA ({evento['pico']*100:.1f}%, {evento['fin'] - evento['inicio']:.1f}s)"
+                print(f"{seq:<6} {estado}")
+                try:
+                    cola.put_nowait((evento["pico"], ultima, seq, modo, evento))
+                except Exception:
+                    METRICAS.incrementar("receptor_alertas_total", resultado="cola_llena")
+            else:
+                estado = f"OK ({prob_caida*100:.1f}%)"
+                if detector.estado != "reposo":
+                    estado += f" [{detector.estado}]"
+            if modo != "dual":
+                estado += f" [{modo}]"
+            resumen.tal_vez_imprimir(estado)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sombra is not None:
+            sombra.cerrar()
+        if anillo is not None:
+            anillo.cerrar()
+
+# --- MODO DIVIDIDO: PROCESO DE ALERTAS ---
+def _fragmento_anillo(lector, n, hasta):
+    """Copia y codifica n muestras del anillo terminadas en `hasta`"""
+    _, datos, tiempos = lector.ventana(n, hasta=hasta)
+    if datos is None:
+        return None
+    fragmento = fragmentos.codificar(datos[:, :N_CRUDAS], SPEC_ANILLO["columnas"], t0=float(tiempos[0]))
+    return fragmento if lector.vigente(hasta - n) else None
+
+def _adjuntar_post_anillo(lector, doc_id, seq):
+    if lector.esperar(seq + N_POST, timeout=FRAGMENTO_POST_S * 3):
+        fragmento = _fragmento_anillo(lector, N_POST, seq + N_POST)
+        if fragmento:
+            adjuntar_fragmento_post(doc_id, fragmento)
+
+def proceso_alertas(cola, nombre_anillo):
+    """Envía las alertas (HTTP bloqueante) sin afectar la captura ni la inferencia"""
+    lector = AnilloCompartido.abrir(nombre_anillo)
+    try:
+        while True:
+            item = cola.get()
+            if item is None:
+                break
+            prob_caida, ultima, seq, modo, evento = item
+            cadera = dict(zip(prep.EJES, ultima[:6]))
+            pierna = dict(zip(prep.EJES, ultima[6:]))
+            pre = _fragmento_anillo(lector, N_PRE, seq - muestras_inactividad(evento))
+            doc_id = enviar_a_firestore(prob_caida, cadera, pierna, pre, modo, evento)
+            if doc_id:
+                # La cola posterior se captura en un hilo para no retrasar la siguiente alerta
+                threading.Thread(target=_adjuntar_post_anillo, args=(lector, doc_id, seq), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if notificador is not None:
+            notificador.cerrar()
+
+def _lanzar_proceso(nombre):
+    ctx = multiprocessing.get_context("spawn")
+    if nombre == "inferencia":
+        proceso = ctx.Process(target=proceso_inferencia, args=(anillo.nombre, cola_alertas),
+                              name="receptor-inferencia", daemon=True)
+    else:
+        proceso = ctx.Process(target=proceso_alertas, args=(cola_alertas, anillo.nombre),
+                              name="receptor-alertas", daemon=True)
+    proceso.start()
+    procesos[nombre] = proceso
+    print(f"⚙️  Proceso de {nombre} iniciado (pid {proceso.pid})")
+
+def iniciar_modo_dividido():
+    """Crea el anillo compartido y lanza los procesos de inferencia y alertas"""
+    global anillo, cola_alertas
+    validar_archivos_modelo()
+    anillo = AnilloCompartido.crear(n_features=N_CRUDAS + len(SENSORES))
+    cola_alertas = multiprocessing.get_context("spawn").Queue(maxsize=100)
+    _lanzar_proceso("inferencia")
+    _lanzar_proceso("alertas")
+
+def vigilar_procesos(ahora=None):
+    """Reinicia los procesos hijos que hayan terminado con backoff exponencial (tope REINICIO_MAX_S).
+    Un error de configuración o más de REINICIOS_MAX reinicios en REINICIOS_VENTANA_S detienen el
+    receptor (SystemExit) en lugar de reiniciar en bucle.
+    """
+    ahora = time.monotonic() if ahora is None else ahora
+    for nombre, proceso in list(procesos.items()):
+        if proceso.is_alive():
+            continue
+        estado = reinicios.setdefault(nombre, {"recientes": deque(), "proximo": None})
+        recientes = estado["recientes"]
+        if estado["proximo"] is None:
+            if proceso.exitcode == EXIT_CONFIGURACION:
+                print(f"❌ Proceso de {nombre} terminó por un error de configuración; se detiene el receptor")
+                raise SystemExit(EXIT_CONFIGURACION)
+            while recientes and ahora - recientes[0] > REINICIOS_VENTANA_S:
+                recientes.popleft()
+            if len(recientes) >= REINICIOS_MAX:
+                print(f"❌ Proceso de {nombre} terminó {len(recientes) + 1} veces en "
+                      f"{REINICIOS_VENTANA_S:.0f}s; se detiene el receptor")
+                raise SystemExit(1)
+            espera = calcular_backoff(len(recientes), REINICIO_MIN_S, REINICIO_MAX_S)
+            estado["proximo"] = ahora + espera
+            print(f"⚠️  Proceso de {nombre} terminó (código {proceso.exitcode}); reinicio en {espera:.1f}s")
+        if ahora >= estado["proximo"]:
+            estado["proximo"] = None
+            recientes.append(ahora)
+            METRICAS.incrementar("receptor_procesos_reiniciados_total", proceso=nombre)
+            _lanzar_proceso(nombre)
+
+def detener_modo_dividido():
+    for proceso in procesos.values():
+        proceso.terminate()
+    for proceso in procesos.values():
+        proceso.join(timeout=5)
+    if anillo is not None:
+        anillo.cerrar()
+
+# --- MODO REENVÍO: RECEPTOR LIVIANO → HUB ---
+def enviar_al_hub():
+    """Envía las muestras nuevas desde la última trama sin bloquear el muestreo"""
+    global enviado_hasta
+    if hub_escritor is None:
+        return
+    if hub_escritor.transport.get_write_buffer_size() > HUB_BUFFER_MAX:
+        # Hub lento o red caída: se acumula en la ventana y se envía en la próxima trama
+        METRICAS.incrementar("receptor_hub_tramas_total", resultado="retenida")
+        return
+    nuevas = min(contador - enviado_hasta, len(ventana))
+    hub_escritor.write(proto.trama_muestras(contador, time.time(), list(ventana)[-nuevas:]))
+    enviado_hasta = contador
+    METRICAS.incrementar("receptor_hub_tramas_total", resultado="enviada")
+
+async def reenviar_a_hub():
+    """Muestrea a 20 Hz y reenvía cada PASO_PREDICCION muestras (sin modelo local)"""
+    global contador, decision_hub
     
-    async with BleakClient(cadera_addr, timeout=30.0) as client_cadera, \
-               BleakClient(pierna_addr, timeout=30.0) as client_pierna:
-        
-        print(f"✅ Conectado a CADERA: {cadera_addr}")
-        print(f"✅ Conectado a PIERNA: {pierna_addr}")
-        
-        # Suscribirse a notificaciones de ambos
-        await client_cadera.start_notify(CHAR_CADERA, handler_cadera)
-        await client_pierna.start_notify(CHAR_PIERNA, handler_pierna)
-        
-        print("\n📡 Recibiendo datos de ambos sensores...")
-        
-        # Iniciar detección de caídas
-        tarea_deteccion = asyncio.create_task(detectar_caidas())
-        
+    print(f"\nReenviando muestras al hub {HUB_DIRECCION} como {HUB_NOMBRE}...")
+    while True:
+        for _ in range(muestras_pendientes()):
+            contador += 1
+            muestra = siguiente_muestra()
+            ventana.append(muestra)
+            historial.append((time.time(), muestra[:N_CRUDAS]))
+            if contador - enviado_hasta >= PASO_PREDICCION:
+                enviar_al_hub()
+            if publicador is not None:
+                publicador.muestra(historial[-1][0], muestra[:N_CRUDAS], *(decision_hub or (None, None)))
+                decision_hub = None
+        resumen.tal_vez_imprimir("hub conectado" if hub_escritor is not None else "sin conexión al hub")
+        await asyncio.sleep(0.05)  # 50ms = 20Hz
+
+async def atender_evento_hub(aviso):
+    """Envía la alerta de una caída confirmada por el hub con el fragmento previo a su muestra"""
+    evento, seq = aviso["evento"], aviso["seq"]
+    print(f"{seq:<6} CAÍDA ({evento['pico']*100:.1f}%, {evento['fin'] - evento['inicio']:.1f}s) [hub]")
+    # El aviso llega unos ms después: el fragmento termina en el impacto que confirmó el hub
+    previas = list(historial)
+    previas = previas[:len(previas) - max(0, contador - seq) - muestras_inactividad(evento)][-N_PRE:]
+    ultima = previas[-1][1] if previas else muestra_actual()[:N_CRUDAS]
+    doc_id = await asyncio.get_running_loop().run_in_executor(
+        None, enviar_a_firestore, evento["pico"], dict(zip(prep.EJES, ultima[:6])),
+        dict(zip(prep.EJES, ultima[6:])), codificar_muestras(previas), aviso["modo"], evento)
+    if doc_id:
+        await capturar_post_caida(doc_id, seq)
+
+async def conexion_hub():
+    """Mantiene la conexión TCP con el hub (reconexión con backoff) y atiende sus respuestas"""
+    global hub_escritor, ventana, enviado_hasta, decision_hub
+    host, _, puerto = HUB_DIRECCION.rpartition(":")
+    intento = 0
+    while True:
+        escritor = None
         try:
-            # Mantener conexión activa
+            lector, escritor = await asyncio.open_connection(host, int(puerto))
+            escritor.write(proto.trama_json(proto.HOLA, {"cliente": HUB_NOMBRE, "persona": PERSONA,
+                                                         "columnas": N_CRUDAS + len(SENSORES)}))
+            tipo, carga = await asyncio.wait_for(proto.leer_trama(lector), timeout=10)
+            if tipo == proto.RECHAZO:
+                print(f"❌ El hub rechazó la conexión ({json.loads(carga).get('motivo')}); revisa HUB_NOMBRE")
+                raise ConnectionError("conexión rechazada por el hub")
+            if tipo != proto.BIENVENIDA:
+                raise ConnectionError(f"respuesta inesperada del hub (tipo {tipo})")
+            bienvenida = json.loads(carga)
+            if ventana.maxlen != bienvenida["window_size"]:
+                ventana = deque(ventana, maxlen=bienvenida["window_size"])
+            # La ventana acumulada va completa: el hub puede evaluar de inmediato
+            enviado_hasta = contador - len(ventana)
+            hub_escritor = escritor
+            enviar_al_hub()
+            intento = 0
+            METRICAS.fijar("receptor_hub_conectado", 1)
+            print(f"🛰️  Conectado al hub {HUB_DIRECCION}")
             while True:
-                await asyncio.sleep(1)
-        except asyncio.CancelledError:
-            tarea_deteccion.cancel()
-            await client_cadera.stop_notify(CHAR_CADERA)
-            await client_pierna.stop_notify(CHAR_PIERNA)
-            raise
+                tipo, carga = await proto.leer_trama(lector)
+                if tipo == proto.DECISION:
+                    _, prob, modo = proto.leer_decision(carga)
+                    registrar_modo(modo)
+                    if prob is not None:
+                        METRICAS.fijar("receptor_probabilidad_caida", prob)
+                        decision_hub = (prob, modo)
+                elif tipo == proto.EVENTO:
+                    asyncio.create_task(atender_evento_hub(json.loads(carga)))
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+            if hub_escritor is not None:
+                print(f"⚠️  Conexión con el hub perdida: {e or type(e).__name__}")
+        finally:
+            hub_escritor = None
+            METRICAS.fijar("receptor_hub_conectado", 0)
+            if escritor is not None:
+                escritor.close()
+        await asyncio.sleep(calcular_backoff(intento))
+        intento += 1
 
 # --- LOOP PRINCIPAL ---
+async def vigilar_procesos_periodicamente():
+    while True:
+        await asyncio.sleep(1)
+        vigilar_procesos()
+
 async def main_loop():
-    """Bucle con reconexión automática"""
-    retry_delay = 5
+    """Un supervisor BLE por sensor y detección continua.
+    Si un sensor se cae, solo ese sensor se reconecta; el otro sigue notificando.
+    """
+    supervisores = [
+        SupervisorBLE("cadera", DEVICE_CADERA, CHAR_CADERA, handler_cadera),
+        SupervisorBLE("pierna", DEVICE_PIERNA, CHAR_PIERNA, handler_pierna),
+    ]
+    tareas = [asyncio.create_task(s.ejecutar()) for s in supervisores]
     
-    while True:
-        try:
-            await conectar_dispositivos()
-        except KeyboardInterrupt:
-            print("\n\n🚪 Detenido por el usuario")
-            break
-        except Exception as e:
-            print(f"\n\n Error: {e}")
-            print(f"🔄 Reintentando en {retry_delay} segundos...")
-            await asyncio.sleep(retry_delay)
+    # Detección de caídas (o solo captura al anillo / reenvío al hub)
+    if MODO_RECEPTOR == "dividido":
+        tareas.append(asyncio.create_task(muestrear_a_anillo()))
+        tareas.append(asyncio.create_task(vigilar_procesos_periodicamente()))
+    elif MODO_RECEPTOR == "reenvio":
+        tareas.append(asyncio.create_task(reenviar_a_hub()))
+        tareas.append(asyncio.create_task(conexion_hub()))
+    else:
+        tareas.append(asyncio.create_task(detectar_caidas()))
+    
+    try:
+        await asyncio.gather(*tareas)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
 
 # --- EJECUTAR ---
 if __name__ == "__main__":
-    # Cargar modelo primero
-    num_features = cargar_modelo()
+    # Cargar modelo primero (sale si no coincide con la spec de preprocesamiento)
+    if MODO_RECEPTOR == "dividido":
+        iniciar_modo_dividido()
+    elif MODO_RECEPTOR == "reenvio":
+        print(f"🛰️  Modo reenvío: la inferencia la hace el hub {HUB_DIRECCION}")
+    else:
+        cargar_modelo()
+        iniciar_recarga()
+        iniciar_sombra()
+        iniciar_control_carga()
+    
+    # Almacén local de los datos crudos (solo en el proceso que recibe BLE)
+    if ALMACEN_ACTIVO:
+        almacen = AlmacenSeries()
+        subidor = crear_subidor(almacen, PERSONA, pausar=lambda: nivel_carga > 0)
+        print(f"💾 Almacén local: {almacen.raiz} ({almacen.ocupado()/1e6:.1f} MB)")
+    publicador = crear_publicador(PERSONA)
     
-    if num_features != 12:
-        print(f"El modelo espera {num_features} features, pero enviamos 12")
-        print(f"   Entrena el modelo con datos de 12 columnas (cadera + pierna)")
+    # Exportadores de métricas y perfilador opcional (SIGUSR1 lo alterna)
+    iniciar_servidor_http(METRICAS)
+    iniciar_volcado_json(METRICAS)
+    if PERFILADOR_ACTIVO:
+        perfilador.iniciar()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: perfilador.alternar())
     
     try:
         asyncio.run(main_loop())
     except KeyboardInterrupt:
         print("\n Exit")
+    finally:
+        if MODO_RECEPTOR == "dividido":
+            detener_modo_dividido()
+        if subidor is not None:
+            subidor.cerrar()
+        if almacen is not None:
+            almacen.cerrar()
+        if publicador is not None:
+            publicador.cerrar()
+        if notificador is not None:
+            notificador.cerrar()
+        if sombra is not None:
+            sombra.cerrar()
+        if perfilador.activo:
+            perfilador.detener()
+            perfilador.guardar()
@@ -0,0 +1,318 @@
+"""
+Reentrenamiento incremental a partir de alertas etiquetadas en Firestore
+Las cuidadoras marcan cada alerta como "Atendido" (caída real) o "Falsa alarma"; las ventanas
+se reconstruyen con los fragmentos pre/post adjuntos (ver fragmentos.py).
+
+Solo se reentrena la cabeza del modelo (capas después de Flatten/GlobalAveragePooling):
+las ventanas antiguas viven en un reservorio de tamaño fijo con sus embeddings en caché,
+así cada actualización toma segundos o minutos en CPU. El resultado se publica como una
+versión nueva en el registro de modelos, que el receptor valida y activa en caliente.
+
+Uso:
+    python reentrenamiento.py --inicial datos/*.csv     (una vez: llena el reservorio)
+    python reentrenamiento.py                           (descarga alertas nuevas y actualiza)
+
+Estado en disco (se reanuda si el proceso se interrumpe):
+    reentrenamiento/estado.json        alertas procesadas, época en curso
+    reentrenamiento/reservorio.npz     ventanas antiguas, etiquetas y embeddings
+    reentrenamiento/nuevos.npz         ventanas de la actualización en curso
+    reentrenamiento/cabeza.weights.h5  checkpoint de la cabeza
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import requests
+
+import fragmentos
+import preprocesamiento as prep
+from registro_modelos import MODELOS_DIR
+
+# --- CONFIGURACIÓN ---
+MODEL_PATH = "modelo_cnn_imu.h5"
+FIREBASE_PROJECT_ID = "detector-de-caidas-360"
+PERSONA = os.environ.get("PERSONA", "Vicente")
+FIRESTORE_URL = f"https://firestore.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/databases/(default)/documents/Historial/Personas/{PERSONA}"
+ESTADO_DIR = Path(os.environ.get("REENTRENAMIENTO_DIR", "reentrenamiento"))
+ETIQUETAS = {"Atendido": 1, "Falsa alarma": 0}
+CAPACIDAD_RESERVORIO = 5000
+PROPORCION_ANTIGUOS = 4  # Ventanas del reservorio por cada ventana nueva
+MINIMO_ANTIGUOS = 500
+STRIDE = 5
+MARGEN_CAIDA = 20  # Ventanas positivas: terminan hasta 1 s después de la alerta
+EPOCHS = 10
+BATCH_SIZE = 64
+TASA_APRENDIZAJE = 1e-4
+MAX_PERDIDA_ACIERTO = 0.02  # Se descarta la actualización si olvida más que esto en el reservorio
+TAM_PAGINA = 300
+
+
+# --- ESTADO ---
+def cargar_estado() -> dict:
+    try:
+        with open(ESTADO_DIR / "estado.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"procesadas": [], "en_curso": None}
+
+
+def guardar_estado(estado: dict):
+    ESTADO_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = ESTADO_DIR / "estado.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+    os.replace(tmp, ESTADO_DIR / "estado.json")
+
+
+# --- ALERTAS ETIQUETADAS ---
+def descargar_alertas(url: str = FIRESTORE_URL):
+    """Recorre la colección página a página y devuelve los documentos etiquetados con fragmento"""
+    documentos, token = [], None
+    with requests.Session() as sesion:
+        while True:
+            params = {"pageSize": TAM_PAGINA}
+            if token:
+                params["pageToken"] = token
+            r = sesion.get(url, params=params, timeout=15)
+            r.raise_for_status()
+            datos = r.json()
+            for doc in datos.get("documents", []):
+                campos = doc.get("fields", {})
+                estado = campos.get("estado", {}).get("stringValue")
+                if estado in ETIQUETAS and "fragmento_pre" in campos:
+                    documentos.append((doc["name"].split("/")[-1], ETIQUETAS[estado], campos))
+            token = datos.get("nextPageToken")
+            if not token:
+                return documentos
+
+
+def ventanas_de_alerta(campos: dict, etiqueta: int, spec: dict):
+    """Ventanas (n, w, c) alrededor de la alerta: en caídas solo las que contienen el impacto"""
+    columnas = campos.get("fragmento_columnas", {}).get("stringValue", ",".join(prep.FEATURES_DUAL)).split(",")
+    pre, _, _ = fragmentos.desde_firestore(campos["fragmento_pre"])
+    partes = [pre]
+    if "fragmento_post" in campos:
+        partes.append(fragmentos.desde_firestore(campos["fragmento_post"])[0])
+    crudo = np.concatenate(partes)
+    indices = [columnas.index(c if c.startswith(("cadera_", "pierna_")) else f"cadera_{c}")
+               for c in spec["columnas"]]
+    X = prep.transformar(crudo[:, indices], spec)
+    w = spec["window_size"]
+    ventanas = prep.crear_ventanas(X, w, STRIDE)
+    if etiqueta == 1:
+        fines = np.arange(len(ventanas)) * STRIDE + w
+        ventanas = ventanas[(fines >= len(pre)) & (fines <= len(pre) + MARGEN_CAIDA)]
+    return np.ascontiguousarray(ventanas), np.full(len(ventanas), etiqueta, dtype=np.int32)
+
+
+# --- MODELO: BASE CONGELADA + CABEZA ---
+def ruta_modelo_base() -> Path:
+    """La versión activa del registro si existe; si no, MODEL_PATH"""
+    activo = Path(MODELOS_DIR) / "ACTIVO"
+    if activo.exists():
+        ruta = Path(MODELOS_DIR) / activo.read_text(encoding="utf-8").strip() / Path(MODEL_PATH).name
+        if ruta.exists():
+            return ruta
+    return Path(MODEL_PATH)
+
+
+def dividir_modelo(modelo):
+    """(extractor, cabeza): corta después de la última capa Flatten/GlobalAveragePooling"""
+    from tensorflow import keras
+    corte = max(i for i, capa in enumerate(modelo.layers)
+                if type(capa).__name__ in ("Flatten", "GlobalAveragePooling1D"))
+    extractor = keras.Model(modelo.inputs, modelo.layers[corte].output)
+    capas = modelo.layers[corte + 1:]
+    cabeza = keras.Sequential([keras.Input(shape=extractor.output_shape[1:])] +
+                              [type(capa).from_config(capa.get_config()) for capa in capas])
+    for nueva, original in zip(cabeza.layers, capas):
+        nueva.set_weights(original.get_weights())
+    return extractor, cabeza
+
+
+def huella(extractor) -> str:
+    """Identifica los pesos del extractor: si cambian, los embeddings en caché no sirven"""
+    h = hashlib.sha1()
+    for w in extractor.get_weights():
+        h.update(np.ascontiguousarray(w).tobytes())
+    return h.hexdigest()
+
+
+# --- RESERVORIO ---
+def cargar_reservorio():
+    ruta = ESTADO_DIR / "reservorio.npz"
+    if not ruta.exists():
+        return None
+    with np.load(ruta) as d:
+        return {k: d[k] for k in d.files}
+
+
+def guardar_reservorio(res: dict):
+    ESTADO_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = ESTADO_DIR / "reservorio.tmp.npz"
+    np.savez(tmp, **res)
+    os.replace(tmp, ESTADO_DIR / "reservorio.npz")
+
+
+def agregar_al_reservorio(res: dict | None, X, y, E, firma: str, rng) -> dict:
+    """Muestreo de reservorio (algoritmo R): cada ventana vista tiene igual probabilidad de quedar"""
+    if res is None:
+        res = {"X": X[:0], "y": y[:0], "E": E[:0], "vistos": np.int64(0), "huella": np.str_(firma)}
+    Xr, yr, Er = list(res["X"]), list(res["y"]), list(res["E"])
+    vistos = int(res["vistos"])
+    for i in range(len(X)):
+        vistos += 1
+        if len(Xr) < CAPACIDAD_RESERVORIO:
+            Xr.append(X[i]); yr.append(y[i]); Er.append(E[i])
+        else:
+            j = rng.integers(0, vistos)
+            if j < CAPACIDAD_RESERVORIO:
+                Xr[j], yr[j], Er[j] = X[i], y[i], E[i]
+    return {"X": np.asarray(Xr, dtype=np.float32), "y": np.asarray(yr, dtype=np.int32),
+            "E": np.asarray(Er, dtype=np.float32), "vistos": np.int64(vistos), "huella": np.str_(firma)}
+
+
+def embeddings_reservorio(res: dict, extractor, firma: str) -> np.ndarray:
+    """Usa la caché si el extractor no cambió; si cambió, recalcula y la actualiza"""
+    if str(res["huella"]) != firma:
+        print("   Extractor distinto: recalculando embeddings del reservorio...")
+        res["E"] = extractor.predict(res["X"], batch_size=512, verbose=0).astype(np.float32)
+        res["huella"] = np.str_(firma)
+        guardar_reservorio(res)
+    return res["E"]
+
+
+# --- ACTUALIZACIÓN ---
+def inicializar(archivos, spec, extractor, firma, rng):
+    from compresion import cargar_ventanas
+    X, y = cargar_ventanas(archivos, spec)
+    E = extractor.predict(X, batch_size=512, verbose=0).astype(np.float32)
+    res = agregar_al_reservorio(cargar_reservorio(), X, y, E, firma, rng)
+    guardar_reservorio(res)
+    print(f"💾 Reservorio: {len(res['X'])} ventanas ({int(res['y'].sum())} caídas) de {int(res['vistos'])} vistas")
+
+
+def acierto(cabeza, E, y) -> float:
+    return float(np.mean((cabeza.predict(E, verbose=0).reshape(-1) > 0.5) == (y == 1)))
+
+
+def publicar(modelo, spec) -> Path:
+    """Guarda el modelo como versión nueva del registro (el receptor la recarga en caliente)"""
+    version = datetime.now().strftime("v%Y%m%d-%H%M%S")
+    tmp = Path(MODELOS_DIR) / f".{version}"
+    tmp.mkdir(parents=True, exist_ok=True)
+    ruta = tmp / Path(MODEL_PATH).name
+    modelo.save(ruta)
+    prep.guardar_spec(ruta, spec)
+    destino = Path(MODELOS_DIR) / version
+    os.replace(tmp, destino)  # Aparece completa para el vigilante
+    return destino
+
+
+def actualizar(modelo, spec, extractor, cabeza, firma, estado, rng):
+    from tensorflow import keras
+
+    en_curso = estado.get("en_curso")
+    if en_curso and (ESTADO_DIR / "nuevos.npz").exists():
+        print(f"♻️  Reanudando actualización desde la época {en_curso['epoca']}")
+        with np.load(ESTADO_DIR / "nuevos.npz") as d:
+            Xn, yn, ids = d["X"], d["y"], list(d["ids"])
+        epoca_inicial = en_curso["epoca"]
+    else:
+        print("📥 Descargando alertas etiquetadas...")
+        procesadas = set(estado["procesadas"])
+        nuevas = [d for d in descargar_alertas() if d[0] not in procesadas]
+        if not nuevas:
+            print("✅ No hay alertas etiquetadas nuevas")
+            return
+        partes = [ventanas_de_alerta(campos, etiqueta, spec) for _, etiqueta, campos in nuevas]
+        Xn = np.concatenate([p[0] for p in partes])
+        yn = np.concatenate([p[1] for p in partes])
+        ids = [doc_id for doc_id, _, _ in nuevas]
+        np.savez(ESTADO_DIR / "nuevos.npz", X=Xn, y=yn, ids=np.array(ids))
+        estado["en_curso"] = {"epoca": 0}
+        guardar_estado(estado)
+        epoca_inicial = 0
+    print(f"   {len(ids)} alertas nuevas → {len(Xn)} ventanas ({int(yn.sum())} de caída)")
+
+    res = cargar_reservorio()
+    if res is None or not len(res["X"]):
+        print("❌ Reservorio vacío: ejecuta primero con --inicial <csv>")
+        exit(1)
+    Er = embeddings_reservorio(res, extractor, firma)
+    En = extractor.predict(Xn, batch_size=512, verbose=0).astype(np.float32)
+
+    # Conjunto de ajuste: todas las ventanas nuevas + muestra del reservorio contra el olvido
+    n_antiguos = min(len(Er), max(MINIMO_ANTIGUOS, PROPORCION_ANTIGUOS * len(En)))
+    muestra = rng.choice(len(Er), size=n_antiguos, replace=False)
+    E = np.concatenate([En, Er[muestra]])
+    y = np.concatenate([yn, res["y"][muestra]])
+    antes = acierto(cabeza, Er, res["y"]), acierto(cabeza, En, yn)
+    if epoca_inicial and (ESTADO_DIR / "cabeza.weights.h5").exists():
+        cabeza.load_weights(ESTADO_DIR / "cabeza.weights.h5")
+
+    class Checkpoint(keras.callbacks.Callback):
+        def on_epoch_end(self, epoca, logs=None):
+            cabeza.save_weights(ESTADO_DIR / "cabeza.weights.h5")
+            estado["en_curso"] = {"epoca": epoca + 1}
+            guardar_estado(estado)
+
+    cabeza.compile(optimizer=keras.optimizers.Adam(TASA_APRENDIZAJE), loss='binary_crossentropy')
+    cabeza.fit(E, y, epochs=EPOCHS, initial_epoch=epoca_inicial, batch_size=BATCH_SIZE, shuffle=True,
+               callbacks=[Checkpoint()], verbose=1)
+    despues = acierto(cabeza, Er, res["y"]), acierto(cabeza, En, yn)
+    print(f"   Acierto reservorio: {antes[0]:.3f} → {despues[0]:.3f} | alertas nuevas: {antes[1]:.3f} → {despues[1]:.3f}")
+
+    if antes[0] - despues[0] > MAX_PERDIDA_ACIERTO:
+        print(f"❌ La actualización olvida demasiado (>{MAX_PERDIDA_ACIERTO:.0%}); no se publica")
+    else:
+        for capa, nueva in zip(modelo.layers[-len(cabeza.layers):], cabeza.layers):
+            capa.set_weights(nueva.get_weights())
+        print(f"📦 Versión publicada: {publicar(modelo, spec)}")
+        res = agregar_al_reservorio(res, Xn, yn, En, firma, rng)
+        guardar_reservorio(res)
+
+    estado["procesadas"] = sorted(set(estado["procesadas"]) | set(ids))
+    estado["en_curso"] = None
+    guardar_estado(estado)
+    for nombre in ("nuevos.npz", "cabeza.weights.h5"):
+        (ESTADO_DIR / nombre).unlink(missing_ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reentrenamiento incremental desde alertas etiquetadas")
+    parser.add_argument("--modelo", type=Path, default=None, help="Modelo base (por defecto la versión activa)")
+    parser.add_argument("--inicial", nargs="+", type=Path, help="CSV para llenar el reservorio")
+    parser.add_argument("--reiniciar", action="store_true", help="Descarta una actualización a medias")
+    args = parser.parse_args()
+
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    from tensorflow import keras
+
+    ruta = args.modelo or ruta_modelo_base()
+    modelo = keras.models.load_model(ruta)
+    spec = prep.cargar_spec(ruta) or prep.spec_por_defecto(modelo.input_shape)
+    prep.validar_modelo(modelo.input_shape, spec)
+    extractor, cabeza = dividir_modelo(modelo)
+    firma = huella(extractor)
+    print(f"🧠 Modelo base: {ruta} (cabeza: {len(cabeza.layers)} capas, embedding {extractor.output_shape[1:]})")
+
+    ESTADO_DIR.mkdir(parents=True, exist_ok=True)
+    estado = cargar_estado()
+    if args.reiniciar:
+        estado["en_curso"] = None
+        (ESTADO_DIR / "nuevos.npz").unlink(missing_ok=True)
+    rng = np.random.default_rng()
+
+    if args.inicial:
+        inicializar(args.inicial, spec, extractor, firma, rng)
+    else:
+        actualizar(modelo, spec, extractor, cabeza, firma, estado, rng)
+
+
+if __name__ == "__main__":
+    main()
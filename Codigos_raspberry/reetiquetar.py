@@ -0,0 +1,239 @@
+"""
+Reetiquetado y conversión de capturas por bloques (generaliza Versiones.py)
+Lee cada CSV en trozos, normaliza el layout de columnas (ax → cadera_ax, cadera, dual),
+asigna la columna `state` a partir de anotaciones por rango de tiempo y escribe
+Parquet (o CSV) sin cargar el archivo completo. Varios archivos se procesan en paralelo;
+la memoria queda acotada por procesos x tamaño de bloque.
+
+Anotaciones (CSV):  archivo,inicio,fin,etiqueta
+    archivo  nombre del CSV de captura (sin ruta)
+    inicio   segundos desde el inicio de la captura (o valores de la columna de tiempo si existe)
+    fin      exclusivo
+Las filas fuera de toda anotación reciben --etiqueta-defecto; si dos rangos se solapan manda el último.
+Sin pyarrow instalado el formato por defecto es CSV. Cada salida se escribe en un archivo oculto
+y solo se publica con su nombre final si el archivo completo se procesó sin errores.
+
+Uso:
+    python reetiquetar.py datos_capturados/ --anotaciones anotaciones.csv --salida datos_limpios
+    python reetiquetar.py "datos_capturados/datos_capturados_caidas (1).csv" --etiqueta-defecto 1 --formato csv
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import preprocesamiento as prep
+
+# --- CONFIGURACIÓN ---
+FILAS_POR_BLOQUE = 200_000
+COLUMNAS_TIEMPO = ("timestamp", "tiempo", "ts", "time")
+COLUMNA_ETIQUETA = "state"
+
+
+def formato_por_defecto() -> str:
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "csv"
+
+
+# --- COLUMNAS ---
+def normalizar_nombres(columnas, sensor_unico: str = "cadera") -> dict:
+    """Mapa columna original → nombre canónico (cadera_ax, ..., pierna_gz)"""
+    mapa = {}
+    for col in columnas:
+        limpio = str(col).strip().lower()
+        if limpio in prep.EJES:
+            mapa[col] = f"{sensor_unico}_{limpio}"
+        elif limpio in prep.FEATURES_DUAL:
+            mapa[col] = limpio
+    return mapa
+
+
+def detectar_tiempo(columnas) -> str | None:
+    for col in columnas:
+        if str(col).strip().lower() in COLUMNAS_TIEMPO:
+            return col
+    return None
+
+
+def layout_salida(canonicas) -> list:
+    """Columnas de salida en el orden de FEATURES_DUAL (solo los sensores presentes)"""
+    return [c for c in prep.FEATURES_DUAL if c in set(canonicas)]
+
+
+# --- ANOTACIONES ---
+def cargar_anotaciones(ruta) -> dict:
+    """archivo → array (n, 3) de [inicio, fin, etiqueta] en orden de aparición"""
+    if ruta is None:
+        return {}
+    df = pd.read_csv(ruta)
+    faltantes = {"archivo", "inicio", "fin", "etiqueta"} - set(df.columns)
+    if faltantes:
+        raise ValueError(f"Faltan columnas en las anotaciones: {sorted(faltantes)}")
+    return {archivo: grupo[["inicio", "fin", "etiqueta"]].to_numpy(dtype=np.float64)
+            for archivo, grupo in df.groupby("archivo", sort=False)}
+
+
+def etiquetar(t: np.ndarray, rangos: np.ndarray | None, defecto: int) -> np.ndarray:
+    etiquetas = np.full(len(t), defecto, dtype=np.int8)
+    if rangos is not None:
+        for inicio, fin, etiqueta in rangos:
+            etiquetas[(t >= inicio) & (t < fin)] = int(etiqueta)
+    return etiquetas
+
+
+# --- ESCRITORES ---
+class _EscritorParquet:
+    """Escribe un row group por bloque con pyarrow (sin acumular el archivo en memoria)"""
+
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self.tmp = ruta.with_name("." + ruta.name)
+        self._escritor = None
+
+    def escribir(self, df: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        if self._escritor is None:
+            self._escritor = pq.ParquetWriter(self.tmp, tabla.schema, compression="zstd")
+        self._escritor.write_table(tabla)
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+            os.replace(self.tmp, self.ruta)
+
+    def descartar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+class _EscritorCSV:
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self.tmp = ruta.with_name("." + ruta.name)
+        self._abierto = False
+
+    def escribir(self, df: pd.DataFrame):
+        df.to_csv(self.tmp, mode="a" if self._abierto else "w", header=not self._abierto, index=False)
+        self._abierto = True
+
+    def cerrar(self):
+        if self._abierto:
+            os.replace(self.tmp, self.ruta)
+
+    def descartar(self):
+        self.tmp.unlink(missing_ok=True)
+
+
+# --- PROCESAR UN ARCHIVO ---
+def procesar_archivo(ruta, salida, rangos, defecto: int, formato: str, sensor_unico: str,
+                     filas_por_bloque: int = FILAS_POR_BLOQUE) -> dict:
+    """Se ejecuta en un proceso trabajador; devuelve un resumen del archivo"""
+    ruta, salida = Path(ruta), Path(salida)
+    t0 = time.perf_counter()
+    destino = salida / f"{ruta.stem}.{formato}"
+    escritor = _EscritorParquet(destino) if formato == "parquet" else _EscritorCSV(destino)
+    filas = descartadas = 0
+    conteo = {}
+    columnas = None
+    try:
+        for bloque in pd.read_csv(ruta, chunksize=filas_por_bloque):
+            if columnas is None:
+                mapa = normalizar_nombres(bloque.columns, sensor_unico)
+                columnas = layout_salida(mapa.values())
+                col_tiempo = detectar_tiempo(bloque.columns)
+                if not columnas:
+                    raise ValueError(f"Columnas no reconocidas: {list(bloque.columns)}")
+            datos = bloque.rename(columns=mapa)[columnas].apply(pd.to_numeric, errors="coerce")
+            if col_tiempo is not None:
+                t = pd.to_numeric(bloque[col_tiempo], errors="coerce").to_numpy(dtype=np.float64)
+            else:
+                t = (filas + np.arange(len(bloque))) / prep.FRECUENCIA_HZ
+            validas = datos.notna().all(axis=1).to_numpy() & ~np.isnan(t)
+            filas += len(bloque)
+            descartadas += int((~validas).sum())
+
+            salida_df = datos[validas].astype(np.float32).reset_index(drop=True)
+            salida_df.insert(0, "t", t[validas])
+            salida_df[COLUMNA_ETIQUETA] = etiquetar(t[validas], rangos, defecto)
+            for etiqueta, n in zip(*np.unique(salida_df[COLUMNA_ETIQUETA], return_counts=True)):
+                conteo[int(etiqueta)] = conteo.get(int(etiqueta), 0) + int(n)
+            escritor.escribir(salida_df)
+    except BaseException:
+        escritor.descartar()  # Un archivo a medias nunca queda con el nombre final
+        raise
+    escritor.cerrar()
+    return {
+        "archivo": ruta.name,
+        "layout": prep.describir_layout(columnas or []),
+        "filas": filas,
+        "descartadas": descartadas,
+        "etiquetas": conteo,
+        "segundos": time.perf_counter() - t0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reetiqueta y convierte capturas CSV por bloques")
+    parser.add_argument("archivos", nargs="+", type=Path, help="Archivos .csv o directorios")
+    parser.add_argument("--anotaciones", type=Path, help="CSV archivo,inicio,fin,etiqueta")
+    parser.add_argument("--etiqueta-defecto", type=int, default=0)
+    parser.add_argument("--salida", type=Path, default=Path("datos_limpios"))
+    parser.add_argument("--formato", choices=("parquet", "csv"), default=formato_por_defecto(),
+                        help="Por defecto parquet si pyarrow está instalado, si no csv")
+    parser.add_argument("--sensor-unico", choices=("cadera", "pierna"), default="cadera",
+                        help="Sensor al que corresponden columnas sin prefijo (ax, ..., gz)")
+    parser.add_argument("--filas-por-bloque", type=int, default=FILAS_POR_BLOQUE)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    archivos = []
+    for ruta in args.archivos:
+        archivos += sorted(ruta.glob("*.csv")) if ruta.is_dir() else [ruta]
+    if not archivos:
+        print("❌ No hay archivos para procesar")
+        exit(1)
+    anotaciones = cargar_anotaciones(args.anotaciones)
+    sin_anotar = [r.name for r in archivos if anotaciones and r.name not in anotaciones]
+    if sin_anotar:
+        print(f"ℹ Sin anotaciones (etiqueta {args.etiqueta_defecto}): {', '.join(sin_anotar)}")
+
+    args.salida.mkdir(parents=True, exist_ok=True)
+    procesos = max(1, min(args.procesos, len(archivos)))
+    print(f"📂 {len(archivos)} archivos | {procesos} procesos | bloques de {args.filas_por_bloque:,} filas "
+          f"| formato {args.formato}")
+
+    t0 = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {pool.submit(procesar_archivo, ruta, args.salida, anotaciones.get(ruta.name),
+                               args.etiqueta_defecto, args.formato, args.sensor_unico,
+                               args.filas_por_bloque): ruta for ruta in archivos}
+        for futuro in as_completed(futuros):
+            ruta = futuros[futuro]
+            try:
+                r = futuro.result()
+            except Exception as e:
+                print(f"   ❌ {ruta.name}: {e}")
+                continue
+            total += r["filas"]
+            etiquetas = ", ".join(f"{k}: {v:,}" for k, v in sorted(r["etiquetas"].items()))
+            descartadas = f", {r['descartadas']:,} descartadas" if r["descartadas"] else ""
+            print(f"   ✅ {r['archivo']} ({r['layout']}): {r['filas']:,} filas [{etiquetas}]{descartadas} "
+                  f"({r['segundos']:.1f}s)")
+    dt = time.perf_counter() - t0
+    print(f"\n📊 {total:,} filas en {dt:.1f}s ({total / max(dt, 1e-9):,.0f} filas/s)")
+    print(f"💾 Resultados en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
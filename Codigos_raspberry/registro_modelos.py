@@ -0,0 +1,148 @@
+"""
+Registro de modelos versionados con recarga en caliente
+Vigila un directorio con una subcarpeta por versión, carga y valida la más nueva en segundo plano
+y la deja lista para que el receptor la active entre dos predicciones
+
+Estructura:
+    modelos/
+        replay.npz                      ventanas crudas de validación (X) y etiquetas opcionales (y)
+        ACTIVO                          versión en uso (no existe si se usan los modelos de arranque)
+        REVERTIDO                       última versión revertida: las anteriores no se activan solas
+        v0003/
+            modelo_cnn_imu.h5           obligatorio (modelo dual)
+            modelo_cnn_imu.preproc.json
+            modelo_cnn_imu_cadera.h5    opcional (respaldo de un solo sensor)
+            RECHAZADO                   lo escribe el vigilante si la versión falla
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+MODELOS_DIR = os.environ.get("MODELOS_DIR", "modelos")
+INTERVALO_REVISION_S = float(os.environ.get("MODELOS_INTERVALO_S", "10"))
+ESTABLE_S = 5.0  # Los archivos deben llevar este tiempo sin cambios (copia terminada)
+MARCA_RECHAZO = "RECHAZADO"
+MARCA_REVERSION = "REVERTIDO"
+
+
+class VigilanteModelos:
+    """Detecta versiones nuevas y las prepara en un hilo aparte.
+
+    `cargar(directorio)` debe devolver las entradas listas (modelos calentados) y
+    `validar(entradas)` lanzar una excepción si no sirven. Nada se activa aquí:
+    el receptor llama a `tomar_pendiente()` entre predicciones.
+    """
+
+    def __init__(self, cargar, validar, directorio=MODELOS_DIR, intervalo_s: float = INTERVALO_REVISION_S):
+        self.directorio = Path(directorio)
+        self.cargar = cargar
+        self.validar = validar
+        self.intervalo_s = intervalo_s
+        self.version_activa = None
+        # Tras una reversión solo se activan versiones más nuevas que la fallida (o la que quedó activa)
+        self.version_base = self._leer(MARCA_REVERSION)
+        self._aprobada = self._leer("ACTIVO")
+        self._pendiente = None
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    # --- VERSIONES ---
+    def versiones(self) -> list:
+        """Versiones no rechazadas, de la más antigua a la más nueva (las ocultas se están escribiendo)"""
+        if not self.directorio.is_dir():
+            return []
+        return sorted(d.name for d in self.directorio.iterdir()
+                      if d.is_dir() and not d.name.startswith(".") and not (d / MARCA_RECHAZO).exists())
+
+    def _leer(self, nombre: str):
+        try:
+            return (self.directorio / nombre).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+
+    def _permitida(self, version: str) -> bool:
+        return self.version_base is None or version > self.version_base or version == self._aprobada
+
+    def _estable(self, version: str) -> bool:
+        archivos = [p for p in (self.directorio / version).iterdir() if p.is_file()]
+        if not archivos:
+            return False
+        return time.time() - max(p.stat().st_mtime for p in archivos) >= ESTABLE_S
+
+    def rechazar(self, version: str, motivo: str):
+        print(f"⛔ Modelo {version} rechazado: {motivo}")
+        METRICAS.incrementar("receptor_recargas_modelo_total", resultado="rechazado")
+        try:
+            (self.directorio / version / MARCA_RECHAZO).write_text(motivo[:500], encoding="utf-8")
+        except OSError:
+            pass
+
+    def confirmar(self, version: str):
+        self.version_activa = self._aprobada = version
+        try:
+            (self.directorio / "ACTIVO").write_text(version, encoding="utf-8")
+        except OSError:
+            pass
+
+    def revertir(self, fallida: str, anterior: str | None, motivo: str):
+        """Rechaza `fallida` y vuelve a `anterior` (None = modelos de arranque) sin que una versión
+        más vieja, nunca aprobada, se active sola en la próxima revisión ni al reiniciar"""
+        self.rechazar(fallida, motivo)
+        self.version_activa = self._aprobada = anterior
+        self.version_base = max(v for v in (self.version_base, fallida) if v is not None)
+        try:
+            (self.directorio / MARCA_REVERSION).write_text(self.version_base, encoding="utf-8")
+            if anterior is None:
+                (self.directorio / "ACTIVO").unlink(missing_ok=True)
+            else:
+                (self.directorio / "ACTIVO").write_text(anterior, encoding="utf-8")
+        except OSError:
+            pass
+
+    # --- HILO DE REVISIÓN ---
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="vigilante-modelos")
+        self._hilo.start()
+        print(f"👀 Vigilando modelos en {self.directorio}/")
+
+    def _bucle(self):
+        while True:
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"ℹ Error revisando modelos: {e}")
+            time.sleep(self.intervalo_s)
+
+    def revisar(self):
+        """Prepara la versión más nueva si difiere de la activa (y no hay otra pendiente)"""
+        versiones = self.versiones()
+        if not versiones:
+            return
+        candidata = versiones[-1]
+        with self._lock:
+            ocupado = self._pendiente is not None
+        if candidata == self.version_activa or ocupado or not self._permitida(candidata) \
+                or not self._estable(candidata):
+            return
+
+        print(f"📦 Cargando modelo {candidata} en segundo plano...")
+        t0 = time.perf_counter()
+        try:
+            entradas = self.cargar(self.directorio / candidata)
+            self.validar(entradas)
+        except Exception as e:
+            self.rechazar(candidata, str(e))
+            return
+        print(f"   Modelo {candidata} listo en {time.perf_counter() - t0:.1f}s")
+        with self._lock:
+            self._pendiente = (candidata, entradas)
+
+    def tomar_pendiente(self):
+        """Devuelve (version, entradas) listo para activar, o None"""
+        with self._lock:
+            pendiente, self._pendiente = self._pendiente, None
+        return pendiente
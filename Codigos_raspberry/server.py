@@ -1,11 +1,141 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import json
+import os
+import queue
+import threading
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import urllib.parse
 
+# CALLMEBOT_URL permite apuntar a un CallMeBot falso (ver carga_servidor.py)
+CALLMEBOT_URL = os.environ.get('CALLMEBOT_URL', 'https://api.callmebot.com/whatsapp.php')
+CALLMEBOT_TIMEOUT_S = float(os.environ.get('CALLMEBOT_TIMEOUT_S', '10'))
+SERVER_PUERTO = int(os.environ.get('SERVER_PUERTO', '5000'))
+
+# Stream en vivo (SSE) alimentado por el receptor: POST /stream/publicar → GET /stream
+STREAM_HZ = float(os.environ.get('STREAM_HZ', '10'))  # Muestras/s enviadas a los navegadores
+STREAM_BUFFER_MAX = int(os.environ.get('STREAM_BUFFER_MAX', '50'))  # Mensajes pendientes por navegador
+STREAM_KEEPALIVE_S = 15.0
+FRECUENCIA_RECEPTOR_HZ = 20
+
 app = Flask(__name__)
 CORS(app)  # 🔓 Permitir conexión desde frontend (localhost:3000)
 
+# Conexiones reutilizadas hacia CallMeBot (una por hilo de Flask como máximo)
+sesion = requests.Session()
+sesion.mount('https://', HTTPAdapter(pool_maxsize=32))
+sesion.mount('http://', HTTPAdapter(pool_maxsize=32))
+
+# --- STREAM EN VIVO ---
+class Difusor:
+    """Submuestrea lo que publica el receptor y reparte cada mensaje ya serializado a todos los navegadores.
+    Cada navegador tiene una cola acotada: si no alcanza a leer, se descartan sus mensajes más antiguos.
+    """
+
+    def __init__(self, hz=STREAM_HZ, buffer_max=STREAM_BUFFER_MAX):
+        self.factor = max(1, round(FRECUENCIA_RECEPTOR_HZ / hz))
+        self.buffer_max = buffer_max
+        self.clientes = set()
+        self._lock = threading.Lock()
+        self._resto = {}  # Muestras que aún no completan un grupo del submuestreo, por persona
+        self.publicados = 0
+        self.descartados = 0
+
+    def suscribir(self):
+        cola = queue.Queue(maxsize=self.buffer_max)
+        with self._lock:
+            self.clientes.add(cola)
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self.clientes.discard(cola)
+
+    def submuestrear(self, persona, ts, muestras):
+        """Promedia grupos de `factor` muestras (las sobrantes esperan al siguiente lote)"""
+        resto_ts, resto = self._resto.get(persona, ([], np.zeros((0, muestras.shape[1]))))
+        ts = np.concatenate([resto_ts, ts])
+        muestras = np.concatenate([resto, muestras]) if len(resto) else muestras
+        n = len(muestras) // self.factor * self.factor
+        self._resto[persona] = (ts[n:], muestras[n:])
+        if n == 0:
+            return ts[:0], muestras[:0]
+        return (ts[:n].reshape(-1, self.factor)[:, -1],
+                muestras[:n].reshape(-1, self.factor, muestras.shape[1]).mean(axis=1))
+
+    def publicar(self, datos):
+        persona = datos.get('persona', 'Vicente')
+        muestras = np.asarray(datos.get('muestras') or [], dtype=np.float64).reshape(-1, 12)
+        ts = np.asarray(datos.get('ts') or [], dtype=np.float64)[:len(muestras)]
+        with self._lock:
+            ts, muestras = self.submuestrear(persona, ts, muestras[:len(ts)])
+        mensaje = {'persona': persona, 'ts': np.round(ts, 3).tolist(), 'muestras': np.round(muestras, 3).tolist()}
+        if datos.get('prob') is not None:
+            mensaje.update(prob=round(float(datos['prob']), 4), modo=datos.get('modo'))
+        if not mensaje['ts'] and 'prob' not in mensaje:
+            return
+        # Se serializa una sola vez para todos los navegadores
+        evento = f'event: datos\ndata: {json.dumps(mensaje, separators=(",", ":"))}\n\n'
+        with self._lock:
+            clientes = list(self.clientes)
+        for cola in clientes:
+            while True:
+                try:
+                    cola.put_nowait(evento)
+                    break
+                except queue.Full:
+                    try:
+                        cola.get_nowait()
+                        self.descartados += 1
+                    except queue.Empty:
+                        pass
+        self.publicados += 1
+
+
+difusor = Difusor()
+
+
+@app.route('/stream/publicar', methods=['POST'])
+def stream_publicar():
+    """El receptor envía lotes {persona, ts: [...], muestras: [[12 columnas], ...], prob, modo}"""
+    datos = request.get_json(force=True, silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({'status': 'error', 'message': 'Se esperaba un objeto JSON'}), 400
+    try:
+        difusor.publicar(datos)
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'ok', 'clientes': len(difusor.clientes)})
+
+
+@app.route('/stream')
+def stream():
+    """Server-Sent Events con trazas submuestreadas y probabilidades (un hilo por navegador)"""
+    cola = difusor.suscribir()
+
+    def eventos():
+        try:
+            yield f'retry: 2000\nevent: config\ndata: {json.dumps({"hz": FRECUENCIA_RECEPTOR_HZ / difusor.factor})}\n\n'
+            while True:
+                try:
+                    yield cola.get(timeout=STREAM_KEEPALIVE_S)
+                except queue.Empty:
+                    yield ': ping\n\n'  # Mantiene viva la conexión a través de proxies
+        finally:
+            difusor.desuscribir(cola)
+
+    return Response(eventos(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/stream/estado')
+def stream_estado():
+    return jsonify({'clientes': len(difusor.clientes), 'hz': FRECUENCIA_RECEPTOR_HZ / difusor.factor,
+                    'publicados': difusor.publicados, 'descartados': difusor.descartados})
+
+
 @app.route('/send-alert', methods=['POST'])
 def send_alert():
     try:
@@ -21,10 +151,10 @@ def send_alert():
         encoded_message = urllib.parse.quote(message)
 
         # 🔗 Construir URL segura
-        url = f'https://api.callmebot.com/whatsapp.php?phone={phone}&text={encoded_message}&apikey={apikey}'
+        url = f'{CALLMEBOT_URL}?phone={phone}&text={encoded_message}&apikey={apikey}'
 
         print(f'📤 Enviando mensaje a {phone}...')
-        response = requests.get(url)
+        response = sesion.get(url, timeout=CALLMEBOT_TIMEOUT_S)
 
         if response.status_code == 200:
             print('✅ Mensaje enviado correctamente!')
@@ -33,10 +163,14 @@ def send_alert():
             print('❌ Error al enviar mensaje:', response.text)
             return jsonify({'status': 'error', 'response': response.text}), 500
 
+    except requests.exceptions.Timeout:
+        print(f'⏱️ CallMeBot no respondió en {CALLMEBOT_TIMEOUT_S:.0f}s')
+        return jsonify({'status': 'error', 'message': 'Timeout de CallMeBot'}), 504
+
     except Exception as e:
         print('⚠️ Excepción capturada:', str(e))
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=SERVER_PUERTO, threaded=True)
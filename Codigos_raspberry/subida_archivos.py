@@ -0,0 +1,411 @@
+"""
+Subida en segundo plano de los datos crudos del almacén local (almacen_series.py)
+Junta los bloques de 1 minuto ya cerrados de ambos sensores en paquetes de SUBIDA_PAQUETE_MIN
+minutos, los escribe como archivo columnar comprimido (Parquet con pyarrow, si no .npz con una
+columna por arreglo) y los sube por partes a un endpoint HTTP u object storage:
+
+    GET  {url}/{objeto}?partes      → {"partes": [índices ya recibidos]}   (404 = ninguna)
+    PUT  {url}/{objeto}?parte={i}   cuerpo: bytes de la parte i
+    POST {url}/{objeto}?completar   {"partes": n, "bytes": total, "sha256": hex}
+
+Es reanudable: el paquete queda en <almacén>/subida/ hasta completarse y, tras un corte, solo se
+envían las partes que el servidor no tiene. El sha256 se guarda con el resumen del paquete antes de
+subir nada; si el paquete local ya no coincide (o el resumen no llegó a escribirse) se reconstruye y
+se envían todas las partes de nuevo, porque un .npz reconstruido no es idéntico byte a byte. Nunca compite con la detección: el hilo corre con
+prioridad baja, limita su uso de CPU (SUBIDA_CPU_MAX) y de ancho de banda (SUBIDA_KBPS) y se
+pausa mientras el receptor esté degradado por carga.
+
+Vinculado al almacén (`vincular`), los bloques aún sin empaquetar quedan retenidos frente a la
+retención y los paquetes en <almacén>/subida/ cuentan para ALMACEN_MAX_MB. Si aun así faltan
+bloques al empaquetar, el paquete se registra en subidas.csv como "parcial" (o "perdido" si no
+quedó ninguna fila) con las filas realmente enviadas, nunca como "completo".
+
+Uso:
+    python subida_archivos.py --url http://servidor:8080/crudos          (sube lo pendiente y termina)
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from almacen_series import ALMACEN_DIR, COLUMNAS, DURACION_BLOQUE_S
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+SUBIDA_URL = os.environ.get("SUBIDA_URL")  # None = desactivado
+SUBIDA_PAQUETE_MIN = int(os.environ.get("SUBIDA_PAQUETE_MIN", "10"))
+SUBIDA_PARTE_KB = int(os.environ.get("SUBIDA_PARTE_KB", "256"))
+SUBIDA_KBPS = float(os.environ.get("SUBIDA_KBPS", "64"))  # Ancho de banda máximo
+SUBIDA_CPU_MAX = float(os.environ.get("SUBIDA_CPU_MAX", "0.1"))  # Fracción de un núcleo
+SUBIDA_CADA_S = float(os.environ.get("SUBIDA_CADA_S", "60"))
+TIMEOUT_S = 30.0
+SENSORES = ("cadera", "pierna")
+ARCHIVO_ESTADO = "subidas.csv"
+DIRECTORIO_SUBIDA = "subida"
+
+_CAMPOS_ESTADO = ["objeto", "inicio", "fin", "filas", "bytes", "sha256", "resultado", "faltantes"]
+
+METRICAS.describir("subida_paquetes_total", "counter", "Paquetes de datos crudos subidos por resultado")
+METRICAS.describir("subida_bytes_total", "counter", "Bytes de datos crudos enviados")
+METRICAS.describir("subida_pendientes", "gauge", "Paquetes cerrados aún no subidos")
+
+
+def formato_por_defecto() -> str:
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "npz"
+
+
+# --- LÍMITES DE RECURSOS ---
+class LimiteRecursos:
+    """Cubeta de tokens para bytes/s y ciclo de trabajo para el CPU del hilo que lo usa"""
+
+    def __init__(self, kbps: float = SUBIDA_KBPS, cpu_max: float = SUBIDA_CPU_MAX, detener=None):
+        self.bytes_s = kbps * 1024
+        self.cpu_max = cpu_max
+        self.detener = detener or threading.Event()
+        self._tokens = self.bytes_s  # Ráfaga máxima de 1 s
+        self._t = time.monotonic()
+        self._cpu = time.thread_time()
+
+    def _dormir(self, segundos: float):
+        if segundos > 0:
+            self.detener.wait(segundos)
+
+    def consumir(self, n: int):
+        """Bloquea hasta poder enviar n bytes"""
+        if self.bytes_s <= 0:
+            return
+        ahora = time.monotonic()
+        self._tokens = min(self.bytes_s, self._tokens + (ahora - self._t) * self.bytes_s)
+        self._t = ahora
+        self._tokens -= n
+        if self._tokens < 0:
+            self._dormir(-self._tokens / self.bytes_s)
+
+    def iniciar_tramo(self):
+        """Punto de partida del CPU medido (thread_time es por hilo)"""
+        self._cpu = time.thread_time()
+
+    def ceder_cpu(self):
+        """Tras un tramo de trabajo, duerme lo necesario para no superar cpu_max"""
+        usado = time.thread_time() - self._cpu
+        if 0 < self.cpu_max < 1 and usado > 0:
+            self._dormir(usado * (1 / self.cpu_max - 1))
+        self._cpu = time.thread_time()
+
+
+# --- PAQUETES ---
+def leer_indice(raiz: Path) -> list:
+    """Bloques del índice del almacén (ignora una última línea a medio escribir)"""
+    ruta = Path(raiz) / "indice.csv"
+    if not ruta.exists():
+        return []
+    bloques = []
+    with open(ruta, newline="", encoding="utf-8") as f:
+        for fila in csv.DictReader(f):
+            try:
+                bloques.append({"flujo": fila["flujo"], "inicio": float(fila["inicio"]), "fin": float(fila["fin"]),
+                                "filas": int(fila["filas"]), "archivo": fila["archivo"]})
+            except (TypeError, ValueError):
+                continue
+    return bloques
+
+
+def paquetes_cerrados(bloques: list, ahora: float, paquete_s: float) -> dict:
+    """{inicio_paquete: [bloques]} de los paquetes cuyo último minuto ya se escribió"""
+    paquetes = {}
+    for bloque in bloques:
+        if bloque["flujo"] in SENSORES:
+            paquetes.setdefault(int(bloque["inicio"] // paquete_s) * paquete_s, []).append(bloque)
+    # El bloque del último minuto se escribe con la primera muestra del minuto siguiente (de cualquier
+    # sensor) o tras CIERRE_INACTIVO_S sin muestras
+    margen = 2 * DURACION_BLOQUE_S
+    return {inicio: b for inicio, b in sorted(paquetes.items()) if inicio + paquete_s + margen <= ahora}
+
+
+def empaquetar(raiz: Path, bloques: list, destino: Path, formato: str, limite: LimiteRecursos | None = None) -> dict:
+    """Escribe las columnas ts, sensor (0 cadera, 1 pierna) y los 6 ejes.
+    Retorna {"filas": filas escritas, "faltantes": bloques del índice que ya no estaban en disco}.
+    """
+    if limite is not None:
+        limite.iniciar_tramo()
+    partes = []
+    faltantes = 0
+    for bloque in sorted(bloques, key=lambda b: (b["flujo"], b["inicio"])):
+        try:
+            with np.load(Path(raiz) / bloque["archivo"]) as datos:
+                partes.append((SENSORES.index(bloque["flujo"]), datos["ts"], datos["valores"]))
+        except FileNotFoundError:
+            faltantes += 1  # Eliminado por la retención del almacén
+            continue
+        if limite is not None:
+            limite.ceder_cpu()
+    ts = np.concatenate([p[1] for p in partes]) if partes else np.empty(0)
+    columnas = {
+        "ts": ts,
+        "sensor": np.concatenate([np.full(len(p[1]), p[0], dtype=np.uint8) for p in partes]) if partes
+        else np.empty(0, dtype=np.uint8),
+    }
+    valores = np.concatenate([p[2] for p in partes]) if partes else np.empty((0, len(COLUMNAS)), dtype=np.float32)
+    for i, columna in enumerate(COLUMNAS):
+        columnas[columna] = valores[:, i]
+
+    tmp = destino.with_name(destino.name + ".tmp")
+    if formato == "parquet":
+        import pandas as pd
+        pd.DataFrame(columnas).to_parquet(tmp, index=False, compression="zstd")
+    else:
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **columnas)
+    os.replace(tmp, destino)
+    if limite is not None:
+        limite.ceder_cpu()
+    return {"filas": len(ts), "faltantes": faltantes}
+
+
+# --- SUBIDOR ---
+class SubidorArchivos:
+    """Sube los paquetes cerrados del almacén en un hilo de baja prioridad"""
+
+    def __init__(self, raiz=ALMACEN_DIR, url: str = SUBIDA_URL, persona: str = "Vicente",
+                 formato: str | None = None, paquete_min: int = SUBIDA_PAQUETE_MIN,
+                 parte_kb: int = SUBIDA_PARTE_KB, kbps: float = SUBIDA_KBPS, cpu_max: float = SUBIDA_CPU_MAX,
+                 cada_s: float = SUBIDA_CADA_S, pausar=None):
+        self.raiz = Path(raiz)
+        self.url = url.rstrip("/")
+        self.persona = persona
+        self.formato = formato or formato_por_defecto()
+        self.paquete_s = paquete_min * 60
+        self.parte_bytes = parte_kb * 1024
+        self.cada_s = cada_s
+        self.pausar = pausar or (lambda: False)  # p.ej. receptor degradado por carga
+        self.detener = threading.Event()
+        self.limite = LimiteRecursos(kbps, cpu_max, self.detener)
+        self.ruta_estado = self.raiz / ARCHIVO_ESTADO
+        self.staging = self.raiz / DIRECTORIO_SUBIDA
+        self.staging.mkdir(parents=True, exist_ok=True)
+        self.subidos = self._cargar_estado()
+        self.empaquetados = self._cargar_empaquetados()  # Objetos ya listos en subida/
+        self._sesion = requests.Session()
+        self._hilo = None
+
+    # --- ESTADO ---
+    def _cargar_estado(self) -> set:
+        """Objetos ya resueltos (completos, parciales o perdidos): no se vuelven a intentar"""
+        if not self.ruta_estado.exists():
+            return set()
+        with open(self.ruta_estado, newline="", encoding="utf-8") as f:
+            return {fila["objeto"] for fila in csv.DictReader(f)}
+
+    def _cargar_empaquetados(self) -> set:
+        objetos = set()
+        for meta in self.staging.glob("*.json"):
+            try:
+                objetos.add(json.loads(meta.read_text(encoding="utf-8"))["objeto"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return objetos
+
+    def _registrar(self, fila: dict):
+        nuevo = not self.ruta_estado.exists()
+        with open(self.ruta_estado, "a", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=_CAMPOS_ESTADO)
+            if nuevo:
+                escritor.writeheader()
+            escritor.writerow(fila)
+            f.flush()
+            os.fsync(f.fileno())
+        self.subidos.add(fila["objeto"])
+
+    def objeto(self, inicio: float) -> str:
+        extension = "parquet" if self.formato == "parquet" else "npz"
+        return f"{self.persona}/{time.strftime('%Y%m%d', time.gmtime(inicio))}/{int(inicio * 1000)}.{extension}"
+
+    def _local(self, objeto: str) -> Path:
+        return self.staging / objeto.replace("/", "_")
+
+    @staticmethod
+    def _meta(local: Path) -> Path:
+        """Resumen del empaquetado con su sha256; su presencia indica que el paquete local está completo"""
+        return local.with_name(local.name + ".json")
+
+    def _preparar(self, objeto: str, bloques: list, local: Path, meta: Path):
+        """(resumen, bytes del paquete, reanudable): reutiliza el paquete local si coincide con el sha256
+        de su resumen; si no, lo reconstruye y la subida por partes empieza de cero"""
+        try:
+            resumen = json.loads(meta.read_text(encoding="utf-8"))
+            datos = local.read_bytes()
+            if hashlib.sha256(datos).hexdigest() == resumen["sha256"]:
+                return resumen, datos, True
+        except (OSError, ValueError, KeyError):
+            pass
+        resumen = empaquetar(self.raiz, bloques, local, self.formato, self.limite)
+        datos = local.read_bytes()
+        resumen = {"objeto": objeto, **resumen, "bytes": len(datos), "sha256": hashlib.sha256(datos).hexdigest()}
+        tmp = meta.with_name(meta.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(resumen, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, meta)  # Antes de la primera parte: el sha256 subido siempre es el del resumen
+        self.empaquetados.add(objeto)
+        return resumen, datos, False
+
+    # --- VÍNCULO CON EL ALMACÉN ---
+    def vincular(self, almacen):
+        """Retiene en el almacén los bloques sin empaquetar y le suma lo que ocupa subida/"""
+        almacen.retener = self.retener
+        almacen.bytes_externos = self.bytes_staging
+        return self
+
+    def retener(self, bloque: dict) -> bool:
+        """True si el bloque aún hace falta para un paquete (ni subido ni empaquetado)"""
+        if bloque["flujo"] not in SENSORES:
+            return False
+        objeto = self.objeto(int(bloque["inicio"] // self.paquete_s) * self.paquete_s)
+        return objeto not in self.subidos and objeto not in self.empaquetados
+
+    def bytes_staging(self) -> int:
+        total = 0
+        for ruta in self.staging.iterdir():
+            try:
+                total += ruta.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def pendientes(self, ahora: float | None = None) -> dict:
+        """{objeto: (inicio, bloques)} de los paquetes cerrados aún no subidos"""
+        cerrados = paquetes_cerrados(leer_indice(self.raiz), time.time() if ahora is None else ahora, self.paquete_s)
+        return {self.objeto(inicio): (inicio, bloques) for inicio, bloques in cerrados.items()
+                if self.objeto(inicio) not in self.subidos}
+
+    # --- SUBIDA ---
+    def subir_paquete(self, objeto: str, inicio: float, bloques: list) -> str | None:
+        """Retorna el resultado registrado ("completo", "parcial" o "perdido") o None si se detuvo"""
+        local = self._local(objeto)
+        meta = self._meta(local)
+        resumen, datos, reanudable = self._preparar(objeto, bloques, local, meta)
+        fila = {"objeto": objeto, "inicio": inicio, "fin": inicio + self.paquete_s, "filas": resumen["filas"],
+                "faltantes": resumen["faltantes"]}
+        if resumen["filas"] == 0:
+            # La retención eliminó todos los bloques: no hay nada que subir
+            self._registrar({**fila, "bytes": 0, "sha256": "", "resultado": "perdido"})
+            self._limpiar(objeto, local, meta)
+            return "perdido"
+
+        n_partes = max(1, -(-len(datos) // self.parte_bytes))
+        url = f"{self.url}/{objeto}"
+
+        recibidas = set()
+        if reanudable:
+            r = self._sesion.get(url, params={"partes": ""}, timeout=TIMEOUT_S)
+            recibidas = set(r.json().get("partes", [])) if r.status_code == 200 else set()
+        for i in range(n_partes):
+            if i in recibidas:
+                continue
+            if self.detener.is_set():
+                return None
+            parte = datos[i * self.parte_bytes:(i + 1) * self.parte_bytes]
+            self.limite.consumir(len(parte))
+            r = self._sesion.put(url, params={"parte": i}, data=parte, timeout=TIMEOUT_S,
+                                 headers={"Content-Type": "application/octet-stream"})
+            r.raise_for_status()
+            METRICAS.incrementar("subida_bytes_total", len(parte))
+
+        sha256 = resumen["sha256"]
+        resultado = "parcial" if resumen["faltantes"] else "completo"
+        r = self._sesion.post(url, params={"completar": ""}, timeout=TIMEOUT_S,
+                              json={"partes": n_partes, "bytes": len(datos), "sha256": sha256,
+                                    "filas": resumen["filas"], "completo": resultado == "completo"})
+        r.raise_for_status()
+        self._registrar({**fila, "bytes": len(datos), "sha256": sha256, "resultado": resultado})
+        self._limpiar(objeto, local, meta)
+        if resultado == "parcial":
+            print(f"ℹ {objeto} subido sin {resumen['faltantes']} bloques eliminados por la retención")
+        return resultado
+
+    def _limpiar(self, objeto: str, local: Path, meta: Path):
+        local.unlink()
+        meta.unlink()
+        self.empaquetados.discard(objeto)
+
+    def subir_pendientes(self, ahora: float | None = None) -> int:
+        """Sube en orden lo pendiente; se detiene ante el primer error (se reintenta en el próximo ciclo)"""
+        pendientes = self.pendientes(ahora)
+        METRICAS.fijar("subida_pendientes", len(pendientes))
+        subidos = 0
+        for objeto, (inicio, bloques) in pendientes.items():
+            if self.detener.is_set() or self.pausar():
+                break
+            try:
+                resultado = self.subir_paquete(objeto, inicio, bloques)
+            except (requests.RequestException, ValueError) as e:
+                METRICAS.incrementar("subida_paquetes_total", resultado="error")
+                print(f"ℹ Subida de {objeto} interrumpida: {e}")
+                break
+            if resultado is None:
+                break
+            subidos += 1
+            METRICAS.incrementar("subida_paquetes_total", resultado="ok" if resultado == "completo" else resultado)
+            METRICAS.fijar("subida_pendientes", len(pendientes) - subidos)
+        return subidos
+
+    # --- HILO ---
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="subida-archivos")
+        self._hilo.start()
+        return self
+
+    def _bucle(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)  # Solo este hilo (Linux)
+        except (AttributeError, OSError):
+            pass
+        while not self.detener.wait(self.cada_s):
+            self.subir_pendientes()
+
+    def cerrar(self):
+        self.detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=TIMEOUT_S)
+        self._sesion.close()
+
+
+def crear_subidor(almacen, persona: str, pausar=None) -> SubidorArchivos | None:
+    """Subidor en segundo plano vinculado al almacén (None si SUBIDA_URL no está definido)"""
+    if not SUBIDA_URL:
+        return None
+    print(f"☁️  Subida de datos crudos → {SUBIDA_URL} (≤{SUBIDA_KBPS:.0f} KB/s, CPU ≤{SUBIDA_CPU_MAX:.0%})")
+    return SubidorArchivos(almacen.raiz, SUBIDA_URL, persona, pausar=pausar).vincular(almacen).iniciar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sube los paquetes cerrados del almacén local")
+    parser.add_argument("--url", default=SUBIDA_URL, required=SUBIDA_URL is None)
+    parser.add_argument("--almacen", default=ALMACEN_DIR)
+    parser.add_argument("--persona", default="Vicente")
+    parser.add_argument("--formato", choices=("parquet", "npz"), default=None)
+    parser.add_argument("--kbps", type=float, default=SUBIDA_KBPS, help="0 = sin límite")
+    args = parser.parse_args()
+
+    subidor = SubidorArchivos(args.almacen, args.url, args.persona, args.formato, kbps=args.kbps, cpu_max=1.0)
+    pendientes = len(subidor.pendientes())
+    print(f"📦 {pendientes} paquetes pendientes ({subidor.formato}) → {args.url}")
+    t0 = time.monotonic()
+    n = subidor.subir_pendientes()
+    print(f"✅ {n}/{pendientes} paquetes subidos en {time.monotonic() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
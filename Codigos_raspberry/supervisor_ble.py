@@ -0,0 +1,160 @@
+"""
+Supervisores de conexión BLE por dispositivo
+Cada sensor se reconecta por separado con backoff exponencial con jitter,
+usa direcciones en caché para evitar un escaneo completo y mide el tiempo de recuperación
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+from bleak import BleakClient, BleakScanner
+
+from metricas import METRICAS
+
+# --- CONFIGURACIÓN ---
+CACHE_DIRECCIONES = Path(os.environ.get("BLE_CACHE", "dispositivos_ble.json"))
+BACKOFF_MIN_S = float(os.environ.get("BLE_BACKOFF_MIN_S", "0.5"))
+BACKOFF_MAX_S = float(os.environ.get("BLE_BACKOFF_MAX_S", "30"))
+TIMEOUT_CONEXION_S = 15.0
+TIMEOUT_BUSQUEDA_CACHE_S = 4.0  # Confirmar una dirección conocida es rápido
+TIMEOUT_BUSQUEDA_NOMBRE_S = 10.0
+MTU_MINIMO = 120  # El JSON de cada lectura ocupa ~110 bytes; con MTU 23 llega truncado
+BUCKETS_RECUPERACION_S = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+METRICAS.describir("receptor_sensor_conectado", "gauge", "1 si el sensor está conectado y notificando")
+METRICAS.describir("receptor_recuperacion_s", "histogram", "Tiempo desde la desconexión hasta volver a notificar")
+METRICAS.describir("receptor_mtu_bytes", "gauge", "MTU ATT negociado por sensor")
+
+
+# --- CACHÉ DE DIRECCIONES ---
+def cargar_cache() -> dict:
+    try:
+        with open(CACHE_DIRECCIONES, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_cache(nombre: str, direccion: str):
+    cache = cargar_cache()
+    if cache.get(nombre) == direccion:
+        return
+    cache[nombre] = direccion
+    tmp = CACHE_DIRECCIONES.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, CACHE_DIRECCIONES)
+
+
+def calcular_backoff(intento: int, minimo: float = BACKOFF_MIN_S, maximo: float = BACKOFF_MAX_S) -> float:
+    """Backoff exponencial con 'full jitter': uniforme en [minimo, min(maximo, minimo * 2^intento)]"""
+    techo = min(maximo, minimo * (2 ** intento))
+    return random.uniform(minimo, max(minimo, techo))
+
+
+# --- SUPERVISOR ---
+class SupervisorBLE:
+    """Mantiene conectado un sensor; si se cae, solo ese sensor se reconecta"""
+
+    def __init__(self, etiqueta: str, nombre_dispositivo: str, caracteristica: str, handler):
+        self.etiqueta = etiqueta
+        self.nombre_dispositivo = nombre_dispositivo
+        self.caracteristica = caracteristica
+        self.handler = handler
+        self.conectado = False
+        self.desconectado_desde = None  # monotonic de la última caída
+        self._evento_desconexion = asyncio.Event()
+
+    def _on_desconexion(self, _client):
+        # Lo invoca bleak desde el loop; se marca la hora para medir la recuperación
+        if self.conectado:
+            print(f"⚠️  {self.etiqueta.upper()} desconectado")
+        self.conectado = False
+        self.desconectado_desde = self.desconectado_desde or time.monotonic()
+        METRICAS.fijar("receptor_sensor_conectado", 0, sensor=self.etiqueta)
+        self._evento_desconexion.set()
+
+    async def _resolver_dispositivo(self):
+        """Primero confirma la dirección en caché; si falla, busca por nombre"""
+        direccion = cargar_cache().get(self.nombre_dispositivo)
+        if direccion:
+            dispositivo = await BleakScanner.find_device_by_address(direccion, timeout=TIMEOUT_BUSQUEDA_CACHE_S)
+            if dispositivo:
+                return dispositivo
+        dispositivo = await BleakScanner.find_device_by_name(self.nombre_dispositivo,
+                                                             timeout=TIMEOUT_BUSQUEDA_NOMBRE_S)
+        if dispositivo is None:
+            raise ConnectionError(f"No se encontró {self.nombre_dispositivo}")
+        guardar_cache(self.nombre_dispositivo, dispositivo.address)
+        print(f"Encontrado {self.etiqueta.upper()}: {dispositivo.name} ({dispositivo.address})")
+        return dispositivo
+
+    async def _negociar_mtu(self, client):
+        """Solicita el MTU en BlueZ (bleak no lo hace solo) y lo reporta"""
+        backend = getattr(client, "_backend", None)
+        adquirir = getattr(backend, "_acquire_mtu", None)
+        if adquirir is not None:
+            try:
+                await adquirir()
+            except Exception:
+                pass
+        mtu = getattr(client, "mtu_size", None)
+        if mtu:
+            METRICAS.fijar("receptor_mtu_bytes", mtu, sensor=self.etiqueta)
+            if mtu < MTU_MINIMO:
+                print(f"⚠️  MTU de {self.etiqueta.upper()} = {mtu}: las lecturas JSON pueden llegar truncadas")
+        return mtu
+
+    async def ejecutar(self):
+        """Bucle de conexión → notificación → espera de desconexión → backoff"""
+        intento = 0
+        while True:
+            client = None
+            try:
+                dispositivo = await self._resolver_dispositivo()
+                self._evento_desconexion.clear()
+                client = BleakClient(dispositivo, disconnected_callback=self._on_desconexion,
+                                     timeout=TIMEOUT_CONEXION_S)
+                await client.connect()
+                mtu = await self._negociar_mtu(client)
+                await client.start_notify(self.caracteristica, self.handler)
+
+                self.conectado = True
+                METRICAS.fijar("receptor_sensor_conectado", 1, sensor=self.etiqueta)
+                if self.desconectado_desde is not None:
+                    recuperacion = time.monotonic() - self.desconectado_desde
+                    METRICAS.observar("receptor_recuperacion_s", recuperacion,
+                                      buckets=BUCKETS_RECUPERACION_S, sensor=self.etiqueta)
+                    print(f"♻️  {self.etiqueta.upper()} recuperado en {recuperacion:.1f}s")
+                else:
+                    print(f"✅ Conectado a {self.etiqueta.upper()}: {dispositivo.address} (MTU {mtu})")
+                self.desconectado_desde = None
+                intento = 0
+
+                await self._evento_desconexion.wait()
+            except asyncio.CancelledError:
+                if client is not None and client.is_connected:
+                    try:
+                        await client.stop_notify(self.caracteristica)
+                    except Exception:
+                        pass
+                    await client.disconnect()
+                raise
+            except Exception as e:
+                self.desconectado_desde = self.desconectado_desde or time.monotonic()
+                print(f"   {self.etiqueta.upper()}: {e}")
+            finally:
+                if client is not None and client.is_connected and not self._evento_desconexion.is_set():
+                    try:
+                        await client.disconnect()
+                    except Exception:
+                        pass
+
+            METRICAS.incrementar("receptor_reconexiones_total", sensor=self.etiqueta)
+            espera = calcular_backoff(intento)
+            intento += 1
+            print(f"🔄 Reintentando {self.etiqueta.upper()} en {espera:.1f}s")
+            await asyncio.sleep(espera)
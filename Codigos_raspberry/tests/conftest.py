@@ -0,0 +1,346 @@
+"""
+Configuración compartida de las pruebas: los módulos de Codigos_raspberry se importan
+directamente (igual que cuando se ejecutan desde esa carpeta) y los servicios externos
+se reemplazan por servidores HTTP locales
+"""
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+import pytest
+from werkzeug.serving import make_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from carga_servidor import CallMeBotFalso  # noqa: E402
+
+
+# --- STUB DE FIRESTORE ---
+class StubFirestore:
+    """Subconjunto de la API REST de Firestore sobre documentos en memoria: crear (POST a la
+    colección), leer (GET), actualizar con updateMask (PATCH) y runQuery. Registra cada solicitud
+    como (método, ruta, milisegundos) para verificar conteos y latencias en las pruebas.
+    """
+
+    def __init__(self):
+        self.documentos = {}  # name -> documento REST
+        self.registro = []
+        self.solicitudes = 0
+        self.concurrencia_max = 0
+        self.estado_forzado = None  # Código HTTP a devolver en lugar de atender (simula fallas)
+        self.latencia_s = 0.0
+        self._activas = 0
+        self._ids = 0
+        self._lock = threading.Lock()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.servidor.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.servidor.server_address[1]}/v1"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def agregar(self, coleccion: str, doc_id: str, campos: dict):
+        nombre = f"projects/p/databases/(default)/documents/{coleccion}/{doc_id}"
+        self.documentos[nombre] = {"name": nombre, "fields": campos}
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def contar(self, metodo: str) -> int:
+        return sum(m == metodo for m, _, _ in self.registro)
+
+    def crear(self, coleccion: str, cuerpo: dict, doc_id: str | None = None) -> dict:
+        with self._lock:
+            self._ids += 1
+            nombre = f"{coleccion}/{doc_id or f'stub{self._ids:06d}'}"
+        self.documentos[nombre] = {"name": nombre, "fields": dict(cuerpo.get("fields", {}))}
+        return self.documentos[nombre]
+
+    def actualizar(self, nombre: str, cuerpo: dict, mascara: list) -> dict:
+        doc = self.documentos.setdefault(nombre, {"name": nombre, "fields": {}})
+        campos = cuerpo.get("fields", {})
+        if not mascara:
+            doc["fields"] = dict(campos)
+        for campo in mascara:
+            if campo in campos:
+                doc["fields"][campo] = campos[campo]
+            else:
+                doc["fields"].pop(campo, None)  # En la máscara pero ausente = se borra
+        return doc
+
+    def run_query(self, padre: str, consulta: dict) -> list:
+        coleccion = consulta["from"][0]["collectionId"]
+        prefijo = f"{padre.split('/documents/', 1)[1]}/{coleccion}/"
+        orden = consulta.get("orderBy", [])
+        campo = orden[0]["field"]["fieldPath"] if orden else None
+        filas = []
+        for nombre, doc in self.documentos.items():
+            if not nombre.split("/documents/", 1)[1].startswith(prefijo):
+                continue
+            if campo and campo not in doc["fields"]:
+                continue  # Firestore omite documentos sin el campo de orden
+            if self._cumple(doc, consulta.get("where")):
+                filas.append(doc)
+        descendente = bool(orden) and orden[0].get("direction") == "DESCENDING"
+        filas.sort(key=lambda d: self._clave(d, campo), reverse=descendente)
+        inicio = consulta.get("startAt")
+        if inicio:
+            valores = inicio["values"]
+            clave = (pd.Timestamp(valores[0]["timestampValue"]), valores[1]["referenceValue"])
+            filas = [d for d in filas if (self._clave(d, campo) < clave if descendente else self._clave(d, campo) > clave)]
+        return filas[:consulta.get("limit", len(filas))]
+
+    @staticmethod
+    def _clave(doc, campo):
+        if not campo:
+            return (pd.Timestamp(0, tz="UTC"), doc["name"])
+        return (pd.Timestamp(doc["fields"][campo]["timestampValue"]), doc["name"])
+
+    def _cumple(self, doc, filtro) -> bool:
+        if not filtro:
+            return True
+        if "compositeFilter" in filtro:
+            return all(self._cumple(doc, f) for f in filtro["compositeFilter"]["filters"])
+        f = filtro["fieldFilter"]
+        valor = doc["fields"].get(f["field"]["fieldPath"], {}).get("timestampValue")
+        if valor is None:
+            return False
+        a, b = pd.Timestamp(valor), pd.Timestamp(f["value"]["timestampValue"])
+        return {"GREATER_THAN_OR_EQUAL": a >= b, "GREATER_THAN": a > b,
+                "LESS_THAN": a < b, "LESS_THAN_OR_EQUAL": a <= b, "EQUAL": a == b}[f["op"]]
+
+    def atender(self, metodo: str, ruta: str, consulta: dict, cuerpo):
+        """Devuelve (código, respuesta JSON) para una solicitud ya decodificada"""
+        time.sleep(self.latencia_s)
+        if self.estado_forzado:
+            return self.estado_forzado, {"error": {"code": self.estado_forzado}}
+        if metodo == "POST" and ruta.endswith(":runQuery"):
+            docs = self.run_query(ruta[:-len(":runQuery")], cuerpo["structuredQuery"])
+            return 200, [{"document": d, "readTime": "2025-01-01T00:00:00Z"} for d in docs] or \
+                        [{"readTime": "2025-01-01T00:00:00Z"}]
+        if metodo == "POST":
+            doc_id = consulta.get("documentId", [None])[0]
+            if doc_id and f"{ruta}/{doc_id}" in self.documentos:
+                return 409, {"error": {"code": 409, "status": "ALREADY_EXISTS"}}
+            return 200, self.crear(ruta, cuerpo, doc_id)
+        if metodo == "PATCH":
+            return 200, self.actualizar(ruta, cuerpo, consulta.get("updateMask.fieldPaths", []))
+        if ruta in self.documentos:
+            return 200, self.documentos[ruta]
+        return 404, {"error": {"code": 404, "status": "NOT_FOUND"}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _atender(self):
+                t0 = time.perf_counter()
+                with stub._lock:
+                    stub.solicitudes += 1
+                    stub._activas += 1
+                    stub.concurrencia_max = max(stub.concurrencia_max, stub._activas)
+                try:
+                    url = urlsplit(self.path)
+                    ruta = unquote(url.path).split("/v1/", 1)[1]
+                    largo = int(self.headers.get("Content-Length") or 0)
+                    cuerpo = json.loads(self.rfile.read(largo)) if largo else None
+                    codigo, respuesta = stub.atender(self.command, ruta, parse_qs(url.query), cuerpo)
+                    datos = json.dumps(respuesta).encode()
+                    self.send_response(codigo)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(datos)))
+                    self.end_headers()
+                    self.wfile.write(datos)
+                finally:
+                    with stub._lock:
+                        stub._activas -= 1
+                        stub.registro.append((self.command, ruta, (time.perf_counter() - t0) * 1000))
+
+            do_GET = do_POST = do_PATCH = _atender
+
+        return Handler
+
+
+@pytest.fixture
+def firestore_stub():
+    stub = StubFirestore()
+    yield stub
+    stub.cerrar()
+
+
+# --- STUB DE REALTIME DATABASE / WEBHOOK ---
+class StubRTDB:
+    """POST de JSON a cualquier ruta (p.ej. /alertas.json) responde {"name": id} como Firebase RTDB"""
+
+    def __init__(self):
+        self.datos = {}  # ruta -> {id: cuerpo}
+        self.registro = []  # (método, ruta, milisegundos)
+        self.latencia_s = 0.0
+        self.estado_forzado = None
+        self._lock = threading.Lock()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                t0 = time.perf_counter()
+                cuerpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(stub.latencia_s)
+                ruta = urlsplit(self.path).path
+                with stub._lock:
+                    nodo = stub.datos.setdefault(ruta, {})
+                    clave = f"-stub{len(nodo):06d}"
+                    if not stub.estado_forzado:
+                        nodo[clave] = cuerpo
+                codigo = stub.estado_forzado or 200
+                datos = json.dumps({"name": clave} if codigo == 200 else {"error": "forzado"}).encode()
+                try:
+                    self.send_response(codigo)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(datos)))
+                    self.end_headers()
+                    self.wfile.write(datos)
+                except OSError:
+                    pass  # El cliente ya se fue (timeout)
+                with stub._lock:
+                    stub.registro.append(("POST", ruta, (time.perf_counter() - t0) * 1000))
+
+        return Handler
+
+
+@pytest.fixture
+def rtdb_stub():
+    stub = StubRTDB()
+    yield stub
+    stub.cerrar()
+
+
+# --- STUB DE OBJECT STORAGE (subida por partes) ---
+class StubObjetos:
+    """Protocolo de subida_archivos.py: GET ?partes, PUT ?parte=i, POST ?completar"""
+
+    def __init__(self):
+        self.partes = {}  # objeto -> {i: bytes}
+        self.objetos = {}  # objeto -> bytes ya completados
+        self.registro = []  # (método, objeto, parte o None, bytes)
+        self.fallar = set()  # (objeto, parte) que fallan una vez con 503
+        self._lock = threading.Lock()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/crudos"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def contar(self, metodo: str) -> int:
+        return sum(m == metodo for m, _, _, _ in self.registro)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, codigo: int, cuerpo: dict):
+                datos = json.dumps(cuerpo).encode()
+                self.send_response(codigo)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def _leer(self):
+                url = urlsplit(self.path)
+                cuerpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                return url.path.split("/crudos/", 1)[1], parse_qs(url.query, keep_blank_values=True), cuerpo
+
+            def do_GET(self):
+                objeto, consulta, _ = self._leer()
+                with stub._lock:
+                    stub.registro.append(("GET", objeto, None, 0))
+                    recibidas = sorted(stub.partes.get(objeto, {}))
+                if "partes" not in consulta or not recibidas:
+                    self._responder(404, {"error": "sin partes"})
+                else:
+                    self._responder(200, {"partes": recibidas})
+
+            def do_PUT(self):
+                objeto, consulta, cuerpo = self._leer()
+                parte = int(consulta["parte"][0])
+                with stub._lock:
+                    stub.registro.append(("PUT", objeto, parte, len(cuerpo)))
+                    if (objeto, parte) in stub.fallar:
+                        stub.fallar.discard((objeto, parte))
+                        falla = True
+                    else:
+                        stub.partes.setdefault(objeto, {})[parte] = cuerpo
+                        falla = False
+                self._responder(503, {"error": "forzado"}) if falla else self._responder(200, {"parte": parte})
+
+            def do_POST(self):
+                objeto, _, cuerpo = self._leer()
+                pedido = json.loads(cuerpo)
+                with stub._lock:
+                    stub.registro.append(("POST", objeto, None, 0))
+                    partes = stub.partes.get(objeto, {})
+                    datos = b"".join(partes[i] for i in range(pedido["partes"]) if i in partes)
+                    if len(partes) != pedido["partes"] or hashlib.sha256(datos).hexdigest() != pedido["sha256"]:
+                        self._responder(400, {"error": "partes incompletas o sha256 distinto"})
+                        return
+                    stub.objetos[objeto] = datos
+                    del stub.partes[objeto]
+                self._responder(200, {"objeto": objeto, "bytes": len(datos)})
+
+        return Handler
+
+
+@pytest.fixture
+def objetos_stub():
+    stub = StubObjetos()
+    yield stub
+    stub.cerrar()
+
+
+# --- STUB DE CALLMEBOT + GATEWAY DE ALERTAS ---
+@pytest.fixture
+def callmebot_stub():
+    """CallMeBot falso de carga_servidor.py sin latencia (tasa_error=1.0 lo hace fallar siempre)"""
+    falso = CallMeBotFalso(latencia_ms=0.0, jitter_ms=0.0)
+    yield falso
+    falso.cerrar()
+
+
+@pytest.fixture
+def servidor_alertas(callmebot_stub, monkeypatch):
+    """server.py en un hilo apuntando al CallMeBot falso; devuelve la URL de /send-alert"""
+    import server
+
+    monkeypatch.setattr(server, "CALLMEBOT_URL", callmebot_stub.url)
+    monkeypatch.setattr(server, "CALLMEBOT_TIMEOUT_S", 2.0)
+    http = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{http.server_port}/send-alert"
+    http.shutdown()
@@ -0,0 +1,263 @@
+"""
+Integración del camino de alertas del receptor sin red ni sensores: caídas reproducidas
+muestra a muestra pasan por la ventana, un modelo de umbral, el detector de eventos y el
+envío real (HTTP, concurrente por canal) a un Firestore local, a server.py con un CallMeBot
+falso y opcionalmente a un RTDB / webhook local.
+Los presupuestos de latencia se ajustan con PRUEBAS_PRESUPUESTO_ALERTA_MS y
+PRUEBAS_PRESUPUESTO_SOLICITUD_MS.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+import numpy as np
+import pytest
+
+import fragmentos
+import notificadores
+import receptor_dual_ble as r
+from detector_eventos import DetectorEventos
+
+PRESUPUESTO_ALERTA_MS = float(os.environ.get("PRUEBAS_PRESUPUESTO_ALERTA_MS", "1000"))
+PRESUPUESTO_SOLICITUD_MS = float(os.environ.get("PRUEBAS_PRESUPUESTO_SOLICITUD_MS", "100"))
+HZ = 20
+UMBRAL_IMPACTO_G = 2.5
+
+
+class ModeloUmbral:
+    """Modelo de prueba: probabilidad alta si la aceleración de la cadera supera 2.5 g en la ventana"""
+    input_shape = (None, r.prep.WINDOW_SIZE, r.N_CRUDAS)
+
+    def predict(self, X, verbose=0):
+        smv = np.linalg.norm(X[..., :3], axis=2).max(axis=1)
+        return np.where(smv > UMBRAL_IMPACTO_G, 0.99, 0.02).astype(np.float32)[:, None]
+
+
+def sesion(segundos_reposo: float, caidas: int = 1, separacion_s: float = 15.0) -> np.ndarray:
+    """Muestras (n, 14): reposo de pie, impacto de 3 muestras y acostado, con sensores frescos"""
+    bloques = []
+    for _ in range(caidas):
+        reposo = np.tile([0, 0, 1, 0, 0, 0] * 2, (int(segundos_reposo * HZ), 1))
+        impacto = np.tile([3.2, 1.5, 0.5, 250, 120, 40] * 2, (3, 1))
+        acostado = np.tile([1, 0, 0, 0, 0, 0] * 2, (int(separacion_s * HZ), 1))
+        bloques += [reposo, impacto, acostado]
+    crudas = np.concatenate(bloques).astype(np.float64)
+    return np.hstack([crudas, np.ones((len(crudas), 2))])
+
+
+def reproducir(muestras, t0: float) -> list:
+    """Pasa las muestras por procesar_muestra; devuelve [(índice, doc_id, ms de la muestra)] de las alertas"""
+    alertas = []
+    for i, muestra in enumerate(muestras):
+        t = time.perf_counter()
+        _, doc_id = r.procesar_muestra(list(muestra), t0 + i / HZ)
+        if doc_id:
+            alertas.append((i, doc_id, (time.perf_counter() - t) * 1000))
+    if r.notificador is not None:
+        assert r.notificador.esperar(10)
+    return alertas
+
+
+@pytest.fixture
+def receptor(firestore_stub, servidor_alertas, monkeypatch):
+    """Estado del receptor aislado por prueba y apuntando a los stubs locales"""
+    monkeypatch.setattr(r, "FIRESTORE_URL", f"{firestore_stub.base}/{r.COLECCION_DOC}")
+    monkeypatch.setattr(r, "CONFIG_DOC_URL", f"{firestore_stub.base}/{r.COLECCION_DOC}/_config")
+    monkeypatch.setattr(r, "SERVER_ALERT_URL", servidor_alertas)
+    monkeypatch.setattr(r, "CALLMEBOT_PHONE", "+56900000000")
+    monkeypatch.setattr(r, "CALLMEBOT_APIKEY", "123456")
+    monkeypatch.setattr(r, "_CONFIG_CACHE", {"phone": None, "apiCode": None, "ts": 0})
+    monkeypatch.setattr(r, "modelos", {"dual": {
+        "ruta": "umbral", "modelo": ModeloUmbral(), "spec": r.SPEC_ANILLO,
+        "escala": np.ones(r.N_CRUDAS, dtype=np.float32), "indices": list(range(r.N_CRUDAS)),
+        "window_size": r.prep.WINDOW_SIZE, "sensores": [r.N_CRUDAS, r.N_CRUDAS + 1],
+    }})
+    monkeypatch.setattr(r, "ventana", deque(maxlen=r.prep.WINDOW_SIZE))
+    monkeypatch.setattr(r, "historial", deque(maxlen=r.historial.maxlen))
+    monkeypatch.setattr(r, "detector", DetectorEventos(umbral_alto=r.UMBRAL_CAIDA))
+    monkeypatch.setattr(r, "contador", 0)
+    monkeypatch.setattr(r, "ultima_alerta", 0)
+    monkeypatch.setattr(r, "publicador", None)
+    monkeypatch.setattr(r, "sombra", None)
+    monkeypatch.setattr(r, "vigilante", None)
+    monkeypatch.setattr(r, "notificador", None)
+    monkeypatch.setattr(r, "despachos", {})
+    yield r
+    if r.notificador is not None:
+        r.notificador.cerrar(5)
+
+
+def campos(firestore_stub, doc_id) -> dict:
+    return firestore_stub.documentos[f"{r.COLECCION_DOC}/{doc_id}"]["fields"]
+
+
+def test_caida_crea_documento_y_marca_enviada(receptor, firestore_stub, callmebot_stub):
+    alertas = reproducir(sesion(6), time.time())
+
+    assert len(alertas) == 1
+    indice, doc_id, ms = alertas[0]
+    assert 6 * HZ <= indice <= 6 * HZ + 3 * HZ  # Dentro de impacto_max_s tras el impacto
+    f = campos(firestore_stub, doc_id)
+    assert f["estado"] == {"stringValue": "Enviada"}
+    assert f["mensaje_enviado"] == {"booleanValue": True}
+    assert "error_envio" not in f
+    assert f["confianza"]["doubleValue"] == pytest.approx(0.99)
+    assert f["sensor"] == {"stringValue": r.DESCRIPCION_MODO["dual"]}
+    assert int(f["ventanas_evento"]["integerValue"]) >= 2
+    assert f["inicio_evento"]["timestampValue"] <= f["fin_evento"]["timestampValue"]
+    pre, _, _ = fragmentos.desde_firestore(f["fragmento_pre"])
+    assert pre.shape == (r.N_PRE, r.N_CRUDAS)
+    assert pre[:, 0].max() == pytest.approx(3.2, abs=0.01)  # El impacto va en el fragmento previo
+    assert f["fragmento_columnas"]["stringValue"].split(",") == r.SPEC_ANILLO["columnas"]
+
+    # Un POST (Pendiente) + un PATCH (estado); sin GET de _config porque hay credenciales
+    assert [m for m, _, _ in firestore_stub.registro] == ["POST", "PATCH"]
+    assert callmebot_stub.solicitudes == 1
+    assert ms < PRESUPUESTO_ALERTA_MS  # El lazo de detección no espera a los canales
+    assert r.notificador.ultimo.primer_aviso_ms < PRESUPUESTO_ALERTA_MS
+    assert max(t for _, _, t in firestore_stub.registro) < PRESUPUESTO_SOLICITUD_MS
+
+
+def test_documento_se_crea_pendiente(receptor, firestore_stub, callmebot_stub):
+    creados = []
+    original = firestore_stub.crear
+    firestore_stub.crear = lambda coleccion, cuerpo, doc_id=None: \
+        creados.append(dict(cuerpo["fields"])) or original(coleccion, cuerpo, doc_id)
+
+    reproducir(sesion(6), time.time())
+
+    assert len(creados) == 1
+    assert creados[0]["estado"] == {"stringValue": "Pendiente"}
+    assert "mensaje_enviado" not in creados[0]
+
+
+def test_falla_de_callmebot_marca_error(receptor, firestore_stub, callmebot_stub):
+    callmebot_stub.tasa_error = 1.0
+
+    [(_, doc_id, _)] = reproducir(sesion(6), time.time())
+
+    f = campos(firestore_stub, doc_id)
+    assert f["estado"] == {"stringValue": "Error al enviar"}
+    assert f["mensaje_enviado"] == {"booleanValue": False}
+    assert f["error_envio"]["stringValue"]
+    assert callmebot_stub.solicitudes == 1
+
+
+def test_firestore_caido_no_impide_whatsapp(receptor, firestore_stub, callmebot_stub):
+    firestore_stub.estado_forzado = 503
+
+    [(_, doc_id, _)] = reproducir(sesion(6), time.time())
+
+    assert f"ID: {doc_id}" in r.notificador.ultimo.alerta["mensaje"]
+    assert set(r.notificador.ultimo.fallidos()) == {"firestore"}
+    assert callmebot_stub.solicitudes == 1
+    assert firestore_stub.contar("PATCH") == 0  # No se crea un documento incompleto
+
+
+def test_firestore_lento_no_retrasa_el_primer_aviso(receptor, firestore_stub, callmebot_stub):
+    firestore_stub.latencia_s = 0.5
+
+    [(_, doc_id, ms)] = reproducir(sesion(6), time.time())
+
+    despacho = r.notificador.ultimo
+    assert ms < 100
+    assert despacho.primer_aviso_ms < 400  # WhatsApp llega sin esperar a Firestore
+    assert despacho.resultados["firestore"][2] >= 500
+    assert campos(firestore_stub, doc_id)["estado"] == {"stringValue": "Enviada"}
+
+
+def test_rtdb_y_webhook_en_paralelo(receptor, firestore_stub, callmebot_stub, rtdb_stub, monkeypatch):
+    webhook = type(rtdb_stub)()
+    monkeypatch.setattr(notificadores, "RTDB_URL", rtdb_stub.url)
+    monkeypatch.setattr(notificadores, "WEBHOOK_URL", f"{webhook.url}/caidas")
+    monkeypatch.setitem(notificadores.TIMEOUTS_S, "webhook", 0.2)
+    webhook.latencia_s = 1.0  # Supera su timeout: falla solo ese canal
+    try:
+        [(_, doc_id, _)] = reproducir(sesion(6), time.time())
+    finally:
+        webhook.cerrar()
+
+    [alerta] = rtdb_stub.datos["/alertas.json"].values()
+    assert alerta["id"] == doc_id
+    assert alerta["probabilidad"] == pytest.approx(0.99)
+    assert set(alerta["sensor_cadera"]) == {"ax", "ay", "az", "gx", "gy", "gz"}
+    despacho = r.notificador.ultimo
+    assert set(despacho.resultados) == {"firestore", "whatsapp", "rtdb", "webhook"}
+    assert set(despacho.fallidos()) == {"webhook"}
+    f = campos(firestore_stub, doc_id)
+    assert f["estado"] == {"stringValue": "Enviada"}
+    assert "webhook" in f["error_envio"]["stringValue"]
+
+
+def test_cooldown_entre_caidas(receptor, firestore_stub, callmebot_stub):
+    # Dos caídas separadas más que la inactividad del detector pero dentro del cooldown real
+    alertas = reproducir(sesion(6, caidas=2), time.time())
+
+    assert len(alertas) == 1
+    assert firestore_stub.contar("POST") == 1
+    assert callmebot_stub.solicitudes == 1
+
+
+def test_sin_caida_no_hay_solicitudes(receptor, firestore_stub, callmebot_stub):
+    reproducir(np.hstack([np.tile([0, 0, 1, 0, 0, 0] * 2, (600, 1)), np.ones((600, 2))]), time.time())
+
+    assert firestore_stub.registro == []
+    assert callmebot_stub.solicitudes == 0
+
+
+def test_config_de_whatsapp_desde_firestore_con_cache(receptor, firestore_stub, callmebot_stub, monkeypatch):
+    monkeypatch.setattr(r, "CALLMEBOT_PHONE", None)
+    monkeypatch.setattr(r, "CALLMEBOT_APIKEY", None)
+    firestore_stub.documentos[f"{r.COLECCION_DOC}/_config"] = {
+        "name": f"{r.COLECCION_DOC}/_config",
+        "fields": {"phone": {"integerValue": "56911111111"}, "apiCode": {"stringValue": "777"}},
+    }
+
+    for caida in range(2):
+        monkeypatch.setattr(r, "ultima_alerta", 0)  # Sin cooldown entre las dos caídas
+        [(_, doc_id, _)] = reproducir(sesion(6), time.time() + caida * 60)
+        assert campos(firestore_stub, doc_id)["estado"] == {"stringValue": "Enviada"}
+
+    assert firestore_stub.contar("GET") == 1  # La segunda alerta usa la caché de 60 s
+    assert callmebot_stub.solicitudes == 2
+
+
+def test_fragmento_post_se_adjunta(receptor, firestore_stub, callmebot_stub):
+    muestras = sesion(6)
+    [(_, doc_id, _)] = reproducir(muestras[:6 * HZ + 3 * HZ], time.time())
+    contador_caida = r.contador
+    reproducir(muestras[6 * HZ + 3 * HZ:], time.time() + 10)
+    assert r.contador - contador_caida >= r.N_POST
+
+    asyncio.run(r.capturar_post_caida(doc_id, contador_caida))
+
+    post, _, _ = fragmentos.desde_firestore(campos(firestore_stub, doc_id)["fragmento_post"])
+    assert post.shape == (r.N_POST, r.N_CRUDAS)
+    assert firestore_stub.contar("PATCH") == 2
+
+
+def test_fragmento_post_espera_la_creacion_del_documento(receptor, firestore_stub, callmebot_stub):
+    firestore_stub.latencia_s = 0.3
+    lectura = dict.fromkeys(r.prep.EJES, 0.0)
+    doc_id = r.enviar_a_firestore(0.99, lectura, lectura)
+    fragmento = r.codificar_muestras([(time.time(), [0.0] * r.N_CRUDAS)] * r.N_POST)
+
+    r.adjuntar_fragmento_post(doc_id, fragmento)  # Listo antes de que termine el POST de la alerta
+
+    metodos = [m for m, ruta, _ in firestore_stub.registro if ruta.endswith(doc_id) or m == "POST"]
+    assert metodos.index("POST") < metodos.index("PATCH")
+    f = campos(firestore_stub, doc_id)
+    assert f["confianza"] == {"doubleValue": 0.99} and "fragmento_post" in f
+    assert r.despachos == {}
+
+
+def test_sin_documento_no_se_adjunta_el_fragmento_post(receptor, firestore_stub, callmebot_stub):
+    firestore_stub.estado_forzado = 503
+    lectura = dict.fromkeys(r.prep.EJES, 0.0)
+    doc_id = r.enviar_a_firestore(0.99, lectura, lectura)
+
+    r.adjuntar_fragmento_post(doc_id, r.codificar_muestras([(time.time(), [0.0] * r.N_CRUDAS)]))
+
+    assert r.notificador.esperar(10)
+    assert firestore_stub.contar("PATCH") == 0
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import numpy as np
+
+from almacen_series import AlmacenSeries, calcular_rollup
+
+T0 = 1_700_000_400.0  # Alineado al minuto
+HZ = 20
+
+
+def _llenar(almacen, minutos: float, desde: float = T0, flujo: str = "cadera"):
+    rng = np.random.default_rng(0)
+    for i in range(int(minutos * 60 * HZ)):
+        almacen.agregar(flujo, desde + i / HZ, rng.normal(size=6).round(3))
+
+
+def _bytes_en_disco(raiz) -> int:
+    return sum(p.stat().st_size for p in raiz.glob("*/*") if p.suffix in (".npz", ".csv"))
+
+
+def test_rollup_por_cubeta():
+    ts = np.array([0.0, 0.5, 1.0, 1.5, 3.2])
+    valores = np.array([[1.0], [3.0], [5.0], [7.0], [9.0]], dtype=np.float32)
+    inicio, n, media, minimo, maximo = calcular_rollup(ts, valores, 1)
+    assert inicio.tolist() == [0, 1, 3]
+    assert n.tolist() == [2, 2, 1]
+    assert media[:, 0].tolist() == [2, 6, 9]
+    assert minimo[:, 0].tolist() == [1, 5, 9] and maximo[:, 0].tolist() == [3, 7, 9]
+
+
+def test_escribe_bloques_por_minuto_y_lee_incluyendo_memoria(tmp_path):
+    a = AlmacenSeries(tmp_path, fsync_cada_s=3600)
+    _llenar(a, 2.5)
+    a.vaciar()
+    _llenar(a, 0.5, desde=T0 + 150)  # Queda abierto en memoria
+    limite = time.monotonic() + 10
+    while len(a.bloques) < 3 and time.monotonic() < limite:  # Los bloques cerrados los escribe otro hilo
+        time.sleep(0.01)
+    ts, valores = a.leer("cadera")
+    assert len(ts) == 3 * 60 * HZ and valores.shape == (len(ts), 6)
+    assert np.all(np.diff(ts) > 0)
+    a.cerrar()
+
+    b = AlmacenSeries(tmp_path, fsync_cada_s=3600)  # Se recupera desde el índice
+    assert [blq["filas"] for blq in b.bloques] == [60 * HZ, 60 * HZ, 30 * HZ, 30 * HZ]
+    ts, _ = b.leer("cadera", T0 + 30, T0 + 90)
+    assert ts[0] >= T0 + 30 and ts[-1] <= T0 + 90 and len(ts) == 60 * HZ + 1
+    assert (tmp_path / "cadera" / "rollup_1s_20231114.csv").exists()
+    b.cerrar()
+
+
+def test_retencion_cuenta_y_elimina_rollups(tmp_path):
+    a = AlmacenSeries(tmp_path, fsync_cada_s=3600)
+    _llenar(a, 10)
+    a.cerrar()
+    total = _bytes_en_disco(tmp_path)
+    rollups = sum(p.stat().st_size for p in tmp_path.glob("*/rollup_*.csv"))
+    assert a.bytes_totales == total and rollups > 0  # Los rollups cuentan en el total
+
+    limite = total // 2
+    b = AlmacenSeries(tmp_path, max_bytes=limite, fsync_cada_s=3600)
+    assert b.bytes_totales == total
+    _llenar(b, 1, desde=T0 + 600)
+    b.cerrar()
+    assert _bytes_en_disco(tmp_path) == b.bytes_totales <= limite
+    # Lo más antiguo se va primero; el bloque recién escrito sigue ahí
+    inicios = [blq["inicio"] for blq in b.bloques]
+    assert inicios == sorted(inicios) and inicios[-1] == T0 + 600 and inicios[0] > T0
+
+
+def test_rollups_de_dias_anteriores_se_eliminan_antes_que_los_bloques_recientes(tmp_path):
+    a = AlmacenSeries(tmp_path, fsync_cada_s=3600)
+    _llenar(a, 3, desde=T0 - 86400)  # Día anterior
+    _llenar(a, 3)
+    a.cerrar()
+    ayer = tmp_path / "cadera" / "rollup_1s_20231113.csv"
+    assert ayer.exists()
+
+    bloques_hoy = sum(blq["bytes"] for blq in a.bloques if blq["inicio"] >= T0)
+    rollups_hoy = sum(t for r, t in a.rollups.items() if "20231114" in r.name)
+    b = AlmacenSeries(tmp_path, max_bytes=bloques_hoy + rollups_hoy + 1, fsync_cada_s=3600)
+    b._aplicar_retencion()
+    assert not ayer.exists()
+    assert all(blq["inicio"] >= T0 for blq in b.bloques) and len(b.bloques) == 3
+    b.cerrar()
+
+
+def test_leer_mientras_se_agrega(tmp_path):
+    a = AlmacenSeries(tmp_path, fsync_cada_s=3600)
+    detener = threading.Event()
+    errores = []
+
+    def lector():
+        while not detener.is_set():
+            try:
+                ts, valores = a.leer("cadera")
+                assert len(ts) == len(valores)
+            except Exception as e:
+                errores.append(e)
+                return
+
+    hilo = threading.Thread(target=lector)
+    hilo.start()
+    _llenar(a, 3)
+    detener.set()
+    hilo.join()
+    a.cerrar()
+    assert errores == []
+
+
+def test_sensor_callado_no_deja_su_bloque_abierto(tmp_path):
+    a = AlmacenSeries(tmp_path, fsync_cada_s=3600)
+    _llenar(a, 0.5, flujo="pierna")  # La pierna se desconecta a mitad del primer minuto
+    _llenar(a, 2)
+    limite = time.monotonic() + 10
+    while len(a.bloques) < 2 and time.monotonic() < limite:
+        time.sleep(0.01)
+    pierna = [blq for blq in a.bloques if blq["flujo"] == "pierna"]
+    assert len(pierna) == 1 and pierna[0]["filas"] == 30 * HZ  # Escrito al pasar la cadera al minuto 1
+    a.cerrar()
+
+
+def test_todos_callados_cierra_por_inactividad(tmp_path):
+    a = AlmacenSeries(tmp_path, fsync_cada_s=3600, cierre_inactivo_s=0.05)
+    _llenar(a, 0.5)
+    limite = time.monotonic() + 10
+    while not a.bloques and time.monotonic() < limite:  # Sin vaciar(): lo cierra el hilo escritor
+        time.sleep(0.01)
+    assert [blq["filas"] for blq in a.bloques] == [30 * HZ]
+    a.cerrar()
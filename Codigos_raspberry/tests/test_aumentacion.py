@@ -0,0 +1,70 @@
+import threading
+import time
+
+import numpy as np
+
+import aumentacion
+import preprocesamiento as prep
+
+
+def _hilos_aumentacion():
+    return [h for h in threading.enumerate() if h.name.startswith("aumentacion")]
+
+
+def _datos(n=64):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, prep.WINDOW_SIZE, len(prep.FEATURES_DUAL))).astype(np.float32)
+    y = (np.arange(n) < n // 8).astype(np.int32)
+    return X, y
+
+
+def test_cerrar_el_generador_libera_los_hilos():
+    X, y = _datos()
+    lotes = aumentacion.generador_lotes(X, y, prep.FEATURES_DUAL, 8, hilos=2)
+    next(lotes)
+    assert _hilos_aumentacion()
+    lotes.close()  # Lo que hace entrenar_modelo cuando Keras deja de pedir lotes
+    limite = time.monotonic() + 5
+    while _hilos_aumentacion() and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert not _hilos_aumentacion()
+
+
+def test_sin_balanceo_por_defecto():
+    X, y = _datos(512)
+    positivos = [yb.mean() for _, yb in aumentacion.generador_lotes(X, y, prep.FEATURES_DUAL, 64, hilos=1, epocas=4)]
+    balanceados = [yb.mean() for _, yb in aumentacion.generador_lotes(X, y, prep.FEATURES_DUAL, 64, hilos=1,
+                                                                       epocas=4, balancear=True)]
+    assert abs(np.mean(positivos) - y.mean()) < 0.05
+    assert abs(np.mean(balanceados) - 0.5) < 0.1
+
+
+class _ModeloFalso:
+    """Consume lotes como model.fit hasta un corte temprano (EarlyStopping)"""
+
+    def __init__(self, lotes_leidos=3):
+        self.lotes_leidos = lotes_leidos
+        self.llamadas = []
+
+    def fit(self, x, y=None, **kwargs):
+        self.llamadas.append(kwargs)
+        if y is None:
+            for _ in range(self.lotes_leidos):
+                X_lote, y_lote = next(x)
+                assert len(X_lote) == len(y_lote) == 8
+        return "history"
+
+
+def test_entrenar_modelo_con_y_sin_aumentacion():
+    X, y = _datos()
+    modelo = _ModeloFalso()
+    assert aumentacion.entrenar_modelo(modelo, X, y, (X, y), prep.FEATURES_DUAL, 2, 8) == "history"
+    assert modelo.llamadas[-1]["batch_size"] == 8
+
+    assert aumentacion.entrenar_modelo(modelo, X, y, (X, y), prep.FEATURES_DUAL, 2, 8,
+                                       con_aumentacion=True, balancear=True) == "history"
+    assert modelo.llamadas[-1]["steps_per_epoch"] == 8
+    limite = time.monotonic() + 5
+    while _hilos_aumentacion() and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert not _hilos_aumentacion()  # Corte temprano: el generador se cerró igual
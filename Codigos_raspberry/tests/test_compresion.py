@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import compresion
+
+
+class _Maestro:
+    def __init__(self, p):
+        self.p = np.asarray(p, dtype=np.float32)
+
+    def predict(self, X, verbose=0):
+        return self.p[:len(X), None]
+
+
+def test_objetivos_conservan_el_logit_del_maestro_sin_temperatura():
+    y = np.array([1, 1, 0])
+    objetivos = compresion.objetivos_destilacion(_Maestro([0.99, 0.9, 0.1]), np.zeros((3, 4, 2)), y)
+    np.testing.assert_array_equal(objetivos[:, 0], y)
+    np.testing.assert_allclose(1 / (1 + np.exp(-objetivos[:, 1])), [0.99, 0.9, 0.1], rtol=1e-5)
+
+
+def test_se_mide_al_umbral_de_alerta():
+    assert compresion.UMBRAL == 0.95
+
+
+def test_la_perdida_tiene_su_minimo_en_la_probabilidad_del_maestro():
+    tf = pytest.importorskip("tensorflow")
+    # Solo el término del maestro (etiqueta = probabilidad del maestro): mínimo en p = 0.99, no en 0.954
+    objetivos = tf.constant([[0.99, np.log(0.99 / 0.01)]] * 3, dtype=tf.float32)
+    perdidas = compresion.perdida_destilacion(objetivos, tf.constant([[0.954], [0.99], [0.999]])).numpy()
+    assert perdidas.argmin() == 1
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+import receptor_dual_ble as r
+from control_carga import NIVELES, ControlCarga
+from metricas import METRICAS
+
+
+def _alimentar(control, retraso_s, desde, hasta, paso=0.05):
+    niveles = []
+    t = desde
+    while t < hasta:
+        niveles.append(control.registrar(retraso_s, t))
+        t += paso
+    return niveles
+
+
+def test_sube_de_a_un_nivel_con_espera_y_baja_tras_la_calma():
+    control = ControlCarga(alfa=0.5, espera_s=5, calma_s=30)
+    antes = METRICAS.valor("receptor_carga_cambios_total", nivel="sin_consola", sentido="sube")
+
+    assert _alimentar(control, 0.001, 0, 10)[-1] == 0
+    niveles = _alimentar(control, 0.040, 10, 21)  # 40 ms de atraso sostenido
+    assert niveles[0] == 1
+    assert max(niveles) == 3 and niveles.index(3) >= 10 * 20  # Una subida cada 5 s
+    assert METRICAS.valor("receptor_carga_cambios_total", nivel="sin_consola", sentido="sube") == antes + 1
+
+    assert _alimentar(control, 0.010, 21, 80)[-1] == 3  # Entre umbrales: se mantiene (histéresis)
+    niveles = _alimentar(control, 0.0, 80, 200)
+    assert niveles[int(29 * 20)] == 3 and niveles[-1] == 0
+    assert METRICAS.valor("receptor_carga_nivel") == 0
+
+
+def test_respeta_el_nivel_maximo():
+    control = ControlCarga(nivel_max=2, alfa=1.0, espera_s=0)
+    assert max(_alimentar(control, 0.5, 0, 5)) == 2
+
+
+class _Constante:
+    input_shape = (None, r.prep.WINDOW_SIZE, r.N_CRUDAS)
+
+    def __init__(self, prob):
+        self.prob = prob
+        self.llamadas = 0
+
+    def predict(self, X, verbose=0):
+        self.llamadas += 1
+        return np.full((len(X), 1), self.prob, dtype=np.float32)
+
+
+def _entrada(modelo):
+    return {"ruta": "x", "modelo": modelo, "spec": r.SPEC_ANILLO, "escala": np.ones(r.N_CRUDAS, dtype=np.float32),
+            "indices": list(range(r.N_CRUDAS)), "window_size": r.prep.WINDOW_SIZE,
+            "sensores": [r.N_CRUDAS, r.N_CRUDAS + 1]}
+
+
+def test_degradacion_no_descarta_muestras(monkeypatch):
+    completo, ligero = _Constante(0.1), _Constante(0.2)
+    monkeypatch.setattr(r, "modelos", {"dual": _entrada(completo)})
+    monkeypatch.setattr(r, "entrada_ligera", _entrada(ligero))
+    monkeypatch.setattr(r, "ventana", deque(maxlen=r.prep.WINDOW_SIZE))
+    monkeypatch.setattr(r, "historial", deque(maxlen=r.historial.maxlen))
+    monkeypatch.setattr(r, "contador", 0)
+    monkeypatch.setattr(r, "publicador", None)
+    monkeypatch.setattr(r, "sombra", None)
+    monkeypatch.setattr(r, "vigilante", None)
+    monkeypatch.setattr(r, "nivel_carga", 0)
+    monkeypatch.setattr(r, "paso_prediccion", r.PASO_PREDICCION)
+    muestra = [0, 0, 1, 0, 0, 0] * 2 + [1.0, 1.0]
+    for _ in range(r.prep.WINDOW_SIZE):
+        r.procesar_muestra(muestra, 0.0)  # Ventana llena antes de medir
+
+    for nivel, modelo, paso in ((1, completo, r.PASO_PREDICCION), (2, completo, 2 * r.PASO_PREDICCION),
+                                (3, ligero, 2 * r.PASO_PREDICCION), (0, completo, r.PASO_PREDICCION)):
+        r.aplicar_nivel_carga(nivel)
+        assert r.paso_prediccion == paso
+        llamadas, contador = modelo.llamadas, r.contador
+        for _ in range(r.prep.WINDOW_SIZE):
+            r.procesar_muestra(muestra, 0.0)
+        assert r.contador - contador == r.prep.WINDOW_SIZE  # Todas las muestras entran a la ventana
+        assert len(r.ventana) == r.prep.WINDOW_SIZE
+        assert modelo.llamadas - llamadas == r.prep.WINDOW_SIZE // paso
+    assert NIVELES[r.nivel_carga] == "normal"
+
+
+def test_lazo_atrasado_no_pierde_notificaciones(monkeypatch):
+    procesadas = []
+
+    def procesar_lento(muestra, ts):
+        procesadas.append((muestra[0], ts))
+        if len(procesadas) == 20:
+            time.sleep(1.0)  # 20 periodos bloqueado (p. ej. un predict lento), más que la cola anterior
+        return None, None
+
+    monkeypatch.setattr(r, "procesar_muestra", procesar_lento)
+    monkeypatch.setattr(r, "colas_lecturas", {s: deque() for s in r.SENSORES})
+    monkeypatch.setattr(r, "ultima_notificacion", dict.fromkeys(r.SENSORES, 0.0))
+    monkeypatch.setattr(r, "control_carga", None)
+    monkeypatch.setattr(r, "nivel_carga", NIVELES.index("sin_consola"))
+    monkeypatch.setattr(r, "almacen", None)
+    enviadas = []
+
+    async def sensor(t0):
+        # Notifica en plazos fijos de 50 ms; lo atrasado llega en ráfaga, como desde la pila BLE
+        while True:
+            while t0 + len(enviadas) * r.PERIODO_MUESTRA_S <= time.monotonic():
+                lectura = dict.fromkeys(("ax", "ay", "az", "gx", "gy", "gz"), float(len(enviadas)))
+                r.handler_cadera(None, json.dumps(lectura).encode())
+                enviadas.append(lectura)
+            await asyncio.sleep(t0 + len(enviadas) * r.PERIODO_MUESTRA_S - time.monotonic())
+
+    async def correr():
+        tarea = asyncio.create_task(sensor(time.monotonic()))
+        try:
+            await asyncio.wait_for(r.detectar_caidas(), timeout=3.0)
+        except asyncio.TimeoutError:
+            pass
+        tarea.cancel()
+
+    antes = METRICAS.valor("receptor_muestras_descartadas_total", sensor="cadera")
+    asyncio.run(correr())
+
+    valores = [v for v, _ in procesadas]
+    assert valores[0] == 0.0
+    assert all(b - a == 1.0 for a, b in zip(valores, valores[1:]))  # En orden, sin saltos ni repeticiones
+    assert valores[-1] >= len(enviadas) - 2  # La cola se vació: la latencia se recuperó tras el atraso
+    assert METRICAS.valor("receptor_muestras_descartadas_total", sensor="cadera") == antes
+    assert all(b[1] > a[1] for a, b in zip(procesadas, procesadas[1:]))
@@ -0,0 +1,114 @@
+import numpy as np
+
+import preprocesamiento as prep
+from detector_eventos import (IMPACTO, INACTIVIDAD, PRE_IMPACTO, REFRACTARIO, REPOSO, DetectorEventos, detectar,
+                              movimiento)
+
+PASO = 0.25  # El receptor predice cada 5 muestras a 20 Hz
+PARAMETROS = {"alfa": 0.5, "umbral_alto": 0.95, "umbral_bajo": 0.6, "k": 2, "n": 3, "impacto_max_s": 1.5,
+              "quietud_s": 1.0, "inactividad_max_s": 5.0, "movimiento_max": 0.1, "refractario_s": 10.0}
+
+
+def _alimentar(detector, desde, segundos, prob, mov=None):
+    """Ventanas cada PASO; retorna [(ts, evento)] de los eventos emitidos"""
+    eventos = []
+    for i in range(int(round(segundos / PASO))):
+        ts = desde + i * PASO
+        evento = detector.actualizar(ts, prob, mov)
+        if evento:
+            eventos.append((ts, evento))
+    return eventos
+
+
+def test_impacto_seguido_de_quietud_emite_un_evento():
+    d = DetectorEventos(**PARAMETROS)
+    assert _alimentar(d, 0, 5, 0.02, 0.3) == []
+    assert _alimentar(d, 5, 1, 0.99, 0.8) == []  # Impacto: aún no se emite
+    assert d.estado == IMPACTO
+    eventos = _alimentar(d, 6, 4, 0.02, 0.01)
+
+    assert len(eventos) == 1
+    ts, evento = eventos[0]
+    assert 5 <= evento["inicio"] <= 5 + PASO and evento["pico"] == 0.99
+    assert 6 <= evento["fin"] < ts  # El evento marca el fin del impacto, no la confirmación
+    assert evento["inactividad_s"] == ts - evento["fin"] >= PARAMETROS["quietud_s"]
+    assert d.estado == REFRACTARIO
+
+
+def test_movimiento_tras_el_impacto_descarta_el_candidato():
+    d = DetectorEventos(**PARAMETROS)
+    _alimentar(d, 0, 1, 0.99, 0.8)
+    assert _alimentar(d, 1, 1.5, 0.3, 0.4) == []
+    assert d.estado == INACTIVIDAD
+    assert _alimentar(d, 2.5, 5, 0.3, 0.4) == []  # Sigue caminando: nunca hay quietud
+    assert d.estado == REPOSO and d.descartados == 1
+
+
+def test_la_quietud_debe_ser_continua():
+    d = DetectorEventos(**PARAMETROS)
+    _alimentar(d, 0, 1, 0.99, 0.8)
+    assert _alimentar(d, 1, 0.75, 0.02, 0.01) == []
+    assert _alimentar(d, 1.75, 0.25, 0.02, 0.5) == []  # Un movimiento reinicia la cuenta
+    eventos = _alimentar(d, 2, 2, 0.02, 0.01)
+    assert len(eventos) == 1 and eventos[0][0] >= 2 + PARAMETROS["quietud_s"]
+
+
+def test_sin_movimiento_usa_la_probabilidad():
+    d = DetectorEventos(**PARAMETROS)
+    _alimentar(d, 0, 1, 0.99)
+    eventos = _alimentar(d, 1, 3, 0.02)
+    assert len(eventos) == 1
+
+    d = DetectorEventos(**PARAMETROS)
+    assert _alimentar(d, 0, 10, 0.99) == []  # Probabilidad alta sostenida: no hay inactividad
+    assert d.descartados == 1
+
+
+def test_un_pico_aislado_no_confirma():
+    d = DetectorEventos(**{**PARAMETROS, "alfa": 0.7})
+    d.actualizar(0, 0.99, 0.5)
+    assert d.estado == PRE_IMPACTO
+    assert _alimentar(d, PASO, 2, 0.02, 0.01) == []
+    assert d.estado == REPOSO
+
+
+def test_periodo_refractario():
+    d = DetectorEventos(**PARAMETROS)
+    _alimentar(d, 0, 1, 0.99, 0.8)
+    [(ts, _)] = _alimentar(d, 1, 2, 0.02, 0.01)
+    assert _alimentar(d, ts + PASO, 1, 0.99, 0.8) == []  # Dentro del refractario
+    assert d.estado == REFRACTARIO
+    fin_refractario = ts + PARAMETROS["refractario_s"]
+    _alimentar(d, fin_refractario, 1, 0.99, 0.8)
+    assert len(_alimentar(d, fin_refractario + 1, 2, 0.02, 0.01)) == 1
+
+
+def test_quietud_cero_emite_al_cerrar_el_impacto():
+    d = DetectorEventos(**{**PARAMETROS, "quietud_s": 0.0})
+    _alimentar(d, 0, 1, 0.99, 0.8)
+    [(ts, evento)] = _alimentar(d, 1, 1, 0.02, 0.01)
+    assert evento["fin"] == ts and evento["inactividad_s"] == 0
+
+
+def test_detectar_sobre_una_sesion():
+    ts = np.arange(0, 60, PASO)
+    probs = np.full(len(ts), 0.02)
+    for inicio in (10, 40):
+        probs[(ts >= inicio) & (ts < inicio + 1)] = 0.99
+    eventos = detectar(ts, probs, **PARAMETROS)
+    assert [round(e["inicio"]) for e in eventos] == [10, 40]
+
+
+def test_movimiento_de_la_senal_cruda():
+    rng = np.random.default_rng(0)
+    quieto = np.tile([0, 0, 1, 0, 0, 0] * 2, (40, 1)).astype(np.float32)
+    assert movimiento(quieto) == 0.0
+    assert movimiento(quieto[:1]) is None
+
+    caminando = quieto.copy()
+    caminando[:, 6:9] += rng.normal(0, 0.3, size=(40, 3))  # Solo la pierna se mueve
+    assert movimiento(caminando) > PARAMETROS["movimiento_max"]
+    # Solo cuenta el último segundo
+    caminando[-int(prep.FRECUENCIA_HZ):] = quieto[-int(prep.FRECUENCIA_HZ):]
+    assert movimiento(caminando) == 0.0
+    assert movimiento(np.hstack([quieto, np.ones((40, 2))])) == 0.0  # Con banderas de frescura
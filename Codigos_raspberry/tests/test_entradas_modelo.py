@@ -0,0 +1,34 @@
+import numpy as np
+
+import entradas_modelo
+import hub_inferencia
+import modelo_ligero
+import preprocesamiento as prep
+import receptor_dual_ble
+
+
+def test_receptor_y_hub_comparten_carga_y_eleccion():
+    assert receptor_dual_ble.cargar_entrada is hub_inferencia.cargar_entrada is entradas_modelo.cargar_entrada
+    assert receptor_dual_ble.elegir_modo is hub_inferencia.elegir_modo is entradas_modelo.elegir_modo
+
+
+def test_modelo_de_pierna_se_carga_y_se_elige_sin_cadera(tmp_path):
+    spec = prep.crear_spec(prep.FEATURES_PIERNA)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(40, spec["window_size"], len(spec["columnas"]))).astype(np.float32)
+    y = (np.arange(40) % 2).astype(np.int32)
+    ruta = tmp_path / "pierna.joblib"
+    modelo_ligero.entrenar(X, y, spec, calibrar=False).guardar(ruta)
+
+    entrada = entradas_modelo.cargar_entrada(ruta, "pierna")
+    n = entradas_modelo.N_CRUDAS
+    assert entrada["sensores"] == [n + 1]
+    assert entrada["indices"] == [prep.FEATURES_DUAL.index(c) for c in prep.FEATURES_PIERNA]
+
+    bloque = np.zeros((spec["window_size"], n + 2), dtype=np.float32)
+    bloque[:, n + 1] = 1.0  # Solo la pierna fresca
+    modelos = {"dual": {**entrada, "sensores": [n, n + 1]}, "pierna": entrada}
+    assert entradas_modelo.elegir_modo(modelos, bloque) == "pierna"
+    bloque[:, n] = 1.0
+    assert entradas_modelo.elegir_modo(modelos, bloque) == "dual"
+    assert entradas_modelo.elegir_modo(modelos, bloque[:-1]) is None  # Ventana incompleta
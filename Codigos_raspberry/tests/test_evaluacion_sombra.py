@@ -0,0 +1,45 @@
+import threading
+
+import numpy as np
+
+from evaluacion_sombra import EvaluadorSombra
+
+W = 4
+
+
+class _FallaTrasPuerta:
+    """predict espera una señal y falla siempre (modelo roto al cerrar el receptor)"""
+
+    def __init__(self):
+        self.puerta = threading.Event()
+        self.ocupado = threading.Event()
+        self.llamadas = 0
+
+    def predict(self, X, verbose=0):
+        self.llamadas += 1
+        self.ocupado.set()
+        self.puerta.wait(5)
+        raise RuntimeError("modelo roto")
+
+
+def test_error_del_modelo_con_el_cierre_a_mitad_de_lote_no_mata_al_hilo(tmp_path, monkeypatch, capsys):
+    errores = []
+    monkeypatch.setattr(threading, "excepthook", lambda args: errores.append(args.exc_value))
+    modelo = _FallaTrasPuerta()
+    entrada = {"modelo": modelo, "window_size": W, "indices": [0, 1], "escala": np.ones(2, dtype=np.float32),
+               "sensores": [2]}
+    sombra = EvaluadorSombra(entrada, 0.95, directorio=tmp_path, lote_max=8)
+    bloque = np.ones((W, 3), dtype=np.float32)
+
+    sombra.enviar(0.0, bloque, 0.1, "dual")  # El hilo queda bloqueado en este primer lote
+    assert modelo.ocupado.wait(5)
+    for i in range(3):
+        sombra.enviar(float(i + 1), bloque, 0.1, "dual")
+    sombra._cola.put(None)  # Centinela detrás de ventanas pendientes
+    modelo.puerta.set()
+    sombra._hilo.join(timeout=5)
+
+    assert not sombra._hilo.is_alive()
+    assert errores == []
+    assert modelo.llamadas == 2
+    assert capsys.readouterr().out.count("Error en evaluación en sombra") == 2
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+import exportar_historial as eh
+
+COLECCION = "Historial/Personas/Vicente"
+
+
+def _alerta(i: int, segundos: int) -> dict:
+    return {
+        "hora_caida": {"timestampValue": f"2025-03-01T12:{segundos // 60:02d}:{segundos % 60:02d}.123456789Z"},
+        "confianza": {"doubleValue": 0.9 + i / 10000},
+        "estado": {"stringValue": "Pendiente" if i % 2 else "Atendido"},
+        "ventanas_evento": {"integerValue": str(i)},
+        "whatsapp_enviado": {"booleanValue": bool(i % 3)},
+    }
+
+
+@pytest.fixture
+def cliente(firestore_stub, monkeypatch):
+    monkeypatch.setattr(eh, "TAM_PAGINA", 7)  # Fuerza varias páginas por partición
+    c = eh.ClienteFirestore(base=firestore_stub.base, proyecto="p", persona="Vicente", hilos=4)
+    yield c
+    c.cerrar()
+
+
+def test_decodificar_tipos():
+    docs = [
+        {"name": "a/1", "fields": {"x": {"doubleValue": 1.5}, "n": {"integerValue": "3"},
+                                   "t": {"timestampValue": "2025-01-01T00:00:00Z"}, "s": {"stringValue": "hola"}}},
+        {"name": "a/2", "fields": {"x": {"integerValue": "2"}, "phone": {"integerValue": "569"}}},
+        {"name": "a/3", "fields": {"phone": {"stringValue": "+569"}, "b": {"booleanValue": True}}},
+    ]
+    df = eh.decodificar(docs)
+    assert list(df["id"]) == ["1", "2", "3"]
+    assert df["x"].tolist()[:2] == [1.5, 2.0]
+    assert df["n"].iloc[0] == 3
+    assert str(df["t"].dtype).startswith("datetime64")
+    assert df["phone"].tolist()[1:] == ["569", "+569"]
+    assert df["b"].iloc[2]
+
+
+def test_exporta_todo_en_paralelo_sin_duplicados(firestore_stub, cliente, tmp_path):
+    for i in range(60):
+        firestore_stub.agregar(COLECCION, f"doc{i:03d}", _alerta(i, i // 2))  # pares con la misma hora
+    firestore_stub.agregar(COLECCION, "_config", {"phone": {"stringValue": "+56"}})
+
+    df = eh.exportar(tmp_path, cliente, formato="csv", hilos=4, particiones=4)
+
+    assert sorted(df["id"]) == [f"doc{i:03d}" for i in range(60)]
+    assert df["hora_caida"].is_monotonic_increasing
+    assert firestore_stub.concurrencia_max > 1
+    assert len(list(tmp_path.glob("parte_*.csv"))) == 1
+
+
+def test_exportacion_incremental_desde_cursor(firestore_stub, cliente, tmp_path):
+    for i in range(20):
+        firestore_stub.agregar(COLECCION, f"doc{i:03d}", _alerta(i, i))
+    assert len(eh.exportar(tmp_path, cliente, formato="csv", particiones=3)) == 20
+
+    assert len(eh.exportar(tmp_path, cliente, formato="csv", particiones=3)) == 0
+
+    for i in range(20, 25):
+        firestore_stub.agregar(COLECCION, f"doc{i:03d}", _alerta(i, i))
+    # Mismo instante que el último exportado: debe entrar sin repetir los anteriores
+    firestore_stub.agregar(COLECCION, "empate", _alerta(99, 19))
+    nuevos = eh.exportar(tmp_path, cliente, formato="csv", particiones=3)
+    assert sorted(nuevos["id"]) == ["doc020", "doc021", "doc022", "doc023", "doc024", "empate"]
+
+    partes = pd.concat(pd.read_csv(p) for p in sorted(tmp_path.glob("parte_*.csv")))
+    assert partes["id"].is_unique and len(partes) == 26
+
+
+def test_coleccion_vacia(firestore_stub, cliente, tmp_path):
+    assert eh.exportar(tmp_path, cliente, formato="csv").empty
+
+
+def test_parquet(firestore_stub, cliente, tmp_path):
+    pytest.importorskip("pyarrow")
+    for i in range(5):
+        firestore_stub.agregar(COLECCION, f"doc{i}", _alerta(i, i))
+    eh.exportar(tmp_path, cliente)
+    assert len(pd.read_parquet(next(tmp_path.glob("parte_*.parquet")))) == 5
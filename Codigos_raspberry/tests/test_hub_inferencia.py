@@ -0,0 +1,67 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+import hub_inferencia as hub_mod
+import protocolo_hub as proto
+import receptor_dual_ble as r
+from metricas import METRICAS
+
+
+async def _conectar(puerto, nombre):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    escritor.write(proto.trama_json(proto.HOLA, {"cliente": nombre, "columnas": hub_mod.N_COLUMNAS}))
+    tipo, carga = await asyncio.wait_for(proto.leer_trama(lector), timeout=2)
+    return lector, escritor, tipo, json.loads(carga)
+
+
+def _con_hub(prueba, **kwargs):
+    async def correr():
+        hub = hub_mod.HubInferencia(hub_mod.modelos_sin_red(), **kwargs)
+        servidor = await asyncio.start_server(hub.atender, "127.0.0.1", 0)
+        try:
+            await prueba(hub, servidor.sockets[0].getsockname()[1])
+        finally:
+            servidor.close()
+    asyncio.run(correr())
+
+
+def test_nombre_duplicado_vivo_se_rechaza():
+    async def prueba(hub, puerto):
+        _, escritor_a, tipo, _ = await _conectar(puerto, "raspberrypi")
+        assert tipo == proto.BIENVENIDA
+        antes = METRICAS.valor("hub_conexiones_rechazadas_total")
+
+        lector_b, escritor_b, tipo, carga = await _conectar(puerto, "raspberrypi")
+        assert tipo == proto.RECHAZO and "raspberrypi" in carga["motivo"]
+        with pytest.raises(asyncio.IncompleteReadError):
+            await asyncio.wait_for(proto.leer_trama(lector_b), timeout=2)  # El hub cierra la nueva
+        assert hub.clientes["raspberrypi"].escritor.get_extra_info("peername") == \
+            escritor_a.get_extra_info("sockname")  # La conexión original sigue atendida
+        assert METRICAS.valor("hub_conexiones_rechazadas_total") == antes + 1
+        escritor_a.close()
+        escritor_b.close()
+
+    _con_hub(prueba)
+
+
+def test_conexion_colgada_se_reemplaza():
+    async def prueba(hub, puerto):
+        lector_a, escritor_a, _, _ = await _conectar(puerto, "pi-1")
+        await asyncio.sleep(0.2)  # Sin tramas: la conexión vieja quedó colgada
+        _, escritor_b, tipo, _ = await _conectar(puerto, "pi-1")
+        assert tipo == proto.BIENVENIDA
+        with pytest.raises(asyncio.IncompleteReadError):
+            await asyncio.wait_for(proto.leer_trama(lector_a), timeout=2)
+        assert hub.clientes["pi-1"].escritor.get_extra_info("peername") == escritor_b.get_extra_info("sockname")
+        escritor_a.close()
+        escritor_b.close()
+
+    _con_hub(prueba, inactivo_s=0.1)
+
+
+def test_nombre_por_defecto_no_es_solo_el_hostname():
+    nombre = r.id_dispositivo()
+    assert nombre.startswith(socket.gethostname() + "-") and len(nombre) > len(socket.gethostname()) + 1
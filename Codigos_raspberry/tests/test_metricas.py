@@ -0,0 +1,26 @@
+import threading
+
+from metricas import Registro
+
+
+def test_actualizaciones_concurrentes_no_se_pierden():
+    registro = Registro()
+    hilos, n = 8, 20000
+
+    def trabajar():
+        for i in range(n):
+            registro.incrementar("eventos_total", canal="x")
+            registro.observar("latencia_ms", i % 100)
+
+    trabajadores = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    while any(t.is_alive() for t in trabajadores):
+        registro.a_prometheus()  # Exportar mientras se actualiza no falla
+    for t in trabajadores:
+        t.join()
+
+    assert registro.valor("eventos_total", canal="x") == hilos * n
+    hist = registro.histograma("latencia_ms")
+    assert hist.total == sum(hist.conteos) == hilos * n
+    assert registro.total("eventos_total") == hilos * n
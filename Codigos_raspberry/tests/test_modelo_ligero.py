@@ -0,0 +1,59 @@
+import numpy as np
+from sklearn.calibration import CalibratedClassifierCV
+
+import modelo_ligero
+import preprocesamiento as prep
+
+
+def _ventanas(n=240, semilla=0):
+    """Reposo con ruido; la cuarta parte lleva un impacto de 4 g a mitad de ventana"""
+    rng = np.random.default_rng(semilla)
+    spec = prep.crear_spec(prep.FEATURES_CADERA)
+    X = rng.normal(0, 0.05, size=(n, spec["window_size"], len(spec["columnas"]))).astype(np.float32)
+    X[..., 2] += 1.0
+    y = (np.arange(n) % 4 == 0).astype(np.int32)
+    X[y == 1, spec["window_size"] // 2, 0] += 4.0
+    return X, y, spec
+
+
+def test_se_calibra_y_se_mide_al_umbral_de_alerta(tmp_path):
+    X, y, spec = _ventanas()
+    modelo = modelo_ligero.entrenar(X[:160], y[:160], spec)
+    assert isinstance(modelo.clasificador, CalibratedClassifierCV)
+
+    r = modelo_ligero.medir(modelo, X[160:], y[160:])
+    assert r["umbral"] == modelo_ligero.UMBRAL_CAIDA == 0.95
+    assert 0 <= r["acierto"] <= 1
+
+    barrido = modelo_ligero.barrido_umbrales(modelo, X[160:], y[160:])
+    assert list(barrido["umbral"]) == list(modelo_ligero.UMBRALES_BARRIDO)
+    assert barrido["recall"].is_monotonic_decreasing
+    assert barrido["falsos_positivos"].is_monotonic_decreasing
+
+    modelo.guardar(tmp_path / "m.joblib")
+    cargado = modelo_ligero.cargar(tmp_path / "m.joblib")
+    np.testing.assert_allclose(cargado.predict(X[160:]), modelo.predict(X[160:]))
+
+
+def test_sin_ejemplos_suficientes_no_se_calibra():
+    X, y, spec = _ventanas(24)
+    y[:] = 0
+    y[0] = 1  # Un solo positivo: no alcanza para dos pliegues de calibración
+    modelo = modelo_ligero.entrenar(X, y, spec)
+    assert not isinstance(modelo.clasificador, CalibratedClassifierCV)
+    assert modelo.predict(X).shape == (len(X), 1)
+
+
+class _CnnFalsa:
+    def predict(self, X, verbose=0):
+        return np.full((len(X), 1), 0.5, dtype=np.float32)
+
+
+def test_entrenar_y_comparar_guarda_junto_a_la_cnn(tmp_path, capsys):
+    X, y, spec = _ventanas()
+    ruta = modelo_ligero.entrenar_y_comparar(X[:160], y[:160], X[160:], y[160:], spec, _CnnFalsa(),
+                                             tmp_path / "modelo_cnn_imu_cadera.h5")
+    assert ruta == tmp_path / "modelo_ligero_cadera.joblib"
+    assert modelo_ligero.cargar(ruta).predict(X[160:]).shape == (80, 1)
+    salida = capsys.readouterr().out
+    assert "modelo_cnn_imu_cadera.h5" in salida and "Barrido de umbrales" in salida
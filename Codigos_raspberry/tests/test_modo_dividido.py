@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import receptor_dual_ble as r
+
+
+class _ProcesoTerminado:
+    def __init__(self, exitcode):
+        self.exitcode = exitcode
+        self.pid = 0
+
+    def is_alive(self):
+        return False
+
+
+@pytest.fixture
+def procesos(monkeypatch):
+    lanzados = []
+
+    def lanzar(nombre):
+        lanzados.append(nombre)
+        r.procesos[nombre] = _ProcesoTerminado(1)  # Vuelve a fallar de inmediato
+
+    monkeypatch.setattr(r, "procesos", {"inferencia": _ProcesoTerminado(1)})
+    monkeypatch.setattr(r, "reinicios", {})
+    monkeypatch.setattr(r, "_lanzar_proceso", lanzar)
+    return lanzados
+
+
+def test_error_de_configuracion_no_se_reinicia(procesos):
+    r.procesos["inferencia"] = _ProcesoTerminado(r.EXIT_CONFIGURACION)
+    with pytest.raises(SystemExit) as salida:
+        r.vigilar_procesos(ahora=0.0)
+    assert salida.value.code == r.EXIT_CONFIGURACION
+    assert procesos == []
+
+
+def test_reinicios_con_backoff_y_presupuesto(procesos):
+    ahora, esperas = 0.0, []
+    with pytest.raises(SystemExit) as salida:
+        while True:
+            r.vigilar_procesos(ahora)
+            proximo = r.reinicios["inferencia"]["proximo"]
+            esperas.append(proximo - ahora)
+            r.vigilar_procesos(proximo - 1e-3)
+            assert len(procesos) == len(esperas) - 1  # No se relanza antes del plazo
+            ahora = proximo
+            r.vigilar_procesos(ahora)
+    assert salida.value.code == 1
+    assert len(procesos) == r.REINICIOS_MAX
+    for intento, espera in enumerate(esperas):
+        assert r.REINICIO_MIN_S <= espera <= min(r.REINICIO_MAX_S, r.REINICIO_MIN_S * 2 ** intento)
+
+    # Pasada la ventana el presupuesto se recupera
+    r.reinicios["inferencia"]["proximo"] = None
+    r.vigilar_procesos(ahora + r.REINICIOS_VENTANA_S + 1)
+    assert r.reinicios["inferencia"]["proximo"] is not None
+
+
+def test_el_padre_valida_el_modelo_antes_de_lanzar(tmp_path, monkeypatch):
+    monkeypatch.setattr(r, "MODEL_PATH", str(tmp_path / "modelo.h5"))
+    with pytest.raises(SystemExit) as salida:
+        r.validar_archivos_modelo()
+    assert salida.value.code == r.EXIT_CONFIGURACION
+
+    (tmp_path / "modelo.h5").write_bytes(b"")
+    spec = r.prep.crear_spec(r.prep.FEATURES_DUAL)
+    r.prep.ruta_spec(r.MODEL_PATH).write_text(json.dumps({**spec, "columnas": ["cuello_ax"]}))
+    with pytest.raises(SystemExit) as salida:
+        r.validar_archivos_modelo()
+    assert salida.value.code == r.EXIT_CONFIGURACION
+
+    r.prep.ruta_spec(r.MODEL_PATH).write_text(json.dumps(spec))
+    r.validar_archivos_modelo()  # Compatible: sin TensorFlow no se carga, pero se puede lanzar
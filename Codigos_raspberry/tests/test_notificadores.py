@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from notificadores import Canal, Notificador
+
+
+def _canal(nombre, espera_s=0.0, ok=True, orden=None, **kwargs):
+    def enviar(alerta, timeout_s):
+        if orden is not None:
+            orden.append(nombre)
+        time.sleep(espera_s)
+        if isinstance(ok, Exception):
+            raise ok
+        return ok
+
+    return Canal(nombre, enviar, **kwargs)
+
+
+def test_canales_en_paralelo_y_primer_aviso_del_mas_rapido():
+    terminados = []
+    n = Notificador([_canal("lento", 0.4), _canal("medio", 0.3), _canal("rapido", 0.05),
+                     _canal("registro", 0.4, aviso=False)], al_terminar=terminados.append)
+    t0 = time.perf_counter()
+    despacho = n.notificar({"id": "a"})
+    assert time.perf_counter() - t0 < 0.05  # No bloquea al que notifica
+
+    assert despacho.esperar(2)
+    assert time.perf_counter() - t0 < 0.7  # Máximo de los canales, no la suma (1.15 s)
+    assert 50 <= despacho.primer_aviso_ms < 250
+    assert terminados == [despacho]
+    assert set(despacho.resultados) == {"lento", "medio", "rapido", "registro"}
+    n.cerrar()
+
+
+def test_fallas_y_timeouts_quedan_por_canal():
+    n = Notificador([_canal("ok"), _canal("rechaza", ok=False),
+                     _canal("explota", ok=RuntimeError("500")),
+                     _canal("lento", ok=requests.exceptions.ReadTimeout(), timeout_s=0.5)])
+    despacho = n.notificar({"id": "b"})
+    assert despacho.esperar(2)
+
+    assert despacho.avisado
+    assert despacho.fallidos() == {"rechaza": "rechazado", "explota": "RuntimeError: 500",
+                                   "lento": "timeout (0.5s)"}
+    n.cerrar()
+
+
+def test_prioridad_define_el_orden_con_pocos_hilos():
+    orden = []
+    canales = [_canal(nombre, 0.01, orden=orden, prioridad=p) for nombre, p in
+               (("firestore", 3), ("webhook", 2), ("whatsapp", 0), ("rtdb", 1))]
+    n = Notificador(canales, hilos=1)
+    assert n.notificar({"id": "c"}).esperar(2)
+
+    assert orden == ["whatsapp", "rtdb", "webhook", "firestore"]
+    n.cerrar()
+
+
+def test_sin_avisos_exitosos_y_error_en_al_terminar():
+    llamado = threading.Event()
+
+    def al_terminar(despacho):
+        llamado.set()
+        raise ValueError("fallo al actualizar")
+
+    n = Notificador([_canal("whatsapp", ok=False), _canal("firestore", aviso=False)], al_terminar=al_terminar)
+    despacho = n.notificar({"id": "d"})
+
+    assert despacho.esperar(2)  # Un error en al_terminar no deja el despacho colgado
+    assert llamado.is_set()
+    assert not despacho.avisado
+    assert n.esperar(0.1)
+    n.cerrar()
+
+
+@pytest.mark.parametrize("hilos", [0, 2])
+def test_esperar_todas_las_alertas_en_curso(hilos):
+    n = Notificador([_canal("a", 0.1), _canal("b", 0.2)], hilos=hilos)
+    despachos = [n.notificar({"id": i}) for i in range(3)]
+
+    assert n.esperar(3)
+    assert all(d.esperar(0) for d in despachos)
+    n.cerrar()
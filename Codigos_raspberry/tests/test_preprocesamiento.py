@@ -0,0 +1,12 @@
+import pytest
+
+import preprocesamiento as prep
+
+
+def test_sensores_de_entrenamiento():
+    assert prep.columnas_entrenamiento(prep.FEATURES_DUAL) == prep.FEATURES_DUAL
+    assert prep.columnas_entrenamiento(prep.FEATURES_DUAL, "pierna") == prep.FEATURES_PIERNA
+    with pytest.raises(ValueError, match="pierna"):
+        prep.columnas_entrenamiento(prep.FEATURES_CADERA, "pierna")
+    with pytest.raises(ValueError, match="TRAIN_SENSORES"):
+        prep.validar_sensores("cuello")
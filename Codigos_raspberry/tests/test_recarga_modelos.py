@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+import receptor_dual_ble as r
+from registro_modelos import VigilanteModelos
+
+
+class _Reposo:
+    """Entrega una probabilidad baja para cualquier ventana del largo esperado"""
+
+    def __init__(self, window_size):
+        self.window_size = window_size
+
+    def predict(self, X, verbose=0):
+        assert X.shape[1] == self.window_size
+        return np.full((len(X), 1), 0.01, dtype=np.float32)
+
+
+def _entrada(window_size):
+    return {"modelo": _Reposo(window_size), "escala": np.ones(r.N_CRUDAS, dtype=np.float32),
+            "indices": list(range(r.N_CRUDAS)), "window_size": window_size}
+
+
+def test_sin_replay_acepta_una_version_con_ventana_mas_larga(tmp_path, monkeypatch):
+    monkeypatch.setattr(r, "MODELOS_DIR", str(tmp_path))  # Sin replay.npz
+    monkeypatch.setattr(r, "WINDOW_SIZE", r.prep.WINDOW_SIZE)
+    r.validar_version({"dual": _entrada(2 * r.prep.WINDOW_SIZE), "cadera": _entrada(r.prep.WINDOW_SIZE)})
+
+
+def test_replay_mas_corto_que_el_modelo_se_rechaza(tmp_path, monkeypatch):
+    X = np.zeros((2, r.prep.WINDOW_SIZE, r.N_CRUDAS + 2), dtype=np.float32)
+    np.savez(tmp_path / "replay.npz", X=X)
+    monkeypatch.setattr(r, "MODELOS_DIR", str(tmp_path))
+    with pytest.raises(ValueError, match="necesita"):
+        r.validar_version({"dual": _entrada(2 * r.prep.WINDOW_SIZE)})
+
+
+def _version(raiz, nombre):
+    (raiz / nombre).mkdir()
+    archivo = raiz / nombre / "modelo_cnn_imu.h5"
+    archivo.write_bytes(b"")
+    os.utime(archivo, (0, 0))  # Copia terminada hace tiempo
+    return nombre
+
+
+def _vigilante(raiz):
+    return VigilanteModelos(lambda directorio: {"dual": directorio.name}, lambda entradas: None, raiz)
+
+
+def test_la_reversion_no_activa_versiones_anteriores(tmp_path):
+    _version(tmp_path, "v0001")
+    _version(tmp_path, "v0002")
+    vigilante = _vigilante(tmp_path)
+    vigilante.revisar()
+    version, _ = vigilante.tomar_pendiente()
+    vigilante.confirmar(version)
+    vigilante.revertir("v0002", None, "predicción no finita")  # Vuelve a los modelos de arranque
+
+    vigilante.revisar()
+    assert vigilante.tomar_pendiente() is None  # v0001 nunca se aprobó
+    reiniciado = _vigilante(tmp_path)  # La marca REVERTIDO sobrevive al reinicio
+    reiniciado.revisar()
+    assert reiniciado.tomar_pendiente() is None
+
+    _version(tmp_path, "v0003")
+    vigilante.revisar()
+    assert vigilante.tomar_pendiente()[0] == "v0003"
+
+
+def test_tras_revertir_a_una_version_se_conserva_al_reiniciar(tmp_path):
+    _version(tmp_path, "v0001")
+    vigilante = _vigilante(tmp_path)
+    vigilante.confirmar("v0001")
+    _version(tmp_path, "v0002")
+    vigilante.confirmar("v0002")
+    vigilante.revertir("v0002", "v0001", "predicción no finita")
+
+    reiniciado = _vigilante(tmp_path)
+    reiniciado.revisar()
+    assert reiniciado.tomar_pendiente()[0] == "v0001"
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from reetiquetar import procesar_archivo
+
+
+def _captura(ruta, filas: int, linea_rota: int | None = None):
+    lineas = ["ax,ay,az,gx,gy,gz"]
+    for i in range(filas):
+        lineas.append("0,0,1,0,0,0" + (",9" if i + 2 == linea_rota else ""))
+    ruta.write_text("\n".join(lineas) + "\n")
+
+
+def test_csv_completo_se_publica(tmp_path):
+    _captura(tmp_path / "cap.csv", 1000)
+    salida = tmp_path / "out"
+    salida.mkdir()
+    r = procesar_archivo(tmp_path / "cap.csv", salida, None, 1, "csv", "cadera", filas_por_bloque=200)
+    df = pd.read_csv(salida / "cap.csv")
+    assert r["filas"] == len(df) == 1000
+    assert set(df["state"]) == {1}
+    assert [p.name for p in salida.iterdir()] == ["cap.csv"]
+
+
+def test_error_a_mitad_de_archivo_no_deja_salida_truncada(tmp_path):
+    _captura(tmp_path / "cap.csv", 1000, linea_rota=801)
+    salida = tmp_path / "out"
+    salida.mkdir()
+    with pytest.raises(pd.errors.ParserError):
+        procesar_archivo(tmp_path / "cap.csv", salida, None, 0, "csv", "cadera", filas_por_bloque=200)
+    assert list(salida.iterdir()) == []  # Ni el archivo final ni el temporal
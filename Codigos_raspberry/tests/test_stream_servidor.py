@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+import server
+
+
+def _lote(n, valor=1.0, persona="Vicente"):
+    return {"persona": persona, "ts": [i / server.FRECUENCIA_RECEPTOR_HZ for i in range(n)],
+            "muestras": np.full((n, 12), valor).tolist()}
+
+
+def _mensaje(evento):
+    assert evento.startswith("event: datos\ndata: ")
+    return json.loads(evento.split("data: ", 1)[1])
+
+
+def test_submuestrea_y_guarda_el_resto_para_el_siguiente_lote():
+    difusor = server.Difusor(hz=5)  # Grupos de 4 muestras
+    cola = difusor.suscribir()
+    difusor.publicar(_lote(6))
+    assert len(_mensaje(cola.get_nowait())["ts"]) == 1
+    difusor.publicar(_lote(2, valor=3.0))  # Completa el grupo con las 2 sobrantes
+    mensaje = _mensaje(cola.get_nowait())
+    assert mensaje["muestras"] == [[2.0] * 12]
+    difusor.publicar(_lote(3))  # No completa un grupo: no se envía nada
+    assert cola.empty()
+
+
+def test_cola_llena_descarta_lo_mas_antiguo():
+    difusor = server.Difusor(hz=server.FRECUENCIA_RECEPTOR_HZ, buffer_max=3)
+    cola = difusor.suscribir()
+    for i in range(5):
+        difusor.publicar(_lote(1, valor=float(i)))
+    assert difusor.descartados == 2 and difusor.publicados == 5
+    assert [_mensaje(cola.get_nowait())["muestras"][0][0] for _ in range(3)] == [2.0, 3.0, 4.0]
+
+
+def test_navegador_desconectado_deja_de_recibir():
+    difusor = server.Difusor(hz=server.FRECUENCIA_RECEPTOR_HZ)
+    cola, otra = difusor.suscribir(), difusor.suscribir()
+    difusor.desuscribir(cola)
+    difusor.publicar(_lote(1))
+    assert cola.empty() and otra.qsize() == 1
+    assert difusor.clientes == {otra}
+
+
+@pytest.mark.parametrize("cuerpo", ["null", "[1, 2]", '"texto"', "no es json"])
+def test_publicar_rechaza_cuerpos_que_no_son_objetos(cuerpo):
+    respuesta = server.app.test_client().post("/stream/publicar", data=cuerpo, content_type="application/json")
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["status"] == "error"
+
+
+def test_publicar_reparte_a_los_navegadores(monkeypatch):
+    monkeypatch.setattr(server, "difusor", server.Difusor(hz=server.FRECUENCIA_RECEPTOR_HZ))
+    cola = server.difusor.suscribir()
+    respuesta = server.app.test_client().post("/stream/publicar", json={**_lote(2), "prob": 0.5, "modo": "dual"})
+    assert respuesta.status_code == 200 and respuesta.get_json()["clientes"] == 1
+    mensaje = _mensaje(cola.get_nowait())
+    assert len(mensaje["ts"]) == 2 and mensaje["prob"] == 0.5 and mensaje["modo"] == "dual"
+
+
+def test_cerrar_el_stream_desuscribe_al_navegador(monkeypatch):
+    monkeypatch.setattr(server, "difusor", server.Difusor(hz=server.FRECUENCIA_RECEPTOR_HZ))
+    respuesta = server.app.test_client().get("/stream", buffered=False)
+    eventos = respuesta.response
+    assert "event: config" in next(eventos).decode()
+    assert len(server.difusor.clientes) == 1
+    server.difusor.publicar(_lote(1))
+    assert next(eventos).decode().startswith("event: datos")
+    respuesta.close()  # El navegador cierra la conexión
+    assert server.difusor.clientes == set()
@@ -0,0 +1,186 @@
+import io
+import time
+
+import numpy as np
+import pytest
+
+import subida_archivos as sa
+from almacen_series import AlmacenSeries
+from metricas import METRICAS
+
+T0 = 1_700_000_400.0  # Alineado a 10 minutos
+HZ = 20
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    """25 minutos de ambos sensores: dos paquetes de 10 min cerrados y uno abierto"""
+    a = AlmacenSeries(tmp_path / "almacen", fsync_cada_s=3600)
+    rng = np.random.default_rng(0)
+    for i in range(25 * 60 * HZ):
+        ts = T0 + i / HZ
+        a.agregar("cadera", ts, rng.normal(size=6).round(3))
+        a.agregar("pierna", ts + 0.01, rng.normal(size=6).round(3))
+    a.cerrar()
+    return a
+
+
+def _subidor(almacen, stub, **kwargs):
+    opciones = dict(formato="npz", paquete_min=10, parte_kb=64, kbps=0, cpu_max=1.0)
+    return sa.SubidorArchivos(almacen.raiz, stub.url, "Prueba", **{**opciones, **kwargs})
+
+
+def _leer_npz(datos: bytes) -> dict:
+    with np.load(io.BytesIO(datos)) as npz:
+        return {k: npz[k] for k in npz.files}
+
+
+def test_sube_paquetes_cerrados_completos(almacen, objetos_stub):
+    subidor = _subidor(almacen, objetos_stub)
+    assert subidor.subir_pendientes(ahora=T0 + 25 * 60 + 10) == 2
+
+    assert sorted(objetos_stub.objetos) == [subidor.objeto(T0), subidor.objeto(T0 + 600)]
+    columnas = _leer_npz(objetos_stub.objetos[subidor.objeto(T0)])
+    assert list(columnas) == ["ts", "sensor"] + sa.COLUMNAS
+    for codigo, sensor in enumerate(sa.SENSORES):
+        ts, valores = almacen.leer(sensor, T0, T0 + 600 - 1e-6)
+        mascara = columnas["sensor"] == codigo
+        np.testing.assert_array_equal(columnas["ts"][mascara], ts)
+        np.testing.assert_array_equal(np.column_stack([columnas[c][mascara] for c in sa.COLUMNAS]), valores)
+    assert objetos_stub.contar("PUT") > 2  # Varias partes por paquete
+    assert list(subidor.staging.iterdir()) == []
+
+    # Reanudar desde el estado en disco: nada que subir hasta que cierre el tercer paquete
+    otro = _subidor(almacen, objetos_stub)
+    assert otro.subir_pendientes(ahora=T0 + 25 * 60 + 10) == 0
+    assert otro.subir_pendientes(ahora=T0 + 32 * 60) == 1
+    assert METRICAS.valor("subida_pendientes") == 0
+
+
+def test_reanuda_solo_las_partes_faltantes(almacen, objetos_stub):
+    subidor = _subidor(almacen, objetos_stub)
+    objeto = subidor.objeto(T0)
+    objetos_stub.fallar.add((objeto, 2))
+
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 0
+    assert objeto not in objetos_stub.objetos
+    assert sorted(objetos_stub.partes[objeto]) == [0, 1]
+
+    # Un proceso nuevo (p.ej. tras reiniciar la Pi) retoma el archivo local y las partes del servidor
+    assert _subidor(almacen, objetos_stub).subir_pendientes(ahora=T0 + 21 * 60) == 1
+    envios = [parte for m, o, parte, _ in objetos_stub.registro if m == "PUT" and o == objeto]
+    assert envios.count(0) == 1 and envios.count(1) == 1 and envios.count(2) == 2
+
+
+def test_pausa_mientras_el_receptor_esta_degradado(almacen, objetos_stub):
+    subidor = _subidor(almacen, objetos_stub, pausar=lambda: True)
+    assert subidor.subir_pendientes(ahora=T0 + 25 * 60 + 10) == 0
+    assert objetos_stub.registro == []
+
+
+def test_limite_de_ancho_de_banda():
+    limite = sa.LimiteRecursos(kbps=256, cpu_max=1.0)
+    t0 = time.monotonic()
+    for _ in range(4):
+        limite.consumir(128 * 1024)
+    # 512 KB a 256 KB/s con ráfaga inicial de 256 KB
+    assert 0.9 <= time.monotonic() - t0 < 1.5
+
+
+def test_limite_de_cpu():
+    limite = sa.LimiteRecursos(kbps=0, cpu_max=0.25)
+    limite.iniciar_tramo()
+    t0, cpu0 = time.monotonic(), time.thread_time()
+    while time.thread_time() - cpu0 < 0.1:
+        pass
+    limite.ceder_cpu()
+    assert time.monotonic() - t0 >= 0.1 / 0.25 - 0.02
+
+
+def _bytes_bloques(almacen, desde, hasta):
+    return sum(b["bytes"] for b in almacen.bloques if desde <= b["inicio"] < hasta)
+
+
+def test_retencion_conserva_los_bloques_sin_subir(tmp_path, objetos_stub):
+    a = AlmacenSeries(tmp_path / "almacen", fsync_cada_s=3600, holgura_retenidos=1e12)
+    subidor = _subidor(a, objetos_stub).vincular(a)
+    a.max_bytes = 1  # Cualquier bloque supera el máximo
+    for i in range(21 * 60 * HZ):
+        a.agregar("cadera", T0 + i / HZ, np.zeros(6))
+    a.cerrar()
+    assert len(a.bloques) == 21  # Nada subido: todo retenido
+
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 1
+    a._aplicar_retencion()
+    assert min(b["inicio"] for b in a.bloques) == T0 + 600  # Solo se elimina el paquete ya subido
+    assert len(a.bloques) == 11
+
+
+def test_los_retenidos_tienen_un_tope(tmp_path, objetos_stub):
+    a = AlmacenSeries(tmp_path / "almacen", fsync_cada_s=3600)
+    _subidor(a, objetos_stub).vincular(a)
+    for i in range(5 * 60 * HZ):
+        a.agregar("cadera", T0 + i / HZ, np.zeros(6))
+    a.cerrar()
+    a.max_bytes = a.ocupado() / 10
+    a._aplicar_retencion()
+    assert a.ocupado() <= a.max_bytes * a.holgura_retenidos and a.retenidos_eliminados > 0
+
+
+def test_paquete_con_bloques_eliminados_no_se_marca_completo(almacen, objetos_stub):
+    subidor = _subidor(almacen, objetos_stub)
+    bloques = subidor.pendientes(ahora=T0 + 21 * 60)[subidor.objeto(T0)][1]
+    eliminados = [b for b in bloques if b["flujo"] == "pierna"][:3]
+    for b in eliminados:
+        (almacen.raiz / b["archivo"]).unlink()
+
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 1
+    columnas = _leer_npz(objetos_stub.objetos[subidor.objeto(T0)])
+    with open(subidor.ruta_estado, newline="", encoding="utf-8") as f:
+        [fila] = list(sa.csv.DictReader(f))
+    assert fila["resultado"] == "parcial" and fila["faltantes"] == "3"
+    assert int(fila["filas"]) == len(columnas["ts"]) == sum(b["filas"] for b in bloques) - sum(
+        b["filas"] for b in eliminados)
+    assert METRICAS.valor("subida_paquetes_total", resultado="parcial") >= 1
+
+
+def test_paquete_sin_bloques_se_registra_perdido_sin_subirse(almacen, objetos_stub):
+    subidor = _subidor(almacen, objetos_stub)
+    for b in subidor.pendientes(ahora=T0 + 21 * 60)[subidor.objeto(T0)][1]:
+        (almacen.raiz / b["archivo"]).unlink()
+
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 1
+    assert objetos_stub.registro == []
+    with open(subidor.ruta_estado, newline="", encoding="utf-8") as f:
+        [fila] = list(sa.csv.DictReader(f))
+    assert fila["resultado"] == "perdido" and fila["filas"] == "0"
+    assert list(subidor.staging.iterdir()) == []
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 0  # No se reintenta
+
+
+def test_paquetes_en_preparacion_cuentan_para_el_maximo(almacen, objetos_stub):
+    subidor = _subidor(almacen, objetos_stub).vincular(almacen)
+    objetos_stub.fallar.add((subidor.objeto(T0), 0))  # Queda empaquetado en subida/ sin completarse
+    antes = almacen.ocupado()
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 0
+    staging = subidor.bytes_staging()
+    assert staging > 0 and almacen.ocupado() == antes + staging
+    # Ya empaquetados: sus bloques dejan de estar retenidos
+    assert not any(subidor.retener(b) for b in almacen.bloques if b["inicio"] < T0 + 600)
+    assert all(subidor.retener(b) for b in almacen.bloques if b["inicio"] >= T0 + 600)
+
+
+@pytest.mark.parametrize("dano", ["paquete", "resumen"])
+def test_paquete_reconstruido_reenvia_todas_las_partes(almacen, objetos_stub, dano):
+    subidor = _subidor(almacen, objetos_stub)
+    objeto = subidor.objeto(T0)
+    objetos_stub.fallar.add((objeto, 2))
+    assert subidor.subir_pendientes(ahora=T0 + 21 * 60) == 0
+    local = subidor._local(objeto)
+    # Corte a mitad de escritura: el paquete ya no coincide con el sha256 del resumen, o el resumen quedó truncado
+    (local if dano == "paquete" else subidor._meta(local)).write_bytes(b"{")
+
+    assert _subidor(almacen, objetos_stub).subir_pendientes(ahora=T0 + 21 * 60) == 1
+    envios = [parte for m, o, parte, _ in objetos_stub.registro if m == "PUT" and o == objeto]
+    assert envios.count(0) == 2 and envios.count(1) == 2  # Las partes del paquete anterior se reemplazan
+    assert objeto in objetos_stub.objetos
@@ -2,6 +2,7 @@
 Script para entrenar CNN 1D con datos capturados del Arduino
 Lee archivos limpios, crea ventanas y entrena modelo
 """
+import os
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -12,14 +13,33 @@ from tensorflow.keras.layers import Conv1D, MaxPooling1D, Dropout, Flatten, Dens
 from tensorflow.keras.callbacks import EarlyStopping
 import matplotlib.pyplot as plt
 import seaborn as sns
+import preprocesamiento as prep
+import aumentacion
+import modelo_ligero
 
 # --- CONFIGURACIÓN ---
 DATOS_DIR = Path(__file__).parent / "datos_limpios"
-WINDOW_SIZE = 40  # 40 muestras = 2 segundos a 20Hz
-OVERLAP = 20  # Solapamiento de ventanas (50%)
+WINDOW_SIZE = prep.WINDOW_SIZE  # Compartido con el receptor (ver preprocesamiento.py)
+# "auto" usa el layout del CSV; "cadera"/"pierna" entrena el modelo de respaldo de un solo sensor
+SENSORES = os.environ.get("TRAIN_SENSORES", "auto")
+OVERLAP = prep.OVERLAP  # Solapamiento de ventanas (50%)
 TEST_SIZE = 0.2
 EPOCHS = 25
 BATCH_SIZE = 16
+# Aumentación en línea (rotación, magnitud, deformación temporal, ruido, desfase cadera/pierna)
+AUMENTAR = os.environ.get("TRAIN_AUMENTAR", "0") == "1"
+# Muestreo con igual probabilidad por clase (solo con aumentación); cambia la calibración
+# de las probabilidades respecto de UMBRAL_CAIDA del receptor, por eso va aparte
+BALANCEAR = os.environ.get("TRAIN_BALANCEAR", "0") == "1"
+SEMILLA = aumentacion.SEMILLA
+# Modelo ligero por características (scikit-learn) entrenado con las mismas ventanas
+ENTRENAR_LIGERO = os.environ.get("TRAIN_LIGERO", "1") == "1"
+
+try:
+    prep.validar_sensores(SENSORES)
+except ValueError as e:
+    print(f"❌ ERROR: {e}")
+    exit(1)
 
 print("╔════════════════════════════════════════════════╗")
 print("║   Entrenamiento CNN para detección de caídas  ║")
@@ -46,6 +66,7 @@ print(f"📄 Archivos encontrados: {len(archivos)}\n")
 # Clasificar archivos automáticamente según su nombre
 datos_totales = []
 etiquetas_totales = []
+spec = None
 
 for archivo in archivos:
     print(f"📄 {archivo.name}")
@@ -74,53 +95,40 @@ for archivo in archivos:
     try:
         df = pd.read_csv(archivo)
         
-        # Detectar columnas disponibles
-        columnas = df.columns.tolist()
-        
-        # Seleccionar columnas según lo disponible
-        if 'cadera_ax' in columnas and 'pierna_ax' in columnas:
-            # Usar datos de AMBOS sensores (12 features)
-            cols = [
-                'cadera_ax', 'cadera_ay', 'cadera_az', 'cadera_gx', 'cadera_gy', 'cadera_gz',
-                'pierna_ax', 'pierna_ay', 'pierna_az', 'pierna_gx', 'pierna_gy', 'pierna_gz'
-            ]
-            print(f"    Usando datos de CADERA + PIERNA (12 features)")
-        elif 'cadera_ax' in columnas:
-            # Usar solo datos de la cadera
-            cols = ['cadera_ax', 'cadera_ay', 'cadera_az', 'cadera_gx', 'cadera_gy', 'cadera_gz']
-            print(f"    Usando datos del sensor de CADERA (6 features)")
-        elif 'ax' in columnas:
-            # Usar datos directos
-            cols = ['ax', 'ay', 'az', 'gx', 'gy', 'gz']
-            print(f"    Usando datos del sensor único (6 features)")
-        else:
-            print(f"   ❌ Error: Columnas no reconocidas: {columnas}")
+        # Detectar columnas disponibles (todos los archivos deben compartir el layout)
+        try:
+            cols = prep.columnas_entrenamiento(df.columns, SENSORES)
+        except ValueError as e:
+            if SENSORES == "auto":
+                raise  # Layout no reconocido: se descarta el archivo
+            print(f"❌ ERROR: {archivo.name}: {e}")
+            exit(1)  # Falta el sensor pedido: el modelo de respaldo no tendría sentido
+        if spec is None:
+            spec = prep.crear_spec(cols, WINDOW_SIZE, OVERLAP)
+        elif cols != spec["columnas"]:
+            print(f"   ❌ Error: layout {prep.describir_layout(cols)} distinto de {prep.describir_layout(spec['columnas'])}\n")
             continue
-        
+        print(f"    Usando datos de {prep.describir_layout(cols)} ({len(cols)} features)")
         print(f"   ✅ Cargado: {len(df)} muestras")
+        print(f"   ⚙️  Giroscopio escalado x{prep.ESCALA_GIRO}")
         
-        # Escalar giroscopio x4 para darle más peso
-        cols_giro = [c for c in cols if 'gx' in c or 'gy' in c or 'gz' in c]
-        if cols_giro:
-            df[cols_giro] = df[cols_giro] * 4.0
-            print(f"   ⚙️  Giroscopio escalado x4: {cols_giro}")
-        
-        # Crear ventanas con solapamiento
-        ventanas_creadas = 0
-        for i in range(0, len(df) - WINDOW_SIZE + 1, OVERLAP):
-            ventana = df.iloc[i:i+WINDOW_SIZE][cols].values
-            datos_totales.append(ventana)
-            etiquetas_totales.append(etiqueta)
-            ventanas_creadas += 1
+        # Escalar y crear ventanas con solapamiento
+        ventanas = prep.crear_ventanas(prep.preparar_dataframe(df, spec), WINDOW_SIZE, OVERLAP)
+        datos_totales.append(ventanas)
+        etiquetas_totales.append(np.full(len(ventanas), etiqueta, dtype=np.int32))
         
-        print(f"   📊 Ventanas creadas: {ventanas_creadas}\n")
+        print(f"   📊 Ventanas creadas: {len(ventanas)}\n")
     
     except Exception as e:
         print(f"   ❌ Error: {e}\n")
 
+if not datos_totales:
+    print("❌ No se cargaron datos válidos")
+    exit(1)
+
 # Convertir a arrays
-X = np.array(datos_totales, dtype=np.float32)
-y = np.array(etiquetas_totales, dtype=np.int32)
+X = np.concatenate(datos_totales).astype(np.float32)
+y = np.concatenate(etiquetas_totales)
 
 print(f"\n📊 Datos preparados:")
 print(f"   Total de ventanas: {len(X)}")
@@ -173,13 +181,9 @@ print("   - Dropout aumentado a 0.5\n")
 
 early_stop = EarlyStopping(monitor='val_loss', patience=15, restore_best_weights=True)
 
-history = model.fit(
-    X_train, y_train,
-    validation_data=(X_test, y_test),
-    epochs=EPOCHS,
-    batch_size=BATCH_SIZE,
-    callbacks=[early_stop],
-    verbose=1
+history = aumentacion.entrenar_modelo(
+    model, X_train, y_train, (X_test, y_test), spec["columnas"], EPOCHS, BATCH_SIZE,
+    callbacks=[early_stop], con_aumentacion=AUMENTAR, balancear=BALANCEAR, semilla=SEMILLA
 )
 
 # --- 5. EVALUAR ---
@@ -208,9 +212,10 @@ print("\n📋 Reporte de clasificación:")
 print(classification_report(y_test, y_pred, target_names=['Normal', 'Caída']))
 
 # --- 6. GUARDAR MODELO ---
-MODEL_PATH = "modelo_cnn_imu.h5"
+MODEL_PATH = "modelo_cnn_imu.h5" if SENSORES == "auto" else f"modelo_cnn_imu_{SENSORES}.h5"
 model.save(MODEL_PATH)
 print(f"\n💾 Modelo guardado: {MODEL_PATH}")
+print(f"💾 Spec de preprocesamiento: {prep.guardar_spec(MODEL_PATH, spec)}")
 
 # Gráfico de entrenamiento
 plt.figure(figsize=(12,4))
@@ -236,4 +241,8 @@ plt.tight_layout()
 plt.savefig('entrenamiento_arduino.png', dpi=150)
 print(f"💾 Gráfico guardado: entrenamiento_arduino.png")
 
+# --- 7. MODELO LIGERO ---
+if ENTRENAR_LIGERO:
+    modelo_ligero.entrenar_y_comparar(X_train, y_train, X_test, y_test, spec, model, MODEL_PATH)
+
 print("\n✅ ¡Entrenamiento completado!")
@@ -2,6 +2,8 @@
 Script para entrenar CNN 1D con datos capturados del Arduino
 Lee archivos limpios, crea ventanas y entrena modelo
 """
+import os
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -13,13 +15,35 @@ from tensorflow.keras.callbacks import EarlyStopping
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# Pipeline de features compartido con el receptor y la puntuación offline
+sys.path.insert(0, str(Path(__file__).parent / "Codigos_raspberry"))
+import preprocesamiento as prep
+import aumentacion
+import modelo_ligero
+
 # --- CONFIGURACIÓN ---
 DATOS_DIR = Path(__file__).parent / "datos_limpios"
-WINDOW_SIZE = 100  # 80 muestras = 2 segundos a 40Hz
-OVERLAP = 50 
+WINDOW_SIZE = prep.WINDOW_SIZE
+# "auto" usa el layout del CSV; "cadera"/"pierna" entrena el modelo de respaldo de un solo sensor
+SENSORES = os.environ.get("TRAIN_SENSORES", "auto")
+OVERLAP = prep.OVERLAP
 TEST_SIZE = 0.2
 EPOCHS = 15
 BATCH_SIZE = 16
+# Aumentación en línea (rotación, magnitud, deformación temporal, ruido, desfase cadera/pierna)
+AUMENTAR = os.environ.get("TRAIN_AUMENTAR", "0") == "1"
+# Muestreo con igual probabilidad por clase (solo con aumentación); cambia la calibración
+# de las probabilidades respecto de UMBRAL_CAIDA del receptor, por eso va aparte
+BALANCEAR = os.environ.get("TRAIN_BALANCEAR", "0") == "1"
+SEMILLA = aumentacion.SEMILLA
+# Modelo ligero por características (scikit-learn) entrenado con las mismas ventanas
+ENTRENAR_LIGERO = os.environ.get("TRAIN_LIGERO", "1") == "1"
+
+try:
+    prep.validar_sensores(SENSORES)
+except ValueError as e:
+    print(f"❌ ERROR: {e}")
+    exit(1)
 
 
 RUTA_NORMAL = Path("datos_capturados_normales.csv")
@@ -32,6 +56,7 @@ archivos = [
 
 datos_totales = []
 etiquetas_totales = []
+spec = None
 
 print("📂 Cargando archivos fijos...")
 
@@ -44,48 +69,32 @@ for ruta, etiqueta in archivos:
 
     # Cargar CSV
     df = pd.read_csv(ruta)
-    columnas = df.columns.tolist()
-
-    # Detectar columnas disponibles
-    if 'cadera_ax' in columnas and 'pierna_ax' in columnas:
-        cols = [
-            'cadera_ax','cadera_ay','cadera_az','cadera_gx','cadera_gy','cadera_gz',
-            'pierna_ax','pierna_ay','pierna_az','pierna_gx','pierna_gy','pierna_gz'
-        ]
-        print("   → Usando datos de CADERA + PIERNA (12 features)")
-    elif 'cadera_ax' in columnas:
-        cols = ['cadera_ax','cadera_ay','cadera_az','cadera_gx','cadera_gy','cadera_gz']
-        print("   → Usando datos del sensor CADERA (6 features)")
-    else:
-        cols = ['ax','ay','az','gx','gy','gz']
-        print("   → Usando sensor único (6 features)")
 
+    # Detectar columnas disponibles (todos los archivos deben compartir el layout)
+    try:
+        cols = prep.columnas_entrenamiento(df.columns, SENSORES)
+    except ValueError as e:
+        print(f"❌ ERROR: {ruta.name}: {e}")
+        exit(1)
+    if spec is None:
+        spec = prep.crear_spec(cols, WINDOW_SIZE, OVERLAP)
+    elif cols != spec["columnas"]:
+        print(f"❌ ERROR: {ruta.name} usa {prep.describir_layout(cols)}, se esperaba {prep.describir_layout(spec['columnas'])}")
+        exit(1)
+    print(f"   → Usando datos de {prep.describir_layout(cols)} ({len(cols)} features)")
     print(f"   → Total muestras: {len(df)}")
+    print(f"   → Giroscopio x{prep.ESCALA_GIRO} | cadera x{prep.FACTOR_CADERA}")
 
-    # Escalar giroscopio
-    cols_giro = [c for c in cols if 'gx' in c or 'gy' in c or 'gz' in c]
-    df[cols_giro] = df[cols_giro] * 4.0
-    print(f"   → Giroscopio escalado x1: {cols_giro}")
-
-    FACTOR_CADERA = 1.0
+    # Escalar y crear ventanas
+    ventanas = prep.crear_ventanas(prep.preparar_dataframe(df, spec), WINDOW_SIZE, OVERLAP)
+    datos_totales.append(ventanas)
+    etiquetas_totales.append(np.full(len(ventanas), etiqueta, dtype=np.int32))
 
-    cols_cadera = [c for c in cols if 'cadera_' in c]
-    df[cols_cadera] = df[cols_cadera] * FACTOR_CADERA
-    print(f"   → Peso aplicado a cadera: {FACTOR_CADERA}x")
-
-    # Crear ventanas
-    ventanas_creadas = 0
-    for i in range(0, len(df) - WINDOW_SIZE + 1, OVERLAP):
-        ventana = df.iloc[i:i+WINDOW_SIZE][cols].values
-        datos_totales.append(ventana)
-        etiquetas_totales.append(etiqueta)
-        ventanas_creadas += 1
-
-    print(f"   → Ventanas creadas: {ventanas_creadas}")
+    print(f"   → Ventanas creadas: {len(ventanas)}")
 
 # Convertir a arrays
-X = np.array(datos_totales, dtype=np.float32)
-y = np.array(etiquetas_totales, dtype=np.int32)
+X = np.concatenate(datos_totales).astype(np.float32)
+y = np.concatenate(etiquetas_totales)
 
 print(f"\n📊 Datos preparados:")
 print(f"   Total de ventanas: {len(X)}")
@@ -138,13 +147,9 @@ print("   - Dropout aumentado a 0.5\n")
 
 early_stop = EarlyStopping(monitor='val_loss', patience=15, restore_best_weights=True)
 
-history = model.fit(
-    X_train, y_train,
-    validation_data=(X_test, y_test),
-    epochs=EPOCHS,
-    batch_size=BATCH_SIZE,
-    callbacks=[early_stop],
-    verbose=1
+history = aumentacion.entrenar_modelo(
+    model, X_train, y_train, (X_test, y_test), spec["columnas"], EPOCHS, BATCH_SIZE,
+    callbacks=[early_stop], con_aumentacion=AUMENTAR, balancear=BALANCEAR, semilla=SEMILLA
 )
 
 # --- 5. EVALUAR ---
@@ -173,9 +178,10 @@ print("\n📋 Reporte de clasificación:")
 print(classification_report(y_test, y_pred, target_names=['Normal', 'Caída']))
 
 # --- 6. GUARDAR MODELO ---
-MODEL_PATH = "modelo_cnn_imu.h5"
+MODEL_PATH = "modelo_cnn_imu.h5" if SENSORES == "auto" else f"modelo_cnn_imu_{SENSORES}.h5"
 model.save(MODEL_PATH)
 print(f"\n💾 Modelo guardado: {MODEL_PATH}")
+print(f"💾 Spec de preprocesamiento: {prep.guardar_spec(MODEL_PATH, spec)}")
 
 # Gráfico de entrenamiento
 plt.figure(figsize=(12,4))
@@ -201,4 +207,8 @@ plt.tight_layout()
 plt.savefig('entrenamiento_arduino.png', dpi=150)
 print(f"💾 Gráfico guardado: entrenamiento_arduino.png")
 
+# --- 7. MODELO LIGERO ---
+if ENTRENAR_LIGERO:
+    modelo_ligero.entrenar_y_comparar(X_train, y_train, X_test, y_test, spec, model, MODEL_PATH)
+
 print("\n✅ ¡Entrenamiento completado!")